@@ -33,6 +33,11 @@ read_setting() {
 SERVER_PORT="$(read_setting SERVER_PORT)"
 ENABLE_TLS="$(read_setting ENABLE_TLS)"
 EXPORT_TARGETS="$(read_setting EXPORT_TARGETS)"
+STORAGE_LAYOUT="$(read_setting STORAGE_LAYOUT)"
+STORAGE_VERSIONED_PATHS="$(read_setting STORAGE_VERSIONED_PATHS)"
+PKG_EXTRA_ROOTS="$(read_setting PKG_EXTRA_ROOTS)"
+DOWNLOAD_COUNTING="$(read_setting DOWNLOAD_COUNTING)"
+PKGTOOL_LAZY_MEDIA="$(read_setting PKGTOOL_LAZY_MEDIA)"
 
 TLS_ENABLED=false
 case "$(printf '%s' "${ENABLE_TLS:-false}" | tr '[:upper:]' '[:lower:]')" in
@@ -57,6 +62,36 @@ if [ "$TLS_ENABLED" = "true" ]; then
   fi
 fi
 
+SHARDED_DIRECTIVE_PREFIX="# "
+case "$(printf '%s' "${STORAGE_LAYOUT:-flat}" | tr '[:upper:]' '[:lower:]')" in
+  sharded) SHARDED_DIRECTIVE_PREFIX="" ;;
+esac
+
+# Unversioned PKG URLs are reused by newer releases, so caches must revalidate.
+PKG_CACHE_CONTROL="public, no-cache"
+case "$(printf '%s' "${STORAGE_VERSIONED_PATHS:-false}" | tr '[:upper:]' '[:lower:]')" in
+  1|true|yes|on) PKG_CACHE_CONTROL="public, max-age=31536000, immutable" ;;
+esac
+
+MEDIA_FALLBACK="=404"
+LAZY_MEDIA_DIRECTIVE_PREFIX="# "
+case "$(printf '%s' "${PKGTOOL_LAZY_MEDIA:-false}" | tr '[:upper:]' '[:lower:]')" in
+  1|true|yes|on)
+    MEDIA_FALLBACK="@media"
+    LAZY_MEDIA_DIRECTIVE_PREFIX=""
+    ;;
+esac
+
+DOWNLOAD_LOG_DIRECTIVE_PREFIX="# "
+case "$(printf '%s' "${DOWNLOAD_COUNTING:-api}" | tr '[:upper:]' '[:lower:]')" in
+  access-log)
+    DOWNLOAD_LOG_DIRECTIVE_PREFIX=""
+    # The worker fills the map with its first export.
+    mkdir -p /app/data/internal/catalog
+    touch /app/data/internal/catalog/download_map.conf
+    ;;
+esac
+
 if [ -z "$SERVER_PORT" ]; then
   SERVER_PORT="$DEFAULT_PORT"
 fi
@@ -82,8 +117,42 @@ sed \
   -e "s|__SERVER_LISTEN_PORT__|$SERVER_PORT|g" \
   -e "s|__SERVER_LISTEN_SSL_SUFFIX__|$LISTEN_SUFFIX|g" \
   -e "s|__SSL_DIRECTIVE_PREFIX__|$SSL_DIRECTIVE_PREFIX|g" \
+  -e "s|__SHARDED_DIRECTIVE_PREFIX__|$SHARDED_DIRECTIVE_PREFIX|g" \
+  -e "s|__PKG_CACHE_CONTROL__|$PKG_CACHE_CONTROL|g" \
+  -e "s|__DOWNLOAD_LOG_DIRECTIVE_PREFIX__|$DOWNLOAD_LOG_DIRECTIVE_PREFIX|g" \
+  -e "s|__MEDIA_FALLBACK__|$MEDIA_FALLBACK|g" \
+  -e "s|__LAZY_MEDIA_DIRECTIVE_PREFIX__|$LAZY_MEDIA_DIRECTIVE_PREFIX|g" \
   "$NGINX_TEMPLATE_FILE" > /etc/nginx/nginx.conf
 
+# /pkg/ falls through the extra package volumes in order, then answers 404.
+write_pkg_volume_locations() {
+  name="pkg_volumes"
+  index=1
+  old_ifs="$IFS"
+  IFS=","
+  for root in $PKG_EXTRA_ROOTS; do
+    IFS="$old_ifs"
+    root="$(printf '%s' "$root" | sed -E "s/^[[:space:]]+//; s/[[:space:]]+$//")"
+    case "$root" in
+      /*) ;;
+      *) continue ;;
+    esac
+    index=$((index + 1))
+    printf 'location @%s {\n' "$name"
+    printf '  root %s;\n' "$root"
+    printf '  try_files $pkg_volume_uri $pkg_volume_unsharded_uri @pkg_volume_%s;\n' "$index"
+    printf '  default_type application/octet-stream;\n'
+    printf '  add_header Accept-Ranges bytes always;\n'
+    printf '  add_header Cache-Control $pkg_cache_control always;\n'
+    printf '  gzip off;\n}\n'
+    name="pkg_volume_$index"
+  done
+  IFS="$old_ifs"
+  printf 'location @%s {\n  return 404;\n}\n' "$name"
+}
+
+write_pkg_volume_locations > /etc/nginx/pkg_volumes.conf
+
 APP_VERSION="unknown"
 if [ -f "$PYPROJECT_FILE" ]; then
   APP_VERSION="$(
@@ -18,9 +18,16 @@ CREATE TABLE IF NOT EXISTS catalog_items
     icon0_path      TEXT,
     pic0_path       TEXT,
     pic1_path       TEXT,
+    pic0_entry      TEXT,
+    pic1_entry      TEXT,
     sfo_json        TEXT NOT NULL,
     sfo_raw         BLOB NOT NULL,
     sfo_hash        TEXT NOT NULL,
+    probe_version   INTEGER NOT NULL DEFAULT 0,
+    derive_version  INTEGER NOT NULL DEFAULT 0,
+    pkg_md5         TEXT,
+    pkg_blake2      TEXT,
+    pkg_hashed_at   TEXT,
     created_at      TEXT NOT NULL,
     updated_at      TEXT NOT NULL,
     UNIQUE (content_id, app_type, version)
@@ -39,3 +46,63 @@ CREATE TABLE IF NOT EXISTS download_counters
 );
 
 CREATE INDEX IF NOT EXISTS download_counters_downloads_idx ON download_counters (downloads);
+
+CREATE TABLE IF NOT EXISTS download_log_state
+(
+    log_name   TEXT PRIMARY KEY,
+    inode      INTEGER NOT NULL,
+    position   INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS probe_cache
+(
+    pkg_fingerprint TEXT PRIMARY KEY,
+    status          TEXT NOT NULL,
+    error           TEXT,
+    content_id      TEXT,
+    title_id        TEXT,
+    title           TEXT,
+    category        TEXT,
+    version         TEXT,
+    pubtoolinfo     TEXT,
+    system_ver      TEXT,
+    app_type        TEXT,
+    release_date    TEXT,
+    icon0_path      TEXT,
+    pic0_path       TEXT,
+    pic1_path       TEXT,
+    pic0_entry      TEXT,
+    pic1_entry      TEXT,
+    sfo_json        TEXT,
+    sfo_raw         BLOB,
+    sfo_hash        TEXT,
+    probe_version   INTEGER NOT NULL DEFAULT 0,
+    derive_version  INTEGER NOT NULL DEFAULT 0,
+    created_at      TEXT NOT NULL,
+    updated_at      TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pkg_snapshot
+(
+    pkg_path     TEXT PRIMARY KEY,
+    pkg_size     INTEGER NOT NULL,
+    pkg_mtime_ns INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS reprobe_queue
+(
+    pkg_path TEXT PRIMARY KEY
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS media_derivatives
+(
+    source_name     TEXT NOT NULL,
+    variant         TEXT NOT NULL,
+    source_size     INTEGER NOT NULL,
+    source_mtime_ns INTEGER NOT NULL,
+    source_hash     TEXT NOT NULL,
+    output_name     TEXT,
+    updated_at      TEXT NOT NULL,
+    PRIMARY KEY (source_name, variant)
+) WITHOUT ROWID;
@@ -3,17 +3,39 @@ from __future__ import annotations
 import logging
 import os
 import signal
+import threading
 import time
 from pathlib import Path
 from types import FrameType
-from typing import final
+from typing import ClassVar, final
 
 from homebrew_cdn_m1_server.domain.models.app_config import AppConfig
+from homebrew_cdn_m1_server.domain.models.download_counting import DownloadCounting
+from homebrew_cdn_m1_server.domain.models.ingest_priority import IngestPriority
+from homebrew_cdn_m1_server.domain.models.io_budget_policy import IoBudgetPolicy, parse_hour_range
+from homebrew_cdn_m1_server.domain.models.export_policy import ExportPolicy
 from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+from homebrew_cdn_m1_server.domain.models.results import ReconcileResult
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
+from homebrew_cdn_m1_server.domain.workflows.build_media_derivatives import (
+    BuildMediaDerivatives,
+)
 from homebrew_cdn_m1_server.domain.workflows.export_outputs import ExportOutputs
+from homebrew_cdn_m1_server.domain.workflows.export_scheduler import ExportScheduler
+from homebrew_cdn_m1_server.domain.workflows.extract_lazy_media import ExtractLazyMedia
+from homebrew_cdn_m1_server.domain.workflows.hash_packages import HashPackages
+from homebrew_cdn_m1_server.domain.workflows.ingest_concurrency import IngestConcurrency
 from homebrew_cdn_m1_server.domain.workflows.ingest_package import IngestPackage
+from homebrew_cdn_m1_server.domain.workflows.migrate_storage_layout import MigrateStorageLayout
 from homebrew_cdn_m1_server.domain.workflows.reconcile_catalog import ReconcileCatalog
+from homebrew_cdn_m1_server.domain.workflows.refresh_stale_items import RefreshStaleItems
+from homebrew_cdn_m1_server.domain.workflows.warm_page_cache import WarmPageCache
+from homebrew_cdn_m1_server.domain.protocols.catalog_export_protocol import (
+    CatalogExportProtocol,
+)
 from homebrew_cdn_m1_server.domain.protocols.scheduler_protocol import SchedulerProtocol
+from homebrew_cdn_m1_server.application.download_log_ingester import DownloadLogIngester
+from homebrew_cdn_m1_server.application.exporters.download_map_writer import DownloadMapWriter
 from homebrew_cdn_m1_server.application.exporters.fpkgi_json_exporter import FpkgiJsonExporter
 from homebrew_cdn_m1_server.application.exporters.store_db_exporter import StoreDbExporter
 from homebrew_cdn_m1_server.application.gateways.github_assets_gateway import (
@@ -32,49 +54,99 @@ from homebrew_cdn_m1_server.application.repositories.json_snapshot_repository im
 from homebrew_cdn_m1_server.application.repositories.settings_snapshot_repository import (
     SettingsSnapshotRepository,
 )
+from homebrew_cdn_m1_server.application.io_budget import IoBudget
 from homebrew_cdn_m1_server.application.hb_store_api import (
     HbStoreApiResolver,
     HbStoreApiServer,
 )
+from homebrew_cdn_m1_server.application.repositories.sqlite_snapshot_repository import (
+    SqliteSnapshotRepository,
+)
 from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import SqliteUnitOfWork
+from homebrew_cdn_m1_server.application.scheduler.adaptive_scheduler_runner import (
+    AdaptiveSchedulerRunner,
+)
 from homebrew_cdn_m1_server.application.scheduler.apscheduler_runner import APSchedulerRunner
+from homebrew_cdn_m1_server.application.watchers.inotify_watcher import InotifyWatcher
 from homebrew_cdn_m1_server.config.logging_setup import configure_logging
 from homebrew_cdn_m1_server.config.settings_loader import SettingsLoader
 
 
 @final
 class WorkerApp:
+    _TARGETED_RECONCILE_LOCK_TIMEOUT_SECONDS: ClassVar[float] = 30.0
+    _DEFAULT_REFRESH_ITEMS_PER_MINUTE: ClassVar[int] = 30
+    _DEFAULT_ADAPTIVE_MIN_SECONDS: ClassVar[int] = 15
+    _DEFAULT_ADAPTIVE_MAX_SECONDS: ClassVar[int] = 3600
+    _DEFAULT_EXPORT_MAX_STALENESS_SECONDS: ClassVar[int] = 900
+    _EXPORT_FLUSH_INTERVAL_SECONDS: ClassVar[int] = 5
+    _DEFAULT_SMALL_PKG_MAX_MB: ClassVar[int] = 1024
+    _DEFAULT_PKGTOOL_TIMEOUT_SECONDS_PER_GB: ClassVar[int] = 10
+    _DEFAULT_PREPROCESS_MAX_CPU_PERCENT: ClassVar[int] = 50
+    _DEFAULT_PREPROCESS_API_P99_MS: ClassVar[int] = 250
+    _DEFAULT_MEDIA_DERIVATIVES_WORKERS: ClassVar[int] = 2
+    _DOWNLOAD_LOG_INTERVAL_SECONDS: ClassVar[int] = 10
+    _DEFAULT_DOWNLOAD_DEDUP_SECONDS: ClassVar[int] = 600
+    _NGINX_PID_PATH: ClassVar[Path] = Path("/tmp/nginx.pid")
+
     def __init__(self, config: AppConfig) -> None:
         self._config = config
         self._scheduler: SchedulerProtocol | None = None
+        self._watcher: InotifyWatcher | None = None
         self._should_stop = False
         self._log = logging.getLogger("homebrew_cdn_m1_server.worker")
+        # Scheduler jobs, the package watcher and the API thread all reload
+        # settings; use cases are built under this lock so none of them sees
+        # the config and pkgtool of two different reloads.
+        self._settings_lock = threading.Lock()
+        # nginx is configured from these at container start, so changed
+        # STORAGE_* settings take effect on restart only.
+        self._storage_layout = config.user.storage_layout or StorageLayout.FLAT
+        self._versioned_paths = bool(config.user.storage_versioned_paths)
+        self._download_counting = config.user.download_counting or DownloadCounting.API
 
-        self._package_store = FilesystemRepository(config.paths)
-        self._snapshot_store = JsonSnapshotRepository(
-            snapshot_path=config.paths.snapshot_path,
-            schema_path=config.paths.init_dir / "snapshot.schema.json",
+        self._io_budget = IoBudget(*self._io_budget_settings(config), logger=self._log)
+        self._package_store = FilesystemRepository(
+            config.paths,
+            io_budget=self._io_budget,
+            logger=self._log,
+            layout=self._storage_layout,
+            versioned_paths=self._versioned_paths,
+            extra_roots=config.user.pkg_extra_roots or (),
+            pinned_roots=config.user.pkg_root_pins,
         )
+        self._snapshot_store = SqliteSnapshotRepository(config.paths.catalog_db_path)
         self._settings_snapshot_store = SettingsSnapshotRepository(
             snapshot_path=config.paths.settings_snapshot_path,
             settings_path=config.paths.settings_path,
+            pkgtool_bin_path=config.paths.pkgtool_bin_path,
         )
-        self._pkgtool = PkgtoolGateway(
-            pkgtool_bin=config.paths.pkgtool_bin_path,
-            timeout_seconds=config.user.pkgtool_timeout_seconds,
-            media_dir=config.paths.media_dir,
-        )
+        self._pkgtool = self._build_pkgtool(config, self._storage_layout)
         self._github_assets = GithubAssetsGateway()
         self._metadata_lookup = OrbisPatchesGateway()
         self._hb_store_resolver = HbStoreApiResolver(
             catalog_db_path=config.paths.catalog_db_path,
             store_db_path=config.paths.store_db_path,
             base_url=config.base_url,
+            layout=self._storage_layout,
+            dedup_window_seconds=self._download_dedup_seconds(config),
         )
+        self._export_scheduler = self._build_export_scheduler()
         self._hb_store_api = HbStoreApiServer(
             resolver=self._hb_store_resolver,
             logger=self._log,
+            reconcile_paths=self._reconcile_paths,
+            media_extractor=ExtractLazyMedia(
+                uow_factory=self._uow_factory,
+                package_probe=lambda: self._pkgtool,
+                media_dir=config.paths.media_dir,
+                logger=self._log,
+                layout=self._storage_layout,
+            ),
         )
+        self._ingest_concurrency: IngestConcurrency | None = None
+        self._page_cache_warmer = self._build_page_cache_warmer()
+        self._download_log_ingester: DownloadLogIngester | None = None
 
     @classmethod
     def run_from_env(cls) -> int:
@@ -93,6 +165,35 @@ class WorkerApp:
         with self._uow_factory() as uow:
             uow.catalog.init_schema(init_sql)
             uow.commit()
+        self._migrate_legacy_snapshot()
+
+    def _migrate_legacy_snapshot(self) -> None:
+        legacy_path = self._config.paths.snapshot_path
+        if not legacy_path.exists():
+            return
+        if self._snapshot_store.is_empty():
+            legacy_store = JsonSnapshotRepository(
+                snapshot_path=legacy_path,
+                schema_path=self._config.paths.init_dir / "snapshot.schema.json",
+            )
+            self._snapshot_store.save(legacy_store.load())
+        legacy_path.unlink(missing_ok=True)
+        self._log.info("Scan snapshot migrated to catalog DB: %s", legacy_path.name)
+
+    def _migrate_storage_layout(self) -> None:
+        migrate = MigrateStorageLayout(
+            uow_factory=self._uow_factory,
+            package_store=self._package_store,
+            snapshot_store=self._snapshot_store,
+            media_dir=self._config.paths.media_dir,
+            layout=self._storage_layout,
+            marker_path=self._config.paths.cache_dir / "storage_layout",
+            lock_path=self._config.paths.cache_dir / "reconcile.lock",
+            lock_timeout_seconds=60.0,
+            logger=self._log,
+            versioned_paths=self._versioned_paths,
+        )
+        _ = migrate()
 
     @staticmethod
     def _read_init_sql(path: Path) -> str:
@@ -103,51 +204,220 @@ class WorkerApp:
             raise ValueError(f"Catalog schema file is empty: {path}")
         return sql
 
-    def _build_reconcile_use_case(self) -> ReconcileCatalog:
-        ingest = IngestPackage(
+    def _build_ingest_package(self) -> IngestPackage:
+        return IngestPackage(
             uow_factory=self._uow_factory,
             package_probe=self._pkgtool,
             package_store=self._package_store,
             logger=self._log,
             metadata_lookup=self._metadata_lookup,
+            io_budget=self._io_budget,
+            lazy_media=bool(self._config.user.pkgtool_lazy_media),
         )
 
+    def _media_variants(self) -> dict[tuple[str, str], str]:
+        if not self._media_derivatives_enabled():
+            return {}
+        with self._uow_factory() as uow:
+            return uow.media_derivatives.load_index()
+
+    def _build_export_outputs(self) -> ExportOutputs:
+        media_variants = self._media_variants()
         exporters = [
             StoreDbExporter(
                 output_db_path=self._config.paths.store_db_path,
                 init_sql_path=self._config.paths.init_dir / "store_db.sql",
                 base_url=self._config.base_url,
                 metadata_lookup=self._metadata_lookup,
+                media_variants=media_variants,
+                download_map=self._build_download_map(),
             ),
             FpkgiJsonExporter(
                 output_dir=self._config.paths.fpkgi_share_dir,
                 base_url=self._config.base_url,
                 schema_path=self._config.paths.init_dir / "fpkgi.schema.json",
+                media_variants=media_variants,
             ),
         ]
 
-        export_outputs = ExportOutputs(
+        return ExportOutputs(
             uow_factory=self._uow_factory,
             exporters=exporters,
             logger=self._log,
+            io_budget=self._io_budget,
+        )
+
+    def _build_download_map(self) -> DownloadMapWriter | None:
+        if self._download_counting is not DownloadCounting.ACCESS_LOG:
+            return None
+        # Included by nginx.conf; entrypoint.sh creates it empty at start.
+        return DownloadMapWriter(
+            map_path=self._config.paths.cache_dir / "download_map.conf",
+            layout=self._storage_layout,
+            nginx_pid_path=self._NGINX_PID_PATH,
+            logger=self._log,
+        )
+
+    @classmethod
+    def _download_dedup_seconds(cls, config: AppConfig) -> int:
+        seconds = config.user.download_dedup_seconds
+        return cls._DEFAULT_DOWNLOAD_DEDUP_SECONDS if seconds is None else seconds
+
+    def _build_download_log_ingester(self) -> DownloadLogIngester:
+        # Stateful (dedup window), so built once.
+        return DownloadLogIngester(
+            uow_factory=self._uow_factory,
+            log_path=self._config.paths.logs_dir / "nginx_downloads.log",
+            logger=self._log,
+            dedup_window_seconds=self._download_dedup_seconds(self._config),
+            nginx_pid_path=self._NGINX_PID_PATH,
+        )
+
+    def _run_download_log_cycle(self) -> None:
+        if self._download_log_ingester is None:
+            self._download_log_ingester = self._build_download_log_ingester()
+        _ = self._download_log_ingester()
+
+    def _catalog_export(self) -> CatalogExportProtocol:
+        if self._export_scheduler is not None:
+            return self._export_scheduler
+        return self._build_export_outputs()
+
+    def _build_export_scheduler(self) -> ExportScheduler | None:
+        user = self._config.user
+        quiet_seconds = user.export_quiet_seconds or 0
+        if quiet_seconds <= 0:
+            return None
+        max_staleness = max(
+            quiet_seconds,
+            user.export_max_staleness_seconds or self._DEFAULT_EXPORT_MAX_STALENESS_SECONDS,
+        )
+        policies = {
+            OutputTarget.HB_STORE: ExportPolicy(
+                quiet_seconds=quiet_seconds,
+                max_staleness_seconds=max_staleness,
+                min_interval_seconds=user.export_hb_store_min_interval_seconds or 0,
+            ),
+            OutputTarget.FPKGI: ExportPolicy(
+                quiet_seconds=quiet_seconds,
+                max_staleness_seconds=max_staleness,
+                min_interval_seconds=user.export_fpkgi_min_interval_seconds or 0,
+            ),
+        }
+        return ExportScheduler(
+            export_outputs_factory=self._build_export_outputs,
+            policies=policies,
+            logger=self._log,
+        )
+
+    def _flush_exports(self) -> None:
+        if self._export_scheduler is not None:
+            _ = self._export_scheduler.flush()
+
+    @classmethod
+    def _build_pkgtool(cls, config: AppConfig, layout: StorageLayout) -> PkgtoolGateway:
+        per_gb = config.user.pkgtool_timeout_seconds_per_gb
+        return PkgtoolGateway(
+            pkgtool_bin=config.paths.pkgtool_bin_path,
+            timeout_seconds=config.user.pkgtool_timeout_seconds,
+            media_dir=config.paths.media_dir,
+            timeout_seconds_per_gb=(
+                cls._DEFAULT_PKGTOOL_TIMEOUT_SECONDS_PER_GB if per_gb is None else per_gb
+            ),
+            idle_priority=bool(config.user.pkgtool_idle_priority),
+            lazy_media=bool(config.user.pkgtool_lazy_media),
+            layout=layout,
+        )
+
+    @staticmethod
+    def _io_budget_settings(
+        config: AppConfig,
+    ) -> tuple[IoBudgetPolicy, IoBudgetPolicy | None, tuple[int, int] | None]:
+        user = config.user
+        business_hours = IoBudgetPolicy(
+            bytes_per_second=(user.io_budget_mb_per_second or 0) * 1_000_000,
+            ops_per_second=user.io_budget_iops or 0,
+        )
+        off_peak_hours = parse_hour_range(user.io_budget_off_peak_hours)
+        if off_peak_hours is None:
+            return business_hours, None, None
+        off_peak = IoBudgetPolicy(
+            bytes_per_second=(user.io_budget_off_peak_mb_per_second or 0) * 1_000_000,
+            ops_per_second=user.io_budget_off_peak_iops or 0,
+        )
+        return business_hours, off_peak, off_peak_hours
+
+    def _auto_concurrency(self) -> IngestConcurrency:
+        # Long-lived so each batch starts from the worker count the disk
+        # sustained in the previous one.
+        user = self._config.user
+        percent = (
+            user.reconcile_pkg_preprocess_max_cpu_percent
+            or self._DEFAULT_PREPROCESS_MAX_CPU_PERCENT
+        )
+        max_workers = max(1, (os.cpu_count() or 1) * percent // 100)
+        api_p99_ms = user.reconcile_pkg_preprocess_api_p99_ms
+        if api_p99_ms is None:
+            api_p99_ms = self._DEFAULT_PREPROCESS_API_P99_MS
+        current = self._ingest_concurrency
+        if current is not None and current.max_workers == max_workers:
+            return current
+        self._ingest_concurrency = IngestConcurrency(
+            max_workers=max_workers,
+            logger=self._log,
+            api_p99_seconds=self._hb_store_api.latency_p99_seconds,
+            api_p99_limit_seconds=api_p99_ms / 1000,
+            initial_workers=None if current is None else current.limit,
         )
+        self._log.info("Ingest concurrency set to auto: max workers: %d", max_workers)
+        return self._ingest_concurrency
 
+    def _build_reconcile_use_case(self) -> ReconcileCatalog:
+        workers = self._config.user.reconcile_pkg_preprocess_workers
+        concurrency: IngestConcurrency | None = None
+        worker_count = workers if isinstance(workers, int) else 1
+        if workers == "auto":
+            concurrency = self._auto_concurrency()
+            worker_count = concurrency.max_workers
+        small_pkg_max_mb = self._config.user.reconcile_small_pkg_max_mb
+        if small_pkg_max_mb is None:
+            small_pkg_max_mb = self._DEFAULT_SMALL_PKG_MAX_MB
         return ReconcileCatalog(
             uow_factory=self._uow_factory,
             package_store=self._package_store,
             snapshot_store=self._snapshot_store,
-            ingest_package=ingest,
-            export_outputs=export_outputs,
+            ingest_package=self._build_ingest_package(),
+            export_outputs=self._catalog_export(),
             lock_path=self._config.paths.cache_dir / "reconcile.lock",
             lock_timeout_seconds=0.0,
             logger=self._log,
-            worker_count=(
-                self._config.user.reconcile_pkg_preprocess_workers
-                if self._config.user.reconcile_pkg_preprocess_workers is not None
-                else 1
-            ),
+            worker_count=worker_count,
             output_targets=self._config.user.output_targets or tuple(),
             settings_snapshot_store=self._settings_snapshot_store,
+            file_stable_seconds=self._config.reconcile_file_stable_seconds,
+            cycle_max_items=self._config.user.reconcile_cycle_max_items or 0,
+            cycle_max_seconds=self._config.user.reconcile_cycle_max_seconds or 0,
+            export_every_items=self._config.user.reconcile_export_every_items or 0,
+            export_every_seconds=self._config.user.reconcile_export_every_seconds or 0,
+            priority=self._config.user.reconcile_priority or IngestPriority.PATH,
+            small_pkg_max_bytes=small_pkg_max_mb * 1024 * 1024,
+            concurrency=concurrency,
+        )
+
+    def _refresh_items_per_minute(self) -> int:
+        configured = self._config.user.pkgtool_refresh_items_per_minute
+        return self._DEFAULT_REFRESH_ITEMS_PER_MINUTE if configured is None else configured
+
+    def _build_refresh_use_case(self) -> RefreshStaleItems:
+        return RefreshStaleItems(
+            uow_factory=self._uow_factory,
+            package_probe=self._pkgtool,
+            export_outputs=self._catalog_export(),
+            output_targets=self._config.user.output_targets or tuple(),
+            lock_path=self._config.paths.cache_dir / "reconcile.lock",
+            logger=self._log,
+            items_per_run=self._refresh_items_per_minute(),
+            lazy_media=bool(self._config.user.pkgtool_lazy_media),
         )
 
     def _reload_runtime_settings(self) -> None:
@@ -163,13 +433,14 @@ class WorkerApp:
             user=loaded.user,
             paths=loaded.paths,
             reconcile_interval_seconds=current.reconcile_interval_seconds,
-            reconcile_file_stable_seconds=current.reconcile_file_stable_seconds,
-        )
-        self._pkgtool = PkgtoolGateway(
-            pkgtool_bin=self._config.paths.pkgtool_bin_path,
-            timeout_seconds=self._config.user.pkgtool_timeout_seconds,
-            media_dir=self._config.paths.media_dir,
+            reconcile_file_stable_seconds=(
+                loaded.user.reconcile_file_stable_seconds
+                if loaded.user.reconcile_file_stable_seconds is not None
+                else current.reconcile_file_stable_seconds
+            ),
         )
+        self._pkgtool = self._build_pkgtool(self._config, self._storage_layout)
+        self._io_budget.configure(*self._io_budget_settings(self._config))
         self._hb_store_resolver.set_base_url(self._config.base_url)
 
         if self._config.base_url != old_base_url:
@@ -179,10 +450,133 @@ class WorkerApp:
                 self._config.base_url,
             )
 
-    def _run_reconcile_cycle(self) -> None:
-        self._reload_runtime_settings()
-        reconcile = self._build_reconcile_use_case()
-        _ = reconcile()
+    def _run_reconcile_cycle(self) -> ReconcileResult:
+        return self._warm_ingested(self._reconcile_once())
+
+    def _hash_enabled(self) -> bool:
+        return bool(self._config.user.pkg_hash_enabled)
+
+    def _build_hash_use_case(self) -> HashPackages:
+        return HashPackages(
+            uow_factory=self._uow_factory,
+            export_outputs=self._catalog_export(),
+            output_targets=self._config.user.output_targets or tuple(),
+            logger=self._log,
+            io_budget=self._io_budget,
+            with_blake2=bool(self._config.user.pkg_hash_blake2),
+            verify_after_days=self._config.user.pkg_hash_verify_days or 0,
+            keep_cached=(
+                self._page_cache_warmer.is_warm if self._page_cache_warmer is not None else None
+            ),
+        )
+
+    def _run_hash_cycle(self) -> None:
+        if not self._hash_enabled():
+            return
+        with self._settings_lock:
+            hash_packages = self._build_hash_use_case()
+        _ = hash_packages()
+
+    def _media_derivatives_enabled(self) -> bool:
+        return bool(self._config.user.media_derivatives_enabled)
+
+    def _build_media_use_case(self) -> BuildMediaDerivatives:
+        return BuildMediaDerivatives(
+            uow_factory=self._uow_factory,
+            export_outputs=self._catalog_export(),
+            output_targets=self._config.user.output_targets or tuple(),
+            media_dir=self._config.paths.media_dir,
+            logger=self._log,
+            max_workers=(
+                self._config.user.media_derivatives_workers
+                or self._DEFAULT_MEDIA_DERIVATIVES_WORKERS
+            ),
+            io_budget=self._io_budget,
+        )
+
+    def _run_media_cycle(self) -> None:
+        if not self._media_derivatives_enabled():
+            return
+        with self._settings_lock:
+            build_media = self._build_media_use_case()
+        _ = build_media()
+
+    def _build_page_cache_warmer(self) -> WarmPageCache | None:
+        # Stateful (download rates between cycles), so built once.
+        warm_mb = self._config.user.page_cache_warm_mb or 0
+        if warm_mb <= 0:
+            return None
+        if not WarmPageCache.available():
+            self._log.warning("Page cache warming disabled: posix_fadvise is not available")
+            return None
+        return WarmPageCache(
+            uow_factory=self._uow_factory,
+            budget_bytes=warm_mb * 1024 * 1024,
+            logger=self._log,
+            io_budget=self._io_budget,
+        )
+
+    def _run_warm_cycle(self) -> None:
+        if self._page_cache_warmer is None:
+            return
+        _ = self._page_cache_warmer()
+
+    def _warm_ingested(self, result: ReconcileResult) -> ReconcileResult:
+        # New releases are prefetched before the first consoles ask for them.
+        if result.added:
+            self._run_warm_cycle()
+        return result
+
+    def _run_refresh_cycle(self) -> None:
+        with self._settings_lock:
+            self._reload_runtime_settings()
+            refresh = self._build_refresh_use_case()
+        _ = refresh()
+
+    def _reconcile_once(self, force_export: bool = False) -> ReconcileResult:
+        with self._settings_lock:
+            self._reload_runtime_settings()
+            reconcile = self._build_reconcile_use_case()
+        return reconcile(force_export=force_export)
+
+    def _reconcile_paths(
+        self,
+        paths: tuple[Path, ...],
+        lock_timeout_seconds: float = _TARGETED_RECONCILE_LOCK_TIMEOUT_SECONDS,
+    ) -> ReconcileResult:
+        with self._settings_lock:
+            self._reload_runtime_settings()
+            reconcile = self._build_reconcile_use_case()
+        return reconcile.reconcile_paths(paths, lock_timeout_seconds=lock_timeout_seconds)
+
+    def _on_watched_packages_ready(self, paths: tuple[Path, ...]) -> bool:
+        self._log.debug("Package watcher triggered reconcile: files: %d", len(paths))
+        # Without paths (event queue overflow) only a full scan is trustworthy.
+        # A skipped cycle (lock held by the scheduler) keeps the paths pending.
+        if not paths:
+            return not self._warm_ingested(self._reconcile_once()).skipped
+        result = self._reconcile_paths(paths, lock_timeout_seconds=0.0)
+        return not self._warm_ingested(result).skipped
+
+    def _start_watcher(self) -> None:
+        if self._config.user.reconcile_watch_enabled is False:
+            self._log.info("Package watcher disabled by settings")
+            return
+        paths = self._config.paths
+        watcher = InotifyWatcher(
+            root=paths.pkg_root,
+            excluded=(paths.media_dir,),
+            on_ready=self._on_watched_packages_ready,
+            stable_seconds=self._config.reconcile_file_stable_seconds,
+            logger=self._log,
+            extra_roots=self._package_store.roots[1:],
+        )
+        if watcher.start():
+            self._watcher = watcher
+            self._log.info(
+                "Package watcher started with %ss stability window",
+                self._config.reconcile_file_stable_seconds,
+            )
 
     def _sync_hb_store_assets_on_startup(self) -> None:
         output_targets = self._config.user.output_targets or tuple()
@@ -218,10 +612,13 @@ class WorkerApp:
     def start(self) -> None:
         self._initialize_layout_and_schema()
         self._start_hb_store_api()
+        # Runs with the API up; nginx serves files from either layout meanwhile.
+        self._migrate_storage_layout()
         self._sync_hb_store_assets_on_startup()
-        self._run_reconcile_cycle()
+        # Outputs are rebuilt once at startup; later cycles export only on change.
+        _ = self._reconcile_once(force_export=True)
 
-        scheduler = APSchedulerRunner()
+        scheduler = self._build_scheduler()
         cron_expr = str(self._config.user.reconcile_cron_expression or "").strip()
         if cron_expr:
             scheduler.schedule_cron("reconcile", cron_expr, self._run_reconcile_cycle)
@@ -235,10 +632,48 @@ class WorkerApp:
                 self._config.reconcile_interval_seconds,
             )
 
+        if self._refresh_items_per_minute() > 0:
+            scheduler.schedule_interval("refresh", 60, self._run_refresh_cycle)
+        if self._hash_enabled():
+            scheduler.schedule_interval("hash", 60, self._run_hash_cycle)
+        if self._media_derivatives_enabled():
+            if BuildMediaDerivatives.available():
+                scheduler.schedule_interval("media", 60, self._run_media_cycle)
+            else:
+                self._log.warning(
+                    "Media derivatives disabled: Pillow is not installed (install the media extra)"
+                )
+        if self._page_cache_warmer is not None:
+            scheduler.schedule_interval("warm", 60, self._run_warm_cycle)
+        if self._download_counting is DownloadCounting.ACCESS_LOG:
+            scheduler.schedule_interval(
+                "downloads", self._DOWNLOAD_LOG_INTERVAL_SECONDS, self._run_download_log_cycle
+            )
+        if self._export_scheduler is not None:
+            scheduler.schedule_interval(
+                "export", self._EXPORT_FLUSH_INTERVAL_SECONDS, self._flush_exports
+            )
+
         scheduler.start()
         self._scheduler = scheduler
+        self._start_watcher()
         self._log.info("Service started")
 
+    def _build_scheduler(self) -> SchedulerProtocol:
+        user = self._config.user
+        if not user.reconcile_adaptive_enabled:
+            return APSchedulerRunner()
+        min_seconds = user.reconcile_adaptive_min_seconds or self._DEFAULT_ADAPTIVE_MIN_SECONDS
+        max_seconds = user.reconcile_adaptive_max_seconds or self._DEFAULT_ADAPTIVE_MAX_SECONDS
+        self._log.info(
+            "Adaptive scheduling enabled: min: %ss, max: %ss", min_seconds, max_seconds
+        )
+        return AdaptiveSchedulerRunner(
+            min_seconds=min_seconds,
+            max_seconds=max_seconds,
+            logger=self._log,
+        )
+
     def _start_hb_store_api(self) -> None:
         self._hb_store_api.start()
 
@@ -253,6 +688,12 @@ class WorkerApp:
         return 0
 
     def shutdown(self) -> None:
+        watcher = self._watcher
+        self._watcher = None
+        if watcher is not None:
+            watcher.stop()
+        if self._export_scheduler is not None:
+            _ = self._export_scheduler.flush(force=True)
         self._stop_hb_store_api()
         scheduler = self._scheduler
         if scheduler is None:
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from threading import Lock
+from typing import ClassVar, final
+
+
+@final
+class DownloadDedupWindow:
+    # Consoles retry and resume large downloads; within window_seconds only
+    # the first request of a client for a counter key is counted. Entries are
+    # kept oldest first and never refreshed, so expiry only looks at the
+    # front. Past max_entries the oldest are forgotten early, which bounds
+    # memory at the cost of counting some repeats.
+    MAX_ENTRIES: ClassVar[int] = 65536
+
+    def __init__(self, window_seconds: float, max_entries: int = MAX_ENTRIES) -> None:
+        self._window_seconds = max(0.0, float(window_seconds))
+        self._max_entries = max(1, int(max_entries))
+        self._first_seen: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self._lock = Lock()
+
+    def first(self, client: str, key: str, now: float) -> bool:
+        if self._window_seconds <= 0 or not client:
+            return True
+        expired_before = now - self._window_seconds
+        with self._lock:
+            first_seen = self._first_seen
+            while first_seen and next(iter(first_seen.values())) <= expired_before:
+                _ = first_seen.popitem(last=False)
+            if (client, key) in first_seen:
+                return False
+            first_seen[(client, key)] = now
+            if len(first_seen) > self._max_entries:
+                _ = first_seen.popitem(last=False)
+            return True
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import logging
+import os
+import signal
+from collections import Counter
+from pathlib import Path
+from typing import Callable, ClassVar, final
+
+from homebrew_cdn_m1_server.application.download_dedup_window import DownloadDedupWindow
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import SqliteUnitOfWork
+
+
+@final
+class DownloadLogIngester:
+    # Tails the nginx download log (DOWNLOAD_COUNTING=access-log) and adds
+    # the downloads it records to download_counters in one transaction per
+    # cycle. Lines look like
+    #   <msec>|<client>|<method>|<status>|<tid>|<cid>|<ver>|<range>
+    # The read position (inode, offset) is committed with the counts, in
+    # download_log_state. Once the log is read to the end and has grown past
+    # rotate_bytes it is renamed to <log>.1 and nginx is told to reopen it
+    # (SIGUSR1); after a rotation the rest of <log>.1 is read first.
+    # Resumed range requests are not counted as new downloads, and repeats
+    # within dedup_window_seconds (timed by <msec>) count once, as in the API.
+    MAX_BYTES_PER_CYCLE: ClassVar[int] = 16 * 1024 * 1024
+    ROTATE_BYTES: ClassVar[int] = 64 * 1024 * 1024
+    _COUNTED_STATUSES: ClassVar[frozenset[str]] = frozenset({"200", "206"})
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], SqliteUnitOfWork],
+        log_path: Path,
+        logger: logging.Logger,
+        max_bytes_per_cycle: int = MAX_BYTES_PER_CYCLE,
+        dedup_window_seconds: float = 0.0,
+        nginx_pid_path: Path | None = None,
+        rotate_bytes: int = ROTATE_BYTES,
+    ) -> None:
+        self._uow_factory = uow_factory
+        self._log_path = log_path
+        self._logger = logger
+        self._max_bytes_per_cycle = max(1, int(max_bytes_per_cycle))
+        self._dedup_window = DownloadDedupWindow(dedup_window_seconds)
+        self._nginx_pid_path = nginx_pid_path
+        self._rotate_bytes = max(1, int(rotate_bytes))
+
+    def _load_state(self) -> tuple[int, int]:
+        with self._uow_factory() as uow:
+            return uow.catalog.get_download_log_position(self._log_path.name)
+
+    def _counter_key(self, line: str) -> str | None:
+        fields = line.rstrip("\n").split("|", 7)
+        if len(fields) != 8:
+            return None
+        msec, client, method, status, _, content_id, version, byte_range = fields
+        if method != "GET" or status not in self._COUNTED_STATUSES:
+            return None
+        byte_range = byte_range.strip()
+        if byte_range not in {"", "-"} and not byte_range.startswith("bytes=0-"):
+            return None
+        content_id = content_id.strip().upper()
+        version = version.strip()
+        if not content_id or content_id == "-" or not version or version == "-":
+            return None
+        # Same key the API uses for download.php?tid=&cid=&ver= requests.
+        key = f"{content_id}@{version}"
+        try:
+            now = float(msec)
+        except ValueError:
+            return None
+        if not self._dedup_window.first(client.strip(), key, now):
+            return None
+        return key
+
+    def _read(self, path: Path, offset: int, limit: int, counts: Counter[str]) -> int:
+        # Returns the offset after the last complete line read.
+        with path.open("rb") as stream:
+            _ = stream.seek(offset)
+            chunk = stream.read(limit)
+        end = chunk.rfind(b"\n") + 1
+        for raw_line in chunk[:end].splitlines():
+            key = self._counter_key(raw_line.decode("utf-8", errors="replace"))
+            if key is not None:
+                counts[key] += 1
+        return offset + end
+
+    def _commit(self, counts: Counter[str], inode: int, offset: int) -> None:
+        with self._uow_factory() as uow:
+            added = uow.catalog.add_download_counts(counts)
+            uow.catalog.save_download_log_position(self._log_path.name, inode, offset)
+            uow.commit()
+        if counts:
+            self._logger.debug(
+                "Download log ingested: downloads: %d, packages: %d", added, len(counts)
+            )
+
+    def _rotate(self) -> None:
+        # Only called once the log is read to the end, so the <log>.1 it
+        # replaces has been read as well.
+        if self._nginx_pid_path is None:
+            return
+        rotated = self._log_path.with_name(self._log_path.name + ".1")
+        try:
+            pid = int(self._nginx_pid_path.read_text("utf-8").strip())
+        except (OSError, ValueError):
+            return
+        try:
+            _ = self._log_path.replace(rotated)
+        except OSError as exc:
+            self._logger.warning("Download log rotation failed: error: %s", exc)
+            return
+        try:
+            os.kill(pid, signal.SIGUSR1)
+        except OSError as exc:
+            # nginx keeps writing to the renamed file; put it back.
+            if not self._log_path.exists():
+                _ = rotated.replace(self._log_path)
+            self._logger.warning("Download log rotation failed: error: %s", exc)
+
+    def __call__(self) -> int:
+        try:
+            stat = self._log_path.stat()
+        except OSError:
+            return 0
+        saved = self._load_state()
+        inode, offset = saved
+        counts: Counter[str] = Counter()
+        budget = self._max_bytes_per_cycle
+
+        if inode and inode != stat.st_ino:
+            rotated = self._log_path.with_name(self._log_path.name + ".1")
+            try:
+                rotated_stat = rotated.stat()
+                if rotated_stat.st_ino == inode and rotated_stat.st_size > offset:
+                    read_to = self._read(rotated, offset, budget, counts)
+                    if rotated_stat.st_size - offset > budget:
+                        # Budget spent on the old file; the new one waits.
+                        self._commit(counts, inode, read_to)
+                        return sum(counts.values())
+                    budget -= rotated_stat.st_size - offset
+            except OSError:
+                pass
+            offset = 0
+        elif offset > stat.st_size:
+            # Truncated in place (copytruncate).
+            offset = 0
+
+        if budget > 0 and stat.st_size > offset:
+            offset = self._read(self._log_path, offset, budget, counts)
+        if counts or (stat.st_ino, offset) != saved:
+            self._commit(counts, stat.st_ino, offset)
+        if offset >= stat.st_size >= self._rotate_bytes:
+            self._rotate()
+        return sum(counts.values())
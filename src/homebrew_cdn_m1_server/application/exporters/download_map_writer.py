@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+import logging
+import os
+import re
+import signal
+from pathlib import Path
+from typing import ClassVar, final
+
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
+
+
+@final
+class DownloadMapWriter:
+    # Writes the nginx map (DOWNLOAD_COUNTING=access-log) from the
+    # "check|tid|cid|ver" query of every store.db download URL to the stored
+    # PKG, so nginx serves those downloads without the API. URLs that name
+    # more than one PKG, and anything not in the map, still go to the API.
+    _SAFE_VALUE: ClassVar[re.Pattern[str]] = re.compile(r"^[A-Za-z0-9._-]+$")
+
+    def __init__(
+        self,
+        map_path: Path,
+        layout: StorageLayout = StorageLayout.FLAT,
+        nginx_pid_path: Path | None = None,
+        logger: logging.Logger | None = None,
+    ) -> None:
+        self._map_path = map_path
+        self._layout = layout
+        self._nginx_pid_path = nginx_pid_path
+        self._logger = logger
+
+    @property
+    def map_path(self) -> Path:
+        return self._map_path
+
+    def _entry(self, item: CatalogItem) -> tuple[str, str] | None:
+        values = (
+            item.title_id,
+            item.content_id.value,
+            item.version,
+            item.app_type.value,
+            item.pkg_path.name,
+        )
+        # Values are written into nginx.conf syntax unquoted.
+        if not all(self._SAFE_VALUE.match(value) for value in values):
+            return None
+        key = f"|{item.title_id}|{item.content_id.value}|{item.version}"
+        return key, self._layout.route(f"/pkg/{item.app_type.value}/{item.pkg_path.name}")
+
+    def _render(self, items: Sequence[CatalogItem]) -> str:
+        routes: dict[str, str | None] = {}
+        for item in items:
+            entry = self._entry(item)
+            if entry is None:
+                continue
+            key, route = entry
+            routes[key] = route if key not in routes else None
+        lines = [f'"{key}" {route};' for key, route in sorted(routes.items()) if route]
+        return "".join(f"{line}\n" for line in lines)
+
+    def _reload_nginx(self) -> None:
+        # Before nginx starts there is nothing to reload; it reads the file.
+        if self._nginx_pid_path is None or not self._nginx_pid_path.exists():
+            return
+        try:
+            pid = int(self._nginx_pid_path.read_text("utf-8").strip())
+            os.kill(pid, signal.SIGHUP)
+        except (OSError, ValueError) as exc:
+            if self._logger is not None:
+                self._logger.warning("Download map reload failed: error: %s", exc)
+
+    def write(self, items: Sequence[CatalogItem]) -> bool:
+        content = self._render(items)
+        try:
+            if self._map_path.read_text("utf-8") == content:
+                return False
+        except OSError:
+            pass
+        self._map_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._map_path.with_suffix(self._map_path.suffix + ".tmp")
+        _ = tmp_path.write_text(content, encoding="utf-8")
+        _ = tmp_path.replace(self._map_path)
+        # nginx reads map includes only when its configuration is loaded.
+        self._reload_nginx()
+        return True
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from collections.abc import Sequence
+from collections.abc import Collection, Mapping, Sequence
 import json
 import re
 from pathlib import Path
@@ -12,6 +12,7 @@ from homebrew_cdn_m1_server.application.exporters.fpkgi_contract import (
     build_fpkgi_schema,
 )
 from homebrew_cdn_m1_server.domain.protocols.output_exporter_protocol import OutputExporterProtocol
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
 from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
 from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
 
@@ -57,10 +58,18 @@ class FpkgiJsonExporter(OutputExporterProtocol):
     _HEX_SYSTEM_VER_PATTERN: ClassVar[re.Pattern[str]] = re.compile(r"^[0-9A-Fa-f]{8}$")
     _DOT_SYSTEM_VER_PATTERN: ClassVar[re.Pattern[str]] = re.compile(r"^\d+\.\d+(?:\.\d+)?$")
 
-    def __init__(self, output_dir: Path, base_url: str, schema_path: Path) -> None:
+    def __init__(
+        self,
+        output_dir: Path,
+        base_url: str,
+        schema_path: Path,
+        media_variants: Mapping[tuple[str, str], str] | None = None,
+    ) -> None:
         self._output_dir = output_dir
         self._base_url = base_url.rstrip("/")
         self._schema_path = schema_path
+        # (media file name, variant) -> derived file name under pkg/media/derived
+        self._media_variants = media_variants or {}
         self._validate_schema_contract()
 
     def _validate_schema_contract(self) -> None:
@@ -79,10 +88,16 @@ class FpkgiJsonExporter(OutputExporterProtocol):
             )
 
     def _pkg_url(self, item: CatalogItem) -> str:
-        return f"{self._base_url}/pkg/{item.app_type.value}/{item.content_id.value}.pkg"
+        # Named after the stored file, which carries the version when
+        # STORAGE_VERSIONED_PATHS is on.
+        return f"{self._base_url}/pkg/{item.app_type.value}/{item.pkg_path.name}"
 
     def _cover_url(self, item: CatalogItem) -> str:
-        return f"{self._base_url}/pkg/media/{item.content_id.value}_icon0.png"
+        media_name = f"{item.content_id.value}_icon0.png"
+        thumb = self._media_variants.get((media_name, "thumb"))
+        if thumb:
+            return f"{self._base_url}/pkg/media/derived/{thumb}"
+        return f"{self._base_url}/pkg/media/{media_name}"
 
     @classmethod
     def _region(cls, content_id: str) -> str | None:
@@ -145,14 +160,27 @@ class FpkgiJsonExporter(OutputExporterProtocol):
     def _format_size(item: CatalogItem) -> int:
         return int(item.pkg_size)
 
+    def _stem(self, app_type: AppType) -> str:
+        return self._STEM_BY_APP_TYPE.get(app_type.value, app_type.value.upper())
+
     @override
-    def export(self, items: Sequence[CatalogItem]) -> list[Path]:
+    def export(
+        self,
+        items: Sequence[CatalogItem],
+        app_types: Collection[AppType] | None = None,
+    ) -> list[Path]:
+        partial_stems = (
+            None if app_types is None else {self._stem(app_type) for app_type in app_types}
+        )
         grouped: dict[str, dict[str, FpkgiItem]] = {
-            stem: {} for stem in self._MANAGED_STEMS
+            stem: {}
+            for stem in self._MANAGED_STEMS
+            if partial_stems is None or stem in partial_stems
         }
         for item in items:
-            app_type = item.app_type.value
-            stem = self._STEM_BY_APP_TYPE.get(app_type, app_type.upper())
+            stem = self._stem(item.app_type)
+            if partial_stems is not None and stem not in partial_stems:
+                continue
             payload = grouped.setdefault(stem, {})
             pkg_url = self._pkg_url(item)
             payload[pkg_url] = FpkgiItem(
@@ -188,6 +216,9 @@ class FpkgiJsonExporter(OutputExporterProtocol):
             exported.append(destination)
             generated_paths.add(destination)
 
+        if partial_stems is not None:
+            return exported
+
         for managed in self._managed_files():
             if managed in generated_paths:
                 continue
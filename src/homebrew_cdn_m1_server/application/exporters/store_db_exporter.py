@@ -1,14 +1,16 @@
 from __future__ import annotations
 
-from collections.abc import Sequence
+from collections.abc import Collection, Mapping, Sequence
 import sqlite3
 from pathlib import Path
 from typing import final, override
 
+from homebrew_cdn_m1_server.application.exporters.download_map_writer import DownloadMapWriter
 from homebrew_cdn_m1_server.domain.protocols.output_exporter_protocol import OutputExporterProtocol
 from homebrew_cdn_m1_server.domain.protocols.title_metadata_lookup_protocol import (
     TitleMetadataLookupProtocol,
 )
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
 from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
 from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
 
@@ -25,11 +27,16 @@ class StoreDbExporter(OutputExporterProtocol):
         init_sql_path: Path,
         base_url: str,
         metadata_lookup: TitleMetadataLookupProtocol | None = None,
+        media_variants: Mapping[tuple[str, str], str] | None = None,
+        download_map: DownloadMapWriter | None = None,
     ) -> None:
         self._output_db_path = output_db_path
         self._init_sql_path = init_sql_path
         self._base_url = base_url.rstrip("/")
         self._metadata_lookup = metadata_lookup
+        # (media file name, variant) -> derived file name under pkg/media/derived
+        self._media_variants = media_variants or {}
+        self._download_map = download_map
 
     def _download_url(self, item: CatalogItem) -> str:
         return (
@@ -38,7 +45,13 @@ class StoreDbExporter(OutputExporterProtocol):
         )
 
     def _canonical_media_url(self, item: CatalogItem, suffix: str) -> str:
-        return f"{self._base_url}/pkg/media/{item.content_id.value}_{suffix}.png"
+        media_name = f"{item.content_id.value}_{suffix}.png"
+        # The store renders PNG, so only the losslessly recompressed variant
+        # replaces the extracted file.
+        recompressed = self._media_variants.get((media_name, "png"))
+        if recompressed:
+            return f"{self._base_url}/pkg/media/derived/{recompressed}"
+        return f"{self._base_url}/pkg/media/{media_name}"
 
     @classmethod
     def _format_store_size(cls, size_bytes: int) -> str:
@@ -84,7 +97,7 @@ class StoreDbExporter(OutputExporterProtocol):
             "github": None,
             "video": None,
             "twitter": None,
-            "md5": None,
+            "md5": item.pkg_md5,
         }
         return (
             row["content_id"],
@@ -113,7 +126,14 @@ class StoreDbExporter(OutputExporterProtocol):
         )
 
     @override
-    def export(self, items: Sequence[CatalogItem]) -> list[Path]:
+    def export(
+        self,
+        items: Sequence[CatalogItem],
+        app_types: Collection[AppType] | None = None,
+    ) -> list[Path]:
+        # store.db is a single file whose hash clients poll, so it is always
+        # rebuilt whole regardless of which app types changed.
+        _ = app_types
         self._output_db_path.parent.mkdir(parents=True, exist_ok=True)
         init_sql = self._init_sql_path.read_text("utf-8")
 
@@ -142,10 +162,15 @@ class StoreDbExporter(OutputExporterProtocol):
             conn.close()
 
         _ = tmp_db.replace(self._output_db_path)
+        # The nginx download map follows the URLs just published.
+        if self._download_map is not None and self._download_map.write(items):
+            return [self._output_db_path, self._download_map.map_path]
         return [self._output_db_path]
 
     @override
     def cleanup(self) -> list[Path]:
+        if self._download_map is not None:
+            _ = self._download_map.write([])
         if not self._output_db_path.exists():
             return []
         _ = self._output_db_path.unlink()
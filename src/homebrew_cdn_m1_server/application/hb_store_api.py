@@ -1,17 +1,26 @@
 from __future__ import annotations
 
+from collections import deque
+from collections.abc import Mapping
 import hashlib
 import json
 import logging
+import math
 import re
 import sqlite3
+import time
 from datetime import UTC, datetime
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from pathlib import Path
-from threading import Thread
-from typing import ClassVar, cast, final, override
+from pathlib import Path, PurePosixPath
+from threading import Lock, Thread
+from typing import Callable, ClassVar, cast, final, override
 from urllib.parse import parse_qs, urlparse
 
+from homebrew_cdn_m1_server.application.download_dedup_window import DownloadDedupWindow
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.results import ReconcileResult
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
+
 
 @final
 class HbStoreApiResolver:
@@ -62,7 +71,8 @@ class HbStoreApiResolver:
             COALESCE(content_id, ''),
             COALESCE(app_type, ''),
             COALESCE(version, ''),
-            COALESCE(updated_at, '')
+            COALESCE(updated_at, ''),
+            COALESCE(pkg_path, '')
         FROM catalog_items
         WHERE title_id = ?
     """
@@ -71,7 +81,8 @@ class HbStoreApiResolver:
             COALESCE(content_id, ''),
             COALESCE(app_type, ''),
             COALESCE(version, ''),
-            COALESCE(updated_at, '')
+            COALESCE(updated_at, ''),
+            COALESCE(pkg_path, '')
         FROM catalog_items
         WHERE content_id = ?
     """
@@ -83,10 +94,21 @@ class HbStoreApiResolver:
         LIMIT 1
     """
 
-    def __init__(self, catalog_db_path: Path, store_db_path: Path, base_url: str) -> None:
+    def __init__(
+        self,
+        catalog_db_path: Path,
+        store_db_path: Path,
+        base_url: str,
+        layout: StorageLayout = StorageLayout.FLAT,
+        dedup_window_seconds: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
         self._catalog_db_path = catalog_db_path
         self._store_db_path = store_db_path
         self._base_url = base_url.rstrip("/")
+        self._layout = layout
+        self._dedup_window = DownloadDedupWindow(dedup_window_seconds)
+        self._clock = clock
 
     def set_base_url(self, base_url: str) -> None:
         self._base_url = str(base_url or "").rstrip("/")
@@ -205,11 +227,17 @@ class HbStoreApiResolver:
         return "0"
 
     def increment_download_count(
-        self, title_id: str, content_id: str | None = None, version: str | None = None
+        self,
+        title_id: str,
+        content_id: str | None = None,
+        version: str | None = None,
+        client: str | None = None,
     ) -> int:
         key = self._counter_key(title_id, content_id, version)
         if not key or not self._catalog_db_path.exists():
             return 0
+        if not self._dedup_window.first(str(client or "").strip(), key, self._clock()):
+            return self._catalog_download_count(key) or 0
 
         if self._normalize_content_id(content_id):
             seed = 0
@@ -248,9 +276,9 @@ class HbStoreApiResolver:
     @classmethod
     def _best_catalog_row(
         cls,
-        rows: list[tuple[str, str, str, str]],
+        rows: list[tuple[str, str, str, str, str]],
         preferred_version: str | None = None,
-    ) -> tuple[str, str, str, str] | None:
+    ) -> tuple[str, str, str, str, str] | None:
         if not rows:
             return None
 
@@ -270,6 +298,18 @@ class HbStoreApiResolver:
             ),
         )
 
+    @staticmethod
+    def _catalog_route(row: tuple[str, str, str, str, str]) -> str | None:
+        content_id = str(row[0] or "").strip()
+        app_type = str(row[1] or "").strip().lower()
+        if not content_id or not app_type:
+            return None
+        # The stored file name carries the version with STORAGE_VERSIONED_PATHS.
+        pkg_name = PurePosixPath(str(row[4] or "")).name
+        if not pkg_name.endswith(".pkg"):
+            pkg_name = f"{content_id}.pkg"
+        return f"/pkg/{app_type}/{pkg_name}"
+
     def _package_url_from_catalog(self, title_id: str) -> str | None:
         if not title_id or not self._catalog_db_path.exists():
             return None
@@ -280,7 +320,7 @@ class HbStoreApiResolver:
         except sqlite3.Error:
             return None
 
-        rows = cast(list[tuple[str, str, str, str]], rows_obj)
+        rows = cast(list[tuple[str, str, str, str, str]], rows_obj)
         if not rows:
             return None
 
@@ -288,12 +328,9 @@ class HbStoreApiResolver:
         if best is None:
             return None
 
-        content_id = str(best[0] or "").strip()
-        app_type = str(best[1] or "").strip().lower()
-        if not content_id or not app_type:
+        route = self._catalog_route(best)
+        if route is None:
             return None
-
-        route = f"/pkg/{app_type}/{content_id}.pkg"
         if self._base_url:
             return f"{self._base_url}{route}"
         return route
@@ -316,15 +353,13 @@ class HbStoreApiResolver:
         except sqlite3.Error:
             return None
 
-        rows = cast(list[tuple[str, str, str, str]], rows_obj)
+        rows = cast(list[tuple[str, str, str, str, str]], rows_obj)
         best = self._best_catalog_row(rows, version)
         if best is None:
             return None
-        content_value = str(best[0] or "").strip()
-        app_type = str(best[1] or "").strip().lower()
-        if not content_value or not app_type:
+        route = self._catalog_route(best)
+        if route is None:
             return None
-        route = f"/pkg/{app_type}/{content_value}.pkg"
         if self._base_url:
             return f"{self._base_url}{route}"
         return route
@@ -380,24 +415,41 @@ class HbStoreApiResolver:
         normalized = path.lower()
         if not normalized.startswith("/pkg/") or not normalized.endswith(".pkg"):
             return None
-        return path
+        # Public URLs stay flat; the internal redirect goes to the stored file.
+        return self._layout.route(path)
 
 
 @final
 class HbStoreApiServer:
+    _ADMIN_RECONCILE_PATH: ClassVar[str] = "/admin/reconcile"
+    _ADMIN_MAX_BODY_BYTES: ClassVar[int] = 1024 * 1024
+    _PROXY_HEADERS: ClassVar[tuple[str, ...]] = ("X-Real-IP", "X-Forwarded-For")
+    _LATENCY_SAMPLES: ClassVar[int] = 512
+    _LATENCY_WINDOW_SECONDS: ClassVar[float] = 60.0
+    _MEDIA_PREFIX: ClassVar[str] = "/pkg/media/"
+
     def __init__(
         self,
         resolver: HbStoreApiResolver,
         logger: logging.Logger,
         host: str = "127.0.0.1",
         port: int = 18191,
+        reconcile_paths: Callable[[tuple[Path, ...]], ReconcileResult] | None = None,
+        media_extractor: Callable[[str], Path | None] | None = None,
+        clock: Callable[[], float] = time.monotonic,
     ) -> None:
         self._resolver = resolver
         self._logger = logger
+        self._reconcile_paths = reconcile_paths
+        self._media_extractor = media_extractor
         self._host = host
         self._port = int(port)
         self._server: ThreadingHTTPServer | None = None
         self._thread: Thread | None = None
+        self._clock = clock
+        # (clock time, seconds), oldest first.
+        self._latencies: deque[tuple[float, float]] = deque(maxlen=self._LATENCY_SAMPLES)
+        self._latencies_lock = Lock()
 
     @property
     def port(self) -> int:
@@ -439,19 +491,129 @@ class HbStoreApiServer:
             thread.join(timeout=2.0)
         self._logger.debug("HB-Store API stopped")
 
+    @classmethod
+    def _samples_latency(cls, path: str) -> bool:
+        # Only store API requests measure API pressure: lazy media extraction
+        # runs pkgtool and admin calls run a reconcile.
+        request_path = urlparse(path).path
+        return not (
+            request_path.startswith(cls._MEDIA_PREFIX) or request_path.startswith("/admin/")
+        )
+
+    def record_latency(self, seconds: float) -> None:
+        with self._latencies_lock:
+            self._latencies.append((self._clock(), max(0.0, float(seconds))))
+
+    def latency_p99_seconds(self) -> float | None:
+        # Over the public requests of the last _LATENCY_WINDOW_SECONDS; None
+        # without recent traffic.
+        expired_before = self._clock() - self._LATENCY_WINDOW_SECONDS
+        with self._latencies_lock:
+            while self._latencies and self._latencies[0][0] < expired_before:
+                _ = self._latencies.popleft()
+            samples = sorted(seconds for _, seconds in self._latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(len(samples) * 0.99) - 1)]
+
+    @staticmethod
+    def _parse_reconcile_paths(body: bytes) -> tuple[Path, ...] | None:
+        try:
+            payload = cast(object, json.loads(body.decode("utf-8") or "{}"))
+        except (UnicodeDecodeError, ValueError):
+            return None
+        if not isinstance(payload, dict):
+            return None
+        raw_paths = cast(dict[str, object], payload).get("paths")
+        if not isinstance(raw_paths, list):
+            return None
+        paths: list[Path] = []
+        for raw in cast(list[object], raw_paths):
+            text = str(raw or "").strip() if isinstance(raw, str) else ""
+            if not text:
+                return None
+            paths.append(Path(text))
+        return tuple(paths)
+
+    @staticmethod
+    def _catalog_entry(item: CatalogItem) -> dict[str, object]:
+        return {
+            "content_id": item.content_id.value,
+            "title_id": item.title_id,
+            "title": item.title,
+            "app_type": item.app_type.value,
+            "version": item.version,
+            "pkg_path": str(item.pkg_path),
+            "pkg_size": item.pkg_size,
+        }
+
+    @classmethod
+    def _reconcile_payload(cls, result: ReconcileResult) -> dict[str, object]:
+        return {
+            "added": result.added,
+            "updated": result.updated,
+            "removed": result.removed,
+            "failed": result.failed,
+            "items": [cls._catalog_entry(item) for item in result.items],
+        }
+
     def _build_handler(self) -> type[BaseHTTPRequestHandler]:
         resolver = self._resolver
         logger = self._logger
+        reconcile_paths = self._reconcile_paths
+        media_extractor = self._media_extractor
+        server_cls = type(self)
+        api_server = self
 
         class _Handler(BaseHTTPRequestHandler):
             server_version: str = "HomebrewCdnApi/1.0"
             sys_version: str = ""
 
             def do_HEAD(self) -> None:
+                started = time.perf_counter()
                 self._dispatch(send_body=False)
+                if server_cls._samples_latency(self.path):
+                    api_server.record_latency(time.perf_counter() - started)
 
             def do_GET(self) -> None:
+                started = time.perf_counter()
                 self._dispatch(send_body=True)
+                if server_cls._samples_latency(self.path):
+                    api_server.record_latency(time.perf_counter() - started)
+
+            def do_POST(self) -> None:
+                parsed = urlparse(self.path)
+                if parsed.path != server_cls._ADMIN_RECONCILE_PATH or reconcile_paths is None:
+                    self._write_json({"error": "not_found"}, status=404)
+                    return
+                # nginx only proxies the public endpoints and always sets these
+                # headers, so their presence means the request came from outside.
+                if any(self.headers.get(name) for name in server_cls._PROXY_HEADERS):
+                    self._write_json({"error": "forbidden"}, status=403)
+                    return
+
+                try:
+                    length = int(self.headers.get("Content-Length") or "0")
+                except ValueError:
+                    length = -1
+                if length < 0 or length > server_cls._ADMIN_MAX_BODY_BYTES:
+                    self._write_json({"error": "invalid_body"}, status=400)
+                    return
+                paths = server_cls._parse_reconcile_paths(self.rfile.read(length))
+                if paths is None:
+                    self._write_json({"error": "invalid_body"}, status=400)
+                    return
+
+                try:
+                    result = reconcile_paths(paths)
+                except Exception as exc:
+                    logger.error("Targeted reconcile failed: %s", exc)
+                    self._write_json({"error": "reconcile_failed"}, status=500)
+                    return
+                if result.skipped:
+                    self._write_json({"error": "reconcile_busy"}, status=409)
+                    return
+                self._write_json(server_cls._reconcile_payload(result))
 
             def _dispatch(self, send_body: bool) -> None:
                 parsed = urlparse(self.path)
@@ -485,7 +647,11 @@ class HbStoreApiServer:
                         return
 
                     if send_body:
-                        _ = resolver.increment_download_count(title_id, content_id, version)
+                        # nginx passes the console address; direct calls use the peer.
+                        client = self.headers.get("X-Real-IP") or self.client_address[0]
+                        _ = resolver.increment_download_count(
+                            title_id, content_id, version, client=client
+                        )
 
                     # Use internal redirect so clients receive a direct file response (200)
                     # while keeping download counter logic centralized in this endpoint.
@@ -496,11 +662,35 @@ class HbStoreApiServer:
                     self.end_headers()
                     return
 
+                if parsed.path.startswith(server_cls._MEDIA_PREFIX) and media_extractor is not None:
+                    # With the sharded layout nginx passes the rewritten
+                    # /pkg/media/<shard>/<name> URI.
+                    name = parsed.path[len(server_cls._MEDIA_PREFIX) :].rpartition("/")[2]
+                    try:
+                        media_path = media_extractor(name)
+                    except Exception as exc:
+                        logger.error("Media extraction failed: media: %s, error: %s", name, exc)
+                        media_path = None
+                    if media_path is None:
+                        self._write_json(
+                            {"error": "media_not_found"},
+                            status=404,
+                            send_body=send_body,
+                        )
+                        return
+                    # nginx falls back here when the file is missing; once it
+                    # is extracted the internal redirect serves it statically.
+                    self.send_response(200)
+                    self.send_header("X-Accel-Redirect", parsed.path)
+                    self.send_header("Content-Type", "image/png")
+                    self.end_headers()
+                    return
+
                 self._write_json({"error": "not_found"}, status=404, send_body=send_body)
 
             def _write_json(
                 self,
-                payload: dict[str, str],
+                payload: Mapping[str, object],
                 status: int = 200,
                 send_body: bool = True,
             ) -> None:
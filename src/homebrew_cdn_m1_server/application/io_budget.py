@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime
+from threading import Lock
+from typing import Callable, ClassVar, final
+
+from homebrew_cdn_m1_server.domain.models.io_budget_policy import IoBudgetPolicy
+
+
+@final
+class IoBudget:
+    # Token bucket shared by every background reader and writer so that
+    # nginx keeps most of the disk while reconcile, hashing and exports run.
+    # Callers reserve first and sleep off the debt afterwards, so concurrent
+    # callers queue up fairly instead of spinning on the lock.
+    BURST_SECONDS: ClassVar[float] = 1.0
+
+    def __init__(
+        self,
+        business_hours: IoBudgetPolicy,
+        off_peak: IoBudgetPolicy | None = None,
+        off_peak_hours: tuple[int, int] | None = None,
+        logger: logging.Logger | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        hour: Callable[[], int] = lambda: datetime.now().hour,
+    ) -> None:
+        self._logger = logger
+        self._clock = clock
+        self._sleep = sleep
+        self._hour = hour
+        self._lock = Lock()
+        self._business_hours = business_hours
+        self._off_peak = off_peak
+        self._off_peak_hours = off_peak_hours
+        self._bytes = 0.0
+        self._ops = 0.0
+        self._last_refill = clock()
+        self._active: IoBudgetPolicy | None = None
+
+    def configure(
+        self,
+        business_hours: IoBudgetPolicy,
+        off_peak: IoBudgetPolicy | None = None,
+        off_peak_hours: tuple[int, int] | None = None,
+    ) -> None:
+        with self._lock:
+            self._business_hours = business_hours
+            self._off_peak = off_peak
+            self._off_peak_hours = off_peak_hours
+
+    def _is_off_peak(self) -> bool:
+        hours = self._off_peak_hours
+        if hours is None or self._off_peak is None:
+            return False
+        start, end = hours
+        current = self._hour()
+        if start <= end:
+            return start <= current < end
+        return current >= start or current < end
+
+    def policy(self) -> IoBudgetPolicy:
+        with self._lock:
+            return self._current_policy()
+
+    def _current_policy(self) -> IoBudgetPolicy:
+        if self._is_off_peak() and self._off_peak is not None:
+            return self._off_peak
+        return self._business_hours
+
+    @staticmethod
+    def _refill(tokens: float, rate: float, elapsed: float) -> float:
+        if rate <= 0:
+            return 0.0
+        return min(rate * IoBudget.BURST_SECONDS, tokens + rate * elapsed)
+
+    def consume(self, size_bytes: int, ops: int = 1) -> float:
+        with self._lock:
+            policy = self._current_policy()
+            if policy != self._active:
+                self._active = policy
+                if self._logger is not None:
+                    self._logger.info(
+                        "I/O budget active: MB/s: %s, IOPS: %s",
+                        policy.bytes_per_second / 1_000_000 or "unlimited",
+                        policy.ops_per_second or "unlimited",
+                    )
+            if policy.unlimited:
+                return 0.0
+
+            now = self._clock()
+            elapsed = max(0.0, now - self._last_refill)
+            self._last_refill = now
+            self._bytes = self._refill(self._bytes, policy.bytes_per_second, elapsed)
+            self._ops = self._refill(self._ops, policy.ops_per_second, elapsed)
+
+            wait = 0.0
+            if policy.bytes_per_second > 0:
+                self._bytes -= max(0, int(size_bytes))
+                wait = max(wait, -self._bytes / policy.bytes_per_second)
+            if policy.ops_per_second > 0:
+                self._ops -= max(0, int(ops))
+                wait = max(wait, -self._ops / policy.ops_per_second)
+
+        if wait > 0:
+            self._sleep(wait)
+        return wait
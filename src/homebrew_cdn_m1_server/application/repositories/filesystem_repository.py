@@ -1,17 +1,79 @@
 from __future__ import annotations
 
+import errno
+import fcntl
+import logging
+import os
 import shutil
 import time
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import final
+from typing import ClassVar, final
 
+from homebrew_cdn_m1_server.application.io_budget import IoBudget
 from homebrew_cdn_m1_server.domain.models.app_config import RuntimePaths
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
+
+
+@dataclass(frozen=True, slots=True)
+class _DirListing:
+    mtime_ns: int
+    files: dict[str, tuple[int, int]]
+    subdirs: tuple[str, ...]
 
 
 @final
 class FilesystemRepository:
-    def __init__(self, paths: RuntimePaths) -> None:
+    # Listings are only cached once the directory and every PKG in it have been
+    # quiet for this long: files still being copied grow without touching the
+    # directory mtime, and coarse filesystem timestamps can hide quick changes.
+    _SETTLE_NS: ClassVar[int] = 60_000_000_000
+    _MOVE_CHUNK_BYTES: ClassVar[int] = 64 * 1024 * 1024
+    _PROGRESS_INTERVAL_SECONDS: ClassVar[float] = 10.0
+    # linux/fs.h: _IOW(0x94, 9, int)
+    _FICLONE: ClassVar[int] = 0x40049409
+    _COPY_FALLBACK_ERRNOS: ClassVar[frozenset[int]] = frozenset(
+        {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP}
+    )
+
+    def __init__(
+        self,
+        paths: RuntimePaths,
+        full_rescan_every: int = 12,
+        io_budget: IoBudget | None = None,
+        logger: logging.Logger | None = None,
+        layout: StorageLayout = StorageLayout.FLAT,
+        versioned_paths: bool = False,
+        extra_roots: Sequence[Path] = (),
+        pinned_roots: Mapping[str, Path] | None = None,
+    ) -> None:
         self._paths = paths
+        self._layout = layout
+        self._versioned_paths = versioned_paths
+        self._io_budget = io_budget
+        self._logger = logger or logging.getLogger("homebrew_cdn_m1_server.worker")
+        self._roots: tuple[Path, ...] = (
+            paths.pkg_root,
+            *dict.fromkeys(root for root in extra_roots if root != paths.pkg_root),
+        )
+        self._pinned_roots: dict[str, Path] = {}
+        for app_type, root in (pinned_roots or {}).items():
+            if root not in self._roots:
+                self._logger.warning(
+                    "PKG root pin ignored: app_type: %s, root: %s is not a package root",
+                    app_type,
+                    root,
+                )
+                continue
+            self._pinned_roots[str(app_type)] = root
+        self._copy_file_range_supported = True
+        self._sendfile_supported = True
+        self._full_rescan_every = max(1, int(full_rescan_every))
+        self._scan_count = 0
+        self._dir_cache: dict[str, _DirListing] = {}
+        self._unreadable_roots: tuple[Path, ...] = tuple()
 
     def ensure_layout(self) -> None:
         dirs = [
@@ -46,36 +108,191 @@ class FilesystemRepository:
         self._paths.public_index_path.parent.mkdir(parents=True, exist_ok=True)
         _ = shutil.copyfile(source_path, self._paths.public_index_path)
 
-    def scan_pkg_files(self) -> list[Path]:
-        if not self._paths.pkg_root.exists():
-            return []
+    @property
+    def roots(self) -> tuple[Path, ...]:
+        return self._roots
 
-        files: list[Path] = []
-        for pkg in self._paths.pkg_root.rglob("*.pkg"):
-            if not pkg.is_file():
-                continue
-            if self._paths.media_dir in pkg.parents:
+    def _list_dir(self, directory: str, mtime_ns: int, now_ns: int) -> _DirListing:
+        files: dict[str, tuple[int, int]] = {}
+        subdirs: list[str] = []
+        media_dir = str(self._paths.media_dir)
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.path != media_dir:
+                                subdirs.append(entry.path)
+                            continue
+                        if not entry.name.endswith(".pkg") or not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files[entry.path] = (int(stat.st_size), int(stat.st_mtime_ns))
+        except OSError:
+            _ = self._dir_cache.pop(directory, None)
+            return _DirListing(mtime_ns=mtime_ns, files={}, subdirs=tuple())
+
+        listing = _DirListing(mtime_ns=mtime_ns, files=files, subdirs=tuple(subdirs))
+        newest_ns = max([mtime_ns, *(meta[1] for meta in files.values())])
+        if now_ns - newest_ns > self._SETTLE_NS:
+            self._dir_cache[directory] = listing
+        else:
+            _ = self._dir_cache.pop(directory, None)
+        return listing
+
+    def _scan_root(
+        self, root: str, full_rescan: bool, now_ns: int
+    ) -> tuple[dict[str, tuple[int, int]], set[str]]:
+        snapshot: dict[str, tuple[int, int]] = {}
+        visited: set[str] = set()
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                mtime_ns = int(os.stat(directory).st_mtime_ns)
+            except OSError:
                 continue
-            files.append(pkg)
-        return sorted(files)
+            visited.add(directory)
+
+            cached = self._dir_cache.get(directory)
+            if not full_rescan and cached is not None and cached.mtime_ns == mtime_ns:
+                listing = cached
+            else:
+                listing = self._list_dir(directory, mtime_ns, now_ns)
+            snapshot.update(listing.files)
+            pending.extend(listing.subdirs)
+        return snapshot, visited
+
+    def unreadable_roots(self) -> tuple[Path, ...]:
+        # Roots the last scan could not read (an unmounted volume, say). Their
+        # PKGs are missing from the scan but must not be treated as deleted.
+        return self._unreadable_roots
+
+    def scan_pkg_stats(self) -> dict[str, tuple[int, int]]:
+        self._unreadable_roots = tuple(root for root in self._roots if not os.path.isdir(root))
+        roots = [str(root) for root in self._roots if root not in self._unreadable_roots]
+        if not roots:
+            self._dir_cache.clear()
+            return {}
+
+        # Directory mtimes change when entries are added, removed or renamed, but
+        # not when a file is rewritten in place; a periodic full walk covers that.
+        self._scan_count += 1
+        full_rescan = self._scan_count % self._full_rescan_every == 0
+        now_ns = time.time_ns()
+
+        if len(roots) == 1:
+            results = [self._scan_root(roots[0], full_rescan, now_ns)]
+        else:
+            # One walker per volume, so the disks are read in parallel.
+            with ThreadPoolExecutor(
+                max_workers=len(roots), thread_name_prefix="pkg-scan"
+            ) as executor:
+                results = list(
+                    executor.map(lambda root: self._scan_root(root, full_rescan, now_ns), roots)
+                )
+
+        snapshot: dict[str, tuple[int, int]] = {}
+        visited: set[str] = set()
+        for root_snapshot, root_visited in results:
+            snapshot.update(root_snapshot)
+            visited.update(root_visited)
+        for stale in set(self._dir_cache) - visited:
+            del self._dir_cache[stale]
+        return snapshot
+
+    def scan_pkg_files(self) -> list[Path]:
+        return sorted(Path(path) for path in self.scan_pkg_stats())
+
+    def managed_pkg_path(self, pkg_path: Path) -> Path | None:
+        candidate = pkg_path if pkg_path.is_absolute() else self._paths.pkg_root / pkg_path
+        normalized = Path(os.path.normpath(candidate))
+        if normalized.suffix != ".pkg":
+            return None
+        if self.root_of(normalized) is None:
+            return None
+        if normalized.is_relative_to(self._paths.media_dir):
+            return None
+        return normalized
 
     def stat(self, pkg_path: Path) -> tuple[int, int]:
         stat = pkg_path.stat()
         return int(stat.st_size), int(stat.st_mtime_ns)
 
-    def move_to_canonical(self, pkg_path: Path, app_type: str, content_id: str) -> Path:
-        target_dir = self._paths.pkg_root / app_type
-        target_dir.mkdir(parents=True, exist_ok=True)
-        target = target_dir / f"{content_id}.pkg"
+    def root_of(self, pkg_path: Path) -> Path | None:
+        for root in sorted(self._roots, key=lambda root: len(root.parts), reverse=True):
+            if pkg_path.is_relative_to(root):
+                return root
+        return None
+
+    def _placement_root(self, app_type: str) -> Path:
+        pinned = self._pinned_roots.get(app_type)
+        if pinned is not None:
+            return pinned
+        if len(self._roots) == 1:
+            return self._paths.pkg_root
+        best = self._paths.pkg_root
+        best_free = -1
+        for root in self._roots:
+            try:
+                free = shutil.disk_usage(root).free
+            except OSError:
+                continue
+            if free > best_free:
+                best, best_free = root, free
+        return best
+
+    def _pkg_name(self, content_id: str, version: str | None) -> str:
+        # A versioned name gives every release its own URL, which is what
+        # makes the immutable caching of /pkg/ responses safe.
+        safe_version = "".join(ch for ch in str(version or "") if ch.isalnum() or ch == ".")
+        if self._versioned_paths and safe_version:
+            return f"{content_id}_v{safe_version}.pkg"
+        return f"{content_id}.pkg"
+
+    def canonical_path(
+        self,
+        app_type: str,
+        content_id: str,
+        version: str | None = None,
+        root: Path | None = None,
+    ) -> Path:
+        name = self._pkg_name(content_id, version)
+        return (root or self._paths.pkg_root) / app_type / self._layout.relative_path(name)
+
+    def move_to_canonical(
+        self,
+        pkg_path: Path,
+        app_type: str,
+        content_id: str,
+        version: str | None = None,
+    ) -> Path:
+        # A PKG already in place stays on its volume.
+        current_root = self.root_of(pkg_path)
+        if current_root is not None:
+            in_place = self.canonical_path(app_type, content_id, version, current_root)
+            if pkg_path.resolve() == in_place.resolve():
+                return in_place
+
+        for root in self._roots:
+            existing = self.canonical_path(app_type, content_id, version, root)
+            if existing.exists():
+                raise FileExistsError(f"Target already exists: {existing}")
 
-        if pkg_path.resolve() == target.resolve():
-            return target
+        target = self.canonical_path(
+            app_type, content_id, version, self._placement_root(app_type)
+        )
+        target.parent.mkdir(parents=True, exist_ok=True)
+        return self._move(pkg_path, target)
 
+    def relocate(self, source: Path, target: Path) -> Path:
+        # Used when the storage layout changes: a plain rename within pkg_root.
+        target.parent.mkdir(parents=True, exist_ok=True)
         if target.exists():
             raise FileExistsError(f"Target already exists: {target}")
-
-        moved = Path(shutil.move(str(pkg_path), str(target)))
-        return moved
+        return self._move(source, target)
 
     def move_to_errors(self, pkg_path: Path, reason: str) -> Path:
         self._paths.errors_dir.mkdir(parents=True, exist_ok=True)
@@ -84,4 +301,86 @@ class FilesystemRepository:
         destination = self._paths.errors_dir / (
             f"{pkg_path.stem}.{safe_reason}.{stamp}{pkg_path.suffix}"
         )
-        return Path(shutil.move(str(pkg_path), str(destination)))
+        return self._move(pkg_path, destination)
+
+    def _charge(self, size_bytes: int, ops: int = 1) -> None:
+        if self._io_budget is not None:
+            _ = self._io_budget.consume(size_bytes, ops=ops)
+
+    def _move(self, source: Path, target: Path) -> Path:
+        self._charge(0)
+        try:
+            return source.rename(target)
+        except OSError as exc:
+            if exc.errno != errno.EXDEV:
+                raise
+
+        # The copy lands under a temporary name and is renamed into place, so
+        # nginx and the scanner never see a partially written .pkg. copystat
+        # keeps the mtime, which lets ingest reuse the fingerprint taken while
+        # probing the source instead of reading the copy again.
+        partial = target.with_name(target.name + ".partial")
+        try:
+            with source.open("rb") as reader, partial.open("wb") as writer:
+                if not self._reflink(reader.fileno(), writer.fileno()):
+                    self._copy_range(reader.fileno(), writer.fileno(), source)
+                os.fsync(writer.fileno())
+            _ = shutil.copystat(source, partial)
+            _ = partial.replace(target)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+        source.unlink()
+        return target
+
+    def _reflink(self, source_fd: int, target_fd: int) -> bool:
+        # Bind mounts of one filesystem refuse rename() across mount points but
+        # still share extents, so a clone costs no data I/O at all.
+        try:
+            _ = fcntl.ioctl(target_fd, self._FICLONE, source_fd)
+        except OSError:
+            return False
+        self._charge(0)
+        return True
+
+    def _copy_chunk(self, source_fd: int, target_fd: int, offset: int, count: int) -> int:
+        copy_file_range = getattr(os, "copy_file_range", None)
+        if copy_file_range is not None and self._copy_file_range_supported:
+            try:
+                return int(copy_file_range(source_fd, target_fd, count, offset, offset))
+            except OSError as exc:
+                if exc.errno not in self._COPY_FALLBACK_ERRNOS:
+                    raise
+                self._copy_file_range_supported = False
+        if self._sendfile_supported:
+            try:
+                _ = os.lseek(target_fd, offset, os.SEEK_SET)
+                return os.sendfile(target_fd, source_fd, offset, count)
+            except OSError as exc:
+                if exc.errno not in self._COPY_FALLBACK_ERRNOS:
+                    raise
+                self._sendfile_supported = False
+        data = os.pread(source_fd, count, offset)
+        return os.pwrite(target_fd, data, offset)
+
+    def _copy_range(self, source_fd: int, target_fd: int, source: Path) -> None:
+        total = os.fstat(source_fd).st_size
+        offset = 0
+        last_report = time.monotonic()
+        while offset < total:
+            count = min(self._MOVE_CHUNK_BYTES, total - offset)
+            # Data is read from one device and written to the other.
+            self._charge(2 * count, ops=2)
+            copied = self._copy_chunk(source_fd, target_fd, offset, count)
+            if copied <= 0:
+                raise OSError(errno.EIO, f"Copy stopped early: {source}")
+            offset += copied
+            now = time.monotonic()
+            if now - last_report >= self._PROGRESS_INTERVAL_SECONDS:
+                last_report = now
+                self._logger.info(
+                    "PKG copy progress: file: %s, copied: %d/%d MB",
+                    source.name,
+                    offset // 1_000_000,
+                    total // 1_000_000,
+                )
@@ -1,43 +1,123 @@
 from __future__ import annotations
 
+from collections.abc import Mapping
 import hashlib
 import json
 from pathlib import Path
-from typing import final
+from typing import ClassVar, cast, final
+
+from homebrew_cdn_m1_server.config.settings_loader import SettingsLoader
+from homebrew_cdn_m1_server.domain.models.settings_change import SettingsChange
 
 
 @final
 class SettingsSnapshotRepository:
-    def __init__(self, snapshot_path: Path, settings_path: Path) -> None:
+    # Only these keys change what the exporters write (base URL, targets,
+    # media references, PKG URLs and the nginx download map). Everything else
+    # in settings.ini (log level, cron, worker count, timeouts) is a no-op
+    # for the catalog.
+    _EXPORT_KEYS: ClassVar[tuple[str, ...]] = (
+        "SERVER_IP",
+        "SERVER_PORT",
+        "ENABLE_TLS",
+        "EXPORT_TARGETS",
+        "MEDIA_DERIVATIVES_ENABLED",
+        "STORAGE_LAYOUT",
+        "STORAGE_VERSIONED_PATHS",
+        "DOWNLOAD_COUNTING",
+    )
+    EXPORT_GROUP: ClassVar[str] = "export"
+    PROBE_GROUP: ClassVar[str] = "probe"
+
+    def __init__(
+        self,
+        snapshot_path: Path,
+        settings_path: Path,
+        pkgtool_bin_path: Path | None = None,
+    ) -> None:
         self._snapshot_path = snapshot_path
         self._settings_path = settings_path
+        self._pkgtool_bin_path = pkgtool_bin_path
+        self._pkgtool_digest: tuple[tuple[int, int], str] | None = None
+
+    @staticmethod
+    def _digest(value: str) -> str:
+        return hashlib.blake2b(value.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _export_hash(self) -> str:
+        raw = SettingsLoader.read_values(self._settings_path)
+        payload = {key: raw.get(key, "") for key in self._EXPORT_KEYS}
+        return self._digest(json.dumps(payload, ensure_ascii=True, sort_keys=True))
 
-    def current_hash(self) -> str:
+    def _pkgtool_identity(self) -> str:
+        if self._pkgtool_bin_path is None:
+            return "missing"
+        # Hash the binary content, not its mtime: image rebuilds touch the
+        # mtime of an unchanged pkgtool. The digest is reused until it changes.
         try:
-            raw = self._settings_path.read_bytes()
+            stat = self._pkgtool_bin_path.stat()
+            key = (int(stat.st_size), int(stat.st_mtime_ns))
+            cached = self._pkgtool_digest
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            digest = hashlib.blake2b(digest_size=16)
+            with self._pkgtool_bin_path.open("rb") as stream:
+                for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+                    digest.update(chunk)
         except OSError:
-            raw = b""
-        return hashlib.blake2b(raw, digest_size=16).hexdigest()
+            return "missing"
+        self._pkgtool_digest = (key, digest.hexdigest())
+        return self._pkgtool_digest[1]
 
-    def load(self) -> str:
+    def _probe_hash(self) -> str:
+        # Probe logic changes are tracked per catalog row (probe_version /
+        # derive_version) and refreshed in the background, so only the
+        # pkgtool binary itself forces a full re-probe.
+        return self._digest(self._pkgtool_identity())
+
+    def current_hashes(self) -> dict[str, str]:
+        return {
+            self.EXPORT_GROUP: self._export_hash(),
+            self.PROBE_GROUP: self._probe_hash(),
+        }
+
+    @classmethod
+    def classify(
+        cls,
+        previous: Mapping[str, str],
+        current: Mapping[str, str],
+    ) -> SettingsChange:
+        previous_probe = previous.get(cls.PROBE_GROUP, "")
+        # A snapshot without group hashes (first run or the legacy whole-file
+        # hash) cannot prove the probe inputs changed, so only re-export.
+        if previous_probe and previous_probe != current.get(cls.PROBE_GROUP, ""):
+            return SettingsChange.REPROBE
+        if previous.get(cls.EXPORT_GROUP, "") != current.get(cls.EXPORT_GROUP, ""):
+            return SettingsChange.REEXPORT
+        if not previous_probe:
+            return SettingsChange.REEXPORT
+        return SettingsChange.NONE
+
+    def load(self) -> dict[str, str]:
         if not self._snapshot_path.exists():
-            return ""
+            return {}
         try:
-            raw_obj = json.loads(self._snapshot_path.read_text("utf-8"))
+            raw_obj = cast(object, json.loads(self._snapshot_path.read_text("utf-8")))
         except (OSError, ValueError, TypeError):
-            return ""
+            return {}
 
         if not isinstance(raw_obj, dict):
-            return ""
-        value = raw_obj.get("hash")
-        if not isinstance(value, str):
-            return ""
-        normalized = value.strip()
-        return normalized
-
-    def save(self, hash_value: str) -> None:
+            return {}
+        hashes: dict[str, str] = {}
+        for group in (self.EXPORT_GROUP, self.PROBE_GROUP):
+            value = cast(dict[str, object], raw_obj).get(group)
+            if isinstance(value, str) and value.strip():
+                hashes[group] = value.strip()
+        return hashes
+
+    def save(self, hashes: Mapping[str, str]) -> None:
         self._snapshot_path.parent.mkdir(parents=True, exist_ok=True)
-        payload = {"hash": str(hash_value or "").strip()}
+        payload = {str(group): str(value or "").strip() for group, value in hashes.items()}
         _ = self._snapshot_path.write_text(
             json.dumps(payload, ensure_ascii=True, indent=2, sort_keys=True) + "\n",
             encoding="utf-8",
@@ -1,11 +1,11 @@
 from __future__ import annotations
 
-from collections.abc import Mapping
+from collections.abc import Mapping, Sequence
 import json
 import sqlite3
 from datetime import UTC, datetime
 from pathlib import Path
-from typing import cast, final
+from typing import ClassVar, cast, final
 
 from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
 from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
@@ -15,6 +15,10 @@ from homebrew_cdn_m1_server.domain.models.content_id import ContentId
 
 @final
 class SqliteCatalogRepository:
+    # Rows written before probe/derive versions were recorded came from the
+    # first probe, so they are version 1 rather than "never probed".
+    _LEGACY_ROW_VERSION: ClassVar[int] = 1
+
     def __init__(self, conn: sqlite3.Connection, db_path: Path) -> None:
         self._conn = conn
         self._db_path = db_path
@@ -26,18 +30,29 @@ class SqliteCatalogRepository:
 
     def _ensure_catalog_columns(self) -> None:
         self._ensure_column("catalog_items", "publisher", "TEXT")
+        for column in ("pkg_md5", "pkg_blake2", "pkg_hashed_at"):
+            self._ensure_column("catalog_items", column, "TEXT")
+        for table in ("catalog_items", "probe_cache"):
+            for column in ("probe_version", "derive_version"):
+                if self._ensure_column(table, column, "INTEGER NOT NULL DEFAULT 0"):
+                    _ = self._conn.execute(
+                        f"UPDATE {table} SET {column} = ?", (self._LEGACY_ROW_VERSION,)
+                    )
+            for column in ("pic0_entry", "pic1_entry"):
+                self._ensure_column(table, column, "TEXT")
 
-    def _ensure_column(self, table: str, column: str, column_type: str) -> None:
+    def _ensure_column(self, table: str, column: str, column_type: str) -> bool:
         rows = cast(
             list[tuple[object, ...]],
             self._conn.execute(f"PRAGMA table_info({table})").fetchall(),
         )
         if not rows:
-            return
+            return False
         names = {str(row[1]) for row in rows if len(row) > 1}
         if column in names:
-            return
+            return False
         _ = self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        return True
 
     @staticmethod
     def _to_row(item: CatalogItem) -> dict[str, object]:
@@ -60,9 +75,15 @@ class SqliteCatalogRepository:
             "icon0_path": str(item.icon0_path) if item.icon0_path else None,
             "pic0_path": str(item.pic0_path) if item.pic0_path else None,
             "pic1_path": str(item.pic1_path) if item.pic1_path else None,
+            "pic0_entry": item.pic0_entry,
+            "pic1_entry": item.pic1_entry,
             "sfo_json": json.dumps(item.sfo.fields, ensure_ascii=True, sort_keys=True),
             "sfo_raw": item.sfo.raw,
             "sfo_hash": item.sfo.hash,
+            "probe_version": int(item.probe_version),
+            "derive_version": int(item.derive_version),
+            "pkg_md5": item.pkg_md5,
+            "pkg_blake2": item.pkg_blake2,
             "updated_at": now,
             "created_at": now,
         }
@@ -75,19 +96,39 @@ class SqliteCatalogRepository:
                 content_id, title_id, title, publisher, app_type, category, version,
                 pubtoolinfo, system_ver, release_date, pkg_path,
                 pkg_size, pkg_mtime_ns, pkg_fingerprint,
-                icon0_path, pic0_path, pic1_path,
+                icon0_path, pic0_path, pic1_path, pic0_entry, pic1_entry,
                 sfo_json, sfo_raw, sfo_hash,
+                probe_version, derive_version,
+                pkg_md5, pkg_blake2,
                 created_at, updated_at
             ) VALUES (
                 :content_id, :title_id, :title, :publisher, :app_type, :category, :version,
                 :pubtoolinfo, :system_ver, :release_date, :pkg_path,
                 :pkg_size, :pkg_mtime_ns, :pkg_fingerprint,
-                :icon0_path, :pic0_path, :pic1_path,
+                :icon0_path, :pic0_path, :pic1_path, :pic0_entry, :pic1_entry,
                 :sfo_json, :sfo_raw, :sfo_hash,
+                :probe_version, :derive_version,
+                :pkg_md5, :pkg_blake2,
                 :created_at, :updated_at
             )
             ON CONFLICT(content_id, app_type, version)
             DO UPDATE SET
+                -- Content hashes survive re-ingest as long as the file did not change.
+                pkg_md5=CASE
+                    WHEN catalog_items.pkg_fingerprint = excluded.pkg_fingerprint
+                    THEN COALESCE(excluded.pkg_md5, catalog_items.pkg_md5)
+                    ELSE excluded.pkg_md5
+                END,
+                pkg_blake2=CASE
+                    WHEN catalog_items.pkg_fingerprint = excluded.pkg_fingerprint
+                    THEN COALESCE(excluded.pkg_blake2, catalog_items.pkg_blake2)
+                    ELSE excluded.pkg_blake2
+                END,
+                pkg_hashed_at=CASE
+                    WHEN catalog_items.pkg_fingerprint = excluded.pkg_fingerprint
+                    THEN catalog_items.pkg_hashed_at
+                    ELSE NULL
+                END,
                 title_id=excluded.title_id,
                 title=excluded.title,
                 publisher=excluded.publisher,
@@ -102,9 +143,13 @@ class SqliteCatalogRepository:
                 icon0_path=excluded.icon0_path,
                 pic0_path=excluded.pic0_path,
                 pic1_path=excluded.pic1_path,
+                pic0_entry=excluded.pic0_entry,
+                pic1_entry=excluded.pic1_entry,
                 sfo_json=excluded.sfo_json,
                 sfo_raw=excluded.sfo_raw,
                 sfo_hash=excluded.sfo_hash,
+                probe_version=excluded.probe_version,
+                derive_version=excluded.derive_version,
                 updated_at=excluded.updated_at
             """,
             row,
@@ -176,6 +221,60 @@ class SqliteCatalogRepository:
         )
         return self.get_download_count(key)
 
+    def add_download_counts(self, counts: Mapping[str, int]) -> int:
+        # Batched form of increment_download_count for counters gathered
+        # elsewhere (the nginx access log); keys start from zero.
+        now = datetime.now(UTC).replace(microsecond=0).isoformat()
+        rows = [
+            (str(key).strip(), int(count))
+            for key, count in counts.items()
+            if str(key or "").strip() and count > 0
+        ]
+        if not rows:
+            return 0
+        _ = self._conn.executemany(
+            """
+            INSERT INTO download_counters (title_id, downloads, created_at, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(title_id) DO UPDATE SET
+                downloads = downloads + excluded.downloads,
+                updated_at = excluded.updated_at
+            """,
+            [(key, count, now, now) for key, count in rows],
+        )
+        return sum(count for _, count in rows)
+
+    def get_download_log_position(self, log_name: str) -> tuple[int, int]:
+        row = cast(
+            tuple[object, object] | None,
+            self._conn.execute(
+                "SELECT inode, position FROM download_log_state WHERE log_name = ? LIMIT 1",
+                (log_name,),
+            ).fetchone(),
+        )
+        if row is None:
+            return 0, 0
+        inode, position = row
+        if not isinstance(inode, int) or not isinstance(position, int):
+            return 0, 0
+        return inode, max(0, position)
+
+    def save_download_log_position(self, log_name: str, inode: int, position: int) -> None:
+        # Saved in the same transaction as add_download_counts, so a crash
+        # never counts a line twice or skips one.
+        now = datetime.now(UTC).replace(microsecond=0).isoformat()
+        _ = self._conn.execute(
+            """
+            INSERT INTO download_log_state (log_name, inode, position, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(log_name) DO UPDATE SET
+                inode = excluded.inode,
+                position = excluded.position,
+                updated_at = excluded.updated_at
+            """,
+            (log_name, int(inode), max(0, int(position)), now),
+        )
+
     @staticmethod
     def _row_text(row: Mapping[str, object], key: str) -> str:
         value = row.get(key)
@@ -271,9 +370,20 @@ class SqliteCatalogRepository:
             ),
             publisher=(cls._row_text(row, "publisher").strip() or None),
             downloads=cls._row_int(row, "downloads"),
+            probe_version=cls._row_int(row, "probe_version"),
+            derive_version=cls._row_int(row, "derive_version"),
+            pkg_md5=(cls._row_text(row, "pkg_md5").strip() or None),
+            pkg_blake2=(cls._row_text(row, "pkg_blake2").strip() or None),
+            pic0_entry=(cls._row_text(row, "pic0_entry").strip() or None),
+            pic1_entry=(cls._row_text(row, "pic1_entry").strip() or None),
         )
 
-    def list_items(self) -> list[CatalogItem]:
+    def _select_items(
+        self,
+        where_sql: str = "",
+        params: tuple[object, ...] = (),
+        order_sql: str = "ORDER BY ci.app_type, ci.content_id, ci.version",
+    ) -> list[CatalogItem]:
         self._conn.row_factory = sqlite3.Row
         rows = cast(
             list[sqlite3.Row],
@@ -297,9 +407,15 @@ class SqliteCatalogRepository:
                 ci.icon0_path,
                 ci.pic0_path,
                 ci.pic1_path,
+                ci.pic0_entry,
+                ci.pic1_entry,
                 ci.sfo_json,
                 ci.sfo_raw,
                 ci.sfo_hash,
+                ci.probe_version,
+                ci.derive_version,
+                ci.pkg_md5,
+                ci.pkg_blake2,
                 COALESCE(dc_pkg.downloads, dc_content.downloads, dc_title.downloads, 0) AS downloads
             FROM catalog_items AS ci
             LEFT JOIN download_counters AS dc_pkg
@@ -308,8 +424,11 @@ class SqliteCatalogRepository:
                 ON dc_content.title_id = ci.content_id
             LEFT JOIN download_counters AS dc_title
                 ON dc_title.title_id = ci.title_id
-            ORDER BY ci.app_type, ci.content_id, ci.version
             """
+            + where_sql
+            + "\n"
+            + order_sql,
+            params,
             ).fetchall(),
         )
 
@@ -322,15 +441,137 @@ class SqliteCatalogRepository:
                 continue
         return items
 
-    def delete_by_pkg_paths_not_in(self, existing_pkg_paths: set[str]) -> int:
-        cursor = self._conn.cursor()
-        if not existing_pkg_paths:
-            deleted = cursor.execute("DELETE FROM catalog_items").rowcount
-            return int(deleted or 0)
+    def list_items(self) -> list[CatalogItem]:
+        return self._select_items()
+
+    def get_by_pkg_paths(self, pkg_paths: set[str]) -> list[CatalogItem]:
+        if not pkg_paths:
+            return []
+        placeholders = ",".join("?" for _ in pkg_paths)
+        return self._select_items(
+            f"WHERE ci.pkg_path IN ({placeholders})",
+            tuple(str(path) for path in pkg_paths),
+        )
 
-        placeholders = ",".join("?" for _ in existing_pkg_paths)
-        deleted = cursor.execute(
-            f"DELETE FROM catalog_items WHERE pkg_path NOT IN ({placeholders})",
-            tuple(existing_pkg_paths),
+    def list_by_content_id(self, content_id: str) -> list[CatalogItem]:
+        return self._select_items("WHERE ci.content_id = ?", (str(content_id),))
+
+    def list_stale(
+        self,
+        probe_version: int,
+        derive_version: int,
+        limit: int,
+        deferred_media: bool = False,
+    ) -> list[CatalogItem]:
+        if limit <= 0:
+            return []
+        # deferred_media also lists rows whose PIC0/PIC1 were left in the PKG,
+        # for when PKGTOOL_LAZY_MEDIA has been turned off. Least recently
+        # touched first, so rows that failed to refresh (see defer_stale) do
+        # not starve the rest.
+        return self._select_items(
+            """
+            WHERE ci.probe_version < ? OR ci.derive_version < ?
+               OR (? AND (ci.pic0_entry IS NOT NULL OR ci.pic1_entry IS NOT NULL))
+            """,
+            (int(probe_version), int(derive_version), int(deferred_media), int(limit)),
+            order_sql="ORDER BY ci.updated_at, ci.pid LIMIT ?",
+        )
+
+    def defer_stale(self, item: CatalogItem) -> None:
+        now = datetime.now(UTC).replace(microsecond=0).isoformat()
+        _ = self._conn.execute(
+            """
+            UPDATE catalog_items SET updated_at = ?
+            WHERE content_id = ? AND app_type = ? AND version = ?
+            """,
+            (now, item.content_id.value, item.app_type.value, item.version),
+        )
+
+    def list_hash_due(
+        self,
+        limit: int,
+        require_blake2: bool = False,
+        verified_before: str | None = None,
+    ) -> list[CatalogItem]:
+        # Rows never hashed first, then rows whose last verification is older
+        # than `verified_before` (ISO timestamp), oldest first.
+        if limit <= 0:
+            return []
+        conditions = ["ci.pkg_md5 IS NULL"]
+        params: list[object] = []
+        if require_blake2:
+            conditions.append("ci.pkg_blake2 IS NULL")
+        if verified_before is not None:
+            conditions.append("ci.pkg_hashed_at < ?")
+            params.append(verified_before)
+        params.append(int(limit))
+        return self._select_items(
+            "WHERE " + " OR ".join(conditions),
+            tuple(params),
+            order_sql="ORDER BY ci.pkg_hashed_at IS NOT NULL, ci.pkg_hashed_at, ci.pid LIMIT ?",
+        )
+
+    def save_hashes(
+        self,
+        item: CatalogItem,
+        md5: str | None,
+        blake2: str | None,
+    ) -> bool:
+        # Guarded by the fingerprint so a PKG replaced while it was being
+        # hashed does not inherit the old content's hashes.
+        now = datetime.now(UTC).replace(microsecond=0).isoformat()
+        updated = self._conn.execute(
+            """
+            UPDATE catalog_items
+            SET pkg_md5 = ?, pkg_blake2 = COALESCE(?, pkg_blake2), pkg_hashed_at = ?
+            WHERE content_id = ? AND app_type = ? AND version = ? AND pkg_fingerprint = ?
+            """,
+            (
+                md5,
+                blake2,
+                now,
+                item.content_id.value,
+                item.app_type.value,
+                item.version,
+                item.pkg_fingerprint,
+            ),
+        ).rowcount
+        return bool(updated)
+
+    def delete_item(self, item: CatalogItem) -> int:
+        deleted = self._conn.execute(
+            "DELETE FROM catalog_items WHERE content_id = ? AND app_type = ? AND version = ?",
+            (item.content_id.value, item.app_type.value, item.version),
         ).rowcount
         return int(deleted or 0)
+
+    def delete_by_pkg_paths(self, pkg_paths: set[str]) -> int:
+        if not pkg_paths:
+            return 0
+        placeholders = ",".join("?" for _ in pkg_paths)
+        deleted = self._conn.execute(
+            f"DELETE FROM catalog_items WHERE pkg_path IN ({placeholders})",
+            tuple(pkg_paths),
+        ).rowcount
+        return int(deleted or 0)
+
+    def delete_by_pkg_paths_not_in(
+        self,
+        existing_pkg_paths: set[str],
+        keep_roots: Sequence[Path] = (),
+    ) -> int:
+        # Rows under keep_roots are left alone whether or not they were seen.
+        conditions: list[str] = []
+        params: list[object] = []
+        for root in keep_roots:
+            prefix = f"{str(root).rstrip('/')}/"
+            conditions.append("substr(pkg_path, 1, ?) != ?")
+            params.extend((len(prefix), prefix))
+        if existing_pkg_paths:
+            placeholders = ",".join("?" for _ in existing_pkg_paths)
+            conditions.append(f"pkg_path NOT IN ({placeholders})")
+            params.extend(existing_pkg_paths)
+        where_sql = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        deleted = self._conn.execute(f"DELETE FROM catalog_items{where_sql}", params).rowcount
+        return int(deleted or 0)
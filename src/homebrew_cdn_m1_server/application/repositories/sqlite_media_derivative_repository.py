@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import sqlite3
+from collections.abc import Collection, Mapping
+from datetime import UTC, datetime
+from typing import cast, final
+
+
+@final
+class SqliteMediaDerivativeRepository:
+    # One row per (media file, variant). output_name is NULL when the variant
+    # was built but turned out no lighter than the source, so the source
+    # stays recorded and is not rendered again.
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    def list_sources(self) -> dict[str, tuple[int, int]]:
+        rows = cast(
+            list[tuple[str, int, int]],
+            self._conn.execute(
+                """
+                SELECT source_name, MAX(source_size), MAX(source_mtime_ns)
+                FROM media_derivatives
+                GROUP BY source_name
+                """
+            ).fetchall(),
+        )
+        return {str(row[0]): (int(row[1]), int(row[2])) for row in rows}
+
+    def save(
+        self,
+        source_name: str,
+        source_size: int,
+        source_mtime_ns: int,
+        source_hash: str,
+        outputs: Mapping[str, str | None],
+    ) -> None:
+        now = datetime.now(UTC).replace(microsecond=0).isoformat()
+        _ = self._conn.execute(
+            "DELETE FROM media_derivatives WHERE source_name = ?", (source_name,)
+        )
+        _ = self._conn.executemany(
+            """
+            INSERT INTO media_derivatives (
+                source_name, variant, source_size, source_mtime_ns,
+                source_hash, output_name, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    source_name,
+                    variant,
+                    int(source_size),
+                    int(source_mtime_ns),
+                    source_hash,
+                    output_name,
+                    now,
+                )
+                for variant, output_name in sorted(outputs.items())
+            ],
+        )
+
+    def delete_except(self, source_names: Collection[str]) -> int:
+        known = set(source_names)
+        stale = [name for name in self.list_sources() if name not in known]
+        for name in stale:
+            _ = self._conn.execute(
+                "DELETE FROM media_derivatives WHERE source_name = ?", (name,)
+            )
+        return len(stale)
+
+    def load_index(self) -> dict[tuple[str, str], str]:
+        rows = cast(
+            list[tuple[str, str, str]],
+            self._conn.execute(
+                """
+                SELECT source_name, variant, output_name
+                FROM media_derivatives
+                WHERE output_name IS NOT NULL
+                """
+            ).fetchall(),
+        )
+        return {(str(row[0]), str(row[1])): str(row[2]) for row in rows}
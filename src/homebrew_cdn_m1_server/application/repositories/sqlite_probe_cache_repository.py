@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from collections.abc import Mapping
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import ClassVar, cast, final
+
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.content_id import ContentId
+from homebrew_cdn_m1_server.domain.models.results import ProbeResult
+
+
+@final
+class SqliteProbeCacheRepository:
+    _STATUS_OK: str = "ok"
+    _STATUS_FAILED: str = "failed"
+    # Failures are keyed by content fingerprint, which no longer matches
+    # anything once the file is replaced or deleted; they expire instead.
+    FAILURE_TTL: ClassVar[timedelta] = timedelta(days=30)
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(UTC).replace(microsecond=0).isoformat()
+
+    @staticmethod
+    def _optional_path(value: object) -> Path | None:
+        text = str(value or "").strip()
+        if not text:
+            return None
+        return Path(text)
+
+    @staticmethod
+    def _blob(value: object) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        if isinstance(value, (bytearray, memoryview)):
+            return bytes(value)
+        return b""
+
+    def get_result(self, fingerprint: str) -> ProbeResult | None:
+        key = str(fingerprint or "").strip()
+        if not key:
+            return None
+        row_obj = cast(
+            object,
+            self._conn.execute(
+                """
+                SELECT
+                    content_id, title_id, title, category, version,
+                    pubtoolinfo, system_ver, app_type, release_date,
+                    icon0_path, pic0_path, pic1_path,
+                    sfo_json, sfo_raw, sfo_hash,
+                    probe_version, derive_version,
+                    pic0_entry, pic1_entry
+                FROM probe_cache
+                WHERE pkg_fingerprint = ? AND status = ?
+                LIMIT 1
+                """,
+                (key, self._STATUS_OK),
+            ).fetchone(),
+        )
+        row = cast(tuple[object, ...] | None, row_obj)
+        if row is None:
+            return None
+
+        try:
+            fields_obj = cast(object, json.loads(str(row[12] or "{}")))
+            fields: dict[str, str] = {}
+            if isinstance(fields_obj, dict):
+                for field_key, field_value in cast(dict[object, object], fields_obj).items():
+                    fields[str(field_key)] = str(field_value)
+            return ProbeResult(
+                content_id=ContentId.parse(str(row[0] or "")),
+                title_id=str(row[1] or ""),
+                title=str(row[2] or ""),
+                category=str(row[3] or ""),
+                version=str(row[4] or ""),
+                pubtoolinfo=str(row[5] or ""),
+                system_ver=str(row[6] or ""),
+                app_type=AppType(str(row[7] or "unknown")),
+                release_date=str(row[8] or ""),
+                sfo_fields=fields,
+                sfo_raw=self._blob(row[13]),
+                sfo_hash=str(row[14] or ""),
+                icon0_path=self._optional_path(row[9]),
+                pic0_path=self._optional_path(row[10]),
+                pic1_path=self._optional_path(row[11]),
+                probe_version=int(cast(int, row[15] or 0)),
+                derive_version=int(cast(int, row[16] or 0)),
+                pic0_entry=(str(row[17] or "").strip() or None),
+                pic1_entry=(str(row[18] or "").strip() or None),
+            )
+        except ValueError:
+            return None
+
+    def get_failure(self, fingerprint: str) -> str | None:
+        key = str(fingerprint or "").strip()
+        if not key:
+            return None
+        row_obj = cast(
+            object,
+            self._conn.execute(
+                """
+                SELECT COALESCE(error, '')
+                FROM probe_cache
+                WHERE pkg_fingerprint = ? AND status = ?
+                LIMIT 1
+                """,
+                (key, self._STATUS_FAILED),
+            ).fetchone(),
+        )
+        row = cast(tuple[object] | None, row_obj)
+        if row is None:
+            return None
+        return str(row[0] or "")
+
+    def save_result(self, fingerprint: str, probe: ProbeResult) -> None:
+        now = self._now()
+        _ = self._conn.execute(
+            """
+            INSERT INTO probe_cache (
+                pkg_fingerprint, status, error,
+                content_id, title_id, title, category, version,
+                pubtoolinfo, system_ver, app_type, release_date,
+                icon0_path, pic0_path, pic1_path, pic0_entry, pic1_entry,
+                sfo_json, sfo_raw, sfo_hash,
+                probe_version, derive_version,
+                created_at, updated_at
+            ) VALUES (
+                :pkg_fingerprint, :status, NULL,
+                :content_id, :title_id, :title, :category, :version,
+                :pubtoolinfo, :system_ver, :app_type, :release_date,
+                :icon0_path, :pic0_path, :pic1_path, :pic0_entry, :pic1_entry,
+                :sfo_json, :sfo_raw, :sfo_hash,
+                :probe_version, :derive_version,
+                :now, :now
+            )
+            ON CONFLICT(pkg_fingerprint)
+            DO UPDATE SET
+                status=excluded.status,
+                error=NULL,
+                content_id=excluded.content_id,
+                title_id=excluded.title_id,
+                title=excluded.title,
+                category=excluded.category,
+                version=excluded.version,
+                pubtoolinfo=excluded.pubtoolinfo,
+                system_ver=excluded.system_ver,
+                app_type=excluded.app_type,
+                release_date=excluded.release_date,
+                icon0_path=excluded.icon0_path,
+                pic0_path=excluded.pic0_path,
+                pic1_path=excluded.pic1_path,
+                pic0_entry=excluded.pic0_entry,
+                pic1_entry=excluded.pic1_entry,
+                sfo_json=excluded.sfo_json,
+                sfo_raw=excluded.sfo_raw,
+                sfo_hash=excluded.sfo_hash,
+                probe_version=excluded.probe_version,
+                derive_version=excluded.derive_version,
+                updated_at=excluded.updated_at
+            """,
+            {
+                "pkg_fingerprint": fingerprint,
+                "status": self._STATUS_OK,
+                "content_id": probe.content_id.value,
+                "title_id": probe.title_id,
+                "title": probe.title,
+                "category": probe.category,
+                "version": probe.version,
+                "pubtoolinfo": probe.pubtoolinfo,
+                "system_ver": probe.system_ver,
+                "app_type": probe.app_type.value,
+                "release_date": probe.release_date,
+                "icon0_path": str(probe.icon0_path) if probe.icon0_path else None,
+                "pic0_path": str(probe.pic0_path) if probe.pic0_path else None,
+                "pic1_path": str(probe.pic1_path) if probe.pic1_path else None,
+                "pic0_entry": probe.pic0_entry,
+                "pic1_entry": probe.pic1_entry,
+                "sfo_json": json.dumps(dict(probe.sfo_fields), ensure_ascii=True, sort_keys=True),
+                "sfo_raw": probe.sfo_raw,
+                "sfo_hash": probe.sfo_hash,
+                "probe_version": int(probe.probe_version),
+                "derive_version": int(probe.derive_version),
+                "now": now,
+            },
+        )
+
+    def record_failure(self, fingerprint: str, error: str) -> None:
+        now = self._now()
+        _ = self._conn.execute(
+            """
+            INSERT INTO probe_cache (pkg_fingerprint, status, error, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(pkg_fingerprint)
+            DO UPDATE SET
+                status=excluded.status,
+                error=excluded.error,
+                updated_at=excluded.updated_at
+            """,
+            (fingerprint, self._STATUS_FAILED, str(error or ""), now, now),
+        )
+
+    def relocate_media(self, moves: Mapping[Path, Path]) -> int:
+        rows = [(str(new), str(old)) for old, new in moves.items()]
+        updated = 0
+        for column in ("icon0_path", "pic0_path", "pic1_path"):
+            updated += int(
+                self._conn.executemany(
+                    f"UPDATE probe_cache SET {column} = ? WHERE {column} = ?", rows
+                ).rowcount
+                or 0
+            )
+        return updated
+
+    def delete_unreferenced(self, now: datetime | None = None) -> int:
+        failed_before = (now or datetime.now(UTC)) - self.FAILURE_TTL
+        deleted = self._conn.execute(
+            """
+            DELETE FROM probe_cache
+            WHERE (
+                status = ?
+                AND pkg_fingerprint NOT IN (SELECT pkg_fingerprint FROM catalog_items)
+            ) OR (status = ? AND updated_at < ?)
+            """,
+            (
+                self._STATUS_OK,
+                self._STATUS_FAILED,
+                failed_before.replace(microsecond=0).isoformat(),
+            ),
+        ).rowcount
+        return int(deleted or 0)
+
+    def clear(self) -> int:
+        deleted = self._conn.execute("DELETE FROM probe_cache").rowcount
+        return int(deleted or 0)
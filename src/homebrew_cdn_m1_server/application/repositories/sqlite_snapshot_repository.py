@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import contextmanager
+import sqlite3
+from pathlib import Path
+from typing import ClassVar, cast, final
+
+from homebrew_cdn_m1_server.domain.models.results import ScanDelta
+
+
+@final
+class SqliteSnapshotRepository:
+    _STAGE_SCHEMA_SQL: ClassVar[str] = """
+        CREATE TEMP TABLE IF NOT EXISTS scan_current
+        (
+            pkg_path     TEXT PRIMARY KEY,
+            pkg_size     INTEGER NOT NULL,
+            pkg_mtime_ns INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """
+    # Catalog rows are checkpointed per ingested package and win over the scan
+    # snapshot; the snapshot only fills in paths the catalog does not track.
+    _PREVIOUS_CTE_SQL: ClassVar[str] = """
+        WITH previous AS (
+            SELECT pkg_path, pkg_size, MAX(pkg_mtime_ns) AS pkg_mtime_ns
+            FROM catalog_items
+            GROUP BY pkg_path
+            UNION ALL
+            SELECT s.pkg_path, s.pkg_size, s.pkg_mtime_ns
+            FROM pkg_snapshot AS s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM catalog_items AS ci WHERE ci.pkg_path = s.pkg_path
+            )
+        )
+    """
+    _UPSERT_SQL: ClassVar[str] = """
+        INSERT INTO pkg_snapshot (pkg_path, pkg_size, pkg_mtime_ns)
+        VALUES (?, ?, ?)
+        ON CONFLICT(pkg_path) DO UPDATE SET
+            pkg_size=excluded.pkg_size,
+            pkg_mtime_ns=excluded.pkg_mtime_ns
+        WHERE pkg_size <> excluded.pkg_size OR pkg_mtime_ns <> excluded.pkg_mtime_ns
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self._db_path = db_path
+
+    @contextmanager
+    def _session(self) -> Iterator[sqlite3.Connection]:
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self._db_path))
+        try:
+            _ = conn.execute("PRAGMA journal_mode=WAL").fetchall()
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _rows(snapshot: Mapping[str, tuple[int, int]]) -> list[tuple[str, int, int]]:
+        return [
+            (str(path), int(meta[0]), int(meta[1])) for path, meta in snapshot.items()
+        ]
+
+    def _stage(self, conn: sqlite3.Connection, snapshot: Mapping[str, tuple[int, int]]) -> None:
+        _ = conn.execute(self._STAGE_SCHEMA_SQL)
+        _ = conn.execute("DELETE FROM scan_current")
+        _ = conn.executemany(
+            "INSERT OR REPLACE INTO scan_current (pkg_path, pkg_size, pkg_mtime_ns) VALUES (?, ?, ?)",
+            self._rows(snapshot),
+        )
+
+    @staticmethod
+    def _paths(conn: sqlite3.Connection, sql: str) -> tuple[str, ...]:
+        rows = cast(list[tuple[str]], conn.execute(sql).fetchall())
+        return tuple(str(row[0]) for row in rows)
+
+    def is_empty(self) -> bool:
+        with self._session() as conn:
+            rows = cast(
+                list[tuple[int]],
+                conn.execute("SELECT EXISTS (SELECT 1 FROM pkg_snapshot)").fetchall(),
+            )
+        return not rows or not rows[0][0]
+
+    def load(self) -> Mapping[str, tuple[int, int]]:
+        with self._session() as conn:
+            rows = cast(
+                list[tuple[str, int, int]],
+                conn.execute(
+                    "SELECT pkg_path, pkg_size, pkg_mtime_ns FROM pkg_snapshot"
+                ).fetchall(),
+            )
+        return {str(path): (int(size), int(mtime_ns)) for path, size, mtime_ns in rows}
+
+    def build_delta(self, current: Mapping[str, tuple[int, int]]) -> ScanDelta:
+        with self._session() as conn:
+            self._stage(conn, current)
+            added = self._paths(
+                conn,
+                self._PREVIOUS_CTE_SQL
+                + """
+                SELECT c.pkg_path
+                FROM scan_current AS c
+                LEFT JOIN previous AS p ON p.pkg_path = c.pkg_path
+                WHERE p.pkg_path IS NULL
+                ORDER BY c.pkg_path
+                """,
+            )
+            updated = self._paths(
+                conn,
+                self._PREVIOUS_CTE_SQL
+                + """
+                SELECT c.pkg_path
+                FROM scan_current AS c
+                JOIN previous AS p ON p.pkg_path = c.pkg_path
+                WHERE p.pkg_size <> c.pkg_size OR p.pkg_mtime_ns <> c.pkg_mtime_ns
+                ORDER BY c.pkg_path
+                """,
+            )
+            removed = self._paths(
+                conn,
+                self._PREVIOUS_CTE_SQL
+                + """
+                SELECT p.pkg_path
+                FROM previous AS p
+                LEFT JOIN scan_current AS c ON c.pkg_path = p.pkg_path
+                WHERE c.pkg_path IS NULL
+                ORDER BY p.pkg_path
+                """,
+            )
+            _ = conn.execute("DELETE FROM scan_current")
+        return ScanDelta(added=added, updated=updated, removed=removed)
+
+    def changed_paths(self, current: Mapping[str, tuple[int, int]]) -> tuple[str, ...]:
+        if not current:
+            return tuple()
+        with self._session() as conn:
+            self._stage(conn, current)
+            changed = self._paths(
+                conn,
+                self._PREVIOUS_CTE_SQL
+                + """
+                SELECT c.pkg_path
+                FROM scan_current AS c
+                LEFT JOIN previous AS p ON p.pkg_path = c.pkg_path
+                WHERE p.pkg_path IS NULL
+                   OR p.pkg_size <> c.pkg_size
+                   OR p.pkg_mtime_ns <> c.pkg_mtime_ns
+                ORDER BY c.pkg_path
+                """,
+            )
+            _ = conn.execute("DELETE FROM scan_current")
+        return changed
+
+    def upsert(self, snapshot: Mapping[str, tuple[int, int]]) -> None:
+        if not snapshot:
+            return
+        with self._session() as conn:
+            _ = conn.executemany(self._UPSERT_SQL, self._rows(snapshot))
+
+    def delete(self, pkg_paths: Iterable[str]) -> None:
+        rows = [(str(path),) for path in pkg_paths]
+        if not rows:
+            return
+        with self._session() as conn:
+            _ = conn.executemany("DELETE FROM pkg_snapshot WHERE pkg_path = ?", rows)
+
+    # Paths still to be re-probed after the probe inputs changed. The queue
+    # outlives the cycle that filled it, so a cycle budget can spread the
+    # re-probe over several cycles.
+    def queue_reprobe(self, pkg_paths: Iterable[str]) -> None:
+        rows = [(str(path),) for path in pkg_paths]
+        with self._session() as conn:
+            _ = conn.execute("DELETE FROM reprobe_queue")
+            _ = conn.executemany("INSERT OR IGNORE INTO reprobe_queue (pkg_path) VALUES (?)", rows)
+
+    def reprobe_queue(self) -> tuple[str, ...]:
+        with self._session() as conn:
+            return self._paths(conn, "SELECT pkg_path FROM reprobe_queue ORDER BY pkg_path")
+
+    def dequeue_reprobe(self, pkg_paths: Iterable[str]) -> None:
+        rows = [(str(path),) for path in pkg_paths]
+        if not rows:
+            return
+        with self._session() as conn:
+            _ = conn.executemany("DELETE FROM reprobe_queue WHERE pkg_path = ?", rows)
+
+    def save(self, snapshot: Mapping[str, tuple[int, int]]) -> None:
+        with self._session() as conn:
+            self._stage(conn, snapshot)
+            _ = conn.execute(
+                """
+                DELETE FROM pkg_snapshot
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM scan_current AS c WHERE c.pkg_path = pkg_snapshot.pkg_path
+                )
+                """
+            )
+            _ = conn.execute(
+                """
+                INSERT INTO pkg_snapshot (pkg_path, pkg_size, pkg_mtime_ns)
+                SELECT pkg_path, pkg_size, pkg_mtime_ns FROM scan_current WHERE true
+                ON CONFLICT(pkg_path) DO UPDATE SET
+                    pkg_size=excluded.pkg_size,
+                    pkg_mtime_ns=excluded.pkg_mtime_ns
+                WHERE pkg_size <> excluded.pkg_size OR pkg_mtime_ns <> excluded.pkg_mtime_ns
+                """
+            )
+            _ = conn.execute("DELETE FROM scan_current")
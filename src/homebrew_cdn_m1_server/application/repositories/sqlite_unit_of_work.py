@@ -8,6 +8,12 @@ from typing import final
 from homebrew_cdn_m1_server.application.repositories.sqlite_catalog_repository import (
     SqliteCatalogRepository,
 )
+from homebrew_cdn_m1_server.application.repositories.sqlite_media_derivative_repository import (
+    SqliteMediaDerivativeRepository,
+)
+from homebrew_cdn_m1_server.application.repositories.sqlite_probe_cache_repository import (
+    SqliteProbeCacheRepository,
+)
 
 
 @final
@@ -16,6 +22,8 @@ class SqliteUnitOfWork:
         self._db_path = db_path
         self._conn: sqlite3.Connection | None = None
         self.catalog: SqliteCatalogRepository
+        self.probe_cache: SqliteProbeCacheRepository
+        self.media_derivatives: SqliteMediaDerivativeRepository
 
     def __enter__(self) -> "SqliteUnitOfWork":
         self._db_path.parent.mkdir(parents=True, exist_ok=True)
@@ -23,6 +31,8 @@ class SqliteUnitOfWork:
         _ = self._conn.execute("PRAGMA journal_mode=WAL")
         _ = self._conn.execute("PRAGMA foreign_keys=ON")
         self.catalog = SqliteCatalogRepository(self._conn, self._db_path)
+        self.probe_cache = SqliteProbeCacheRepository(self._conn)
+        self.media_derivatives = SqliteMediaDerivativeRepository(self._conn)
         _ = self._conn.execute("BEGIN")
         return self
 
@@ -0,0 +1,126 @@
+# pyright: reportMissingTypeStubs=false, reportUnknownMemberType=false
+
+from __future__ import annotations
+
+import logging
+import math
+import random
+from dataclasses import dataclass
+from datetime import datetime, tzinfo
+from threading import Event, Thread
+from typing import Callable, ClassVar, cast, final, override
+
+from apscheduler.triggers.cron import CronTrigger
+
+from homebrew_cdn_m1_server.application.scheduler.apscheduler_runner import (
+    parse_cron_expression,
+)
+from homebrew_cdn_m1_server.domain.protocols.scheduler_protocol import SchedulerProtocol
+
+
+@dataclass(slots=True)
+class _AdaptiveJob:
+    job_id: str
+    func: Callable[[], object]
+    # Seconds until the configured interval/cron would run the job again.
+    ceiling: Callable[[], float]
+    delay: float
+
+
+@final
+class AdaptiveSchedulerRunner(SchedulerProtocol):
+    # Jobs whose result exposes a boolean `has_changes` poll quickly after a
+    # change and back off exponentially while idle. A result with `skipped`
+    # set (the cycle never looked) keeps the current delay. The configured
+    # interval or cron stays the upper bound. Any other job keeps its
+    # configured schedule.
+    BACKOFF_FACTOR: ClassVar[float] = 2.0
+    JITTER_RATIO: ClassVar[float] = 0.1
+
+    def __init__(
+        self,
+        min_seconds: float,
+        max_seconds: float,
+        logger: logging.Logger,
+        rng: random.Random | None = None,
+    ) -> None:
+        self._min_seconds = max(1.0, float(min_seconds))
+        self._max_seconds = max(self._min_seconds, float(max_seconds))
+        self._logger = logger
+        self._rng = rng or random.Random()
+        self._jobs: dict[str, _AdaptiveJob] = {}
+        self._stop = Event()
+        self._threads: list[Thread] = []
+
+    @staticmethod
+    def _seconds_until(trigger: CronTrigger) -> float:
+        now = datetime.now(cast(tzinfo, trigger.timezone))
+        next_fire = cast(datetime | None, trigger.get_next_fire_time(None, now))
+        if next_fire is None:
+            return math.inf
+        return max(1.0, (next_fire - now).total_seconds())
+
+    def _add(self, job_id: str, func: Callable[[], object], ceiling: Callable[[], float]) -> None:
+        self._jobs[job_id] = _AdaptiveJob(
+            job_id=job_id,
+            func=func,
+            ceiling=ceiling,
+            delay=self._min_seconds,
+        )
+
+    @override
+    def schedule_interval(
+        self, job_id: str, seconds: int, func: Callable[[], object]
+    ) -> None:
+        interval = float(max(1, int(seconds)))
+        self._add(job_id, func, lambda: interval)
+
+    @override
+    def schedule_cron(
+        self, job_id: str, cron_expression: str, func: Callable[[], object]
+    ) -> None:
+        trigger = CronTrigger(**parse_cron_expression(cron_expression))
+        self._add(job_id, func, lambda: self._seconds_until(trigger))
+
+    def _next_delay(self, job: _AdaptiveJob, result: object) -> float:
+        has_changes = cast(object, getattr(result, "has_changes", None))
+        if not isinstance(has_changes, bool):
+            return job.ceiling()
+        if has_changes:
+            job.delay = self._min_seconds
+        elif cast(object, getattr(result, "skipped", False)) is not True:
+            job.delay = min(self._max_seconds, job.delay * self.BACKOFF_FACTOR)
+        # Jitter keeps idle polls from lining up with cron-driven jobs.
+        jitter = job.delay * self.JITTER_RATIO * self._rng.uniform(-1.0, 1.0)
+        return max(1.0, min(job.ceiling(), job.delay + jitter))
+
+    def _run_job(self, job: _AdaptiveJob) -> None:
+        wait = min(job.delay, job.ceiling())
+        while not self._stop.wait(wait):
+            result: object = None
+            try:
+                result = job.func()
+            except Exception as exc:
+                self._logger.error("Scheduled job failed: job: %s, error: %s", job.job_id, exc)
+            wait = self._next_delay(job, result)
+            self._logger.debug(
+                "Adaptive scheduler: job: %s, next run in: %.1fs", job.job_id, wait
+            )
+
+    @override
+    def start(self) -> None:
+        self._stop.clear()
+        for job in self._jobs.values():
+            thread = Thread(
+                target=self._run_job,
+                args=(job,),
+                name=f"scheduler-{job.job_id}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    @override
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._threads.clear()
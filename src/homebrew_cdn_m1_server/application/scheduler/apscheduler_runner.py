@@ -9,6 +9,20 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from homebrew_cdn_m1_server.domain.protocols.scheduler_protocol import SchedulerProtocol
 
 
+def parse_cron_expression(cron_expression: str) -> dict[str, str]:
+    parts = cron_expression.split()
+    if len(parts) != 5:
+        raise ValueError("Cron expression must have 5 fields")
+    minute, hour, day, month, day_of_week = parts
+    return {
+        "minute": minute,
+        "hour": hour,
+        "day": day,
+        "month": month,
+        "day_of_week": day_of_week,
+    }
+
+
 @final
 class APSchedulerRunner(SchedulerProtocol):
     def __init__(self) -> None:
@@ -16,17 +30,7 @@ class APSchedulerRunner(SchedulerProtocol):
 
     @staticmethod
     def _parse_cron(cron_expression: str) -> dict[str, str]:
-        parts = cron_expression.split()
-        if len(parts) != 5:
-            raise ValueError("Cron expression must have 5 fields")
-        minute, hour, day, month, day_of_week = parts
-        return {
-            "minute": minute,
-            "hour": hour,
-            "day": day,
-            "month": month,
-            "day_of_week": day_of_week,
-        }
+        return parse_cron_expression(cron_expression)
 
     @override
     def schedule_interval(
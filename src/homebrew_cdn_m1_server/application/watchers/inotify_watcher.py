@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from threading import Event, Thread
+from typing import Callable, ClassVar, final
+
+
+@final
+class InotifyWatcher:
+    IN_MODIFY: ClassVar[int] = 0x00000002
+    IN_CLOSE_WRITE: ClassVar[int] = 0x00000008
+    IN_MOVED_FROM: ClassVar[int] = 0x00000040
+    IN_MOVED_TO: ClassVar[int] = 0x00000080
+    IN_CREATE: ClassVar[int] = 0x00000100
+    IN_DELETE_SELF: ClassVar[int] = 0x00000400
+    IN_Q_OVERFLOW: ClassVar[int] = 0x00004000
+    IN_IGNORED: ClassVar[int] = 0x00008000
+    IN_ISDIR: ClassVar[int] = 0x40000000
+    IN_NONBLOCK: ClassVar[int] = 0o4000
+    IN_CLOEXEC: ClassVar[int] = 0o2000000
+
+    _WATCH_MASK: ClassVar[int] = (
+        IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE_SELF
+    )
+    _EVENT_HEADER: ClassVar[struct.Struct] = struct.Struct("iIII")
+
+    def __init__(
+        self,
+        root: Path,
+        excluded: tuple[Path, ...],
+        on_ready: Callable[[tuple[Path, ...]], bool],
+        stable_seconds: float,
+        logger: logging.Logger,
+        poll_seconds: float = 1.0,
+        extra_roots: tuple[Path, ...] = (),
+    ) -> None:
+        self._root = root
+        self._extra_roots = extra_roots
+        self._excluded = {str(path) for path in excluded}
+        self._on_ready = on_ready
+        self._stable_seconds = max(0.0, float(stable_seconds))
+        self._logger = logger
+        self._poll_seconds = max(0.01, float(poll_seconds))
+        self._fd: int | None = None
+        self._libc: ctypes.CDLL | None = None
+        self._watches: dict[int, str] = {}
+        # path -> (size, mtime_ns, monotonic time the pair was first observed)
+        self._pending: dict[str, tuple[int, int, float]] = {}
+        self._rescan_requested = False
+        self._stop = Event()
+        self._thread: Thread | None = None
+
+    @staticmethod
+    def supported() -> bool:
+        return sys.platform.startswith("linux")
+
+    def start(self) -> bool:
+        if self._thread is not None:
+            return True
+        if not self.supported():
+            self._logger.warning("Package watcher disabled: inotify requires Linux")
+            return False
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        fd = int(libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC))
+        if fd < 0:
+            errno = ctypes.get_errno()
+            self._logger.warning("Package watcher disabled: %s", os.strerror(errno))
+            return False
+
+        self._libc = libc
+        self._fd = fd
+        self._stop.clear()
+        # Files already on disk are the reconcile scan's job; only what
+        # arrives after this point is tracked.
+        for root in (self._root, *self._extra_roots):
+            self._add_tree(str(root), track=False)
+        thread = Thread(target=self._loop, name="pkg-inotify-watcher", daemon=True)
+        thread.start()
+        self._thread = thread
+        self._logger.debug(
+            "Package watcher started: root: %s, directories: %d",
+            self._root,
+            len(self._watches),
+        )
+        return True
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._stop.set()
+        thread.join(timeout=2.0)
+        fd = self._fd
+        self._fd = None
+        if fd is not None:
+            os.close(fd)
+        self._watches.clear()
+        self._pending.clear()
+        self._logger.debug("Package watcher stopped")
+
+    def _is_excluded(self, path: str) -> bool:
+        return any(
+            path == excluded or path.startswith(excluded + os.sep) for excluded in self._excluded
+        )
+
+    def _add_watch(self, directory: str) -> None:
+        if self._libc is None or self._fd is None:
+            return
+        wd = int(self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self._WATCH_MASK))
+        if wd < 0:
+            errno = ctypes.get_errno()
+            self._logger.warning(
+                "Package watcher cannot watch %s: %s", directory, os.strerror(errno)
+            )
+            return
+        self._watches[wd] = directory
+
+    def _add_tree(self, directory: str, track: bool) -> None:
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            if self._is_excluded(current):
+                continue
+            self._add_watch(current)
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif track and entry.name.endswith(".pkg"):
+                            self._track(entry.path)
+            except OSError:
+                continue
+
+    def _track(self, path: str) -> None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            _ = self._pending.pop(path, None)
+            return
+        observed = (int(stat.st_size), int(stat.st_mtime_ns))
+        previous = self._pending.get(path)
+        if previous is not None and previous[:2] == observed:
+            return
+        self._pending[path] = (*observed, time.monotonic())
+
+    def _handle_event(self, wd: int, mask: int, name: str) -> None:
+        if mask & self.IN_Q_OVERFLOW:
+            self._logger.warning("Package watcher queue overflow: requesting full reconcile")
+            self._rescan_requested = True
+            return
+        if mask & self.IN_IGNORED:
+            _ = self._watches.pop(wd, None)
+            return
+
+        directory = self._watches.get(wd)
+        if directory is None or not name:
+            return
+        path = os.path.join(directory, name)
+        if self._is_excluded(path):
+            return
+
+        if mask & self.IN_ISDIR:
+            if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                # A directory moved in after start brings its PKGs with it.
+                self._add_tree(path, track=True)
+            return
+        if not name.endswith(".pkg"):
+            return
+        if mask & self.IN_MOVED_FROM:
+            _ = self._pending.pop(path, None)
+            return
+        # Writes only restart the settle timer of files already pending; a
+        # file becomes pending once it is closed after writing or moved in.
+        if mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO) or path in self._pending:
+            self._track(path)
+
+    def _read_events(self) -> None:
+        fd = self._fd
+        if fd is None:
+            return
+        try:
+            data = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        header_size = self._EVENT_HEADER.size
+        while offset + header_size <= len(data):
+            wd, mask, _cookie, length = self._EVENT_HEADER.unpack_from(data, offset)
+            raw_name = data[offset + header_size : offset + header_size + length]
+            offset += header_size + length
+            name = os.fsdecode(raw_name.rstrip(b"\0"))
+            self._handle_event(int(wd), int(mask), name)
+
+    def _collect_ready(self, now: float) -> tuple[Path, ...]:
+        ready: list[Path] = []
+        for path, (size, mtime_ns, since) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            observed = (int(stat.st_size), int(stat.st_mtime_ns))
+            if observed != (size, mtime_ns):
+                self._pending[path] = (*observed, now)
+                continue
+            if now - since >= self._stable_seconds:
+                ready.append(Path(path))
+        return tuple(sorted(ready))
+
+    def _dispatch(self, now: float) -> None:
+        ready = self._collect_ready(now)
+        if not ready and not self._rescan_requested:
+            return
+        try:
+            handled = bool(self._on_ready(ready))
+        except Exception as exc:
+            self._logger.error("Package watcher callback failed: %s", exc)
+            handled = False
+        if not handled:
+            # Keep the paths pending and retry after another stability window.
+            for path in ready:
+                key = str(path)
+                if key in self._pending:
+                    size, mtime_ns, _ = self._pending[key]
+                    self._pending[key] = (size, mtime_ns, now)
+            return
+        self._rescan_requested = False
+        for path in ready:
+            _ = self._pending.pop(str(path), None)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            fd = self._fd
+            if fd is None:
+                return
+            try:
+                readable, _, _ = select.select([fd], [], [], self._poll_seconds)
+            except (OSError, ValueError):
+                return
+            if readable:
+                self._read_events()
+            self._dispatch(time.monotonic())
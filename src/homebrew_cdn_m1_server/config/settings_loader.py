@@ -4,7 +4,11 @@ from pathlib import Path
 from typing import ClassVar, final
 
 from homebrew_cdn_m1_server.config.settings_models import UserSettings
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.download_counting import DownloadCounting
+from homebrew_cdn_m1_server.domain.models.ingest_priority import IngestPriority
 from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
 from homebrew_cdn_m1_server.domain.models.app_config import AppConfig, RuntimePaths
 
 
@@ -16,9 +20,47 @@ class SettingsLoader:
         "ENABLE_TLS": "enable_tls",
         "LOG_LEVEL": "log_level",
         "RECONCILE_PKG_PREPROCESS_WORKERS": "reconcile_pkg_preprocess_workers",
+        "RECONCILE_PKG_PREPROCESS_MAX_CPU_PERCENT": "reconcile_pkg_preprocess_max_cpu_percent",
+        "RECONCILE_PKG_PREPROCESS_API_P99_MS": "reconcile_pkg_preprocess_api_p99_ms",
         "RECONCILE_CRON_EXPRESSION": "reconcile_cron_expression",
+        "RECONCILE_WATCH_ENABLED": "reconcile_watch_enabled",
+        "RECONCILE_FILE_STABLE_SECONDS": "reconcile_file_stable_seconds",
+        "RECONCILE_CYCLE_MAX_ITEMS": "reconcile_cycle_max_items",
+        "RECONCILE_CYCLE_MAX_SECONDS": "reconcile_cycle_max_seconds",
+        "RECONCILE_EXPORT_EVERY_ITEMS": "reconcile_export_every_items",
+        "RECONCILE_EXPORT_EVERY_SECONDS": "reconcile_export_every_seconds",
+        "RECONCILE_PRIORITY": "reconcile_priority",
+        "RECONCILE_SMALL_PKG_MAX_MB": "reconcile_small_pkg_max_mb",
+        "RECONCILE_ADAPTIVE_ENABLED": "reconcile_adaptive_enabled",
+        "RECONCILE_ADAPTIVE_MIN_SECONDS": "reconcile_adaptive_min_seconds",
+        "RECONCILE_ADAPTIVE_MAX_SECONDS": "reconcile_adaptive_max_seconds",
         "EXPORT_TARGETS": "output_targets",
+        "EXPORT_QUIET_SECONDS": "export_quiet_seconds",
+        "EXPORT_MAX_STALENESS_SECONDS": "export_max_staleness_seconds",
+        "EXPORT_HB_STORE_MIN_INTERVAL_SECONDS": "export_hb_store_min_interval_seconds",
+        "EXPORT_FPKGI_MIN_INTERVAL_SECONDS": "export_fpkgi_min_interval_seconds",
+        "IO_BUDGET_MB_PER_SECOND": "io_budget_mb_per_second",
+        "IO_BUDGET_IOPS": "io_budget_iops",
+        "IO_BUDGET_OFF_PEAK_HOURS": "io_budget_off_peak_hours",
+        "IO_BUDGET_OFF_PEAK_MB_PER_SECOND": "io_budget_off_peak_mb_per_second",
+        "IO_BUDGET_OFF_PEAK_IOPS": "io_budget_off_peak_iops",
         "PKGTOOL_TIMEOUT_SECONDS": "pkgtool_timeout_seconds",
+        "PKGTOOL_TIMEOUT_SECONDS_PER_GB": "pkgtool_timeout_seconds_per_gb",
+        "PKGTOOL_REFRESH_ITEMS_PER_MINUTE": "pkgtool_refresh_items_per_minute",
+        "PKGTOOL_IDLE_PRIORITY": "pkgtool_idle_priority",
+        "PKGTOOL_LAZY_MEDIA": "pkgtool_lazy_media",
+        "PKG_HASH_ENABLED": "pkg_hash_enabled",
+        "PKG_HASH_BLAKE2": "pkg_hash_blake2",
+        "PKG_HASH_VERIFY_DAYS": "pkg_hash_verify_days",
+        "MEDIA_DERIVATIVES_ENABLED": "media_derivatives_enabled",
+        "MEDIA_DERIVATIVES_WORKERS": "media_derivatives_workers",
+        "STORAGE_LAYOUT": "storage_layout",
+        "STORAGE_VERSIONED_PATHS": "storage_versioned_paths",
+        "PKG_EXTRA_ROOTS": "pkg_extra_roots",
+        "PKG_ROOT_PINS": "pkg_root_pins",
+        "PAGE_CACHE_WARM_MB": "page_cache_warm_mb",
+        "DOWNLOAD_COUNTING": "download_counting",
+        "DOWNLOAD_DEDUP_SECONDS": "download_dedup_seconds",
     }
 
     @staticmethod
@@ -39,6 +81,10 @@ class SettingsLoader:
             data[key.strip()] = value.strip().strip('"').strip("'")
         return data
 
+    @classmethod
+    def read_values(cls, path: Path) -> dict[str, str]:
+        return cls._parse_key_value_file(path)
+
     @staticmethod
     def _parse_bool(value: str) -> bool:
         return str(value or "").strip().lower() in {"1", "true", "yes", "on"}
@@ -54,19 +100,95 @@ class SettingsLoader:
             if not text:
                 mapped[target] = None
                 continue
+            if target == "reconcile_pkg_preprocess_workers" and text.lower() == "auto":
+                mapped[target] = "auto"
+                continue
             if target in {
                 "server_port",
                 "reconcile_pkg_preprocess_workers",
+                "reconcile_pkg_preprocess_max_cpu_percent",
+                "reconcile_pkg_preprocess_api_p99_ms",
                 "pkgtool_timeout_seconds",
+                "pkgtool_timeout_seconds_per_gb",
+                "reconcile_small_pkg_max_mb",
+                "reconcile_file_stable_seconds",
+                "pkgtool_refresh_items_per_minute",
+                "reconcile_cycle_max_items",
+                "reconcile_cycle_max_seconds",
+                "reconcile_export_every_items",
+                "reconcile_export_every_seconds",
+                "reconcile_adaptive_min_seconds",
+                "reconcile_adaptive_max_seconds",
+                "export_quiet_seconds",
+                "export_max_staleness_seconds",
+                "export_hb_store_min_interval_seconds",
+                "export_fpkgi_min_interval_seconds",
+                "io_budget_mb_per_second",
+                "io_budget_iops",
+                "io_budget_off_peak_mb_per_second",
+                "io_budget_off_peak_iops",
+                "pkg_hash_verify_days",
+                "media_derivatives_workers",
+                "page_cache_warm_mb",
+                "download_dedup_seconds",
             }:
                 try:
                     mapped[target] = int(text)
                 except ValueError:
                     mapped[target] = None
                 continue
-            if target == "enable_tls":
+            if target in {
+                "enable_tls",
+                "reconcile_watch_enabled",
+                "reconcile_adaptive_enabled",
+                "pkgtool_idle_priority",
+                "pkgtool_lazy_media",
+                "pkg_hash_enabled",
+                "pkg_hash_blake2",
+                "media_derivatives_enabled",
+                "storage_versioned_paths",
+            }:
                 mapped[target] = cls._parse_bool(value)
                 continue
+            if target == "reconcile_priority":
+                try:
+                    mapped[target] = IngestPriority(text.lower())
+                except ValueError:
+                    mapped[target] = None
+                continue
+            if target == "storage_layout":
+                try:
+                    mapped[target] = StorageLayout(text.lower())
+                except ValueError:
+                    mapped[target] = None
+                continue
+            if target == "download_counting":
+                try:
+                    mapped[target] = DownloadCounting(text.lower())
+                except ValueError:
+                    mapped[target] = None
+                continue
+            if target == "pkg_extra_roots":
+                roots: list[Path] = []
+                for item in text.split(","):
+                    root = Path(item.strip())
+                    if item.strip() and root.is_absolute() and root not in roots:
+                        roots.append(root)
+                mapped[target] = tuple(roots) if roots else None
+                continue
+            if target == "pkg_root_pins":
+                pins: dict[AppType, Path] = {}
+                for item in text.split(","):
+                    app_type, _, raw_root = item.partition(":")
+                    root = Path(raw_root.strip())
+                    if not raw_root.strip() or not root.is_absolute():
+                        continue
+                    try:
+                        pins[AppType(app_type.strip().lower())] = root
+                    except ValueError:
+                        continue
+                mapped[target] = pins or None
+                continue
             if target == "output_targets":
                 parsed_targets: list[OutputTarget] = []
                 for item in text.split(","):
@@ -137,4 +259,10 @@ class SettingsLoader:
         raw = cls._parse_key_value_file(resolved_settings)
         user = cls._to_user_settings(raw)
         paths = cls._build_paths(app_root, resolved_settings)
+        if user.reconcile_file_stable_seconds is not None:
+            return AppConfig(
+                user=user,
+                paths=paths,
+                reconcile_file_stable_seconds=user.reconcile_file_stable_seconds,
+            )
         return AppConfig(user=user, paths=paths)
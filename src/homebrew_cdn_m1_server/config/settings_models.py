@@ -1,8 +1,16 @@
 from __future__ import annotations
 
+from pathlib import Path
+from typing import Annotated, Literal
+
 from pydantic import BaseModel, Field, field_validator
 
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.download_counting import DownloadCounting
+from homebrew_cdn_m1_server.domain.models.ingest_priority import IngestPriority
+from homebrew_cdn_m1_server.domain.models.io_budget_policy import parse_hour_range
 from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
 
 
 class UserSettings(BaseModel):
@@ -10,10 +18,50 @@ class UserSettings(BaseModel):
     server_port: int | None = Field(default=None, ge=1, le=65535)
     enable_tls: bool | None = Field(default=None)
     log_level: str | None = Field(default=None)
-    reconcile_pkg_preprocess_workers: int | None = Field(default=None, ge=1)
+    reconcile_pkg_preprocess_workers: Annotated[int, Field(ge=1)] | Literal["auto"] | None = Field(
+        default=None
+    )
+    reconcile_pkg_preprocess_max_cpu_percent: int | None = Field(default=None, ge=1, le=100)
+    reconcile_pkg_preprocess_api_p99_ms: int | None = Field(default=None, ge=0)
     reconcile_cron_expression: str | None = Field(default=None)
+    reconcile_watch_enabled: bool | None = Field(default=None)
+    reconcile_file_stable_seconds: int | None = Field(default=None, ge=0)
+    reconcile_cycle_max_items: int | None = Field(default=None, ge=0)
+    reconcile_cycle_max_seconds: int | None = Field(default=None, ge=0)
+    reconcile_export_every_items: int | None = Field(default=None, ge=0)
+    reconcile_export_every_seconds: int | None = Field(default=None, ge=0)
+    reconcile_priority: IngestPriority | None = Field(default=None)
+    reconcile_small_pkg_max_mb: int | None = Field(default=None, ge=0)
+    reconcile_adaptive_enabled: bool | None = Field(default=None)
+    reconcile_adaptive_min_seconds: int | None = Field(default=None, ge=1)
+    reconcile_adaptive_max_seconds: int | None = Field(default=None, ge=1)
     output_targets: tuple[OutputTarget, ...] | None = Field(default=None)
+    export_quiet_seconds: int | None = Field(default=None, ge=0)
+    export_max_staleness_seconds: int | None = Field(default=None, ge=0)
+    export_hb_store_min_interval_seconds: int | None = Field(default=None, ge=0)
+    export_fpkgi_min_interval_seconds: int | None = Field(default=None, ge=0)
+    io_budget_mb_per_second: int | None = Field(default=None, ge=0)
+    io_budget_iops: int | None = Field(default=None, ge=0)
+    io_budget_off_peak_hours: str | None = Field(default=None)
+    io_budget_off_peak_mb_per_second: int | None = Field(default=None, ge=0)
+    io_budget_off_peak_iops: int | None = Field(default=None, ge=0)
     pkgtool_timeout_seconds: int | None = Field(default=None, ge=1)
+    pkgtool_timeout_seconds_per_gb: int | None = Field(default=None, ge=0)
+    pkgtool_refresh_items_per_minute: int | None = Field(default=None, ge=0)
+    pkgtool_idle_priority: bool | None = Field(default=None)
+    pkgtool_lazy_media: bool | None = Field(default=None)
+    pkg_hash_enabled: bool | None = Field(default=None)
+    pkg_hash_blake2: bool | None = Field(default=None)
+    pkg_hash_verify_days: int | None = Field(default=None, ge=0)
+    media_derivatives_enabled: bool | None = Field(default=None)
+    media_derivatives_workers: int | None = Field(default=None, ge=1)
+    storage_layout: StorageLayout | None = Field(default=None)
+    storage_versioned_paths: bool | None = Field(default=None)
+    pkg_extra_roots: tuple[Path, ...] | None = Field(default=None)
+    pkg_root_pins: dict[AppType, Path] | None = Field(default=None)
+    page_cache_warm_mb: int | None = Field(default=None, ge=0)
+    download_counting: DownloadCounting | None = Field(default=None)
+    download_dedup_seconds: int | None = Field(default=None, ge=0)
 
     @field_validator("log_level")
     @classmethod
@@ -26,3 +74,14 @@ class UserSettings(BaseModel):
         if normalized not in {"debug", "info", "warn", "warning", "error"}:
             raise ValueError("LOG_LEVEL must be one of: debug, info, warn, error")
         return "warning" if normalized == "warn" else normalized
+
+    @field_validator("io_budget_off_peak_hours")
+    @classmethod
+    def _validate_off_peak_hours(cls, value: str | None) -> str | None:
+        if value is None:
+            return None
+        try:
+            hours = parse_hour_range(value)
+        except ValueError as exc:
+            raise ValueError("IO_BUDGET_OFF_PEAK_HOURS must look like 22-7") from exc
+        return None if hours is None else f"{hours[0]}-{hours[1]}"
@@ -33,6 +33,12 @@ class CatalogItem:
     sfo: ParamSfoSnapshot
     publisher: str | None = None
     downloads: int = 0
+    probe_version: int = 0
+    derive_version: int = 0
+    pkg_md5: str | None = None
+    pkg_blake2: str | None = None
+    pic0_entry: str | None = None
+    pic1_entry: str | None = None
 
     def to_mb(self) -> float:
         return float(self.pkg_size) / self._BYTES_PER_MB
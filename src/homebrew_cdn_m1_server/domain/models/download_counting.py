@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from enum import StrEnum
+
+
+class DownloadCounting(StrEnum):
+    # api: /download.php goes through the HB-Store API, which counts and
+    # redirects. access_log: nginx resolves catalogued download URLs itself
+    # and the worker counts them from a dedicated access log.
+    API = "api"
+    ACCESS_LOG = "access-log"
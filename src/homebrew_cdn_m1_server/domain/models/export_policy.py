@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class ExportPolicy:
+    # Export once no new change arrived for this long.
+    quiet_seconds: float
+    # Export anyway once the oldest unpublished change is this old.
+    max_staleness_seconds: float
+    # Never export the target more often than this.
+    min_interval_seconds: float = 0.0
@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from enum import StrEnum
+
+
+class IngestPriority(StrEnum):
+    PATH = "path"
+    SMALLEST_FIRST = "smallest-first"
+    LARGEST_FIRST = "largest-first"
+    NEWEST_FIRST = "newest-first"
+    OLDEST_FIRST = "oldest-first"
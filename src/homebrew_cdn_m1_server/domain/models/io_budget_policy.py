@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class IoBudgetPolicy:
+    # 0 leaves the dimension unlimited.
+    bytes_per_second: float = 0.0
+    ops_per_second: float = 0.0
+
+    @property
+    def unlimited(self) -> bool:
+        return self.bytes_per_second <= 0 and self.ops_per_second <= 0
+
+
+def parse_hour_range(value: str | None) -> tuple[int, int] | None:
+    # "22-7" -> (22, 7); the range may wrap past midnight.
+    text = str(value or "").strip()
+    if not text:
+        return None
+    start_text, separator, end_text = text.partition("-")
+    if not separator:
+        raise ValueError(f"Hour range must look like START-END: {text}")
+    start = int(start_text)
+    end = int(end_text)
+    if not (0 <= start <= 23 and 0 <= end <= 24):
+        raise ValueError(f"Hour range out of bounds: {text}")
+    return start, end
@@ -26,6 +26,25 @@ class ProbeResult:
     icon0_path: Path | None
     pic0_path: Path | None
     pic1_path: Path | None
+    probe_version: int = 0
+    derive_version: int = 0
+    # pkgtool entry index of media left in the PKG until first requested.
+    pic0_entry: str | None = None
+    pic1_entry: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class ProbedPackage:
+    pkg_path: Path
+    # (size, mtime_ns, fingerprint) of the source file, when it could be read
+    source: tuple[int, int, str] | None
+    probe: ProbeResult
+
+
+@dataclass(frozen=True, slots=True)
+class PlacedPackage:
+    item: CatalogItem
+    probe: ProbeResult
 
 
 @dataclass(frozen=True, slots=True)
@@ -42,6 +61,57 @@ class ReconcileResult:
     removed: int
     failed: int
     exported_files: tuple[Path, ...]
+    skipped: bool = False
+    items: tuple[CatalogItem, ...] = ()
+    # Candidates left for the next cycle once the cycle budget ran out.
+    pending: int = 0
+    # Files skipped because they were still being written.
+    deferred: int = 0
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(
+            self.added
+            or self.updated
+            or self.removed
+            or self.failed
+            or self.pending
+            or self.deferred
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class RefreshResult:
+    rederived: int
+    reprobed: int
+    removed: int
+
+
+@dataclass(frozen=True, slots=True)
+class HashResult:
+    hashed: int
+    verified: int
+    mismatched: int
+
+
+@dataclass(frozen=True, slots=True)
+class MediaDerivativeResult:
+    built: int
+    removed: int
+
+
+@dataclass(frozen=True, slots=True)
+class LayoutMigrationResult:
+    packages: int
+    media: int
+    failed: int
+
+
+@dataclass(frozen=True, slots=True)
+class PageCacheWarmResult:
+    warmed: int
+    evicted: int
+    warmed_bytes: int
 
 
 @dataclass(frozen=True, slots=True)
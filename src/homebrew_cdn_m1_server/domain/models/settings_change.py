@@ -0,0 +1,9 @@
+from __future__ import annotations
+
+from enum import StrEnum
+
+
+class SettingsChange(StrEnum):
+    NONE = "none"
+    REEXPORT = "reexport"
+    REPROBE = "reprobe"
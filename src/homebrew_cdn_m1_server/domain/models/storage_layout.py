@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import re
+from enum import StrEnum
+from pathlib import PurePosixPath
+
+# The shard comes from the title id digits inside the content id
+# (UP0000-CUSA12345_00-... -> 45/23), so nginx can derive it with a regex
+# rewrite and public URLs keep their flat form.
+_SHARDED_NAME_PATTERN = re.compile(
+    r"^[A-Z0-9]{6}-[A-Z0-9]{5}(?P<outer>[A-Z0-9]{2})(?P<inner>[A-Z0-9]{2})_[0-9]{2}-[A-Z0-9]{16}"
+)
+_ROUTE_PATTERN = re.compile(r"^/pkg/(?P<kind>[a-z]+)/(?P<name>[^/]+)$")
+
+
+class StorageLayout(StrEnum):
+    FLAT = "flat"
+    SHARDED = "sharded"
+
+    def shard(self, name: str) -> PurePosixPath:
+        if self is StorageLayout.FLAT:
+            return PurePosixPath()
+        match = _SHARDED_NAME_PATTERN.match(name)
+        if match is None:
+            return PurePosixPath()
+        return PurePosixPath(match.group("inner"), match.group("outer"))
+
+    def relative_path(self, name: str) -> PurePosixPath:
+        return self.shard(name) / name
+
+    def route(self, flat_route: str) -> str:
+        # Maps a public /pkg/<dir>/<file> URL to where the file is stored.
+        match = _ROUTE_PATTERN.match(flat_route)
+        if match is None:
+            return flat_route
+        return f"/pkg/{match.group('kind')}/{self.relative_path(match.group('name'))}"
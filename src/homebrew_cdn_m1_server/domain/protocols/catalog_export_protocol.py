@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from collections.abc import Collection
+from pathlib import Path
+from typing import Protocol
+
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+
+
+class CatalogExportProtocol(Protocol):
+    def __call__(
+        self,
+        targets: tuple[OutputTarget, ...],
+        app_types: Collection[AppType] | None = None,
+    ) -> tuple[Path, ...]: ...
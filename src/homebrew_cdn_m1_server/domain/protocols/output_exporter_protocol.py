@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from collections.abc import Sequence
+from collections.abc import Collection, Sequence
 from pathlib import Path
 from typing import Protocol
 
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
 from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
 from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
 
@@ -11,6 +12,10 @@ from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
 class OutputExporterProtocol(Protocol):
     target: OutputTarget
 
-    def export(self, items: Sequence[CatalogItem]) -> list[Path]: ...
+    def export(
+        self,
+        items: Sequence[CatalogItem],
+        app_types: Collection[AppType] | None = None,
+    ) -> list[Path]: ...
 
     def cleanup(self) -> list[Path]: ...
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, ClassVar, final
+
+from homebrew_cdn_m1_server.application.io_budget import IoBudget
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import SqliteUnitOfWork
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+from homebrew_cdn_m1_server.domain.models.results import MediaDerivativeResult
+from homebrew_cdn_m1_server.domain.protocols.catalog_export_protocol import (
+    CatalogExportProtocol,
+)
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# variant -> (longest side in pixels or None for full size, image format)
+MEDIA_VARIANTS: dict[str, tuple[int | None, str]] = {
+    "thumb": (256, "png"),
+    "png": (None, "png"),
+    "webp": (None, "webp"),
+}
+
+
+def _write_variant(
+    image: Image.Image,
+    out_path: Path,
+    max_side: int | None,
+    image_format: str,
+) -> None:
+    from PIL import Image
+
+    rendered = image
+    if rendered.mode not in {"RGB", "RGBA", "L", "LA"}:
+        # Palette images would be resized with nearest-neighbour.
+        rendered = rendered.convert("RGBA")
+    if max_side is not None:
+        rendered = rendered.copy()
+        rendered.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    partial_path = out_path.with_name(f".{out_path.name}.partial")
+    try:
+        if image_format == "webp":
+            rendered.save(partial_path, format="WEBP", lossless=True, quality=100, method=6)
+        else:
+            rendered.save(partial_path, format="PNG", optimize=True)
+        os.replace(partial_path, out_path)
+    finally:
+        partial_path.unlink(missing_ok=True)
+
+
+def render_media_variants(source: Path, source_hash: str, out_dir: Path) -> dict[str, str | None]:
+    # Runs in a worker process. Outputs are named after the source content, so
+    # identical media shared by several titles is rendered once.
+    from PIL import Image
+
+    source_size = source.stat().st_size
+    out_dir.mkdir(parents=True, exist_ok=True)
+    outputs: dict[str, str | None] = {}
+    with Image.open(source) as image:
+        image.load()
+        for variant, (max_side, image_format) in MEDIA_VARIANTS.items():
+            name = f"{source_hash}_{variant}.{image_format}"
+            out_path = out_dir / name
+            if not out_path.exists():
+                _write_variant(image, out_path, max_side, image_format)
+            # Only a variant lighter than the source is worth publishing.
+            if out_path.stat().st_size < source_size:
+                outputs[variant] = name
+            else:
+                out_path.unlink(missing_ok=True)
+                outputs[variant] = None
+    return outputs
+
+
+def _process_pool(max_workers: int) -> Executor:
+    # spawn: the worker process runs scheduler and HTTP threads, which fork
+    # would copy in whatever state they happen to be.
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+@final
+class BuildMediaDerivatives:
+    # Builds lighter variants of the extracted media (MEDIA_VARIANTS) in a
+    # process pool and records them per media file, keyed by size/mtime, so
+    # exporters can point clients at them. Needs the optional Pillow extra.
+    SOURCES_PER_RUN: ClassVar[int] = 64
+    DERIVED_DIR_NAME: ClassVar[str] = "derived"
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], SqliteUnitOfWork],
+        export_outputs: CatalogExportProtocol,
+        output_targets: tuple[OutputTarget, ...],
+        media_dir: Path,
+        logger: logging.Logger,
+        max_workers: int = 2,
+        io_budget: IoBudget | None = None,
+        executor_factory: Callable[[int], Executor] = _process_pool,
+    ) -> None:
+        self._uow_factory = uow_factory
+        self._export_outputs = export_outputs
+        self._output_targets = output_targets
+        self._media_dir = media_dir
+        self._derived_dir = media_dir / self.DERIVED_DIR_NAME
+        self._logger = logger
+        self._max_workers = max(1, int(max_workers))
+        self._io_budget = io_budget
+        self._executor_factory = executor_factory
+
+    @staticmethod
+    def available() -> bool:
+        return importlib.util.find_spec("PIL") is not None
+
+    def _source_hash(self, path: Path) -> str:
+        data = path.read_bytes()
+        if self._io_budget is not None:
+            _ = self._io_budget.consume(len(data))
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def _sources(self) -> dict[str, tuple[Path, set[AppType]]]:
+        with self._uow_factory() as uow:
+            items = uow.catalog.list_items()
+        sources: dict[str, tuple[Path, set[AppType]]] = {}
+        for item in items:
+            for media_path in (item.icon0_path, item.pic0_path, item.pic1_path):
+                # Lazily extracted media is picked up once it has been served.
+                if media_path is None or not media_path.exists():
+                    continue
+                _, app_types = sources.setdefault(media_path.name, (media_path, set()))
+                app_types.add(item.app_type)
+        return sources
+
+    def _remove_unreferenced_outputs(self) -> None:
+        with self._uow_factory() as uow:
+            referenced = set(uow.media_derivatives.load_index().values())
+        if not self._derived_dir.is_dir():
+            return
+        for path in self._derived_dir.iterdir():
+            if path.is_file() and path.name not in referenced:
+                path.unlink(missing_ok=True)
+
+    def __call__(self) -> MediaDerivativeResult:
+        sources = self._sources()
+        with self._uow_factory() as uow:
+            removed = uow.media_derivatives.delete_except(sources.keys())
+            recorded = uow.media_derivatives.list_sources()
+            uow.commit()
+        if removed:
+            self._remove_unreferenced_outputs()
+
+        pending: list[tuple[str, Path, int, int]] = []
+        for name, (path, _) in sorted(sources.items()):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            signature = (int(stat.st_size), int(stat.st_mtime_ns))
+            if recorded.get(name) != signature:
+                pending.append((name, path, *signature))
+            if len(pending) >= self.SOURCES_PER_RUN:
+                break
+        if not pending:
+            return MediaDerivativeResult(built=0, removed=removed)
+
+        built = 0
+        affected: set[AppType] = set()
+        with self._executor_factory(self._max_workers) as executor:
+            futures: list[tuple[str, int, int, str, Future[dict[str, str | None]]]] = []
+            # Media shared by several titles renders once per content hash.
+            by_hash: dict[str, Future[dict[str, str | None]]] = {}
+            for name, path, size, mtime_ns in pending:
+                try:
+                    source_hash = self._source_hash(path)
+                except OSError as exc:
+                    self._logger.warning(
+                        "Media derivative build failed: media: %s, error: %s", name, exc
+                    )
+                    continue
+                future = by_hash.get(source_hash)
+                if future is None:
+                    future = executor.submit(
+                        render_media_variants, path, source_hash, self._derived_dir
+                    )
+                    by_hash[source_hash] = future
+                futures.append((name, size, mtime_ns, source_hash, future))
+
+            for name, size, mtime_ns, source_hash, future in futures:
+                try:
+                    outputs = future.result()
+                except Exception as exc:
+                    self._logger.warning(
+                        "Media derivative build failed: media: %s, error: %s", name, exc
+                    )
+                    continue
+                with self._uow_factory() as uow:
+                    uow.media_derivatives.save(name, size, mtime_ns, source_hash, outputs)
+                    uow.commit()
+                built += 1
+                affected.update(sources[name][1])
+
+        # Rebuilt media may leave outputs of its previous content behind.
+        self._remove_unreferenced_outputs()
+        if affected:
+            _ = self._export_outputs(self._output_targets, affected)
+        self._logger.info("Media derivatives built: media: %d, removed: %d", built, removed)
+        return MediaDerivativeResult(built=built, removed=removed)
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-from collections.abc import Iterable
+from collections.abc import Collection, Iterable
 import logging
 from pathlib import Path
 from typing import Callable, final
 
+from homebrew_cdn_m1_server.application.io_budget import IoBudget
 from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import SqliteUnitOfWork
 from homebrew_cdn_m1_server.domain.protocols.output_exporter_protocol import OutputExporterProtocol
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
 from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
 
 
@@ -17,23 +19,45 @@ class ExportOutputs:
         uow_factory: Callable[[], SqliteUnitOfWork],
         exporters: Iterable[OutputExporterProtocol],
         logger: logging.Logger,
+        io_budget: IoBudget | None = None,
     ) -> None:
         self._uow_factory = uow_factory
         self._exporters = {exporter.target: exporter for exporter in exporters}
         self._logger = logger
+        self._io_budget = io_budget
 
-    def __call__(self, targets: tuple[OutputTarget, ...]) -> tuple[Path, ...]:
+    def _charge(self, files: list[Path]) -> None:
+        # Outputs are small and written atomically, so they are charged after
+        # the fact; the debt delays the next background read or write instead.
+        if self._io_budget is None or not files:
+            return
+        written = 0
+        for path in files:
+            try:
+                written += path.stat().st_size
+            except OSError:
+                continue
+        _ = self._io_budget.consume(written, ops=len(files))
+
+    def __call__(
+        self,
+        targets: tuple[OutputTarget, ...],
+        app_types: Collection[AppType] | None = None,
+        enabled_targets: Collection[OutputTarget] | None = None,
+    ) -> tuple[Path, ...]:
         with self._uow_factory() as uow:
             items = uow.catalog.list_items()
 
-        enabled_targets = set(targets)
+        # Exporting a subset of targets must not clean up the other enabled ones.
+        enabled = set(targets if enabled_targets is None else enabled_targets)
         exported: list[Path] = []
         for target in targets:
             exporter = self._exporters.get(target)
             if not exporter:
                 self._logger.warning("Output target not registered: %s", target.value)
                 continue
-            files = exporter.export(items)
+            files = exporter.export(items, app_types)
+            self._charge(files)
             exported.extend(files)
             self._logger.debug(
                 "%s Export completed: %d updated",
@@ -42,7 +66,7 @@ class ExportOutputs:
             )
 
         for target, exporter in self._exporters.items():
-            if target in enabled_targets:
+            if target in enabled:
                 continue
             removed_files = exporter.cleanup()
             if not removed_files:
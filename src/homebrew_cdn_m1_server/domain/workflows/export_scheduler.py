@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Collection, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Callable, final
+
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.export_policy import ExportPolicy
+from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+from homebrew_cdn_m1_server.domain.workflows.export_outputs import ExportOutputs
+
+
+@dataclass(slots=True)
+class _PendingExport:
+    # None means every app type must be rewritten.
+    app_types: set[AppType] | None
+    first_seconds: float
+    last_seconds: float
+
+
+@final
+class ExportScheduler:
+    # Stands in for ExportOutputs: workflows request exports, and flush()
+    # (driven by the scheduler) publishes each target once its policy allows.
+    def __init__(
+        self,
+        export_outputs_factory: Callable[[], ExportOutputs],
+        policies: Mapping[OutputTarget, ExportPolicy],
+        logger: logging.Logger,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._export_outputs_factory = export_outputs_factory
+        self._policies = dict(policies)
+        self._logger = logger
+        self._clock = clock
+        self._pending: dict[OutputTarget, _PendingExport] = {}
+        self._last_export: dict[OutputTarget, float] = {}
+        self._enabled_targets: tuple[OutputTarget, ...] = tuple()
+        self._state_lock = Lock()
+        self._flush_lock = Lock()
+
+    def __call__(
+        self,
+        targets: tuple[OutputTarget, ...],
+        app_types: Collection[AppType] | None = None,
+    ) -> tuple[Path, ...]:
+        now = self._clock()
+        with self._state_lock:
+            disabled = not targets or bool(set(self._enabled_targets) - set(targets))
+            self._enabled_targets = targets
+            if not disabled:
+                self._queue(targets, app_types, now)
+        # Outputs of disabled targets are removed by ExportOutputs, which a
+        # flush never reaches when nothing is queued, so this runs right away.
+        if disabled:
+            return self._export_now(targets, app_types, now)
+        self._logger.debug(
+            "Export requested: targets: %s", ", ".join(target.value for target in targets)
+        )
+        return tuple()
+
+    def _queue(
+        self,
+        targets: tuple[OutputTarget, ...],
+        app_types: Collection[AppType] | None,
+        now: float,
+    ) -> None:
+        for target in targets:
+            pending = self._pending.get(target)
+            if pending is None:
+                self._pending[target] = _PendingExport(
+                    app_types=None if app_types is None else set(app_types),
+                    first_seconds=now,
+                    last_seconds=now,
+                )
+                continue
+            pending.last_seconds = now
+            if pending.app_types is None or app_types is None:
+                pending.app_types = None
+            else:
+                pending.app_types.update(app_types)
+
+    def _export_now(
+        self,
+        targets: tuple[OutputTarget, ...],
+        app_types: Collection[AppType] | None,
+        now: float,
+    ) -> tuple[Path, ...]:
+        with self._flush_lock:
+            exported = self._export_outputs_factory()(targets, app_types)
+            for target in targets:
+                self._last_export[target] = now
+        self._logger.info(
+            "Export published without delay: targets changed: %s",
+            ", ".join(target.value for target in targets) or "none",
+        )
+        return exported
+
+    def has_pending(self) -> bool:
+        with self._state_lock:
+            return bool(self._pending)
+
+    def _is_due(self, target: OutputTarget, pending: _PendingExport, now: float) -> bool:
+        policy = self._policies.get(target)
+        if policy is None:
+            return True
+        last_export = self._last_export.get(target)
+        if last_export is not None and now - last_export < policy.min_interval_seconds:
+            return False
+        quiet = now - pending.last_seconds >= policy.quiet_seconds
+        stale = now - pending.first_seconds >= policy.max_staleness_seconds
+        return quiet or stale
+
+    def flush(self, force: bool = False) -> tuple[Path, ...]:
+        with self._flush_lock:
+            now = self._clock()
+            with self._state_lock:
+                enabled = self._enabled_targets
+                due = {
+                    target: pending
+                    for target, pending in self._pending.items()
+                    if target in enabled and (force or self._is_due(target, pending, now))
+                }
+                for target in due:
+                    del self._pending[target]
+                for target in [target for target in self._pending if target not in enabled]:
+                    del self._pending[target]
+            if not due:
+                return tuple()
+
+            export_outputs = self._export_outputs_factory()
+            exported: list[Path] = []
+            for target, pending in sorted(due.items()):
+                try:
+                    exported.extend(
+                        export_outputs((target,), pending.app_types, enabled_targets=enabled)
+                    )
+                except Exception as exc:
+                    self._logger.error("Export failed: target: %s, error: %s", target.value, exc)
+                    self._requeue(target, pending)
+                    continue
+                self._last_export[target] = now
+                self._logger.info(
+                    "Export published: target: %s, waited: %.1fs",
+                    target.value,
+                    now - pending.first_seconds,
+                )
+            return tuple(exported)
+
+    def _requeue(self, target: OutputTarget, failed: _PendingExport) -> None:
+        with self._state_lock:
+            pending = self._pending.get(target)
+            if pending is None:
+                self._pending[target] = failed
+                return
+            pending.first_seconds = min(pending.first_seconds, failed.first_seconds)
+            if pending.app_types is None or failed.app_types is None:
+                pending.app_types = None
+            else:
+                pending.app_types.update(failed.app_types)
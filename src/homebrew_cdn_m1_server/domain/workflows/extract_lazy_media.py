@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import logging
+import re
+from pathlib import Path
+from threading import Lock
+from typing import Callable, ClassVar, final
+
+from homebrew_cdn_m1_server.application.gateways.pkgtool_gateway import PkgtoolGateway
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import SqliteUnitOfWork
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
+
+
+@final
+class ExtractLazyMedia:
+    # Serves media that ingest left inside the PKG (PKGTOOL_LAZY_MEDIA): the
+    # first request extracts the recorded entry into the media directory and
+    # every later one is a plain static file hit in nginx.
+    _MEDIA_NAME_REGEX: ClassVar[re.Pattern[str]] = re.compile(
+        r"^(?P<content_id>[A-Z0-9_-]+)_(?P<kind>pic0|pic1)\.png$"
+    )
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], SqliteUnitOfWork],
+        package_probe: Callable[[], PkgtoolGateway],
+        media_dir: Path,
+        logger: logging.Logger,
+        layout: StorageLayout = StorageLayout.FLAT,
+    ) -> None:
+        self._uow_factory = uow_factory
+        self._package_probe = package_probe
+        self._media_dir = media_dir
+        self._logger = logger
+        self._layout = layout
+        self._locks: dict[str, Lock] = {}
+        self._locks_guard = Lock()
+
+    def _lock_for(self, name: str) -> Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(name, Lock())
+
+    @staticmethod
+    def _entry(item: CatalogItem, kind: str) -> str | None:
+        return item.pic0_entry if kind == "pic0" else item.pic1_entry
+
+    def _sources(self, content_id: str, kind: str) -> list[tuple[Path, str]]:
+        with self._uow_factory() as uow:
+            items = uow.catalog.list_by_content_id(content_id)
+        # Every version of a title shares the media file; prefer the newest PKG.
+        items.sort(key=lambda item: item.pkg_mtime_ns, reverse=True)
+        sources: list[tuple[Path, str]] = []
+        for item in items:
+            entry = self._entry(item, kind)
+            if entry:
+                sources.append((item.pkg_path, entry))
+        return sources
+
+    def __call__(self, name: str) -> Path | None:
+        match = self._MEDIA_NAME_REGEX.match(name)
+        if match is None:
+            return None
+        # Same location nginx rewrites the public URL to.
+        out_path = self._media_dir / self._layout.relative_path(name)
+        with self._lock_for(name):
+            if out_path.exists():
+                return out_path
+            for pkg_path, entry in self._sources(match.group("content_id"), match.group("kind")):
+                if not pkg_path.exists():
+                    continue
+                try:
+                    _ = self._package_probe().extract_entry(pkg_path, entry, out_path)
+                except Exception as exc:
+                    self._logger.warning(
+                        "Lazy media extraction failed: media: %s, pkg: %s, error: %s",
+                        name,
+                        pkg_path.name,
+                        exc,
+                    )
+                    continue
+                self._logger.debug("Lazy media extracted: media: %s, pkg: %s", name, pkg_path.name)
+                return out_path
+        return None
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import time
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Callable, ClassVar, final
+
+from homebrew_cdn_m1_server.application.io_budget import IoBudget
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import SqliteUnitOfWork
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+from homebrew_cdn_m1_server.domain.models.results import HashResult
+from homebrew_cdn_m1_server.domain.protocols.catalog_export_protocol import (
+    CatalogExportProtocol,
+)
+
+
+def hash_pkg_content(
+    path: Path,
+    with_blake2: bool,
+    io_budget: IoBudget | None = None,
+    chunk_bytes: int = 8 * 1024 * 1024,
+    keep_cached: bool = False,
+) -> tuple[str, str | None]:
+    md5 = hashlib.md5(usedforsecurity=False)
+    blake2 = hashlib.blake2b() if with_blake2 else None
+    buffer = bytearray(chunk_bytes)
+    view = memoryview(buffer)
+    with path.open("rb", buffering=0) as stream:
+        fd = stream.fileno()
+        fadvise = getattr(os, "posix_fadvise", None)
+        if fadvise is not None:
+            fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        offset = 0
+        while True:
+            if io_budget is not None:
+                _ = io_budget.consume(chunk_bytes)
+            read = stream.readinto(buffer)
+            if not read:
+                break
+            md5.update(view[:read])
+            if blake2 is not None:
+                blake2.update(view[:read])
+            # Drop what was read so a full pass over the library does not
+            # evict the pages nginx is serving from. Files kept warm for
+            # serving hold those pages already, so they stay cached.
+            if fadvise is not None and not keep_cached:
+                fadvise(fd, offset, read, os.POSIX_FADV_DONTNEED)
+            offset += read
+    return md5.hexdigest(), None if blake2 is None else blake2.hexdigest()
+
+
+@final
+class HashPackages:
+    # Streams whole PKGs to fill catalog_items.pkg_md5 (published as the
+    # hb-store md5 column) and optionally pkg_blake2. Rows without hashes are
+    # the work queue, so an interrupted pass resumes after a restart. Hashes
+    # are cleared only when ingest sees a different size/mtime fingerprint;
+    # with verify_after_days set, old hashes are re-checked to catch silent
+    # corruption.
+    RUN_SECONDS: ClassVar[float] = 50.0
+    ITEMS_PER_QUERY: ClassVar[int] = 16
+    _SKIPPED: ClassVar[str] = "skipped"
+    _HASHED: ClassVar[str] = "hashed"
+    _VERIFIED: ClassVar[str] = "verified"
+    _MISMATCHED: ClassVar[str] = "mismatched"
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], SqliteUnitOfWork],
+        export_outputs: CatalogExportProtocol,
+        output_targets: tuple[OutputTarget, ...],
+        logger: logging.Logger,
+        io_budget: IoBudget | None = None,
+        with_blake2: bool = False,
+        verify_after_days: int = 0,
+        run_seconds: float = RUN_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        keep_cached: Callable[[Path], bool] | None = None,
+    ) -> None:
+        self._uow_factory = uow_factory
+        self._export_outputs = export_outputs
+        self._output_targets = output_targets
+        self._logger = logger
+        self._io_budget = io_budget
+        self._with_blake2 = with_blake2
+        self._verify_after_days = max(0, int(verify_after_days))
+        self._run_seconds = max(0.0, float(run_seconds))
+        self._clock = clock
+        self._keep_cached = keep_cached
+
+    def _verified_before(self) -> str | None:
+        if self._verify_after_days <= 0:
+            return None
+        cutoff = datetime.now(UTC) - timedelta(days=self._verify_after_days)
+        return cutoff.replace(microsecond=0).isoformat()
+
+    @staticmethod
+    def _unchanged(item: CatalogItem) -> bool:
+        try:
+            stat = item.pkg_path.stat()
+        except OSError:
+            return False
+        return (int(stat.st_size), int(stat.st_mtime_ns)) == (item.pkg_size, item.pkg_mtime_ns)
+
+    def _hash_item(self, item: CatalogItem) -> str:
+        if not self._unchanged(item):
+            return self._SKIPPED
+        md5, blake2 = hash_pkg_content(
+            item.pkg_path,
+            self._with_blake2,
+            self._io_budget,
+            keep_cached=self._keep_cached is not None and self._keep_cached(item.pkg_path),
+        )
+        # A PKG rewritten while it was read gets picked up again by ingest.
+        if not self._unchanged(item):
+            return self._SKIPPED
+
+        status = self._HASHED if item.pkg_md5 is None else self._VERIFIED
+        mismatch = (item.pkg_md5 is not None and item.pkg_md5 != md5) or (
+            blake2 is not None and item.pkg_blake2 is not None and item.pkg_blake2 != blake2
+        )
+        if mismatch:
+            self._logger.error(
+                "PKG integrity check failed: path: %s, stored md5: %s, current md5: %s",
+                item.pkg_path,
+                item.pkg_md5,
+                md5,
+            )
+            # Keep the recorded hashes; only the verification time moves on.
+            md5, blake2 = item.pkg_md5, item.pkg_blake2
+            status = self._MISMATCHED
+
+        with self._uow_factory() as uow:
+            saved = uow.catalog.save_hashes(item, md5, blake2)
+            uow.commit()
+        return status if saved else self._SKIPPED
+
+    def __call__(self) -> HashResult:
+        started = self._clock()
+        verified_before = self._verified_before()
+        hashed = 0
+        verified = 0
+        mismatched = 0
+        affected: set[AppType] = set()
+        seen: set[tuple[str, str, str]] = set()
+        while self._clock() - started < self._run_seconds:
+            with self._uow_factory() as uow:
+                # Rows skipped earlier in this run stay due, so look past them.
+                due = uow.catalog.list_hash_due(
+                    self.ITEMS_PER_QUERY + len(seen),
+                    require_blake2=self._with_blake2,
+                    verified_before=verified_before,
+                )
+            due = [
+                item
+                for item in due
+                if (item.content_id.value, item.app_type.value, item.version) not in seen
+            ]
+            if not due:
+                break
+            for item in due:
+                if self._clock() - started >= self._run_seconds:
+                    break
+                seen.add((item.content_id.value, item.app_type.value, item.version))
+                try:
+                    status = self._hash_item(item)
+                except OSError as exc:
+                    self._logger.warning(
+                        "PKG hashing failed: path: %s, error: %s", item.pkg_path, exc
+                    )
+                    continue
+                if status == self._HASHED:
+                    hashed += 1
+                    affected.add(item.app_type)
+                elif status == self._VERIFIED:
+                    verified += 1
+                elif status == self._MISMATCHED:
+                    mismatched += 1
+
+        # Only store.db carries md5, but exporting a subset of targets would
+        # clean up the others, so every enabled target is requested.
+        if affected and OutputTarget.HB_STORE in self._output_targets:
+            _ = self._export_outputs(self._output_targets, affected)
+        if hashed or verified or mismatched:
+            self._logger.info(
+                "PKG hashing: hashed: %d, verified: %d, mismatched: %d",
+                hashed,
+                verified,
+                mismatched,
+            )
+        return HashResult(hashed=hashed, verified=verified, mismatched=mismatched)
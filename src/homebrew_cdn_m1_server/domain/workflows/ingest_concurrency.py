@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import logging
+from threading import Condition
+from typing import Callable, ClassVar, final
+
+
+@final
+class IngestConcurrency:
+    # Resizable probe slot pool driven by feedback. Every window of finished
+    # probes estimates throughput from per-package latency (Little's law:
+    # active slots * bytes / probe seconds). The limit climbs one slot at a
+    # time while that keeps paying off, steps back when the last increase
+    # made things slower, and halves while the API p99 is over its limit.
+    # The limit survives between batches, so each batch starts from what the
+    # disk sustained last time.
+    SLOWDOWN_TOLERANCE: ClassVar[float] = 0.1
+    HOLD_WINDOWS: ClassVar[int] = 3
+
+    def __init__(
+        self,
+        max_workers: int,
+        logger: logging.Logger,
+        api_p99_seconds: Callable[[], float | None] = lambda: None,
+        api_p99_limit_seconds: float = 0.0,
+        initial_workers: int | None = None,
+    ) -> None:
+        self._max_workers = max(1, int(max_workers))
+        self._logger = logger
+        self._api_p99_seconds = api_p99_seconds
+        self._api_p99_limit_seconds = max(0.0, float(api_p99_limit_seconds))
+        initial = self._max_workers // 2 if initial_workers is None else int(initial_workers)
+        self._limit = min(self._max_workers, max(1, initial))
+        self._active = 0
+        self._condition = Condition()
+        self._window_count = 0
+        self._window_bytes = 0
+        self._window_seconds = 0.0
+        self._last_throughput: float | None = None
+        self._last_step = 0
+        self._hold = 0
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    @property
+    def limit(self) -> int:
+        with self._condition:
+            return self._limit
+
+    def acquire(self) -> None:
+        with self._condition:
+            _ = self._condition.wait_for(lambda: self._active < self._limit)
+            self._active += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self._active = max(0, self._active - 1)
+            self._condition.notify_all()
+
+    def record(self, seconds: float, size_bytes: int) -> None:
+        with self._condition:
+            self._window_count += 1
+            self._window_bytes += max(0, int(size_bytes))
+            self._window_seconds += max(0.0, float(seconds))
+            if self._window_count < 2 * self._limit:
+                return
+            # Without sizes every package counts as one unit of work.
+            work = self._window_bytes or self._window_count
+            throughput = self._limit * work / max(self._window_seconds, 1e-6)
+            self._window_count = 0
+            self._window_bytes = 0
+            self._window_seconds = 0.0
+            self._adjust(throughput)
+            self._condition.notify_all()
+
+    def _adjust(self, throughput: float) -> None:
+        previous_limit = self._limit
+        p99 = self._api_p99_seconds() if self._api_p99_limit_seconds > 0 else None
+        if p99 is not None and p99 > self._api_p99_limit_seconds:
+            self._limit = max(1, self._limit // 2)
+            reason = "api latency"
+        elif (
+            self._last_throughput is not None
+            and self._last_step > 0
+            and throughput < self._last_throughput * (1.0 - self.SLOWDOWN_TOLERANCE)
+        ):
+            self._limit = max(1, self._limit - 1)
+            self._hold = self.HOLD_WINDOWS
+            reason = "slower"
+        elif self._hold > 0:
+            self._hold -= 1
+            reason = "hold"
+        elif self._limit < self._max_workers:
+            self._limit += 1
+            reason = "faster"
+        else:
+            reason = "ceiling"
+
+        self._last_step = self._limit - previous_limit
+        self._last_throughput = throughput
+        if self._limit != previous_limit:
+            self._logger.debug(
+                "Ingest concurrency adjusted: workers: %d -> %d, reason: %s",
+                previous_limit,
+                self._limit,
+                reason,
+            )
@@ -2,9 +2,12 @@ from __future__ import annotations
 
 import hashlib
 import logging
+import subprocess
+from collections.abc import Sequence
 from pathlib import Path
 from typing import Callable, final
 
+from homebrew_cdn_m1_server.application.io_budget import IoBudget
 from homebrew_cdn_m1_server.application.repositories.filesystem_repository import (
     FilesystemRepository,
 )
@@ -15,21 +18,46 @@ from homebrew_cdn_m1_server.domain.protocols.title_metadata_lookup_protocol impo
 )
 from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
 from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
-from homebrew_cdn_m1_server.domain.models.results import IngestResult
+from homebrew_cdn_m1_server.domain.models.results import (
+    IngestResult,
+    PlacedPackage,
+    ProbedPackage,
+    ProbeResult,
+)
+
+# Failures that may succeed on a later attempt without the file changing;
+# these are never remembered in the probe cache.
+_TRANSIENT_PROBE_ERRORS: tuple[type[BaseException], ...] = (
+    OSError,
+    subprocess.TimeoutExpired,
+)
 
 
-def fingerprint_pkg(path: Path, size: int, mtime_ns: int) -> str:
+def fingerprint_pkg(
+    path: Path,
+    size: int,
+    mtime_ns: int,
+    io_budget: IoBudget | None = None,
+) -> str:
     digest = hashlib.blake2b(digest_size=16)
     digest.update(f"{size}:{mtime_ns}".encode("utf-8"))
 
     with path.open("rb") as stream:
         head = stream.read(64 * 1024)
         digest.update(head)
+        read_bytes = len(head)
+        reads = 1
 
         if size > 64 * 1024:
             tail_size = min(size, 64 * 1024)
             _ = stream.seek(max(0, size - tail_size))
-            digest.update(stream.read(tail_size))
+            tail = stream.read(tail_size)
+            digest.update(tail)
+            read_bytes += len(tail)
+            reads += 1
+
+    if io_budget is not None:
+        _ = io_budget.consume(read_bytes, ops=reads)
 
     return digest.hexdigest()
 
@@ -43,39 +71,104 @@ class IngestPackage:
         package_store: FilesystemRepository,
         logger: logging.Logger,
         metadata_lookup: TitleMetadataLookupProtocol | None = None,
+        io_budget: IoBudget | None = None,
+        lazy_media: bool = False,
     ) -> None:
         self._uow_factory = uow_factory
         self._package_probe = package_probe
         self._package_store = package_store
         self._logger = logger
         self._metadata_lookup = metadata_lookup
+        self._io_budget = io_budget
+        self._lazy_media = lazy_media
+
+    def _source_fingerprint(self, pkg_path: Path) -> tuple[int, int, str] | None:
+        try:
+            size, mtime_ns = self._package_store.stat(pkg_path)
+            return size, mtime_ns, fingerprint_pkg(pkg_path, size, mtime_ns, self._io_budget)
+        except OSError as exc:
+            self._logger.debug("Probe cache skipped for %s: %s", pkg_path.name, exc)
+            return None
+
+    def _media_available(self, probe: ProbeResult) -> bool:
+        media = (
+            (probe.icon0_path, None),
+            (probe.pic0_path, probe.pic0_entry),
+            (probe.pic1_path, probe.pic1_entry),
+        )
+        for media_path, lazy_entry in media:
+            # Lazily extracted media only exists once it has been requested;
+            # with PKGTOOL_LAZY_MEDIA off nothing extracts it on request.
+            deferred = lazy_entry is not None and self._lazy_media
+            if media_path is not None and not deferred and not media_path.exists():
+                return False
+        return True
+
+    def _probe(
+        self,
+        pkg_path: Path,
+        fingerprint: str | None,
+        refresh: bool = False,
+    ) -> ProbeResult | None:
+        if fingerprint and not refresh:
+            with self._uow_factory() as uow:
+                cached = uow.probe_cache.get_result(fingerprint)
+                failure = None if cached else uow.probe_cache.get_failure(fingerprint)
+            if cached is not None and self._media_available(cached):
+                self._logger.debug("Probe cache hit: %s", pkg_path.name)
+                return cached
+            if failure is not None:
+                self._logger.error(
+                    "Failed to probe %s: %s (cached result)", pkg_path.name, failure
+                )
+                _ = self._package_store.move_to_errors(pkg_path, "probe_failed")
+                return None
 
-    def __call__(self, pkg_path: Path) -> IngestResult:
         try:
             probe = self._package_probe.probe(pkg_path)
         except Exception as exc:
             self._logger.error("Failed to probe %s: %s", pkg_path.name, exc)
+            if fingerprint and not isinstance(exc, _TRANSIENT_PROBE_ERRORS):
+                with self._uow_factory() as uow:
+                    uow.probe_cache.record_failure(fingerprint, str(exc))
+                    uow.commit()
             _ = self._package_store.move_to_errors(pkg_path, "probe_failed")
-            return IngestResult(item=None, created=False, updated=False)
-
+            return None
+        return probe
+
+    def probe_package(self, pkg_path: Path, refresh: bool = False) -> ProbedPackage | None:
+        source = self._source_fingerprint(pkg_path)
+        probe = self._probe(pkg_path, source[2] if source else None, refresh)
+        if probe is None:
+            return None
+        return ProbedPackage(pkg_path=pkg_path, source=source, probe=probe)
+
+    def place_package(self, probed: ProbedPackage) -> PlacedPackage | None:
+        pkg_path = probed.pkg_path
+        source = probed.source
+        probe = probed.probe
         try:
             canonical_path = self._package_store.move_to_canonical(
                 pkg_path,
                 probe.app_type.value,
                 probe.content_id.value,
+                probe.version,
             )
         except Exception as exc:
             self._logger.error("Failed to move %s to canonical path: %s", pkg_path.name, exc)
             _ = self._package_store.move_to_errors(pkg_path, "organizer_failed")
-            return IngestResult(item=None, created=False, updated=False)
+            return None
 
         try:
             size, mtime_ns = self._package_store.stat(canonical_path)
-            pkg_fp = fingerprint_pkg(canonical_path, size, mtime_ns)
+            if source is not None and source[:2] == (size, mtime_ns):
+                pkg_fp = source[2]
+            else:
+                pkg_fp = fingerprint_pkg(canonical_path, size, mtime_ns, self._io_budget)
         except Exception as exc:
             self._logger.error("Failed to fingerprint %s: %s", canonical_path.name, exc)
             _ = self._package_store.move_to_errors(canonical_path, "fingerprint_failed")
-            return IngestResult(item=None, created=False, updated=False)
+            return None
 
         publisher: str | None = None
         if self._metadata_lookup is not None:
@@ -105,22 +198,42 @@ class IngestPackage:
             icon0_path=probe.icon0_path,
             pic0_path=probe.pic0_path,
             pic1_path=probe.pic1_path,
+            pic0_entry=probe.pic0_entry,
+            pic1_entry=probe.pic1_entry,
             sfo=ParamSfoSnapshot(
                 fields=dict(probe.sfo_fields),
                 raw=probe.sfo_raw,
                 hash=probe.sfo_hash,
             ),
             publisher=publisher,
+            probe_version=probe.probe_version,
+            derive_version=probe.derive_version,
         )
+        return PlacedPackage(item=item, probe=probe)
 
+    def write_packages(self, placed: Sequence[PlacedPackage]) -> None:
+        if not placed:
+            return
         with self._uow_factory() as uow:
-            uow.catalog.upsert(item)
+            for entry in placed:
+                uow.catalog.upsert(entry.item)
+                uow.probe_cache.save_result(entry.item.pkg_fingerprint, entry.probe)
             uow.commit()
 
-        self._logger.info(
-            "Catalog upserted: content_id: %s, app_type: %s, version: %s",
-            item.content_id.value,
-            item.app_type.value,
-            item.version,
-        )
-        return IngestResult(item=item, created=True, updated=False)
+        for entry in placed:
+            self._logger.info(
+                "Catalog upserted: content_id: %s, app_type: %s, version: %s",
+                entry.item.content_id.value,
+                entry.item.app_type.value,
+                entry.item.version,
+            )
+
+    def __call__(self, pkg_path: Path, refresh: bool = False) -> IngestResult:
+        probed = self.probe_package(pkg_path, refresh)
+        if probed is None:
+            return IngestResult(item=None, created=False, updated=False)
+        placed = self.place_package(probed)
+        if placed is None:
+            return IngestResult(item=None, created=False, updated=False)
+        self.write_packages((placed,))
+        return IngestResult(item=placed.item, created=True, updated=False)
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import logging
+import time
+import traceback
+from collections import deque
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from queue import Empty, Queue
+from threading import Lock, Thread
+from typing import ClassVar, final
+
+from homebrew_cdn_m1_server.domain.models.results import (
+    IngestResult,
+    PlacedPackage,
+    ProbedPackage,
+)
+from homebrew_cdn_m1_server.domain.workflows.ingest_concurrency import IngestConcurrency
+from homebrew_cdn_m1_server.domain.workflows.ingest_package import IngestPackage
+
+
+@final
+class _ProbeLanes:
+    # Small packages keep their given order; large ones go longest-first so the
+    # biggest probe starts early instead of extending the tail of the batch.
+    def __init__(
+        self,
+        pkg_paths: Sequence[Path],
+        sizes: Mapping[str, int],
+        small_max_bytes: int,
+    ) -> None:
+        small: list[Path] = []
+        large: list[Path] = []
+        for path in pkg_paths:
+            if small_max_bytes > 0 and sizes.get(str(path), 0) > small_max_bytes:
+                large.append(path)
+            else:
+                small.append(path)
+        large.sort(key=lambda path: (-sizes.get(str(path), 0), str(path)))
+        self._small = deque(small)
+        self._large = deque(large)
+        self._sizes = sizes
+        self._lock = Lock()
+
+    def size(self, path: Path) -> int:
+        return self._sizes.get(str(path), 0)
+
+    def take(self, small_lane: bool) -> Path | None:
+        # Each lane helps the other once its own queue runs dry.
+        with self._lock:
+            first, second = (self._small, self._large) if small_lane else (self._large, self._small)
+            if first:
+                return first.popleft()
+            if second:
+                return second.popleft()
+            return None
+
+
+@final
+class IngestPipeline:
+    # Probe (pkgtool subprocesses) -> place (move + fingerprint) -> one writer.
+    # The single writer groups upserts so a bulk import pays one transaction
+    # per batch instead of one per package, and never competes with itself
+    # for the SQLite write lock.
+    BATCH_SIZE: ClassVar[int] = 64
+    BATCH_INTERVAL_SECONDS: ClassVar[float] = 0.25
+    # Share of probe workers reserved for small packages when sizes are known.
+    SMALL_LANE_RATIO: ClassVar[float] = 0.25
+
+    def __init__(
+        self,
+        ingest_package: IngestPackage,
+        logger: logging.Logger,
+        probe_workers: int,
+        batch_size: int = BATCH_SIZE,
+        batch_interval_seconds: float = BATCH_INTERVAL_SECONDS,
+        small_max_bytes: int = 0,
+        concurrency: IngestConcurrency | None = None,
+    ) -> None:
+        self._ingest_package = ingest_package
+        self._logger = logger
+        # With a concurrency controller every possible worker gets a thread and
+        # the controller decides how many of them probe at once.
+        self._concurrency = concurrency
+        self._probe_workers = (
+            concurrency.max_workers if concurrency is not None else max(1, int(probe_workers))
+        )
+        self._batch_size = max(1, int(batch_size))
+        self._batch_interval_seconds = max(0.0, float(batch_interval_seconds))
+        self._small_max_bytes = max(0, int(small_max_bytes))
+        self._results: list[IngestResult] = []
+        self._results_lock = Lock()
+
+    def _record(self, result: IngestResult) -> None:
+        with self._results_lock:
+            self._results.append(result)
+
+    def _record_failure(self) -> None:
+        self._record(IngestResult(item=None, created=False, updated=False))
+
+    def _small_lane_workers(self, sizes: Mapping[str, int] | None) -> int:
+        if sizes is None or self._small_max_bytes <= 0 or self._probe_workers < 2:
+            return 0
+        return max(1, int(self._probe_workers * self.SMALL_LANE_RATIO))
+
+    def _probe_worker(
+        self,
+        lanes: _ProbeLanes,
+        small_lane: bool,
+        placing: Queue[ProbedPackage | None],
+    ) -> None:
+        concurrency = self._concurrency
+        while True:
+            if concurrency is not None:
+                concurrency.acquire()
+            path = lanes.take(small_lane)
+            if path is None:
+                if concurrency is not None:
+                    concurrency.release()
+                return
+            started = time.monotonic()
+            try:
+                probed = self._ingest_package.probe_package(path)
+            except Exception:
+                self._logger.error(
+                    "Unexpected ingest worker failure for %s\n%s",
+                    path,
+                    traceback.format_exc(),
+                )
+                probed = None
+            if concurrency is not None:
+                concurrency.record(time.monotonic() - started, lanes.size(path))
+                concurrency.release()
+            if probed is None:
+                self._record_failure()
+                continue
+            placing.put(probed)
+
+    def _place_worker(
+        self,
+        placing: Queue[ProbedPackage | None],
+        writing: Queue[PlacedPackage | None],
+    ) -> None:
+        while True:
+            probed = placing.get()
+            if probed is None:
+                writing.put(None)
+                return
+            try:
+                placed = self._ingest_package.place_package(probed)
+            except Exception:
+                self._logger.error(
+                    "Unexpected ingest worker failure for %s\n%s",
+                    probed.pkg_path,
+                    traceback.format_exc(),
+                )
+                placed = None
+            if placed is None:
+                self._record_failure()
+                continue
+            writing.put(placed)
+
+    def _flush(self, batch: list[PlacedPackage]) -> None:
+        try:
+            self._ingest_package.write_packages(batch)
+        except Exception as exc:
+            if len(batch) == 1:
+                self._logger.error(
+                    "Catalog write failed for %s: %s", batch[0].item.pkg_path.name, exc
+                )
+                self._record_failure()
+                return
+            # Retry one by one so a single bad row does not drop the batch.
+            self._logger.warning(
+                "Catalog batch write failed, retrying items: count: %d, error: %s",
+                len(batch),
+                exc,
+            )
+            for entry in batch:
+                self._flush([entry])
+            return
+        for entry in batch:
+            self._record(IngestResult(item=entry.item, created=True, updated=False))
+
+    def _writer(self, writing: Queue[PlacedPackage | None]) -> None:
+        batch: list[PlacedPackage] = []
+        deadline = 0.0
+        done = False
+        while not done:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                entry = writing.get(timeout=timeout)
+            except Empty:
+                self._flush(batch)
+                batch = []
+                continue
+            if entry is None:
+                done = True
+            else:
+                if not batch:
+                    deadline = time.monotonic() + self._batch_interval_seconds
+                batch.append(entry)
+            if batch and (done or len(batch) >= self._batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+
+    def __call__(
+        self,
+        pkg_paths: Sequence[Path],
+        sizes: Mapping[str, int] | None = None,
+    ) -> list[IngestResult]:
+        self._results = []
+        if not pkg_paths:
+            return []
+
+        small_lane_workers = self._small_lane_workers(sizes)
+        lanes = _ProbeLanes(
+            pkg_paths,
+            sizes or {},
+            self._small_max_bytes if small_lane_workers > 0 else 0,
+        )
+        queue_size = self._probe_workers * 2
+        placing: Queue[ProbedPackage | None] = Queue(maxsize=queue_size)
+        writing: Queue[PlacedPackage | None] = Queue(maxsize=max(queue_size, self._batch_size))
+
+        probe_threads = [
+            Thread(
+                target=self._probe_worker,
+                args=(lanes, index < small_lane_workers, placing),
+                name=f"ingest-probe-{index}",
+                daemon=True,
+            )
+            for index in range(self._probe_workers)
+        ]
+        place_thread = Thread(
+            target=self._place_worker, args=(placing, writing), name="ingest-place", daemon=True
+        )
+        writer_thread = Thread(
+            target=self._writer, args=(writing,), name="ingest-writer", daemon=True
+        )
+        for thread in (*probe_threads, place_thread, writer_thread):
+            thread.start()
+
+        for thread in probe_threads:
+            thread.join()
+        placing.put(None)
+        place_thread.join()
+        writer_thread.join()
+
+        results = self._results
+        self._results = []
+        return results
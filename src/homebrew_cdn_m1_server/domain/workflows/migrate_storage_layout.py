@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import replace
+from pathlib import Path
+from typing import Callable, ClassVar, final
+
+from filelock import FileLock, Timeout
+
+from homebrew_cdn_m1_server.application.repositories.filesystem_repository import (
+    FilesystemRepository,
+)
+from homebrew_cdn_m1_server.application.repositories.sqlite_snapshot_repository import (
+    SqliteSnapshotRepository,
+)
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import SqliteUnitOfWork
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.results import LayoutMigrationResult
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
+
+
+@final
+class MigrateStorageLayout:
+    # Moves catalogued PKGs and media to the configured STORAGE_LAYOUT (and
+    # STORAGE_VERSIONED_PATHS file names) once,
+    # while nginx keeps serving: its fallback finds files in either place, so
+    # every rename is immediately visible. Catalog rows, the scan snapshot and
+    # the probe cache are rewritten along with the files, so the next reconcile
+    # sees nothing new. The applied layout is recorded in marker_path.
+    _VERSIONED_SUFFIX: ClassVar[str] = "+versioned"
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], SqliteUnitOfWork],
+        package_store: FilesystemRepository,
+        snapshot_store: SqliteSnapshotRepository,
+        media_dir: Path,
+        layout: StorageLayout,
+        marker_path: Path,
+        lock_path: Path,
+        lock_timeout_seconds: float,
+        logger: logging.Logger,
+        versioned_paths: bool = False,
+    ) -> None:
+        self._uow_factory = uow_factory
+        self._package_store = package_store
+        self._snapshot_store = snapshot_store
+        self._media_dir = media_dir
+        self._layout = layout
+        self._marker_path = marker_path
+        self._lock = FileLock(str(lock_path))
+        self._lock_timeout_seconds = float(lock_timeout_seconds)
+        self._logger = logger
+        self._signature = layout.value + (self._VERSIONED_SUFFIX if versioned_paths else "")
+
+    def _applied_signature(self) -> str:
+        try:
+            return self._marker_path.read_text("utf-8").strip()
+        except OSError:
+            # Installs that predate the setting were always flat.
+            return StorageLayout.FLAT.value
+
+    def _record_layout(self) -> None:
+        self._marker_path.parent.mkdir(parents=True, exist_ok=True)
+        _ = self._marker_path.write_text(f"{self._signature}\n", encoding="utf-8")
+
+    @staticmethod
+    def _settled(source: Path, target: Path) -> bool:
+        # An earlier interrupted run may already have moved the file.
+        return target.exists() and not source.exists()
+
+    def _move_package(self, item: CatalogItem) -> Path | None:
+        source = item.pkg_path
+        # Files are renamed within their own package root.
+        target = self._package_store.canonical_path(
+            item.app_type.value,
+            item.content_id.value,
+            item.version,
+            self._package_store.root_of(source),
+        )
+        if source == target or self._settled(source, target):
+            return target
+        try:
+            return self._package_store.relocate(source, target)
+        except OSError as exc:
+            self._logger.warning(
+                "Layout migration failed: path: %s, target: %s, error: %s", source, target, exc
+            )
+            return None
+
+    def _move_media(self, source: Path, moves: dict[Path, Path]) -> Path | None:
+        if source in moves:
+            return moves[source]
+        target = self._media_dir / self._layout.relative_path(source.name)
+        if source == target:
+            return target
+        # Media left in the PKG (PKGTOOL_LAZY_MEDIA) only needs its path updated.
+        if source.exists():
+            if target.exists():
+                self._logger.warning(
+                    "Layout migration failed: path: %s, target: %s, error: target exists",
+                    source,
+                    target,
+                )
+                return None
+            try:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                _ = source.rename(target)
+            except OSError as exc:
+                self._logger.warning(
+                    "Layout migration failed: path: %s, target: %s, error: %s",
+                    source,
+                    target,
+                    exc,
+                )
+                return None
+        moves[source] = target
+        return target
+
+    def _migrate(self) -> LayoutMigrationResult:
+        with self._uow_factory() as uow:
+            items = uow.catalog.list_items()
+
+        moved_packages: set[Path] = set()
+        failed = 0
+        media_moves: dict[Path, Path] = {}
+        for item in items:
+            pkg_path = self._move_package(item)
+            media: list[Path | None] = []
+            for media_path in (item.icon0_path, item.pic0_path, item.pic1_path):
+                moved = None if media_path is None else self._move_media(media_path, media_moves)
+                media.append(media_path if moved is None else moved)
+                failed += int(media_path is not None and moved is None)
+            if pkg_path is None:
+                failed += 1
+                pkg_path = item.pkg_path
+            relocated = replace(
+                item,
+                pkg_path=pkg_path,
+                icon0_path=media[0],
+                pic0_path=media[1],
+                pic1_path=media[2],
+            )
+            if relocated == item:
+                continue
+
+            with self._uow_factory() as uow:
+                uow.catalog.upsert(relocated)
+                uow.commit()
+            if pkg_path != item.pkg_path:
+                moved_packages.add(pkg_path)
+                self._snapshot_store.delete((str(item.pkg_path),))
+                self._snapshot_store.upsert({str(pkg_path): self._package_store.stat(pkg_path)})
+
+        if media_moves:
+            with self._uow_factory() as uow:
+                _ = uow.probe_cache.relocate_media(media_moves)
+                uow.commit()
+        return LayoutMigrationResult(
+            packages=len(moved_packages), media=len(media_moves), failed=failed
+        )
+
+    def __call__(self) -> LayoutMigrationResult:
+        previous = self._applied_signature()
+        if previous == self._signature:
+            if not self._marker_path.exists():
+                self._record_layout()
+            return LayoutMigrationResult(packages=0, media=0, failed=0)
+        try:
+            _ = self._lock.acquire(timeout=self._lock_timeout_seconds)
+        except Timeout:
+            self._logger.warning("Layout migration skipped: another cycle is still running")
+            return LayoutMigrationResult(packages=0, media=0, failed=0)
+
+        try:
+            self._logger.info(
+                "Layout migration started: from: %s, to: %s", previous, self._signature
+            )
+            result = self._migrate()
+            # Anything left behind is retried on the next start.
+            if not result.failed:
+                self._record_layout()
+            self._logger.info(
+                "Layout migration completed: packages: %d, media: %d, failed: %d",
+                result.packages,
+                result.media,
+                result.failed,
+            )
+            return result
+        finally:
+            self._lock.release()
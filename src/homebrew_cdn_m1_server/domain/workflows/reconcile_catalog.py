@@ -1,59 +1,61 @@
 from __future__ import annotations
 
 import logging
-import traceback
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from collections.abc import Sequence
 from filelock import FileLock, Timeout
 from pathlib import Path
-from typing import Callable, final
+from typing import Callable, ClassVar, final
 
 from homebrew_cdn_m1_server.application.repositories.filesystem_repository import (
     FilesystemRepository,
 )
-from homebrew_cdn_m1_server.application.repositories.json_snapshot_repository import (
-    JsonSnapshotRepository,
-)
 from homebrew_cdn_m1_server.application.repositories.settings_snapshot_repository import (
     SettingsSnapshotRepository,
 )
+from homebrew_cdn_m1_server.application.repositories.sqlite_snapshot_repository import (
+    SqliteSnapshotRepository,
+)
 from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import SqliteUnitOfWork
-from homebrew_cdn_m1_server.domain.workflows.export_outputs import ExportOutputs
 from homebrew_cdn_m1_server.domain.workflows.ingest_package import IngestPackage
+from homebrew_cdn_m1_server.domain.workflows.ingest_concurrency import IngestConcurrency
+from homebrew_cdn_m1_server.domain.workflows.ingest_pipeline import IngestPipeline
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.ingest_priority import IngestPriority
 from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
-from homebrew_cdn_m1_server.domain.models.results import IngestResult, ReconcileResult, ScanDelta
-
-
-def build_delta(
-    previous: dict[str, tuple[int, int]],
-    current: dict[str, tuple[int, int]],
-) -> ScanDelta:
-    previous_keys = set(previous)
-    current_keys = set(current)
-
-    added = sorted(current_keys - previous_keys)
-    removed = sorted(previous_keys - current_keys)
-    updated = sorted(
-        key for key in previous_keys & current_keys if previous[key] != current[key]
-    )
-
-    return ScanDelta(added=tuple(added), updated=tuple(updated), removed=tuple(removed))
+from homebrew_cdn_m1_server.domain.models.settings_change import SettingsChange
+from homebrew_cdn_m1_server.domain.protocols.catalog_export_protocol import (
+    CatalogExportProtocol,
+)
+from homebrew_cdn_m1_server.domain.models.results import IngestResult, ReconcileResult
 
 
 @final
 class ReconcileCatalog:
+    _CHUNK_SIZE: ClassVar[int] = 16
+
     def __init__(
         self,
         uow_factory: Callable[[], SqliteUnitOfWork],
         package_store: FilesystemRepository,
-        snapshot_store: JsonSnapshotRepository,
+        snapshot_store: SqliteSnapshotRepository,
         settings_snapshot_store: SettingsSnapshotRepository,
         ingest_package: IngestPackage,
-        export_outputs: ExportOutputs,
+        export_outputs: CatalogExportProtocol,
         lock_path: Path,
         lock_timeout_seconds: float,
         logger: logging.Logger,
         worker_count: int,
         output_targets: tuple[OutputTarget, ...],
+        file_stable_seconds: float = 0.0,
+        cycle_max_items: int = 0,
+        cycle_max_seconds: float = 0.0,
+        export_every_items: int = 0,
+        export_every_seconds: float = 0.0,
+        priority: IngestPriority = IngestPriority.PATH,
+        small_pkg_max_bytes: int = 0,
+        concurrency: IngestConcurrency | None = None,
     ) -> None:
         self._uow_factory = uow_factory
         self._package_store = package_store
@@ -66,15 +68,44 @@ class ReconcileCatalog:
         self._logger = logger
         self._worker_count = max(1, int(worker_count))
         self._output_targets = output_targets
+        self._file_stable_ns = max(0, int(float(file_stable_seconds) * 1_000_000_000))
+        self._cycle_max_items = max(0, int(cycle_max_items))
+        self._cycle_max_seconds = max(0.0, float(cycle_max_seconds))
+        self._export_every_items = max(0, int(export_every_items))
+        self._export_every_seconds = max(0.0, float(export_every_seconds))
+        self._priority = priority
+        self._small_pkg_max_bytes = max(0, int(small_pkg_max_bytes))
+        self._concurrency = concurrency
 
     def _build_snapshot(self) -> dict[str, tuple[int, int]]:
-        snapshot: dict[str, tuple[int, int]] = {}
-        for pkg_path in self._package_store.scan_pkg_files():
-            try:
-                snapshot[str(pkg_path)] = self._package_store.stat(pkg_path)
-            except OSError:
-                continue
-        return snapshot
+        return self._package_store.scan_pkg_stats()
+
+    @staticmethod
+    def _under(path: str, roots: Sequence[Path]) -> bool:
+        return any(Path(path).is_relative_to(root) for root in roots)
+
+    def _split_unstable(
+        self,
+        candidates: list[Path],
+        current: dict[str, tuple[int, int]],
+    ) -> tuple[list[Path], set[str]]:
+        if self._file_stable_ns <= 0:
+            return candidates, set()
+
+        cutoff_ns = time.time_ns() - self._file_stable_ns
+        ready: list[Path] = []
+        deferred: set[str] = set()
+        for path in candidates:
+            stats = current.get(str(path))
+            if stats is not None and stats[1] > cutoff_ns:
+                deferred.add(str(path))
+            else:
+                ready.append(path)
+        if deferred:
+            self._logger.debug(
+                "Reconcile deferred files still being written: count: %d", len(deferred)
+            )
+        return ready, deferred
 
     @staticmethod
     def _split_results(paths: list[str], results: list[IngestResult]) -> tuple[int, int, int]:
@@ -82,63 +113,268 @@ class ReconcileCatalog:
         added = max(0, len(paths) - failures)
         return added, 0, failures
 
-    def _ingest_candidates(self, candidates: list[Path]) -> tuple[int, int, int]:
+    def _run_ingest(
+        self,
+        candidates: list[Path],
+        current: dict[str, tuple[int, int]],
+    ) -> list[IngestResult]:
+        if not candidates:
+            return []
+
+        if len(candidates) == 1:
+            return [self._ingest_package(candidates[0])]
+
+        pipeline = IngestPipeline(
+            ingest_package=self._ingest_package,
+            logger=self._logger,
+            probe_workers=self._worker_count,
+            small_max_bytes=self._small_pkg_max_bytes,
+            concurrency=self._concurrency,
+        )
+        return pipeline(candidates, {key: stats[0] for key, stats in current.items()})
+
+    def _order_candidates(
+        self,
+        candidates: list[Path],
+        current: dict[str, tuple[int, int]],
+    ) -> list[Path]:
+        if self._priority is IngestPriority.PATH:
+            return candidates
+
+        def _stats(path: Path) -> tuple[int, int]:
+            return current.get(str(path), (0, 0))
+
+        if self._priority is IngestPriority.SMALLEST_FIRST:
+            return sorted(candidates, key=lambda path: (_stats(path)[0], str(path)))
+        if self._priority is IngestPriority.LARGEST_FIRST:
+            return sorted(candidates, key=lambda path: (-_stats(path)[0], str(path)))
+        if self._priority is IngestPriority.NEWEST_FIRST:
+            return sorted(candidates, key=lambda path: (-_stats(path)[1], str(path)))
+        return sorted(candidates, key=lambda path: (_stats(path)[1], str(path)))
+
+    def _ingest_candidates(
+        self,
+        candidates: list[Path],
+        current: dict[str, tuple[int, int]],
+    ) -> tuple[tuple[int, int, int], list[Path]]:
         if not candidates:
-            return 0, 0, 0
+            return (0, 0, 0), []
 
-        if self._worker_count <= 1 or len(candidates) == 1:
-            results = [self._ingest_package(path) for path in candidates]
-            return self._split_results([str(p) for p in candidates], results)
+        selected = candidates
+        carried: list[Path] = []
+        if self._cycle_max_items > 0:
+            selected = candidates[: self._cycle_max_items]
+            carried = candidates[self._cycle_max_items :]
 
+        # Without a time budget or checkpoints the whole set goes through the
+        # pipeline in one run, which keeps the writer batches as large as possible.
+        if self._export_every_items > 0:
+            chunk_size = self._export_every_items
+        elif self._cycle_max_seconds > 0 or self._export_every_seconds > 0:
+            chunk_size = self._CHUNK_SIZE
+        else:
+            chunk_size = len(selected)
+
+        started = time.monotonic()
+        last_export = started
+        unexported: set[AppType] = set()
         results: list[IngestResult] = []
-        with ThreadPoolExecutor(max_workers=self._worker_count) as executor:
-            future_by_path = {
-                executor.submit(self._ingest_package, path): path for path in candidates
-            }
-            for future in as_completed(future_by_path):
-                path = future_by_path[future]
+        index = 0
+        while index < len(selected):
+            elapsed = time.monotonic() - started
+            if self._cycle_max_seconds > 0 and elapsed >= self._cycle_max_seconds:
+                break
+            chunk = selected[index : index + chunk_size]
+            index += len(chunk)
+            chunk_results = self._run_ingest(chunk, current)
+            results.extend(chunk_results)
+            unexported.update(
+                result.item.app_type for result in chunk_results if result.item is not None
+            )
+
+            if index >= len(selected) or not unexported:
+                continue
+            now = time.monotonic()
+            if self._export_every_items > 0 or (
+                self._export_every_seconds > 0 and now - last_export >= self._export_every_seconds
+            ):
+                _ = self._export_outputs(self._output_targets, unexported)
+                self._logger.info(
+                    "Reconcile checkpoint exported: ingested: %d, remaining: %d",
+                    len(results),
+                    len(selected) - index + len(carried),
+                )
+                unexported = set()
+                last_export = now
+
+        carried = [*selected[index:], *carried]
+        processed = [str(path) for path in selected[:index]]
+        return self._split_results(processed, results), carried
+
+    def reconcile_paths(
+        self,
+        pkg_paths: Sequence[Path],
+        lock_timeout_seconds: float | None = None,
+    ) -> ReconcileResult:
+        timeout = (
+            self._lock_timeout_seconds
+            if lock_timeout_seconds is None
+            else float(lock_timeout_seconds)
+        )
+        try:
+            _ = self._lock.acquire(timeout=timeout)
+        except Timeout:
+            self._logger.warning("Targeted reconcile skipped: another cycle is still running")
+            return ReconcileResult(0, 0, 0, 0, tuple(), skipped=True)
+
+        try:
+            requested: dict[str, Path] = {}
+            for raw_path in pkg_paths:
+                path = self._package_store.managed_pkg_path(raw_path)
+                if path is None:
+                    self._logger.warning("Targeted reconcile ignored path: %s", raw_path)
+                    continue
+                requested[str(path)] = path
+
+            current: dict[str, tuple[int, int]] = {}
+            missing: set[str] = set()
+            for key, path in requested.items():
+                try:
+                    current[key] = self._package_store.stat(path)
+                except OSError:
+                    missing.add(key)
+
+            changed = set(self._snapshot_store.changed_paths(current))
+            with self._uow_factory() as uow:
+                previous_items = uow.catalog.get_by_pkg_paths(changed | missing)
+            affected: set[AppType] = {item.app_type for item in previous_items}
+
+            results = self._run_ingest([requested[key] for key in sorted(changed)], current)
+            ingested = [result.item for result in results if result.item is not None]
+            failed = len(results) - len(ingested)
+            affected.update(item.app_type for item in ingested)
+
+            with self._uow_factory() as uow:
+                removed = uow.catalog.delete_by_pkg_paths(missing)
+                _ = uow.probe_cache.delete_unreferenced()
+                unchanged = uow.catalog.get_by_pkg_paths(set(current) - changed)
+                uow.commit()
+
+            # Ingest may have moved a source file to its canonical path (or to
+            # errors/), so the snapshot is updated from the post-ingest state.
+            gone = set(missing)
+            settled: dict[str, tuple[int, int]] = {}
+            for key in changed:
                 try:
-                    results.append(future.result())
-                except Exception:
-                    self._logger.error(
-                        "Unexpected ingest worker failure for %s\n%s",
-                        path,
-                        traceback.format_exc(),
-                    )
-                    results.append(IngestResult(item=None, created=False, updated=False))
-        return self._split_results([str(p) for p in candidates], results)
-
-    def __call__(self) -> ReconcileResult:
+                    settled[key] = self._package_store.stat(requested[key])
+                except OSError:
+                    gone.add(key)
+            for item in ingested:
+                settled[str(item.pkg_path)] = (item.pkg_size, item.pkg_mtime_ns)
+            self._snapshot_store.delete(gone - set(settled))
+            self._snapshot_store.upsert(settled)
+
+            exported_files: tuple[Path, ...] = tuple()
+            if affected:
+                exported_files = self._export_outputs(self._output_targets, affected)
+
+            items: list[CatalogItem] = [*ingested, *unchanged]
+            items.sort(key=lambda item: str(item.pkg_path))
+            self._logger.info(
+                "Targeted reconcile completed: requested: %d, added: %d, removed: %d, failed: %d",
+                len(requested),
+                len(ingested),
+                removed,
+                failed,
+            )
+            return ReconcileResult(
+                added=len(ingested),
+                updated=0,
+                removed=removed,
+                failed=failed,
+                exported_files=exported_files,
+                items=tuple(items),
+            )
+        finally:
+            self._lock.release()
+
+    def __call__(self, force_export: bool = False) -> ReconcileResult:
         try:
             _ = self._lock.acquire(timeout=self._lock_timeout_seconds)
         except Timeout:
             self._logger.warning("Reconcile skipped: another cycle is still running")
-            return ReconcileResult(0, 0, 0, 0, tuple())
+            return ReconcileResult(0, 0, 0, 0, tuple(), skipped=True)
 
         try:
-            previous = dict(self._snapshot_store.load())
             current = self._build_snapshot()
-            delta = build_delta(previous, current)
-            previous_settings_hash = self._settings_snapshot_store.load()
-            current_settings_hash = self._settings_snapshot_store.current_hash()
-            settings_changed = previous_settings_hash != current_settings_hash
+            unreadable = set(self._package_store.unreadable_roots())
+            delta = self._snapshot_store.build_delta(current)
+            current_settings = self._settings_snapshot_store.current_hashes()
+            settings_change = self._settings_snapshot_store.classify(
+                self._settings_snapshot_store.load(),
+                current_settings,
+            )
 
-            if settings_changed:
-                candidates = [Path(path) for path in sorted(current)]
-            else:
-                candidates = [Path(path) for path in (*delta.added, *delta.updated)]
-            added, updated, failed = self._ingest_candidates(candidates)
+            if settings_change is SettingsChange.REPROBE:
+                self._logger.info("Probe inputs changed: re-probing all packages")
+                with self._uow_factory() as uow:
+                    _ = uow.probe_cache.clear()
+                    uow.commit()
+                self._snapshot_store.queue_reprobe(sorted(current))
+            # Unchanged files only come back through the re-probe queue, which
+            # is drained across cycles when a cycle budget is set.
+            queued = set(self._snapshot_store.reprobe_queue())
+            changed = [*delta.added, *delta.updated]
+            requeued = sorted((queued & set(current)) - set(changed))
+            candidates = [Path(path) for path in (*changed, *requeued)]
+            candidates, deferred = self._split_unstable(candidates, current)
+            unstable = len(deferred)
+            candidates = self._order_candidates(candidates, current)
+            (added, updated, failed), carried = self._ingest_candidates(
+                candidates, current
+            )
+            deferred.update(str(path) for path in carried)
 
             final_snapshot = self._build_snapshot()
+            unreadable.update(self._package_store.unreadable_roots())
+            keep_roots = tuple(sorted(unreadable))
             existing_paths = set(final_snapshot)
+            # Files still being copied, or left over once the cycle budget ran
+            # out, stay out of the snapshot so the next cycle picks them up.
+            for path in deferred:
+                _ = final_snapshot.pop(path, None)
+            # A root that cannot be read (an unmounted volume) keeps its rows,
+            # snapshot entries and queued re-probes until it comes back.
+            if keep_roots:
+                self._logger.warning(
+                    "Reconcile kept packages on unreadable roots: %s",
+                    ", ".join(str(root) for root in keep_roots),
+                )
+                for path, stats in self._snapshot_store.load().items():
+                    if self._under(path, keep_roots):
+                        final_snapshot[path] = stats
+            self._snapshot_store.dequeue_reprobe(
+                {path for path in queued - deferred if not self._under(path, keep_roots)}
+            )
 
             with self._uow_factory() as uow:
-                removed = uow.catalog.delete_by_pkg_paths_not_in(existing_paths)
+                removed = uow.catalog.delete_by_pkg_paths_not_in(existing_paths, keep_roots)
+                _ = uow.probe_cache.delete_unreferenced()
                 uow.commit()
 
-            exported_files = self._export_outputs(self._output_targets)
+            # Idle cycles leave the outputs alone so clients polling store.db
+            # do not see a rebuilt file when nothing changed.
+            exported_files: tuple[Path, ...] = tuple()
+            if (
+                force_export
+                or settings_change is not SettingsChange.NONE
+                or added
+                or updated
+                or removed
+            ):
+                exported_files = self._export_outputs(self._output_targets)
             self._snapshot_store.save(final_snapshot)
-            self._settings_snapshot_store.save(current_settings_hash)
+            self._settings_snapshot_store.save(current_settings)
 
             has_changes = bool(added or updated or removed or failed)
             log_fn = self._logger.info if has_changes else self._logger.debug
@@ -149,12 +385,18 @@ class ReconcileCatalog:
                 removed,
                 failed,
             )
+            if carried:
+                self._logger.info(
+                    "Reconcile budget reached: carried over to next cycle: %d", len(carried)
+                )
             return ReconcileResult(
                 added=added,
                 updated=updated,
                 removed=removed,
                 failed=failed,
                 exported_files=exported_files,
+                pending=len(carried),
+                deferred=unstable,
             )
         finally:
             self._lock.release()
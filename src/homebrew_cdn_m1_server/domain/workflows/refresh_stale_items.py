@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import replace
+from filelock import FileLock, Timeout
+from pathlib import Path
+from typing import Callable, final
+
+from homebrew_cdn_m1_server.application.gateways.pkgtool_gateway import PkgtoolGateway
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import SqliteUnitOfWork
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
+from homebrew_cdn_m1_server.domain.models.results import ProbeResult, RefreshResult
+from homebrew_cdn_m1_server.domain.protocols.catalog_export_protocol import (
+    CatalogExportProtocol,
+)
+
+
+@final
+class RefreshStaleItems:
+    def __init__(
+        self,
+        uow_factory: Callable[[], SqliteUnitOfWork],
+        package_probe: PkgtoolGateway,
+        export_outputs: CatalogExportProtocol,
+        output_targets: tuple[OutputTarget, ...],
+        lock_path: Path,
+        logger: logging.Logger,
+        items_per_run: int,
+        lazy_media: bool = False,
+    ) -> None:
+        self._uow_factory = uow_factory
+        self._package_probe = package_probe
+        self._export_outputs = export_outputs
+        self._output_targets = output_targets
+        self._lock = FileLock(str(lock_path))
+        self._logger = logger
+        self._items_per_run = max(0, int(items_per_run))
+        self._lazy_media = lazy_media
+
+    @staticmethod
+    def _apply(item: CatalogItem, probe: ProbeResult, full: bool) -> CatalogItem:
+        refreshed = replace(
+            item,
+            content_id=probe.content_id,
+            app_type=probe.app_type,
+            title_id=probe.title_id,
+            title=probe.title,
+            category=probe.category,
+            version=probe.version,
+            pubtoolinfo=probe.pubtoolinfo,
+            system_ver=probe.system_ver,
+            release_date=probe.release_date,
+            sfo=ParamSfoSnapshot(
+                fields=dict(probe.sfo_fields),
+                raw=probe.sfo_raw,
+                hash=probe.sfo_hash,
+            ),
+            derive_version=probe.derive_version,
+        )
+        if not full:
+            return refreshed
+        return replace(
+            refreshed,
+            icon0_path=probe.icon0_path,
+            pic0_path=probe.pic0_path,
+            pic1_path=probe.pic1_path,
+            pic0_entry=probe.pic0_entry,
+            pic1_entry=probe.pic1_entry,
+            probe_version=probe.probe_version,
+        )
+
+    def _rederive(self, item: CatalogItem) -> CatalogItem | None:
+        try:
+            probe = self._package_probe.rederive(item.sfo.raw)
+        except Exception as exc:
+            self._logger.debug(
+                "Re-derive failed, falling back to probe: content_id: %s, error: %s",
+                item.content_id.value,
+                exc,
+            )
+            return None
+        # Media files are named after content_id and placed by app_type, so a
+        # change of identity needs a full probe to extract them again.
+        if probe.content_id != item.content_id or probe.app_type != item.app_type:
+            return None
+        return self._apply(item, probe, full=False)
+
+    def _reprobe(self, item: CatalogItem) -> tuple[CatalogItem, ProbeResult]:
+        # The PKG is live: it is probed where it is and never moved. Probe
+        # errors propagate, which leaves the row as it is for a later retry.
+        probe = self._package_probe.probe(item.pkg_path)
+        return self._apply(item, probe, full=True), probe
+
+    @staticmethod
+    def _same_key(left: CatalogItem, right: CatalogItem) -> bool:
+        return (left.content_id, left.app_type, left.version) == (
+            right.content_id,
+            right.app_type,
+            right.version,
+        )
+
+    def _deferred_media(self, item: CatalogItem) -> bool:
+        # Media left in the PKG has to be extracted by a probe once
+        # PKGTOOL_LAZY_MEDIA is off, since nothing extracts it on request.
+        return not self._lazy_media and bool(item.pic0_entry or item.pic1_entry)
+
+    def _refresh_item(self, item: CatalogItem) -> tuple[CatalogItem | None, bool]:
+        refreshed: CatalogItem | None = None
+        probe: ProbeResult | None = None
+        if (
+            item.probe_version >= PkgtoolGateway.PROBE_VERSION
+            and item.sfo.raw
+            and not self._deferred_media(item)
+        ):
+            refreshed = self._rederive(item)
+        rederived = refreshed is not None
+        if refreshed is None:
+            if not item.pkg_path.exists():
+                with self._uow_factory() as uow:
+                    _ = uow.catalog.delete_item(item)
+                    uow.commit()
+                return None, False
+            refreshed, probe = self._reprobe(item)
+
+        with self._uow_factory() as uow:
+            if not self._same_key(item, refreshed):
+                _ = uow.catalog.delete_item(item)
+            uow.catalog.upsert(refreshed)
+            if probe is not None:
+                uow.probe_cache.save_result(refreshed.pkg_fingerprint, probe)
+            uow.commit()
+        return refreshed, rederived
+
+    def __call__(self) -> RefreshResult:
+        if self._items_per_run <= 0:
+            return RefreshResult(0, 0, 0)
+        try:
+            _ = self._lock.acquire(timeout=0)
+        except Timeout:
+            self._logger.debug("Stale item refresh skipped: reconcile is running")
+            return RefreshResult(0, 0, 0)
+
+        try:
+            with self._uow_factory() as uow:
+                stale = uow.catalog.list_stale(
+                    PkgtoolGateway.PROBE_VERSION,
+                    PkgtoolGateway.DERIVE_VERSION,
+                    self._items_per_run,
+                    deferred_media=not self._lazy_media,
+                )
+            if not stale:
+                return RefreshResult(0, 0, 0)
+
+            rederived = 0
+            reprobed = 0
+            removed = 0
+            affected: set[AppType] = set()
+            for item in stale:
+                affected.add(item.app_type)
+                try:
+                    refreshed, was_rederived = self._refresh_item(item)
+                except Exception as exc:
+                    self._logger.warning(
+                        "Stale item refresh failed, retrying later: content_id: %s, error: %s",
+                        item.content_id.value,
+                        exc,
+                    )
+                    with self._uow_factory() as uow:
+                        uow.catalog.defer_stale(item)
+                        uow.commit()
+                    continue
+                if refreshed is None:
+                    removed += 1
+                    continue
+                affected.add(refreshed.app_type)
+                if was_rederived:
+                    rederived += 1
+                else:
+                    reprobed += 1
+
+            with self._uow_factory() as uow:
+                _ = uow.probe_cache.delete_unreferenced()
+                uow.commit()
+            _ = self._export_outputs(self._output_targets, affected)
+
+            self._logger.info(
+                "Stale items refreshed: re-derived: %d, re-probed: %d, removed: %d",
+                rederived,
+                reprobed,
+                removed,
+            )
+            return RefreshResult(rederived=rederived, reprobed=reprobed, removed=removed)
+        finally:
+            self._lock.release()
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, ClassVar, final
+
+from homebrew_cdn_m1_server.application.io_budget import IoBudget
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import SqliteUnitOfWork
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.results import PageCacheWarmResult
+
+
+@final
+class WarmPageCache:
+    # Keeps the PKGs consoles are most likely to request next in the page
+    # cache, so a release wave is served from memory instead of the disk.
+    # Packages are ranked by a decaying download rate (download_counters
+    # deltas between cycles); packages that just entered the catalog come
+    # first. The top of the ranking is prefetched with POSIX_FADV_WILLNEED
+    # until budget_bytes is filled, and files that drop out of it get
+    # POSIX_FADV_DONTNEED. State lives in memory, so ranks restart from the
+    # cumulative counters after a restart.
+    HALF_LIFE_SECONDS: ClassVar[float] = 3600.0
+    NEW_PACKAGE_SECONDS: ClassVar[float] = 3600.0
+    REFRESH_SECONDS: ClassVar[float] = 900.0
+    CHUNK_BYTES: ClassVar[int] = 8 * 1024 * 1024
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], SqliteUnitOfWork],
+        budget_bytes: int,
+        logger: logging.Logger,
+        io_budget: IoBudget | None = None,
+        half_life_seconds: float = HALF_LIFE_SECONDS,
+        new_package_seconds: float = NEW_PACKAGE_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._uow_factory = uow_factory
+        self._budget_bytes = max(0, int(budget_bytes))
+        self._logger = logger
+        self._io_budget = io_budget
+        self._half_life_seconds = max(1.0, float(half_life_seconds))
+        self._new_package_seconds = max(0.0, float(new_package_seconds))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_run: float | None = None
+        self._downloads: dict[Path, int] = {}
+        self._rates: dict[Path, float] = {}
+        self._first_seen: dict[Path, float] = {}
+        # path -> (fingerprint, bytes prefetched, prefetched at)
+        self._warm: dict[Path, tuple[str, int, float]] = {}
+
+    @staticmethod
+    def available() -> bool:
+        return hasattr(os, "posix_fadvise")
+
+    def _update_rates(self, items: list[CatalogItem], now: float) -> None:
+        decay = 1.0
+        if self._last_run is not None:
+            decay = 0.5 ** ((now - self._last_run) / self._half_life_seconds)
+        known = self._last_run is not None
+        downloads: dict[Path, int] = {}
+        rates: dict[Path, float] = {}
+        first_seen: dict[Path, float] = {}
+        for item in items:
+            path = item.pkg_path
+            previous = self._downloads.get(path, item.downloads)
+            rates[path] = self._rates.get(path, 0.0) * decay + max(0, item.downloads - previous)
+            downloads[path] = item.downloads
+            # Everything catalogued before the first cycle counts as old.
+            first_seen[path] = self._first_seen.get(path, now if known else float("-inf"))
+        self._downloads = downloads
+        self._rates = rates
+        self._first_seen = first_seen
+        self._last_run = now
+
+    def _ranked(self, items: list[CatalogItem], now: float) -> list[CatalogItem]:
+        def _is_new(item: CatalogItem) -> bool:
+            return now - self._first_seen[item.pkg_path] <= self._new_package_seconds
+
+        candidates = [
+            item
+            for item in items
+            if _is_new(item) or self._rates[item.pkg_path] > 0 or item.downloads > 0
+        ]
+        # Cumulative downloads break ties, which also ranks the first cycle.
+        candidates.sort(
+            key=lambda item: (
+                not _is_new(item),
+                -self._first_seen[item.pkg_path] if _is_new(item) else 0.0,
+                -self._rates[item.pkg_path],
+                -item.downloads,
+                str(item.pkg_path),
+            )
+        )
+        return candidates
+
+    def _select(self, ranked: list[CatalogItem]) -> dict[Path, tuple[str, int]]:
+        selected: dict[Path, tuple[str, int]] = {}
+        remaining = self._budget_bytes
+        for item in ranked:
+            if remaining <= 0:
+                break
+            if item.pkg_path in selected or item.pkg_size <= 0:
+                continue
+            # Downloads start at offset 0, so a PKG larger than what is left
+            # still gets its head prefetched.
+            length = min(item.pkg_size, remaining)
+            selected[item.pkg_path] = (item.pkg_fingerprint, length)
+            remaining -= length
+        return selected
+
+    def is_warm(self, path: Path) -> bool:
+        return path in self._warm
+
+    def _advise(self, path: Path, length: int, advice: int, resident: int = 0) -> None:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            if advice != os.POSIX_FADV_WILLNEED:
+                os.posix_fadvise(fd, 0, length, advice)
+                return
+            offset = 0
+            while offset < length:
+                chunk = min(self.CHUNK_BYTES, length - offset)
+                # Only bytes beyond what was prefetched before are charged.
+                uncached = chunk - max(0, min(chunk, resident - offset))
+                if self._io_budget is not None and uncached > 0:
+                    _ = self._io_budget.consume(uncached)
+                os.posix_fadvise(fd, offset, chunk, advice)
+                offset += chunk
+        finally:
+            os.close(fd)
+
+    def _run(self) -> PageCacheWarmResult:
+        now = self._clock()
+        with self._uow_factory() as uow:
+            items = uow.catalog.list_items()
+        self._update_rates(items, now)
+        selected = self._select(self._ranked(items, now))
+
+        evicted = 0
+        for path in set(self._warm) - set(selected):
+            _, length, _ = self._warm.pop(path)
+            try:
+                self._advise(path, length, os.POSIX_FADV_DONTNEED)
+            except OSError:
+                continue
+            evicted += 1
+
+        warmed = 0
+        warmed_bytes = 0
+        for path, (fingerprint, length) in selected.items():
+            # Other traffic can evict prefetched pages, so kept files are
+            # advised again every REFRESH_SECONDS; resident pages cost no I/O.
+            previous = self._warm.get(path)
+            if (
+                previous is not None
+                and previous[0] == fingerprint
+                and previous[1] >= length
+                and now - previous[2] < self.REFRESH_SECONDS
+            ):
+                continue
+            resident = 0
+            if previous is not None and previous[0] == fingerprint:
+                resident = previous[1]
+            try:
+                self._advise(path, length, os.POSIX_FADV_WILLNEED, resident)
+            except OSError as exc:
+                self._logger.warning("Page cache warming failed: path: %s, error: %s", path, exc)
+                continue
+            self._warm[path] = (fingerprint, length, now)
+            warmed += 1
+            warmed_bytes += length
+
+        if warmed or evicted:
+            self._logger.info(
+                "Page cache warming: warmed: %d, evicted: %d, bytes: %d",
+                warmed,
+                evicted,
+                warmed_bytes,
+            )
+        return PageCacheWarmResult(warmed=warmed, evicted=evicted, warmed_bytes=warmed_bytes)
+
+    def __call__(self) -> PageCacheWarmResult:
+        # Runs from the scheduler and right after ingest; one pass at a time.
+        with self._lock:
+            return self._run()
@@ -0,0 +1,108 @@
+# pyright: reportPrivateUsage=false
+from __future__ import annotations
+
+import logging
+import random
+from dataclasses import dataclass
+
+import pytest
+
+from homebrew_cdn_m1_server.application.scheduler.adaptive_scheduler_runner import (
+    AdaptiveSchedulerRunner,
+)
+from homebrew_cdn_m1_server.domain.models.results import ReconcileResult
+
+
+@dataclass(frozen=True, slots=True)
+class _Result:
+    has_changes: bool
+    skipped: bool = False
+
+
+class _MidpointRandom(random.Random):
+    def uniform(self, a: float, b: float) -> float:
+        return (a + b) / 2
+
+
+def _runner(min_seconds: float = 10, max_seconds: float = 100) -> AdaptiveSchedulerRunner:
+    return AdaptiveSchedulerRunner(
+        min_seconds=min_seconds,
+        max_seconds=max_seconds,
+        logger=logging.getLogger("test"),
+        rng=_MidpointRandom(),
+    )
+
+
+def test_adaptive_scheduler_given_idle_results_when_scheduled_then_backs_off_to_ceiling() -> None:
+    runner = _runner()
+    runner.schedule_interval("reconcile", 60, lambda: None)
+    job = runner._jobs["reconcile"]
+
+    delays = [runner._next_delay(job, _Result(has_changes=False)) for _ in range(4)]
+
+    assert delays == [20.0, 40.0, 60.0, 60.0]
+    assert job.delay == 100.0
+
+
+def test_adaptive_scheduler_given_changes_when_scheduled_then_resets_to_min_delay() -> None:
+    runner = _runner()
+    runner.schedule_interval("reconcile", 600, lambda: None)
+    job = runner._jobs["reconcile"]
+    _ = runner._next_delay(job, _Result(has_changes=False))
+    _ = runner._next_delay(job, _Result(has_changes=False))
+
+    assert runner._next_delay(job, _Result(has_changes=True)) == 10.0
+
+
+def test_adaptive_scheduler_given_skipped_cycle_when_scheduled_then_holds_delay() -> None:
+    runner = _runner()
+    runner.schedule_interval("reconcile", 600, lambda: None)
+    job = runner._jobs["reconcile"]
+    _ = runner._next_delay(job, _Result(has_changes=False))
+
+    delays = [runner._next_delay(job, _Result(has_changes=False, skipped=True)) for _ in range(3)]
+
+    assert delays == [20.0, 20.0, 20.0]
+
+
+def test_adaptive_scheduler_given_deferred_files_when_reconciled_then_resets_to_min_delay() -> None:
+    runner = _runner()
+    runner.schedule_interval("reconcile", 600, lambda: None)
+    job = runner._jobs["reconcile"]
+    _ = runner._next_delay(job, ReconcileResult(0, 0, 0, 0, tuple()))
+    _ = runner._next_delay(job, ReconcileResult(0, 0, 0, 0, tuple()))
+
+    assert runner._next_delay(job, ReconcileResult(0, 0, 0, 0, tuple(), deferred=1)) == 10.0
+
+
+def test_adaptive_scheduler_given_plain_result_when_scheduled_then_keeps_interval() -> None:
+    runner = _runner()
+    runner.schedule_interval("refresh", 60, lambda: None)
+
+    assert runner._next_delay(runner._jobs["refresh"], None) == 60.0
+
+
+def test_adaptive_scheduler_given_jitter_when_delay_computed_then_stays_within_ratio() -> None:
+    runner = AdaptiveSchedulerRunner(
+        min_seconds=10,
+        max_seconds=100,
+        logger=logging.getLogger("test"),
+        rng=random.Random(7),
+    )
+    runner.schedule_interval("reconcile", 600, lambda: None)
+    job = runner._jobs["reconcile"]
+
+    delay = runner._next_delay(job, _Result(has_changes=True))
+
+    assert 9.0 <= delay <= 11.0
+
+
+def test_adaptive_scheduler_given_cron_when_scheduled_then_caps_by_next_fire() -> None:
+    runner = _runner(max_seconds=10_000)
+    runner.schedule_cron("reconcile", "*/5 * * * *", lambda: None)
+    job = runner._jobs["reconcile"]
+    job.delay = 5_000
+
+    assert runner._next_delay(job, _Result(has_changes=False)) <= 300.0
+    with pytest.raises(ValueError, match="5 fields"):
+        runner.schedule_cron("reconcile", "*/5 * *", lambda: None)
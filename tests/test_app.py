@@ -5,7 +5,7 @@ from __future__ import annotations
 import sqlite3
 from pathlib import Path
 import signal
-from typing import cast
+from typing import Callable, cast
 
 import pytest
 
@@ -54,12 +54,40 @@ class _FakeScheduler:
 class _FakeReconcile:
     def __init__(self) -> None:
         self.calls: int = 0
+        self.forced_exports: int = 0
+        self.path_calls: list[tuple[tuple[Path, ...], float | None]] = []
 
-    def __call__(self) -> ReconcileResult:
+    def __call__(self, force_export: bool = False) -> ReconcileResult:
         self.calls += 1
+        self.forced_exports += int(force_export)
+        return ReconcileResult(added=0, updated=0, removed=0, failed=0, exported_files=tuple())
+
+    def reconcile_paths(
+        self,
+        paths: tuple[Path, ...],
+        lock_timeout_seconds: float | None = None,
+    ) -> ReconcileResult:
+        self.path_calls.append((paths, lock_timeout_seconds))
         return ReconcileResult(added=0, updated=0, removed=0, failed=0, exported_files=tuple())
 
 
+class _FakeWatcher:
+    instances: list["_FakeWatcher"] = []
+
+    def __init__(self, **kwargs: object) -> None:
+        self.kwargs: dict[str, object] = kwargs
+        self.started: bool = False
+        self.stopped: bool = False
+        _FakeWatcher.instances.append(self)
+
+    def start(self) -> bool:
+        self.started = True
+        return True
+
+    def stop(self) -> None:
+        self.stopped = True
+
+
 class _FakeGithubAssetsGateway:
     def __init__(self) -> None:
         self.calls: list[list[Path]] = []
@@ -127,6 +155,24 @@ def test_worker_app_initialize_layout_and_schema_given_valid_init_when_called_th
     assert names == ["test_init"]
 
 
+def test_worker_app_initialize_layout_and_schema_given_legacy_json_snapshot_when_called_then_migrates(
+    temp_workspace: Path,
+) -> None:
+    catalog_sql = Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql"
+    _ = (temp_workspace / "init" / "catalog_db.sql").write_text(
+        catalog_sql.read_text("utf-8"), encoding="utf-8"
+    )
+    config = _load_config(temp_workspace)
+    config.paths.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    _ = config.paths.snapshot_path.write_text('{"game/A.pkg": [1, 2]}\n', encoding="utf-8")
+    app = WorkerApp(config)
+
+    app._initialize_layout_and_schema()
+
+    assert config.paths.snapshot_path.exists() is False
+    assert app._snapshot_store.load() == {"game/A.pkg": (1, 2)}
+
+
 def test_worker_app_build_reconcile_use_case_given_config_when_called_then_wires_dependencies(
     temp_workspace: Path,
     monkeypatch: pytest.MonkeyPatch,
@@ -202,11 +248,37 @@ def test_worker_app_run_reconcile_cycle_given_settings_changed_when_called_then_
     assert app._hb_store_resolver._base_url == "http://10.0.0.20:8080"
 
 
+def test_worker_app_reconcile_paths_given_concurrent_reload_when_building_then_holds_settings_lock(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    app = WorkerApp(_load_config(temp_workspace))
+    fake_reconcile = _FakeReconcile()
+    held: list[bool] = []
+
+    def _build_reconcile() -> _FakeReconcile:
+        held.append(app._settings_lock.locked())
+        return fake_reconcile
+
+    monkeypatch.setattr(app, "_build_reconcile_use_case", _build_reconcile)
+
+    _ = app._reconcile_paths((temp_workspace / "A.pkg",))
+    _ = app._run_reconcile_cycle()
+
+    assert held == [True, True]
+    # Released before the cycle runs, so a slow reconcile does not block reloads.
+    assert app._settings_lock.locked() is False
+    assert fake_reconcile.calls == 1
+    assert len(fake_reconcile.path_calls) == 1
+
+
 def test_worker_app_start_given_cron_expression_when_called_then_schedules_cron(
     temp_workspace: Path,
     monkeypatch: pytest.MonkeyPatch,
 ) -> None:
-    config = _load_config(temp_workspace, "RECONCILE_CRON_EXPRESSION=*/5 * * * *\n")
+    config = _load_config(
+        temp_workspace, "RECONCILE_CRON_EXPRESSION=*/5 * * * *\nPKG_HASH_ENABLED=true\n"
+    )
     app = WorkerApp(config)
     fake_scheduler = _FakeScheduler()
     fake_reconcile = _FakeReconcile()
@@ -228,7 +300,7 @@ def test_worker_app_start_given_cron_expression_when_called_then_schedules_cron(
 
     assert fake_reconcile.calls == 1
     assert fake_scheduler.cron_calls == [("reconcile", "*/5 * * * *")]
-    assert fake_scheduler.interval_calls == []
+    assert fake_scheduler.interval_calls == [("refresh", 60), ("hash", 60)]
     assert fake_scheduler.started is True
 
     app.shutdown()
@@ -267,7 +339,8 @@ def test_worker_app_start_given_empty_cron_when_called_then_schedules_interval(
 
     assert fake_reconcile.calls == 1
     assert fake_scheduler.cron_calls == []
-    assert fake_scheduler.interval_calls == [("reconcile", 45)]
+    # Hashing is opt-in: settings files without PKG_HASH_ENABLED do not schedule it.
+    assert fake_scheduler.interval_calls == [("reconcile", 45), ("refresh", 60)]
 
 
 def test_worker_app_shutdown_given_no_scheduler_when_called_then_noop(
@@ -483,3 +556,121 @@ def test_worker_app_sync_hb_store_assets_given_gateway_error_when_called_then_co
     app._sync_hb_store_assets_on_startup()
 
     assert len(fake_gateway.calls) == 1
+
+
+def test_worker_app_start_given_watch_enabled_when_called_then_starts_watcher(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    app = WorkerApp(_load_config(temp_workspace, "RECONCILE_FILE_STABLE_SECONDS=7\n"))
+    fake_reconcile = _FakeReconcile()
+    _FakeWatcher.instances.clear()
+
+    monkeypatch.setattr(app_module, "APSchedulerRunner", _FakeScheduler)
+    monkeypatch.setattr(app_module, "InotifyWatcher", _FakeWatcher)
+    monkeypatch.setattr(app, "_initialize_layout_and_schema", lambda: None)
+    monkeypatch.setattr(app, "_sync_hb_store_assets_on_startup", lambda: None)
+    monkeypatch.setattr(app, "_start_hb_store_api", lambda: None)
+    monkeypatch.setattr(app, "_stop_hb_store_api", lambda: None)
+    monkeypatch.setattr(app, "_build_reconcile_use_case", lambda: fake_reconcile)
+
+    app.start()
+    watcher = _FakeWatcher.instances[-1]
+    on_ready = cast(Callable[[tuple[Path, ...]], bool], watcher.kwargs["on_ready"])
+    handled = on_ready((temp_workspace / "A.pkg",))
+    overflow_handled = on_ready(tuple())
+    app.shutdown()
+
+    assert watcher.started is True
+    assert watcher.kwargs["stable_seconds"] == 7
+    assert watcher.kwargs["excluded"] == (app._config.paths.media_dir,)
+    assert handled is True
+    assert overflow_handled is True
+    assert fake_reconcile.path_calls == [((temp_workspace / "A.pkg",), 0.0)]
+    assert fake_reconcile.calls == 2
+    assert watcher.stopped is True
+
+
+def test_worker_app_start_given_watch_disabled_when_called_then_skips_watcher(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    app = WorkerApp(_load_config(temp_workspace, "RECONCILE_WATCH_ENABLED=false\n"))
+    _FakeWatcher.instances.clear()
+
+    monkeypatch.setattr(app_module, "APSchedulerRunner", _FakeScheduler)
+    monkeypatch.setattr(app_module, "InotifyWatcher", _FakeWatcher)
+    monkeypatch.setattr(app, "_initialize_layout_and_schema", lambda: None)
+    monkeypatch.setattr(app, "_sync_hb_store_assets_on_startup", lambda: None)
+    monkeypatch.setattr(app, "_start_hb_store_api", lambda: None)
+    monkeypatch.setattr(app, "_stop_hb_store_api", lambda: None)
+    monkeypatch.setattr(app, "_build_reconcile_use_case", _FakeReconcile)
+
+    app.start()
+    app.shutdown()
+
+    assert _FakeWatcher.instances == []
+
+
+def test_worker_app_build_scheduler_given_adaptive_enabled_when_called_then_uses_adaptive_runner(
+    temp_workspace: Path,
+) -> None:
+    fixed = WorkerApp(_load_config(temp_workspace, "RECONCILE_ADAPTIVE_ENABLED=false\n"))
+    adaptive = WorkerApp(
+        _load_config(
+            temp_workspace,
+            "RECONCILE_ADAPTIVE_ENABLED=true\nRECONCILE_ADAPTIVE_MIN_SECONDS=5\n",
+        )
+    )
+
+    assert isinstance(fixed._build_scheduler(), app_module.APSchedulerRunner)
+    scheduler = adaptive._build_scheduler()
+    assert isinstance(scheduler, app_module.AdaptiveSchedulerRunner)
+    assert scheduler._min_seconds == 5.0
+    assert scheduler._max_seconds == 3600.0
+
+
+def test_worker_app_auto_concurrency_given_cpu_share_when_called_then_reuses_controller(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(app_module.os, "cpu_count", lambda: 8)
+    app = WorkerApp(
+        _load_config(
+            temp_workspace,
+            "RECONCILE_PKG_PREPROCESS_WORKERS=auto\nRECONCILE_PKG_PREPROCESS_MAX_CPU_PERCENT=50\n",
+        )
+    )
+
+    first = app._auto_concurrency()
+
+    assert app._auto_concurrency() is first
+    assert first.max_workers == 4
+    assert first.limit == 2
+
+
+def test_worker_app_start_given_export_quiet_period_when_called_then_schedules_export_flush(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    config = _load_config(
+        temp_workspace,
+        "RECONCILE_CRON_EXPRESSION=*/5 * * * *\nEXPORT_QUIET_SECONDS=30\n",
+    )
+    app = WorkerApp(config)
+    fake_scheduler = _FakeScheduler()
+    fake_reconcile = _FakeReconcile()
+
+    monkeypatch.setattr(app_module, "APSchedulerRunner", lambda: fake_scheduler)
+    monkeypatch.setattr(app, "_initialize_layout_and_schema", lambda: None)
+    monkeypatch.setattr(app, "_sync_hb_store_assets_on_startup", lambda: None)
+    monkeypatch.setattr(app, "_start_hb_store_api", lambda: None)
+    monkeypatch.setattr(app, "_stop_hb_store_api", lambda: None)
+    monkeypatch.setattr(app, "_build_reconcile_use_case", lambda: fake_reconcile)
+
+    app.start()
+    app.shutdown()
+
+    assert app._catalog_export() is app._export_scheduler
+    assert ("export", 5) in fake_scheduler.interval_calls
+    assert fake_reconcile.forced_exports == 1
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from collections.abc import Collection
+from concurrent.futures import Executor, ThreadPoolExecutor
+import logging
+from pathlib import Path
+from typing import cast
+
+import pytest
+
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import (
+    SqliteUnitOfWork,
+)
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.content_id import ContentId
+from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
+from homebrew_cdn_m1_server.domain.workflows.build_media_derivatives import (
+    BuildMediaDerivatives,
+)
+from homebrew_cdn_m1_server.domain.workflows.export_outputs import ExportOutputs
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _write_icon(path: Path, color: tuple[int, int, int]) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Stored without compression, like many icons extracted from PKGs.
+    Image.new("RGB", (512, 512), color).save(path, format="PNG", compress_level=0)
+    return path
+
+
+def _item(content_id: str, icon0: Path, app_type: AppType = AppType.GAME) -> CatalogItem:
+    return CatalogItem(
+        content_id=ContentId.parse(content_id),
+        title_id="CUSA00001",
+        title="Test",
+        app_type=app_type,
+        category="gd",
+        version="01.00",
+        pubtoolinfo="",
+        system_ver="",
+        release_date="2025-01-01",
+        pkg_path=icon0.parent / f"{content_id}.pkg",
+        pkg_size=1,
+        pkg_mtime_ns=1,
+        pkg_fingerprint=f"fp-{content_id}",
+        icon0_path=icon0,
+        pic0_path=None,
+        pic1_path=None,
+        sfo=ParamSfoSnapshot(fields={}, raw=b"", hash=""),
+    )
+
+
+class _FakeExportOutputs:
+    def __init__(self) -> None:
+        self.calls: list[tuple[tuple[OutputTarget, ...], Collection[AppType] | None]] = []
+
+    def __call__(
+        self,
+        targets: tuple[OutputTarget, ...],
+        app_types: Collection[AppType] | None = None,
+    ) -> tuple[Path, ...]:
+        self.calls.append((targets, app_types))
+        return tuple()
+
+
+def _build(
+    temp_workspace: Path,
+    items: list[CatalogItem],
+    executor_factory: object = None,
+) -> tuple[BuildMediaDerivatives, _FakeExportOutputs, Path]:
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        for item in items:
+            uow.catalog.upsert(item)
+        uow.commit()
+
+    export_outputs = _FakeExportOutputs()
+    kwargs: dict[str, object] = {}
+    if executor_factory is not None:
+        kwargs["executor_factory"] = executor_factory
+    build = BuildMediaDerivatives(
+        uow_factory=lambda: SqliteUnitOfWork(db_path),
+        export_outputs=cast(ExportOutputs, cast(object, export_outputs)),
+        output_targets=(OutputTarget.HB_STORE, OutputTarget.FPKGI),
+        media_dir=temp_workspace / "media",
+        logger=logging.getLogger("tests.build_media_derivatives"),
+        **kwargs,  # pyright: ignore[reportArgumentType]
+    )
+    return build, export_outputs, db_path
+
+
+def _threads(max_workers: int) -> Executor:
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+def test_build_media_derivatives_given_new_icon_when_run_then_builds_lighter_variants_once(
+    temp_workspace: Path,
+) -> None:
+    icon0 = _write_icon(
+        temp_workspace / "media" / "UP0000-TEST00000_00-TEST000000000000_icon0.png",
+        (10, 20, 30),
+    )
+    item = _item("UP0000-TEST00000_00-TEST000000000000", icon0)
+    build, export_outputs, db_path = _build(temp_workspace, [item])
+
+    first = build()
+    second = build()
+
+    assert (first.built, second.built) == (1, 0)
+    with SqliteUnitOfWork(db_path) as uow:
+        index = uow.media_derivatives.load_index()
+    assert set(index) == {(icon0.name, "thumb"), (icon0.name, "png"), (icon0.name, "webp")}
+    derived_dir = temp_workspace / "media" / "derived"
+    for name in index.values():
+        assert (derived_dir / name).stat().st_size < icon0.stat().st_size
+    with Image.open(derived_dir / index[(icon0.name, "thumb")]) as thumb:
+        assert thumb.size == (256, 256)
+    assert export_outputs.calls == [
+        ((OutputTarget.HB_STORE, OutputTarget.FPKGI), {AppType.GAME}),
+    ]
+
+
+def test_build_media_derivatives_given_shared_and_removed_media_when_run_then_reuses_and_cleans(
+    temp_workspace: Path,
+) -> None:
+    media_dir = temp_workspace / "media"
+    game_icon = _write_icon(
+        media_dir / "UP0000-TEST00000_00-TEST000000000000_icon0.png", (1, 2, 3)
+    )
+    dlc_icon = _write_icon(media_dir / "UP0000-TEST00000_00-TEST000000000001_icon0.png", (1, 2, 3))
+    game = _item("UP0000-TEST00000_00-TEST000000000000", game_icon)
+    dlc = _item("UP0000-TEST00000_00-TEST000000000001", dlc_icon, AppType.DLC)
+    build, _, db_path = _build(temp_workspace, [game, dlc], executor_factory=_threads)
+
+    assert build().built == 2
+    with SqliteUnitOfWork(db_path) as uow:
+        index = uow.media_derivatives.load_index()
+    # Identical content maps to the same content-addressed outputs.
+    assert index[(game_icon.name, "png")] == index[(dlc_icon.name, "png")]
+    derived_dir = media_dir / "derived"
+    assert len(list(derived_dir.iterdir())) == 3
+
+    with SqliteUnitOfWork(db_path) as uow:
+        _ = uow.catalog.delete_item(dlc)
+        uow.commit()
+    result = build()
+    assert (result.built, result.removed) == (0, 1)
+    assert len(list(derived_dir.iterdir())) == 3
+
+    with SqliteUnitOfWork(db_path) as uow:
+        _ = uow.catalog.delete_item(game)
+        uow.commit()
+    assert build().removed == 1
+    assert list(derived_dir.iterdir()) == []
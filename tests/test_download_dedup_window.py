@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from homebrew_cdn_m1_server.application.download_dedup_window import DownloadDedupWindow
+
+
+def test_download_dedup_window_given_repeats_when_checked_then_counts_first_until_expiry() -> None:
+    window = DownloadDedupWindow(60)
+
+    assert window.first("10.0.0.2", "A@01.00", 0.0) is True
+    assert window.first("10.0.0.2", "A@01.00", 59.0) is False
+    assert window.first("10.0.0.3", "A@01.00", 59.0) is True
+    # Repeats do not extend the window.
+    assert window.first("10.0.0.2", "A@01.00", 60.0) is True
+    assert window.first("", "A@01.00", 60.0) is True
+    assert DownloadDedupWindow(0).first("10.0.0.2", "A@01.00", 0.0) is True
+
+
+def test_download_dedup_window_given_entry_cap_when_full_then_forgets_oldest() -> None:
+    window = DownloadDedupWindow(3600, max_entries=2)
+
+    assert window.first("10.0.0.1", "A@01.00", 0.0) is True
+    assert window.first("10.0.0.2", "A@01.00", 1.0) is True
+    assert window.first("10.0.0.3", "A@01.00", 2.0) is True
+
+    assert window.first("10.0.0.1", "A@01.00", 3.0) is True
+    assert window.first("10.0.0.3", "A@01.00", 3.0) is False
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import logging
+import signal
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from homebrew_cdn_m1_server.application import download_log_ingester as module
+from homebrew_cdn_m1_server.application.download_log_ingester import DownloadLogIngester
+from homebrew_cdn_m1_server.application.repositories.sqlite_catalog_repository import (
+    SqliteCatalogRepository,
+)
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import (
+    SqliteUnitOfWork,
+)
+
+_CID = "UP0000-CUSA00001_00-TEST000000000000"
+
+
+def _line(
+    method: str = "GET",
+    status: str = "200",
+    byte_range: str = "-",
+    cid: str = _CID,
+    client: str = "192.168.1.10",
+    msec: float = 1700000000.0,
+) -> str:
+    return f"{msec:.3f}|{client}|{method}|{status}|CUSA00001|{cid}|01.00|{byte_range}\n"
+
+
+def _count(db_path: Path, key: str) -> int:
+    with SqliteUnitOfWork(db_path) as uow:
+        return uow.catalog.get_download_count(key)
+
+
+def test_download_log_ingester_given_access_log_when_tailed_then_counts_new_downloads_once(
+    temp_workspace: Path,
+) -> None:
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.commit()
+    log_path = temp_workspace / "data" / "internal" / "logs" / "nginx_downloads.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    ingest = DownloadLogIngester(
+        uow_factory=lambda: SqliteUnitOfWork(db_path),
+        log_path=log_path,
+        logger=logging.getLogger("tests.download_log_ingester"),
+    )
+
+    assert ingest() == 0
+    _ = log_path.write_text(
+        _line()
+        + _line(status="206", byte_range="bytes=0-1048575")
+        # Resumed transfers, HEAD requests and errors are not new downloads.
+        + _line(status="206", byte_range="bytes=1048576-")
+        + _line(method="HEAD")
+        + _line(status="404")
+        + _line(cid="-")
+        # Still being written by nginx.
+        + "1700000000.000|192.168.1.10|GET|200|CUSA00001",
+        encoding="utf-8",
+    )
+
+    assert ingest() == 2
+    assert _count(db_path, f"{_CID}@01.00") == 2
+
+    with log_path.open("a", encoding="utf-8") as stream:
+        _ = stream.write(f"|{_CID}|01.00|-\n")
+    assert ingest() == 1
+    assert ingest() == 0
+
+    # Rotation: the rest of the old file is read before the new one.
+    with log_path.open("a", encoding="utf-8") as stream:
+        _ = stream.write(_line())
+    _ = log_path.rename(log_path.with_name(log_path.name + ".1"))
+    _ = log_path.write_text(_line() + _line(), encoding="utf-8")
+    assert ingest() == 3
+    assert _count(db_path, f"{_CID}@01.00") == 6
+
+
+def test_download_log_ingester_given_dedup_window_when_client_repeats_then_counts_once_per_window(
+    temp_workspace: Path,
+) -> None:
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.commit()
+    log_path = temp_workspace / "nginx_downloads.log"
+    _ = log_path.write_text(
+        _line(msec=1000.0)
+        + _line(msec=1100.0)
+        + _line(msec=1100.0, client="192.168.1.20")
+        + _line(msec=1700.0),
+        encoding="utf-8",
+    )
+    ingest = DownloadLogIngester(
+        uow_factory=lambda: SqliteUnitOfWork(db_path),
+        log_path=log_path,
+        logger=logging.getLogger("tests.download_log_ingester"),
+        dedup_window_seconds=600,
+    )
+
+    assert ingest() == 3
+    assert _count(db_path, f"{_CID}@01.00") == 3
+
+
+def test_download_log_ingester_given_failed_commit_when_rerun_then_counts_once(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.commit()
+    log_path = temp_workspace / "nginx_downloads.log"
+    _ = log_path.write_text(_line() + _line(client="192.168.1.20"), encoding="utf-8")
+
+    def _crash(*_args: object) -> None:
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(SqliteCatalogRepository, "save_download_log_position", _crash)
+    with pytest.raises(sqlite3.OperationalError):
+        _ = DownloadLogIngester(
+            uow_factory=lambda: SqliteUnitOfWork(db_path),
+            log_path=log_path,
+            logger=logging.getLogger("tests.download_log_ingester"),
+        )()
+    assert _count(db_path, f"{_CID}@01.00") == 0
+
+    monkeypatch.undo()
+    ingest = DownloadLogIngester(
+        uow_factory=lambda: SqliteUnitOfWork(db_path),
+        log_path=log_path,
+        logger=logging.getLogger("tests.download_log_ingester"),
+    )
+    assert ingest() == 2
+    # A restart resumes from the committed position.
+    restarted = DownloadLogIngester(
+        uow_factory=lambda: SqliteUnitOfWork(db_path),
+        log_path=log_path,
+        logger=logging.getLogger("tests.download_log_ingester"),
+    )
+    assert restarted() == 0
+    assert _count(db_path, f"{_CID}@01.00") == 2
+
+
+def test_download_log_ingester_given_large_log_when_read_then_rotates_and_reopens_nginx(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.commit()
+    log_path = temp_workspace / "nginx_downloads.log"
+    rotated = log_path.with_name(log_path.name + ".1")
+    pid_path = temp_workspace / "nginx.pid"
+    _ = pid_path.write_text("4242\n", encoding="utf-8")
+    signals: list[tuple[int, int]] = []
+    monkeypatch.setattr(module.os, "kill", lambda pid, sig: signals.append((pid, sig)))
+    ingest = DownloadLogIngester(
+        uow_factory=lambda: SqliteUnitOfWork(db_path),
+        log_path=log_path,
+        logger=logging.getLogger("tests.download_log_ingester"),
+        nginx_pid_path=pid_path,
+        rotate_bytes=len(_line()) * 2,
+    )
+
+    _ = log_path.write_text(_line(), encoding="utf-8")
+    assert ingest() == 1
+    assert signals == []
+
+    with log_path.open("a", encoding="utf-8") as stream:
+        _ = stream.write(_line(client="192.168.1.20"))
+    assert ingest() == 1
+    assert signals == [(4242, signal.SIGUSR1)]
+    assert not log_path.exists()
+
+    # nginx writes to the renamed file until it reopens the log.
+    with rotated.open("a", encoding="utf-8") as stream:
+        _ = stream.write(_line(client="192.168.1.30"))
+    _ = log_path.write_text(_line(client="192.168.1.40"), encoding="utf-8")
+    assert ingest() == 2
+    assert _count(db_path, f"{_CID}@01.00") == 4
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from collections.abc import Sequence
+from collections.abc import Collection, Sequence
 import logging
 from pathlib import Path
 from types import TracebackType
@@ -8,6 +8,7 @@ from typing import cast, final
 
 from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import SqliteUnitOfWork
 from homebrew_cdn_m1_server.domain.workflows.export_outputs import ExportOutputs
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
 from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
 from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
 
@@ -95,10 +96,16 @@ class _FakeExporter:
         self._cleanup_result: list[Path] = list(cleanup_result)
         self.export_calls: int = 0
         self.cleanup_calls: int = 0
+        self.app_types: list[Collection[AppType] | None] = []
 
-    def export(self, items: Sequence[CatalogItem]) -> list[Path]:
+    def export(
+        self,
+        items: Sequence[CatalogItem],
+        app_types: Collection[AppType] | None = None,
+    ) -> list[Path]:
         _ = items
         self.export_calls += 1
+        self.app_types.append(app_types)
         return list(self._export_result)
 
     def cleanup(self) -> list[Path]:
@@ -140,3 +147,55 @@ def test_export_outputs_given_disabled_target_when_run_then_cleans_stale_output(
         "Disabled output cleaned: target: fpkgi, files: 2"
         in logger.infos
     )
+
+
+def test_export_outputs_given_app_types_when_run_then_passes_them_to_exporters():
+    hb_exporter = _FakeExporter(
+        target=OutputTarget.HB_STORE,
+        export_result=[Path("/tmp/store.db")],
+        cleanup_result=[],
+    )
+
+    def _uow_factory() -> SqliteUnitOfWork:
+        return cast(SqliteUnitOfWork, cast(object, _FakeUnitOfWork(items=[])))
+
+    use_case = ExportOutputs(
+        uow_factory=_uow_factory,
+        exporters=[hb_exporter],
+        logger=cast(logging.Logger, cast(object, _FakeLogger())),
+    )
+
+    _ = use_case((OutputTarget.HB_STORE,), {AppType.GAME})
+
+    assert hb_exporter.app_types == [{AppType.GAME}]
+
+
+def test_export_outputs_given_enabled_targets_when_exporting_subset_then_keeps_other_outputs():
+    hb_exporter = _FakeExporter(
+        target=OutputTarget.HB_STORE,
+        export_result=[Path("/tmp/store.db")],
+        cleanup_result=[Path("/tmp/store.db")],
+    )
+    fpkgi_exporter = _FakeExporter(
+        target=OutputTarget.FPKGI,
+        export_result=[Path("/tmp/GAMES.json")],
+        cleanup_result=[Path("/tmp/GAMES.json")],
+    )
+
+    def _uow_factory() -> SqliteUnitOfWork:
+        return cast(SqliteUnitOfWork, cast(object, _FakeUnitOfWork(items=[])))
+
+    use_case = ExportOutputs(
+        uow_factory=_uow_factory,
+        exporters=[hb_exporter, fpkgi_exporter],
+        logger=cast(logging.Logger, cast(object, _FakeLogger())),
+    )
+
+    exported = use_case(
+        (OutputTarget.FPKGI,),
+        enabled_targets=(OutputTarget.HB_STORE, OutputTarget.FPKGI),
+    )
+
+    assert exported == (Path("/tmp/GAMES.json"),)
+    assert hb_exporter.export_calls == 0
+    assert hb_exporter.cleanup_calls == 0
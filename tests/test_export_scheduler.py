@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from collections.abc import Collection
+import logging
+from pathlib import Path
+from typing import cast
+
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.export_policy import ExportPolicy
+from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+from homebrew_cdn_m1_server.domain.workflows.export_outputs import ExportOutputs
+from homebrew_cdn_m1_server.domain.workflows.export_scheduler import ExportScheduler
+
+_TARGETS = (OutputTarget.HB_STORE, OutputTarget.FPKGI)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now: float = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _FakeExportOutputs:
+    def __init__(self) -> None:
+        self.calls: list[tuple[OutputTarget, Collection[AppType] | None]] = []
+        self.enabled: list[Collection[OutputTarget] | None] = []
+        self.fail: bool = False
+
+    def __call__(
+        self,
+        targets: tuple[OutputTarget, ...],
+        app_types: Collection[AppType] | None = None,
+        enabled_targets: Collection[OutputTarget] | None = None,
+    ) -> tuple[Path, ...]:
+        if self.fail:
+            raise RuntimeError("disk full")
+        for target in targets:
+            self.calls.append((target, app_types))
+        self.enabled.append(enabled_targets)
+        return tuple(Path(f"/tmp/{target.value}") for target in targets)
+
+
+def _scheduler(
+    clock: _Clock,
+    export_outputs: _FakeExportOutputs,
+) -> ExportScheduler:
+    return ExportScheduler(
+        export_outputs_factory=lambda: cast(ExportOutputs, cast(object, export_outputs)),
+        policies={
+            OutputTarget.HB_STORE: ExportPolicy(
+                quiet_seconds=30, max_staleness_seconds=900, min_interval_seconds=600
+            ),
+            OutputTarget.FPKGI: ExportPolicy(quiet_seconds=30, max_staleness_seconds=900),
+        },
+        logger=logging.getLogger("test"),
+        clock=clock,
+    )
+
+
+def test_export_scheduler_given_burst_when_quiet_period_passes_then_exports_once() -> None:
+    clock = _Clock()
+    export_outputs = _FakeExportOutputs()
+    scheduler = _scheduler(clock, export_outputs)
+
+    assert scheduler(_TARGETS, {AppType.GAME}) == tuple()
+    clock.now += 20
+    _ = scheduler(_TARGETS, {AppType.DLC})
+    clock.now += 20
+    assert scheduler.flush() == tuple()
+
+    clock.now += 15
+    exported = scheduler.flush()
+
+    assert exported == (Path("/tmp/fpkgi"), Path("/tmp/hb-store"))
+    assert sorted(target.value for target, _ in export_outputs.calls) == ["fpkgi", "hb-store"]
+    assert all(app_types == {AppType.GAME, AppType.DLC} for _, app_types in export_outputs.calls)
+    assert export_outputs.enabled == [_TARGETS, _TARGETS]
+    assert scheduler.has_pending() is False
+
+
+def test_export_scheduler_given_min_interval_when_changes_continue_then_limits_store_db() -> None:
+    clock = _Clock()
+    export_outputs = _FakeExportOutputs()
+    scheduler = _scheduler(clock, export_outputs)
+    _ = scheduler(_TARGETS)
+    clock.now += 31
+    _ = scheduler.flush()
+    export_outputs.calls.clear()
+
+    _ = scheduler(_TARGETS, {AppType.GAME})
+    clock.now += 31
+    _ = scheduler.flush()
+
+    assert export_outputs.calls == [(OutputTarget.FPKGI, {AppType.GAME})]
+    clock.now += 600
+    _ = scheduler.flush()
+    assert export_outputs.calls[-1] == (OutputTarget.HB_STORE, {AppType.GAME})
+
+
+def test_export_scheduler_given_constant_changes_when_staleness_reached_then_exports() -> None:
+    clock = _Clock()
+    export_outputs = _FakeExportOutputs()
+    scheduler = _scheduler(clock, export_outputs)
+
+    for _ in range(45):
+        _ = scheduler(_TARGETS, {AppType.GAME})
+        assert scheduler.flush() == tuple()
+        clock.now += 20
+
+    assert len(scheduler.flush()) == 2
+
+
+def test_export_scheduler_given_export_failure_when_flushed_then_keeps_pending() -> None:
+    clock = _Clock()
+    export_outputs = _FakeExportOutputs()
+    scheduler = _scheduler(clock, export_outputs)
+    _ = scheduler((OutputTarget.FPKGI,), {AppType.GAME})
+    export_outputs.fail = True
+
+    assert scheduler.flush(force=True) == tuple()
+    assert scheduler.has_pending() is True
+
+    export_outputs.fail = False
+    assert scheduler.flush(force=True) == (Path("/tmp/fpkgi"),)
+
+
+def test_export_scheduler_given_targets_disabled_when_requested_then_exports_immediately() -> None:
+    clock = _Clock()
+    export_outputs = _FakeExportOutputs()
+    scheduler = _scheduler(clock, export_outputs)
+    _ = scheduler(_TARGETS, {AppType.GAME})
+
+    # Dropping a target runs ExportOutputs right away so it can clean up.
+    assert scheduler((OutputTarget.FPKGI,), {AppType.DLC}) == (Path("/tmp/fpkgi"),)
+    assert export_outputs.calls == [(OutputTarget.FPKGI, {AppType.DLC})]
+    assert export_outputs.enabled == [None]
+
+    export_outputs.calls.clear()
+    assert scheduler(tuple()) == tuple()
+    assert export_outputs.calls == []
+    assert export_outputs.enabled == [None, None]
+    assert scheduler.flush(force=True) == tuple()
+    assert scheduler.has_pending() is False
@@ -11,6 +11,8 @@ from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
 from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
 from homebrew_cdn_m1_server.domain.models.app_type import AppType
 from homebrew_cdn_m1_server.domain.models.content_id import ContentId
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
+from homebrew_cdn_m1_server.application.exporters.download_map_writer import DownloadMapWriter
 from homebrew_cdn_m1_server.application.exporters.fpkgi_json_exporter import FpkgiJsonExporter
 from homebrew_cdn_m1_server.application.exporters.store_db_exporter import StoreDbExporter
 from homebrew_cdn_m1_server.domain.protocols.title_metadata_lookup_protocol import (
@@ -127,6 +129,44 @@ def test_exporters_given_catalog_items_when_export_then_generates_store_db_and_j
     assert item["cover_url"] == "http://127.0.0.1/pkg/media/UP0000-TEST00000_00-TEST000000000000_icon0.png"
 
 
+def test_exporters_given_media_variants_when_export_then_reference_lighter_media(
+    temp_workspace: Path,
+):
+    share_dir = temp_workspace / "data" / "share"
+    pkg_path = share_dir / "pkg" / "game" / "UP0000-TEST00000_00-TEST000000000000.pkg"
+    pkg_path.parent.mkdir(parents=True, exist_ok=True)
+    _ = pkg_path.write_bytes(b"x")
+    items = [_item(pkg_path, "UP0000-TEST00000_00-TEST000000000000", AppType.GAME)]
+    icon0_name = "UP0000-TEST00000_00-TEST000000000000_icon0.png"
+    media_variants = {(icon0_name, "png"): "abc_png.png", (icon0_name, "thumb"): "abc_thumb.png"}
+
+    store_output = share_dir / "hb-store" / "store.db"
+    store_exporter = StoreDbExporter(
+        store_output,
+        Path(__file__).resolve().parents[1] / "init" / "store_db.sql",
+        "http://127.0.0.1",
+        media_variants=media_variants,
+    )
+    _ = store_exporter.export(items)
+    conn = sqlite3.connect(str(store_output))
+    row_obj = cast(object, conn.execute("SELECT image FROM homebrews").fetchone())
+    conn.close()
+    assert cast(tuple[str] | None, row_obj) == (
+        "http://127.0.0.1/pkg/media/derived/abc_png.png",
+    )
+
+    json_exporter = FpkgiJsonExporter(
+        share_dir / "fpkgi",
+        "http://127.0.0.1",
+        FPKGI_SCHEMA,
+        media_variants=media_variants,
+    )
+    _ = json_exporter.export(items)
+    data_rows = _read_data_rows(share_dir / "fpkgi" / "GAMES.json")
+    item = data_rows["http://127.0.0.1/pkg/game/UP0000-TEST00000_00-TEST000000000000.pkg"]
+    assert item["cover_url"] == "http://127.0.0.1/pkg/media/derived/abc_thumb.png"
+
+
 def test_store_db_exporter_given_pkg_sizes_when_export_then_writes_human_readable_size(
     temp_workspace: Path,
 ):
@@ -470,6 +510,50 @@ def test_store_db_exporter_given_existing_db_when_cleanup_then_removes_file(
     assert store_output.exists() is False
 
 
+def test_store_db_exporter_given_download_map_when_export_then_maps_download_urls_to_pkgs(
+    temp_workspace: Path,
+):
+    share_dir = temp_workspace / "data" / "share"
+    store_sql = Path(__file__).resolve().parents[1] / "init" / "store_db.sql"
+    store_output = share_dir / "hb-store" / "store.db"
+    map_path = temp_workspace / "data" / "internal" / "catalog" / "download_map.conf"
+    pkg_dir = share_dir / "pkg"
+
+    game = _item(
+        pkg_dir / "game" / "UP0000-CUSA12345_00-TEST000000000000.pkg",
+        "UP0000-CUSA12345_00-TEST000000000000",
+        AppType.GAME,
+    )
+    # Same download URL for two PKGs: left to the API to pick.
+    app = _item(
+        pkg_dir / "app" / "UP0000-TEST00000_00-TEST000000000001.pkg",
+        "UP0000-TEST00000_00-TEST000000000001",
+        AppType.APP,
+    )
+    dlc = _item(
+        pkg_dir / "dlc" / "UP0000-TEST00000_00-TEST000000000001.pkg",
+        "UP0000-TEST00000_00-TEST000000000001",
+        AppType.DLC,
+    )
+    exporter = StoreDbExporter(
+        store_output,
+        store_sql,
+        "http://127.0.0.1",
+        download_map=DownloadMapWriter(map_path, layout=StorageLayout.SHARDED),
+    )
+
+    assert exporter.export([game, app, dlc]) == [store_output, map_path]
+    assert map_path.read_text("utf-8") == (
+        '"|CUSA00001|UP0000-CUSA12345_00-TEST000000000000|01.00" '
+        "/pkg/game/45/23/UP0000-CUSA12345_00-TEST000000000000.pkg;\n"
+    )
+    # Unchanged maps are not rewritten (nor nginx reloaded).
+    assert exporter.export([game, app, dlc]) == [store_output]
+
+    _ = exporter.cleanup()
+    assert map_path.read_text("utf-8") == ""
+
+
 def test_fpkgi_exporter_given_existing_outputs_when_cleanup_then_removes_all_known_json(
     temp_workspace: Path,
 ):
@@ -524,3 +608,24 @@ def test_fpkgi_exporter_given_outdated_schema_when_init_then_raises(temp_workspa
 
     with pytest.raises(ValueError, match="out of sync"):
         _ = FpkgiJsonExporter(output_dir, "http://127.0.0.1", bad_schema)
+
+
+def test_fpkgi_exporter_given_app_types_when_export_then_rewrites_only_affected_stems(
+    temp_workspace: Path,
+):
+    share_dir = temp_workspace / "data" / "share"
+    pkg_root = share_dir / "pkg"
+    game = _item(pkg_root / "game" / "G.pkg", "UP0000-TEST00000_00-TEST000000000010", AppType.GAME)
+    dlc = _item(pkg_root / "dlc" / "D.pkg", "UP0000-TEST00000_00-TEST000000000011", AppType.DLC)
+    exporter = FpkgiJsonExporter(share_dir / "fpkgi", "http://127.0.0.1", FPKGI_SCHEMA)
+    _ = exporter.export([game])
+    dlc_json = share_dir / "fpkgi" / "DLC.json"
+    games_json = share_dir / "fpkgi" / "GAMES.json"
+    games_before = games_json.read_text("utf-8")
+    _ = dlc_json.write_text("stale", encoding="utf-8")
+
+    exported = exporter.export([dlc], {AppType.DLC})
+
+    assert exported == [dlc_json]
+    assert len(_read_data_rows(dlc_json)) == 1
+    assert games_json.read_text("utf-8") == games_before
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import cast
+
+from homebrew_cdn_m1_server.application.gateways.pkgtool_gateway import PkgtoolGateway
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import (
+    SqliteUnitOfWork,
+)
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.content_id import ContentId
+from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
+from homebrew_cdn_m1_server.domain.workflows.extract_lazy_media import ExtractLazyMedia
+
+_CONTENT_ID = "UP0000-TEST00000_00-TEST000000000000"
+
+
+def _item(pkg_path: Path, media_dir: Path) -> CatalogItem:
+    _ = pkg_path.write_bytes(b"pkg")
+    return CatalogItem(
+        content_id=ContentId.parse(_CONTENT_ID),
+        title_id="CUSA00001",
+        title="Test",
+        app_type=AppType.GAME,
+        category="gd",
+        version="01.00",
+        pubtoolinfo="",
+        system_ver="",
+        release_date="2025-01-01",
+        pkg_path=pkg_path,
+        pkg_size=3,
+        pkg_mtime_ns=1,
+        pkg_fingerprint="fp",
+        icon0_path=None,
+        pic0_path=media_dir / f"{_CONTENT_ID}_pic0.png",
+        pic1_path=None,
+        sfo=ParamSfoSnapshot(fields={}, raw=b"", hash=""),
+        pic0_entry="12",
+    )
+
+
+class _FakePkgtool:
+    def __init__(self) -> None:
+        self.calls: list[tuple[Path, str, Path]] = []
+
+    def extract_entry(self, pkg_path: Path, entry_index: str, out_path: Path) -> Path:
+        self.calls.append((pkg_path, entry_index, out_path))
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        _ = out_path.write_bytes(b"png")
+        return out_path
+
+
+def _build(temp_workspace: Path) -> tuple[ExtractLazyMedia, _FakePkgtool, Path, Path]:
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    media_dir = temp_workspace / "data" / "share" / "pkg" / "media"
+    pkg_path = temp_workspace / "A.pkg"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.catalog.upsert(_item(pkg_path, media_dir))
+        uow.commit()
+
+    pkgtool = _FakePkgtool()
+    extract = ExtractLazyMedia(
+        uow_factory=lambda: SqliteUnitOfWork(db_path),
+        package_probe=lambda: cast(PkgtoolGateway, cast(object, pkgtool)),
+        media_dir=media_dir,
+        logger=logging.getLogger("tests.extract_lazy_media"),
+    )
+    return extract, pkgtool, media_dir, pkg_path
+
+
+def test_extract_lazy_media_given_recorded_entry_when_requested_then_extracts_once(
+    temp_workspace: Path,
+) -> None:
+    extract, pkgtool, media_dir, pkg_path = _build(temp_workspace)
+
+    first = extract(f"{_CONTENT_ID}_pic0.png")
+    second = extract(f"{_CONTENT_ID}_pic0.png")
+
+    out_path = media_dir / f"{_CONTENT_ID}_pic0.png"
+    assert first == out_path
+    assert second == out_path
+    assert pkgtool.calls == [(pkg_path, "12", out_path)]
+
+
+def test_extract_lazy_media_given_unknown_or_unrecorded_media_when_requested_then_returns_none(
+    temp_workspace: Path,
+) -> None:
+    extract, pkgtool, _, _ = _build(temp_workspace)
+
+    assert extract(f"{_CONTENT_ID}_pic1.png") is None
+    assert extract(f"{_CONTENT_ID}_icon0.png") is None
+    assert extract("../catalog.db") is None
+    assert pkgtool.calls == []
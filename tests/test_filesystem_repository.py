@@ -1,24 +1,41 @@
 from __future__ import annotations
 
+import errno
+import os
+import shutil
 from pathlib import Path
 
 import pytest
 
+from homebrew_cdn_m1_server.application.io_budget import IoBudget
+from homebrew_cdn_m1_server.application.repositories import filesystem_repository as module
+
 from homebrew_cdn_m1_server.config.settings_loader import SettingsLoader
 from homebrew_cdn_m1_server.domain.models.app_config import AppConfig
+from homebrew_cdn_m1_server.domain.models.io_budget_policy import IoBudgetPolicy
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
 from homebrew_cdn_m1_server.application.repositories.filesystem_repository import (
     FilesystemRepository,
 )
 
 
-def _make_store(temp_workspace: Path) -> tuple[FilesystemRepository, AppConfig]:
+def _make_store(
+    temp_workspace: Path, full_rescan_every: int = 12
+) -> tuple[FilesystemRepository, AppConfig]:
     settings = temp_workspace / "configs" / "settings.ini"
     _ = settings.write_text("", encoding="utf-8")
     config = SettingsLoader.load(settings)
-    store = FilesystemRepository(config.paths)
+    store = FilesystemRepository(config.paths, full_rescan_every=full_rescan_every)
     return store, config
 
 
+def _age_tree(root: Path, seconds: int = 3600) -> None:
+    old = (os.stat(root).st_mtime - seconds, os.stat(root).st_mtime - seconds)
+    for path in sorted(root.rglob("*"), reverse=True):
+        os.utime(path, old)
+    os.utime(root, old)
+
+
 def test_filesystem_repository_given_empty_workspace_when_ensure_layout_then_creates_directories(
     temp_workspace: Path,
 ):
@@ -85,6 +102,56 @@ def test_filesystem_repository_given_pkg_tree_when_scan_then_ignores_media_and_s
     assert files == [app_pkg, game_pkg]
 
 
+def test_filesystem_repository_given_settled_tree_when_rescanned_then_skips_unchanged_dirs(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    store, config = _make_store(temp_workspace)
+    store.ensure_layout()
+    game_pkg = config.paths.game_dir / "B.pkg"
+    _ = game_pkg.write_bytes(b"pkg")
+    _age_tree(config.paths.pkg_root)
+
+    scanned: list[str] = []
+    real_scandir = os.scandir
+
+    def _counting_scandir(path: str) -> object:
+        scanned.append(path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(module.os, "scandir", _counting_scandir)
+
+    first = store.scan_pkg_stats()
+    first_count = len(scanned)
+    app_pkg = config.paths.app_dir / "A.pkg"
+    _ = app_pkg.write_bytes(b"12345")
+    second = store.scan_pkg_stats()
+
+    assert str(game_pkg) in first
+    assert str(config.paths.media_dir) not in scanned
+    assert scanned[first_count:] == [str(config.paths.app_dir)]
+    assert second[str(app_pkg)][0] == 5
+    assert str(game_pkg) in second
+
+
+def test_filesystem_repository_given_full_rescan_interval_when_reached_then_walks_everything(
+    temp_workspace: Path,
+):
+    store, config = _make_store(temp_workspace, full_rescan_every=2)
+    store.ensure_layout()
+    pkg = config.paths.game_dir / "B.pkg"
+    _ = pkg.write_bytes(b"pkg")
+    _age_tree(config.paths.pkg_root)
+
+    _ = store.scan_pkg_stats()
+    game_mtime = os.stat(config.paths.game_dir).st_mtime_ns
+    _ = pkg.write_bytes(b"rewritten")
+    os.utime(config.paths.game_dir, ns=(game_mtime, game_mtime))
+    rescanned = store.scan_pkg_stats()
+
+    assert rescanned[str(pkg)][0] == len(b"rewritten")
+
+
 def test_filesystem_repository_given_pkg_when_stat_then_returns_size_and_mtime(
     temp_workspace: Path,
 ):
@@ -116,6 +183,184 @@ def test_filesystem_repository_given_non_canonical_pkg_when_move_to_canonical_th
     assert target.read_bytes() == b"pkg"
 
 
+def test_filesystem_repository_given_sharded_layout_when_move_to_canonical_then_shards_by_title(
+    temp_workspace: Path,
+):
+    settings = temp_workspace / "configs" / "settings.ini"
+    _ = settings.write_text("", encoding="utf-8")
+    config = SettingsLoader.load(settings)
+    store = FilesystemRepository(config.paths, layout=StorageLayout.SHARDED)
+    store.ensure_layout()
+    content_id = "UP0000-CUSA12345_00-TEST000000000000"
+
+    source = config.paths.pkg_root / "incoming.pkg"
+    _ = source.write_bytes(b"pkg")
+
+    target = store.move_to_canonical(source, "game", content_id)
+
+    assert target == config.paths.game_dir / "45" / "23" / f"{content_id}.pkg"
+    assert target.read_bytes() == b"pkg"
+    assert store.move_to_canonical(target, "game", content_id) == target
+    assert set(store.scan_pkg_stats()) == {str(target)}
+
+
+def test_filesystem_repository_given_versioned_paths_when_move_to_canonical_then_names_release(
+    temp_workspace: Path,
+):
+    settings = temp_workspace / "configs" / "settings.ini"
+    _ = settings.write_text("", encoding="utf-8")
+    config = SettingsLoader.load(settings)
+    store = FilesystemRepository(config.paths, versioned_paths=True)
+    store.ensure_layout()
+
+    first = config.paths.pkg_root / "a.pkg"
+    second = config.paths.pkg_root / "b.pkg"
+    _ = first.write_bytes(b"a")
+    _ = second.write_bytes(b"b")
+
+    older = store.move_to_canonical(first, "update", "CUSA00001", "01.00")
+    newer = store.move_to_canonical(second, "update", "CUSA00001", "01.01")
+
+    assert older == config.paths.pkg_update_dir / "CUSA00001_v01.00.pkg"
+    assert newer == config.paths.pkg_update_dir / "CUSA00001_v01.01.pkg"
+    assert (older.read_bytes(), newer.read_bytes()) == (b"a", b"b")
+
+
+def test_filesystem_repository_given_extra_roots_when_placing_then_uses_pins_and_free_space(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    settings = temp_workspace / "configs" / "settings.ini"
+    _ = settings.write_text("", encoding="utf-8")
+    config = SettingsLoader.load(settings)
+    disk2 = temp_workspace / "disk2"
+    disk3 = temp_workspace / "disk3"
+    disk2.mkdir()
+    disk3.mkdir()
+    store = FilesystemRepository(
+        config.paths,
+        extra_roots=(disk2, disk3),
+        pinned_roots={"update": disk3},
+    )
+    store.ensure_layout()
+    free = {str(config.paths.pkg_root): 10, str(disk2): 30, str(disk3): 20}
+    monkeypatch.setattr(
+        module.shutil,
+        "disk_usage",
+        lambda path: module.shutil._ntuple_diskusage(0, 0, free[str(path)]),  # pyright: ignore[reportPrivateUsage]
+    )
+
+    game = config.paths.pkg_root / "game.pkg"
+    update = config.paths.pkg_root / "update.pkg"
+    _ = game.write_bytes(b"game")
+    _ = update.write_bytes(b"update")
+
+    game_target = store.move_to_canonical(game, "game", "CUSA00001")
+    update_target = store.move_to_canonical(update, "update", "CUSA00001")
+
+    assert game_target == disk2 / "game" / "CUSA00001.pkg"
+    assert update_target == disk3 / "update" / "CUSA00001.pkg"
+    # Already placed PKGs stay where they are, whichever volume has more room.
+    free[str(disk3)] = 40
+    assert store.move_to_canonical(game_target, "game", "CUSA00001") == game_target
+    duplicate = config.paths.pkg_root / "duplicate.pkg"
+    _ = duplicate.write_bytes(b"game")
+    with pytest.raises(FileExistsError):
+        _ = store.move_to_canonical(duplicate, "game", "CUSA00001")
+    assert set(store.scan_pkg_stats()) == {str(game_target), str(update_target), str(duplicate)}
+    assert store.managed_pkg_path(game_target) == game_target
+
+
+def test_filesystem_repository_given_unmounted_extra_root_when_scanned_then_reports_it(
+    temp_workspace: Path,
+):
+    settings = temp_workspace / "configs" / "settings.ini"
+    _ = settings.write_text("", encoding="utf-8")
+    config = SettingsLoader.load(settings)
+    disk2 = temp_workspace / "disk2"
+    (disk2 / "game").mkdir(parents=True)
+    pkg = disk2 / "game" / "A.pkg"
+    _ = pkg.write_bytes(b"pkg")
+    store = FilesystemRepository(config.paths, extra_roots=(disk2,))
+    store.ensure_layout()
+
+    assert set(store.scan_pkg_stats()) == {str(pkg)}
+    assert store.unreadable_roots() == tuple()
+
+    shutil.rmtree(disk2)
+    assert store.scan_pkg_stats() == {}
+    assert store.unreadable_roots() == (disk2,)
+
+
+def test_filesystem_repository_given_cross_device_move_when_budgeted_then_copies_through_budget(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    settings = temp_workspace / "configs" / "settings.ini"
+    _ = settings.write_text("", encoding="utf-8")
+    config = SettingsLoader.load(settings)
+    charged: list[int] = []
+    budget = IoBudget(IoBudgetPolicy(bytes_per_second=1_000_000_000), sleep=lambda _: None)
+    original_consume = budget.consume
+
+    def _consume(size_bytes: int, ops: int = 1) -> float:
+        charged.append(size_bytes)
+        return original_consume(size_bytes, ops)
+
+    monkeypatch.setattr(budget, "consume", _consume)
+    store = FilesystemRepository(config.paths, io_budget=budget)
+    store.ensure_layout()
+    source = config.paths.pkg_root / "incoming.pkg"
+    _ = source.write_bytes(b"pkg-data")
+
+    def _cross_device(self: Path, target: Path) -> Path:
+        raise OSError(errno.EXDEV, "Invalid cross-device link", str(self), str(target))
+
+    monkeypatch.setattr(Path, "rename", _cross_device)
+    monkeypatch.setattr(module.fcntl, "ioctl", _no_reflink)
+    target = store.move_to_canonical(source, "game", "CUSA00001")
+
+    assert target.read_bytes() == b"pkg-data"
+    assert source.exists() is False
+    assert list(config.paths.game_dir.glob("*.partial")) == []
+    assert charged == [0, 16]
+
+
+def _no_reflink(*_: object) -> int:
+    raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+
+@pytest.mark.parametrize("unsupported", [(), ("copy_file_range",), ("copy_file_range", "sendfile")])
+def test_filesystem_repository_given_cross_device_move_when_copied_then_keeps_data_and_mtime(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    unsupported: tuple[str, ...],
+) -> None:
+    store, config = _make_store(temp_workspace)
+    store.ensure_layout()
+    source = config.paths.pkg_root / "incoming.pkg"
+    payload = bytes(range(256)) * 40
+    _ = source.write_bytes(payload)
+    os.utime(source, ns=(1_600_000_000_123_456_789, 1_600_000_000_123_456_789))
+
+    def _cross_device(self: Path, target: Path) -> Path:
+        raise OSError(errno.EXDEV, "Invalid cross-device link", str(self), str(target))
+
+    def _unsupported(*_: object) -> int:
+        raise OSError(errno.ENOSYS, "Function not implemented")
+
+    monkeypatch.setattr(Path, "rename", _cross_device)
+    monkeypatch.setattr(module.fcntl, "ioctl", _no_reflink)
+    monkeypatch.setattr(FilesystemRepository, "_MOVE_CHUNK_BYTES", 1000)
+    for name in unsupported:
+        monkeypatch.setattr(module.os, name, _unsupported)
+    target = store.move_to_canonical(source, "game", "CUSA00001")
+
+    assert target.read_bytes() == payload
+    assert target.stat().st_mtime_ns == 1_600_000_000_123_456_789
+    assert source.exists() is False
+
+
 def test_filesystem_repository_given_canonical_pkg_when_move_to_canonical_then_returns_same_path(
     temp_workspace: Path,
 ):
@@ -162,3 +407,16 @@ def test_filesystem_repository_given_bad_pkg_when_move_to_errors_then_moves_with
     assert destination.parent == config.paths.errors_dir
     assert destination.suffix == ".pkg"
     assert ".invalid_metadata_." in destination.name
+
+
+def test_filesystem_repository_given_candidate_paths_when_managed_pkg_path_then_normalizes_or_rejects(
+    temp_workspace: Path,
+):
+    store, config = _make_store(temp_workspace)
+    pkg_root = config.paths.pkg_root
+
+    assert store.managed_pkg_path(Path("incoming/A.pkg")) == pkg_root / "incoming" / "A.pkg"
+    assert store.managed_pkg_path(pkg_root / "game" / ".." / "B.pkg") == pkg_root / "B.pkg"
+    assert store.managed_pkg_path(Path("../escape.pkg")) is None
+    assert store.managed_pkg_path(config.paths.media_dir / "C.pkg") is None
+    assert store.managed_pkg_path(pkg_root / "notes.txt") is None
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+from collections.abc import Collection
+from dataclasses import replace
+import hashlib
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from typing import cast
+
+import pytest
+
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import (
+    SqliteUnitOfWork,
+)
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.content_id import ContentId
+from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
+from homebrew_cdn_m1_server.domain.workflows import hash_packages as module
+from homebrew_cdn_m1_server.domain.workflows.export_outputs import ExportOutputs
+from homebrew_cdn_m1_server.domain.workflows.hash_packages import (
+    HashPackages,
+    hash_pkg_content,
+)
+
+
+def _item(path: Path, version: str = "01.00") -> CatalogItem:
+    stat = path.stat()
+    return CatalogItem(
+        content_id=ContentId.parse("UP0000-TEST00000_00-TEST000000000000"),
+        title_id="CUSA00001",
+        title="Test",
+        app_type=AppType.GAME,
+        category="gd",
+        version=version,
+        pubtoolinfo="",
+        system_ver="",
+        release_date="2025-01-01",
+        pkg_path=path,
+        pkg_size=stat.st_size,
+        pkg_mtime_ns=stat.st_mtime_ns,
+        pkg_fingerprint=f"fp-{stat.st_size}-{stat.st_mtime_ns}",
+        icon0_path=None,
+        pic0_path=None,
+        pic1_path=None,
+        sfo=ParamSfoSnapshot(fields={}, raw=b"", hash=""),
+    )
+
+
+class _FakeExportOutputs:
+    def __init__(self) -> None:
+        self.calls: list[tuple[tuple[OutputTarget, ...], Collection[AppType] | None]] = []
+
+    def __call__(
+        self,
+        targets: tuple[OutputTarget, ...],
+        app_types: Collection[AppType] | None = None,
+    ) -> tuple[Path, ...]:
+        self.calls.append((targets, app_types))
+        return tuple()
+
+
+def _build(
+    temp_workspace: Path,
+    items: list[CatalogItem],
+    verify_after_days: int = 0,
+) -> tuple[HashPackages, _FakeExportOutputs, Path]:
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        for item in items:
+            uow.catalog.upsert(item)
+        uow.commit()
+
+    export_outputs = _FakeExportOutputs()
+    hash_packages = HashPackages(
+        uow_factory=lambda: SqliteUnitOfWork(db_path),
+        export_outputs=cast(ExportOutputs, cast(object, export_outputs)),
+        output_targets=(OutputTarget.HB_STORE, OutputTarget.FPKGI),
+        logger=logging.getLogger("test"),
+        with_blake2=True,
+        verify_after_days=verify_after_days,
+    )
+    return hash_packages, export_outputs, db_path
+
+
+def test_hash_pkg_content_given_file_when_hashed_then_matches_hashlib(
+    temp_workspace: Path,
+) -> None:
+    path = temp_workspace / "A.pkg"
+    payload = os.urandom(300_000)
+    _ = path.write_bytes(payload)
+
+    md5, blake2 = hash_pkg_content(path, with_blake2=True, chunk_bytes=64 * 1024)
+
+    assert md5 == hashlib.md5(payload).hexdigest()
+    assert blake2 == hashlib.blake2b(payload).hexdigest()
+
+
+def test_hash_packages_given_unhashed_rows_when_called_then_stores_hashes_and_exports(
+    temp_workspace: Path,
+) -> None:
+    path = temp_workspace / "A.pkg"
+    _ = path.write_bytes(b"pkg-content")
+    hash_packages, export_outputs, db_path = _build(temp_workspace, [_item(path)])
+
+    result = hash_packages()
+
+    assert (result.hashed, result.verified, result.mismatched) == (1, 0, 0)
+    assert export_outputs.calls == [
+        ((OutputTarget.HB_STORE, OutputTarget.FPKGI), {AppType.GAME})
+    ]
+    with SqliteUnitOfWork(db_path) as uow:
+        stored = uow.catalog.list_items()[0]
+    assert stored.pkg_md5 == hashlib.md5(b"pkg-content").hexdigest()
+    assert stored.pkg_blake2 == hashlib.blake2b(b"pkg-content").hexdigest()
+    assert hash_packages().hashed == 0
+
+
+def test_hash_packages_given_reingest_when_fingerprint_changes_then_hashes_again(
+    temp_workspace: Path,
+) -> None:
+    path = temp_workspace / "A.pkg"
+    _ = path.write_bytes(b"first")
+    hash_packages, _, db_path = _build(temp_workspace, [_item(path)])
+    _ = hash_packages()
+
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.upsert(_item(path))
+        uow.commit()
+        assert uow.catalog.list_items()[0].pkg_md5 is not None
+
+    _ = path.write_bytes(b"second-version")
+    os.utime(path, ns=(1_700_000_000_000_000_000, 1_700_000_000_000_000_000))
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.upsert(_item(path))
+        uow.commit()
+        assert uow.catalog.list_items()[0].pkg_md5 is None
+
+    assert hash_packages().hashed == 1
+    with SqliteUnitOfWork(db_path) as uow:
+        assert uow.catalog.list_items()[0].pkg_md5 == hashlib.md5(b"second-version").hexdigest()
+
+
+def test_hash_packages_given_changed_content_when_verified_then_keeps_hash_and_reports(
+    temp_workspace: Path,
+) -> None:
+    path = temp_workspace / "A.pkg"
+    _ = path.write_bytes(b"original")
+    stored = replace(
+        _item(path),
+        pkg_md5=hashlib.md5(b"different").hexdigest(),
+        pkg_blake2=hashlib.blake2b(b"different").hexdigest(),
+    )
+    hash_packages, export_outputs, db_path = _build(
+        temp_workspace, [stored], verify_after_days=1
+    )
+    with sqlite3.connect(db_path) as conn:
+        _ = conn.execute("UPDATE catalog_items SET pkg_hashed_at = '2000-01-01T00:00:00+00:00'")
+
+    result = hash_packages()
+
+    assert (result.hashed, result.verified, result.mismatched) == (0, 0, 1)
+    assert export_outputs.calls == []
+    with SqliteUnitOfWork(db_path) as uow:
+        assert uow.catalog.list_items()[0].pkg_md5 == hashlib.md5(b"different").hexdigest()
+        assert uow.catalog.list_hash_due(10, verified_before="2001-01-01T00:00:00+00:00") == []
+
+
+def test_hash_pkg_content_given_kept_cached_file_when_hashed_then_does_not_drop_pages(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    if not hasattr(os, "posix_fadvise"):
+        pytest.skip("posix_fadvise is not available")
+    path = temp_workspace / "A.pkg"
+    _ = path.write_bytes(os.urandom(200_000))
+    advice: list[int] = []
+    monkeypatch.setattr(
+        module.os, "posix_fadvise", lambda _fd, _offset, _length, value: advice.append(value)
+    )
+
+    _ = hash_pkg_content(path, with_blake2=False, chunk_bytes=64 * 1024)
+    assert os.POSIX_FADV_DONTNEED in advice
+
+    advice.clear()
+    _ = hash_pkg_content(path, with_blake2=False, chunk_bytes=64 * 1024, keep_cached=True)
+    assert advice == [os.POSIX_FADV_SEQUENTIAL]
@@ -5,6 +5,7 @@ import http.client
 import json
 import logging
 import sqlite3
+import time
 from pathlib import Path
 from typing import cast
 
@@ -12,6 +13,12 @@ from homebrew_cdn_m1_server.application.hb_store_api import (
     HbStoreApiResolver,
     HbStoreApiServer,
 )
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.content_id import ContentId
+from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
+from homebrew_cdn_m1_server.domain.models.results import ReconcileResult
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
 
 
 def _init_catalog_db(path: Path) -> None:
@@ -32,6 +39,7 @@ def _insert_catalog_row(
     app_type: str,
     version: str,
     updated_at: str,
+    pkg_name: str | None = None,
 ) -> None:
     with sqlite3.connect(str(path)) as conn:
         _ = conn.execute(
@@ -55,7 +63,7 @@ def _insert_catalog_row(
                 "c_date=20250101",
                 "0x05050000",
                 "2025-01-01",
-                f"/tmp/{content_id}.pkg",
+                f"/tmp/{pkg_name or f'{content_id}.pkg'}",
                 100,
                 1,
                 "fp",
@@ -190,6 +198,71 @@ def test_hb_store_api_resolver_given_multiple_versions_when_resolve_then_returns
     )
 
 
+def test_hb_store_api_resolver_given_sharded_layout_when_resolve_then_redirects_to_shard(
+    temp_workspace: Path,
+) -> None:
+    catalog_db = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    store_db = temp_workspace / "data" / "share" / "hb-store" / "store.db"
+    _init_catalog_db(catalog_db)
+    _init_store_db(store_db)
+    _insert_catalog_row(
+        catalog_db,
+        content_id="UP0000-CUSA12345_00-TEST000000000001",
+        title_id="CUSA12345",
+        app_type="game",
+        version="01.00",
+        updated_at="2025-01-01T00:00:00+00:00",
+    )
+
+    resolver = HbStoreApiResolver(
+        catalog_db_path=catalog_db,
+        store_db_path=store_db,
+        base_url="http://127.0.0.1",
+        layout=StorageLayout.SHARDED,
+    )
+
+    assert (
+        resolver.resolve_download_url("CUSA12345")
+        == "http://127.0.0.1/pkg/game/UP0000-CUSA12345_00-TEST000000000001.pkg"
+    )
+    assert (
+        resolver.resolve_download_pkg_path("CUSA12345")
+        == "/pkg/game/45/23/UP0000-CUSA12345_00-TEST000000000001.pkg"
+    )
+
+
+def test_hb_store_api_resolver_given_versioned_pkg_names_when_resolve_then_returns_requested_release(
+    temp_workspace: Path,
+) -> None:
+    catalog_db = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    store_db = temp_workspace / "data" / "share" / "hb-store" / "store.db"
+    _init_catalog_db(catalog_db)
+    _init_store_db(store_db)
+    for version in ("01.00", "01.01"):
+        _insert_catalog_row(
+            catalog_db,
+            content_id="UP0000-CUSA00001_00-TEST000000000001",
+            title_id="CUSA00001",
+            app_type="update",
+            version=version,
+            updated_at="2025-01-01T00:00:00+00:00",
+            pkg_name=f"UP0000-CUSA00001_00-TEST000000000001_v{version}.pkg",
+        )
+
+    resolver = HbStoreApiResolver(
+        catalog_db_path=catalog_db,
+        store_db_path=store_db,
+        base_url="http://127.0.0.1",
+    )
+
+    assert resolver.resolve_download_pkg_path(
+        "CUSA00001", "UP0000-CUSA00001_00-TEST000000000001", "01.00"
+    ) == "/pkg/update/UP0000-CUSA00001_00-TEST000000000001_v01.00.pkg"
+    assert resolver.resolve_download_url("CUSA00001") == (
+        "http://127.0.0.1/pkg/update/UP0000-CUSA00001_00-TEST000000000001_v01.01.pkg"
+    )
+
+
 def test_hb_store_api_resolver_given_missing_catalog_entry_when_resolve_then_fallback_to_store_db(
     temp_workspace: Path,
 ) -> None:
@@ -660,3 +733,238 @@ def test_hb_store_api_resolver_given_tid_only_with_game_and_update_when_resolve_
         resolver.resolve_download_url("CUSA00500")
         == f"http://127.0.0.1/pkg/game/{cid}.pkg"
     )
+
+
+def test_hb_store_api_server_given_admin_reconcile_when_posted_then_returns_catalog_entries(
+    temp_workspace: Path,
+) -> None:
+    pkg_path = temp_workspace / "data" / "share" / "pkg" / "game" / "A.pkg"
+    item = CatalogItem(
+        content_id=ContentId.parse("UP0000-TEST00000_00-TEST000000000100"),
+        title_id="CUSA00100",
+        title="Game",
+        app_type=AppType.GAME,
+        category="GD",
+        version="01.00",
+        pubtoolinfo="",
+        system_ver="",
+        release_date="2025-01-01",
+        pkg_path=pkg_path,
+        pkg_size=10,
+        pkg_mtime_ns=20,
+        pkg_fingerprint="fp",
+        icon0_path=None,
+        pic0_path=None,
+        pic1_path=None,
+        sfo=ParamSfoSnapshot(fields={}, raw=b"", hash=""),
+    )
+    calls: list[tuple[Path, ...]] = []
+    busy = [False]
+
+    def _reconcile_paths(paths: tuple[Path, ...]) -> ReconcileResult:
+        calls.append(paths)
+        if busy[0]:
+            return ReconcileResult(0, 0, 0, 0, tuple(), skipped=True)
+        return ReconcileResult(1, 0, 0, 0, tuple(), items=(item,))
+
+    resolver = HbStoreApiResolver(
+        catalog_db_path=temp_workspace / "catalog.db",
+        store_db_path=temp_workspace / "store.db",
+        base_url="http://127.0.0.1",
+    )
+    server = HbStoreApiServer(
+        resolver=resolver,
+        logger=logging.getLogger("tests.hb_store_api"),
+        host="127.0.0.1",
+        port=0,
+        reconcile_paths=_reconcile_paths,
+    )
+    server.start()
+
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=3)
+        body = json.dumps({"paths": [str(pkg_path)]})
+
+        conn.request("POST", "/admin/reconcile", body=body)
+        response = conn.getresponse()
+        payload = cast(dict[str, object], json.loads(response.read()))
+        assert response.status == 200
+        assert payload["added"] == 1
+        assert payload["items"] == [
+            {
+                "content_id": "UP0000-TEST00000_00-TEST000000000100",
+                "title_id": "CUSA00100",
+                "title": "Game",
+                "app_type": "game",
+                "version": "01.00",
+                "pkg_path": str(pkg_path),
+                "pkg_size": 10,
+            }
+        ]
+
+        conn.request("POST", "/admin/reconcile", body=body, headers={"X-Real-IP": "10.0.0.9"})
+        response = conn.getresponse()
+        _ = response.read()
+        assert response.status == 403
+
+        conn.request("POST", "/admin/reconcile", body=json.dumps({"paths": "A.pkg"}))
+        response = conn.getresponse()
+        _ = response.read()
+        assert response.status == 400
+
+        busy[0] = True
+        conn.request("POST", "/admin/reconcile", body=body)
+        response = conn.getresponse()
+        _ = response.read()
+        assert response.status == 409
+        conn.close()
+    finally:
+        server.stop()
+
+    assert calls == [(pkg_path,), (pkg_path,)]
+
+
+def test_hb_store_api_server_given_latencies_when_p99_requested_then_returns_tail(
+    temp_workspace: Path,
+) -> None:
+    resolver = HbStoreApiResolver(
+        catalog_db_path=temp_workspace / "catalog.db",
+        store_db_path=temp_workspace / "store.db",
+        base_url="http://127.0.0.1",
+    )
+    now = [1000.0]
+    server = HbStoreApiServer(
+        resolver=resolver,
+        logger=logging.getLogger("test"),
+        clock=lambda: now[0],
+    )
+    assert server.latency_p99_seconds() is None
+
+    for index in range(100):
+        server.record_latency(5.0 if index == 99 else 0.01)
+    server.record_latency(0.01)
+
+    assert server.latency_p99_seconds() == 0.01
+    server.record_latency(4.0)
+    assert server.latency_p99_seconds() == 4.0
+
+    # After a quiet minute old samples no longer count.
+    now[0] += 61.0
+    assert server.latency_p99_seconds() is None
+    server.record_latency(0.02)
+    assert server.latency_p99_seconds() == 0.02
+
+
+def test_hb_store_api_server_given_media_and_admin_requests_when_served_then_not_sampled(
+    temp_workspace: Path,
+) -> None:
+    def _slow_media_extractor(_name: str) -> Path | None:
+        time.sleep(0.3)
+        return None
+
+    resolver = HbStoreApiResolver(
+        catalog_db_path=temp_workspace / "catalog.db",
+        store_db_path=temp_workspace / "store.db",
+        base_url="http://127.0.0.1",
+    )
+    server = HbStoreApiServer(
+        resolver=resolver,
+        logger=logging.getLogger("tests.hb_store_api"),
+        host="127.0.0.1",
+        port=0,
+        media_extractor=_slow_media_extractor,
+    )
+    server.start()
+
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=3)
+        for path in ("/pkg/media/A_pic0.png", "/admin/reconcile", "/api.php"):
+            conn.request("GET", path)
+            _ = conn.getresponse().read()
+        conn.close()
+    finally:
+        server.stop()
+
+    # Only /api.php was sampled; the slow extraction is not API pressure.
+    p99 = server.latency_p99_seconds()
+    assert p99 is not None and p99 < 0.3
+
+
+def test_hb_store_api_server_given_missing_media_when_requested_then_extracts_and_redirects(
+    temp_workspace: Path,
+) -> None:
+    requested: list[str] = []
+
+    def _media_extractor(name: str) -> Path | None:
+        requested.append(name)
+        if name.endswith("_pic0.png"):
+            return temp_workspace / name
+        return None
+
+    resolver = HbStoreApiResolver(
+        catalog_db_path=temp_workspace / "catalog.db",
+        store_db_path=temp_workspace / "store.db",
+        base_url="http://127.0.0.1",
+    )
+    server = HbStoreApiServer(
+        resolver=resolver,
+        logger=logging.getLogger("tests.hb_store_api"),
+        host="127.0.0.1",
+        port=0,
+        media_extractor=_media_extractor,
+    )
+    server.start()
+
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=3)
+        conn.request("GET", "/pkg/media/UP0000-TEST00000_00-TEST000000000100_pic0.png")
+        response = conn.getresponse()
+        _ = response.read()
+        assert response.status == 200
+        assert response.getheader("X-Accel-Redirect") == (
+            "/pkg/media/UP0000-TEST00000_00-TEST000000000100_pic0.png"
+        )
+        assert response.getheader("Content-Type") == "image/png"
+
+        conn.request("GET", "/pkg/media/UP0000-TEST00000_00-TEST000000000100_pic1.png")
+        response = conn.getresponse()
+        _ = response.read()
+        assert response.status == 404
+        conn.close()
+    finally:
+        server.stop()
+
+    assert requested == [
+        "UP0000-TEST00000_00-TEST000000000100_pic0.png",
+        "UP0000-TEST00000_00-TEST000000000100_pic1.png",
+    ]
+
+
+def test_hb_store_api_resolver_given_dedup_window_when_client_repeats_then_counts_once_per_window(
+    temp_workspace: Path,
+) -> None:
+    catalog_db = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    store_db = temp_workspace / "data" / "share" / "hb-store" / "store.db"
+    _init_catalog_db(catalog_db)
+    _init_store_db(store_db)
+    cid = "UP0000-TEST00000_00-TEST000000000401"
+    now = [1000.0]
+    resolver = HbStoreApiResolver(
+        catalog_db_path=catalog_db,
+        store_db_path=store_db,
+        base_url="http://127.0.0.1",
+        dedup_window_seconds=600,
+        clock=lambda: now[0],
+    )
+
+    assert resolver.increment_download_count("CUSA00401", cid, "01.00", client="10.0.0.2") == 1
+    # Retries and resumes from the same console.
+    assert resolver.increment_download_count("CUSA00401", cid, "01.00", client="10.0.0.2") == 1
+    assert resolver.increment_download_count("CUSA00401", cid, "01.01", client="10.0.0.2") == 1
+    assert resolver.increment_download_count("CUSA00401", cid, "01.00", client="10.0.0.3") == 2
+    # Without a client address every request counts.
+    assert resolver.increment_download_count("CUSA00401", cid, "01.00") == 3
+
+    now[0] = 1600.0
+    assert resolver.increment_download_count("CUSA00401", cid, "01.00", client="10.0.0.2") == 4
+    assert resolver.download_count("CUSA00401", cid, "01.00") == "4"
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import logging
+from threading import Thread
+import time
+
+from homebrew_cdn_m1_server.domain.workflows.ingest_concurrency import IngestConcurrency
+
+
+def _concurrency(
+    max_workers: int,
+    initial_workers: int,
+    api_p99: float | None = None,
+) -> IngestConcurrency:
+    return IngestConcurrency(
+        max_workers=max_workers,
+        logger=logging.getLogger("test"),
+        api_p99_seconds=lambda: api_p99,
+        api_p99_limit_seconds=0.25,
+        initial_workers=initial_workers,
+    )
+
+
+def _window(concurrency: IngestConcurrency, seconds: float, size_bytes: int = 100) -> None:
+    for _ in range(2 * concurrency.limit):
+        concurrency.record(seconds, size_bytes)
+
+
+def test_ingest_concurrency_given_steady_latency_when_windows_complete_then_grows_to_max() -> None:
+    concurrency = _concurrency(max_workers=4, initial_workers=1)
+
+    for _ in range(5):
+        _window(concurrency, seconds=1.0)
+
+    assert concurrency.limit == 4
+
+
+def test_ingest_concurrency_given_slower_after_increase_when_window_completes_then_steps_back() -> (
+    None
+):
+    concurrency = _concurrency(max_workers=8, initial_workers=2)
+    _window(concurrency, seconds=1.0)
+    assert concurrency.limit == 3
+
+    # Three workers each taking three times longer move less data than two did.
+    _window(concurrency, seconds=3.0)
+
+    assert concurrency.limit == 2
+    _window(concurrency, seconds=1.0)
+    assert concurrency.limit == 2
+
+
+def test_ingest_concurrency_given_api_p99_over_limit_when_window_completes_then_halves() -> None:
+    concurrency = _concurrency(max_workers=8, initial_workers=8, api_p99=0.5)
+
+    _window(concurrency, seconds=1.0)
+
+    assert concurrency.limit == 4
+
+
+def test_ingest_concurrency_given_limit_when_acquired_then_blocks_extra_workers() -> None:
+    concurrency = _concurrency(max_workers=4, initial_workers=1)
+    concurrency.acquire()
+    acquired: list[bool] = []
+
+    def _second() -> None:
+        concurrency.acquire()
+        acquired.append(True)
+        concurrency.release()
+
+    thread = Thread(target=_second, daemon=True)
+    thread.start()
+    time.sleep(0.05)
+    assert acquired == []
+
+    concurrency.release()
+    thread.join(timeout=2.0)
+    assert acquired == [True]
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import logging
+from dataclasses import replace
 from pathlib import Path
 from types import TracebackType
 from typing import cast
@@ -32,9 +33,28 @@ class _FakeCatalog:
         self.items.append(item)
 
 
+class _FakeProbeCache:
+    def __init__(self) -> None:
+        self.results: dict[str, ProbeResult] = {}
+        self.failures: dict[str, str] = {}
+
+    def get_result(self, fingerprint: str) -> ProbeResult | None:
+        return self.results.get(fingerprint)
+
+    def get_failure(self, fingerprint: str) -> str | None:
+        return self.failures.get(fingerprint)
+
+    def save_result(self, fingerprint: str, probe: ProbeResult) -> None:
+        self.results[fingerprint] = probe
+
+    def record_failure(self, fingerprint: str, error: str) -> None:
+        self.failures[fingerprint] = error
+
+
 class _FakeUow:
     def __init__(self) -> None:
         self.catalog: _FakeCatalog = _FakeCatalog()
+        self.probe_cache: _FakeProbeCache = _FakeProbeCache()
         self.committed: bool = False
 
     def __enter__(self) -> "_FakeUow":
@@ -63,8 +83,14 @@ class _FakeStore:
         self.errors.append((pkg_path, reason))
         return pkg_path
 
-    def move_to_canonical(self, pkg_path: Path, app_type: str, content_id: str) -> Path:
-        _ = (pkg_path, app_type, content_id)
+    def move_to_canonical(
+        self,
+        pkg_path: Path,
+        app_type: str,
+        content_id: str,
+        version: str | None = None,
+    ) -> Path:
+        _ = (pkg_path, app_type, content_id, version)
         if self.raise_on_move:
             raise RuntimeError("move failed")
         return self._canonical_path
@@ -267,3 +293,154 @@ def test_ingest_package_given_metadata_lookup_failure_when_called_then_keeps_ing
     assert result.item is not None
     assert result.item.publisher is None
     assert result.created is True
+
+
+def test_ingest_package_given_cached_probe_when_called_then_skips_pkgtool(
+    temp_workspace: Path,
+) -> None:
+    canonical = temp_workspace / "data" / "share" / "pkg" / "game" / "A.pkg"
+    canonical.parent.mkdir(parents=True, exist_ok=True)
+    _ = canonical.write_bytes(b"payload")
+    store = _FakeStore(canonical)
+    uow = _FakeUow()
+    probes: list[Path] = []
+
+    class _Probe:
+        def probe(self, pkg_path: Path) -> ProbeResult:
+            probes.append(pkg_path)
+            return _probe_result()
+
+    ingest = IngestPackage(
+        uow_factory=lambda: cast(SqliteUnitOfWork, cast(object, uow)),
+        package_probe=cast(PackageProbeProtocol, cast(object, _Probe())),
+        package_store=cast(FilesystemRepository, cast(object, store)),
+        logger=logging.getLogger("test"),
+    )
+
+    first = ingest(canonical)
+    second = ingest(canonical)
+
+    assert first.item is not None
+    assert second.item is not None
+    assert probes == [canonical]
+    assert list(uow.probe_cache.results) == [first.item.pkg_fingerprint]
+
+
+def test_ingest_package_given_cached_deferred_media_when_lazy_mode_off_then_probes_again(
+    temp_workspace: Path,
+) -> None:
+    canonical = temp_workspace / "data" / "share" / "pkg" / "game" / "A.pkg"
+    canonical.parent.mkdir(parents=True, exist_ok=True)
+    _ = canonical.write_bytes(b"payload")
+    deferred = replace(
+        _probe_result(), pic0_path=temp_workspace / "media" / "pic0.png", pic0_entry="12"
+    )
+    probes: list[Path] = []
+
+    class _Probe:
+        def probe(self, pkg_path: Path) -> ProbeResult:
+            probes.append(pkg_path)
+            return deferred
+
+    for lazy_media, expected in ((True, 1), (False, 2)):
+        probes.clear()
+        uow = _FakeUow()
+        ingest = IngestPackage(
+            uow_factory=lambda: cast(SqliteUnitOfWork, cast(object, uow)),
+            package_probe=cast(PackageProbeProtocol, cast(object, _Probe())),
+            package_store=cast(FilesystemRepository, cast(object, _FakeStore(canonical))),
+            logger=logging.getLogger("test"),
+            lazy_media=lazy_media,
+        )
+        _ = ingest(canonical)
+        _ = ingest(canonical)
+        assert len(probes) == expected
+
+
+def test_ingest_package_given_refresh_when_called_then_bypasses_probe_cache(
+    temp_workspace: Path,
+) -> None:
+    canonical = temp_workspace / "data" / "share" / "pkg" / "game" / "A.pkg"
+    canonical.parent.mkdir(parents=True, exist_ok=True)
+    _ = canonical.write_bytes(b"payload")
+    store = _FakeStore(canonical)
+    uow = _FakeUow()
+    probes: list[Path] = []
+
+    class _Probe:
+        def probe(self, pkg_path: Path) -> ProbeResult:
+            probes.append(pkg_path)
+            return replace(_probe_result(), probe_version=3, derive_version=2)
+
+    ingest = IngestPackage(
+        uow_factory=lambda: cast(SqliteUnitOfWork, cast(object, uow)),
+        package_probe=cast(PackageProbeProtocol, cast(object, _Probe())),
+        package_store=cast(FilesystemRepository, cast(object, store)),
+        logger=logging.getLogger("test"),
+    )
+
+    _ = ingest(canonical)
+    refreshed = ingest(canonical, refresh=True)
+
+    assert probes == [canonical, canonical]
+    assert refreshed.item is not None
+    assert refreshed.item.probe_version == 3
+    assert refreshed.item.derive_version == 2
+
+
+def test_ingest_package_given_cached_failure_when_called_then_rejects_without_probe(
+    temp_workspace: Path,
+) -> None:
+    canonical = temp_workspace / "data" / "share" / "pkg" / "game" / "A.pkg"
+    canonical.parent.mkdir(parents=True, exist_ok=True)
+    _ = canonical.write_bytes(b"broken")
+    store = _FakeStore(canonical)
+    uow = _FakeUow()
+    probes: list[Path] = []
+
+    class _Probe:
+        def probe(self, pkg_path: Path) -> ProbeResult:
+            probes.append(pkg_path)
+            raise ValueError("PARAM.SFO not found")
+
+    ingest = IngestPackage(
+        uow_factory=lambda: cast(SqliteUnitOfWork, cast(object, uow)),
+        package_probe=cast(PackageProbeProtocol, cast(object, _Probe())),
+        package_store=cast(FilesystemRepository, cast(object, store)),
+        logger=logging.getLogger("test"),
+    )
+
+    first = ingest(canonical)
+    second = ingest(canonical)
+
+    assert first.item is None
+    assert second.item is None
+    assert probes == [canonical]
+    assert list(uow.probe_cache.failures.values()) == ["PARAM.SFO not found"]
+    assert [reason for _, reason in store.errors] == ["probe_failed", "probe_failed"]
+
+
+def test_ingest_package_given_transient_probe_failure_when_called_then_does_not_cache(
+    temp_workspace: Path,
+) -> None:
+    canonical = temp_workspace / "data" / "share" / "pkg" / "game" / "A.pkg"
+    canonical.parent.mkdir(parents=True, exist_ok=True)
+    _ = canonical.write_bytes(b"payload")
+    store = _FakeStore(canonical)
+    uow = _FakeUow()
+
+    class _Probe:
+        def probe(self, _pkg_path: Path) -> ProbeResult:
+            raise FileNotFoundError("pkgtool binary not found")
+
+    ingest = IngestPackage(
+        uow_factory=lambda: cast(SqliteUnitOfWork, cast(object, uow)),
+        package_probe=cast(PackageProbeProtocol, cast(object, _Probe())),
+        package_store=cast(FilesystemRepository, cast(object, store)),
+        logger=logging.getLogger("test"),
+    )
+
+    result = ingest(canonical)
+
+    assert result.item is None
+    assert uow.probe_cache.failures == {}
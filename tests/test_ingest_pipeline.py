@@ -0,0 +1,163 @@
+# pyright: reportPrivateUsage=false
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+import logging
+from pathlib import Path
+import threading
+from typing import cast
+
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.content_id import ContentId
+from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
+from homebrew_cdn_m1_server.domain.models.results import (
+    PlacedPackage,
+    ProbedPackage,
+    ProbeResult,
+)
+from homebrew_cdn_m1_server.domain.workflows.ingest_package import IngestPackage
+from homebrew_cdn_m1_server.domain.workflows.ingest_pipeline import IngestPipeline, _ProbeLanes
+
+
+def _catalog_item(path: Path) -> CatalogItem:
+    return CatalogItem(
+        content_id=ContentId.parse("UP0000-TEST00000_00-TEST000000000000"),
+        title_id="CUSA00001",
+        title="Test",
+        app_type=AppType.GAME,
+        category="GD",
+        version=path.stem,
+        pubtoolinfo="",
+        system_ver="",
+        release_date="",
+        pkg_path=path,
+        pkg_size=1,
+        pkg_mtime_ns=1,
+        pkg_fingerprint=path.stem,
+        icon0_path=None,
+        pic0_path=None,
+        pic1_path=None,
+        sfo=ParamSfoSnapshot(fields={}, raw=b"", hash=""),
+    )
+
+
+class _FakeIngest:
+    def __init__(
+        self,
+        failing_probe: set[str] | None = None,
+        failing_write: set[str] | None = None,
+    ) -> None:
+        self.failing_probe: set[str] = failing_probe or set()
+        self.failing_write: set[str] = failing_write or set()
+        self.batches: list[list[str]] = []
+        self.probed: list[tuple[str, str]] = []
+
+    def probe_package(self, path: Path) -> ProbedPackage | None:
+        self.probed.append((threading.current_thread().name, path.name))
+        if path.name in self.failing_probe:
+            return None
+        return ProbedPackage(pkg_path=path, source=None, probe=cast(ProbeResult, object()))
+
+    def place_package(self, probed: ProbedPackage) -> PlacedPackage | None:
+        return PlacedPackage(item=_catalog_item(probed.pkg_path), probe=probed.probe)
+
+    def write_packages(self, placed: Sequence[PlacedPackage]) -> None:
+        names = [entry.item.pkg_path.name for entry in placed]
+        if self.failing_write & set(names):
+            raise RuntimeError("constraint failed")
+        self.batches.append(names)
+
+
+def _pipeline(
+    ingest: _FakeIngest,
+    batch_size: int,
+    probe_workers: int = 2,
+    small_max_bytes: int = 0,
+) -> IngestPipeline:
+    return IngestPipeline(
+        ingest_package=cast(IngestPackage, cast(object, ingest)),
+        logger=logging.getLogger("test"),
+        probe_workers=probe_workers,
+        batch_size=batch_size,
+        batch_interval_seconds=60.0,
+        small_max_bytes=small_max_bytes,
+    )
+
+
+def test_ingest_pipeline_given_many_packages_when_called_then_writes_in_batches(
+    temp_workspace: Path,
+) -> None:
+    ingest = _FakeIngest(failing_probe={"p3.pkg"})
+    paths = [temp_workspace / f"p{index}.pkg" for index in range(7)]
+
+    results = _pipeline(ingest, batch_size=4)(paths)
+
+    written = sorted(name for batch in ingest.batches for name in batch)
+    assert written == sorted(path.name for path in paths if path.name != "p3.pkg")
+    assert [len(batch) for batch in ingest.batches] == [4, 2]
+    assert len(results) == 7
+    assert sum(1 for result in results if result.item is None) == 1
+
+
+def test_ingest_pipeline_given_batch_write_failure_when_called_then_retries_items_alone(
+    temp_workspace: Path,
+) -> None:
+    ingest = _FakeIngest(failing_write={"p1.pkg"})
+    paths = [temp_workspace / f"p{index}.pkg" for index in range(3)]
+
+    results = _pipeline(ingest, batch_size=10)(paths)
+
+    assert sorted(name for batch in ingest.batches for name in batch) == ["p0.pkg", "p2.pkg"]
+    assert all(len(batch) == 1 for batch in ingest.batches)
+    failed = [result for result in results if result.item is None]
+    assert len(results) == 3
+    assert len(failed) == 1
+
+
+def test_probe_lanes_given_sizes_when_taken_then_small_lane_and_large_longest_first(
+    temp_workspace: Path,
+) -> None:
+    sizes = {"big-a.pkg": 50, "big-b.pkg": 80, "small-a.pkg": 1, "big-c.pkg": 60, "small-b.pkg": 2}
+    lanes = _ProbeLanes(
+        [temp_workspace / name for name in sizes],
+        {str(temp_workspace / name): size for name, size in sizes.items()},
+        small_max_bytes=10,
+    )
+
+    taken = [
+        lanes.take(small_lane=True),
+        lanes.take(small_lane=False),
+        lanes.take(small_lane=True),
+        lanes.take(small_lane=True),
+        lanes.take(small_lane=False),
+        lanes.take(small_lane=False),
+        lanes.take(small_lane=True),
+    ]
+
+    assert [path.name if path else None for path in taken] == [
+        "small-a.pkg",
+        "big-b.pkg",
+        "small-b.pkg",
+        "big-c.pkg",
+        "big-a.pkg",
+        None,
+        None,
+    ]
+
+
+def test_ingest_pipeline_given_sizes_when_called_then_reserves_small_lane_worker(
+    temp_workspace: Path,
+) -> None:
+    ingest = _FakeIngest()
+    sizes = {"big-a.pkg": 80, "small-a.pkg": 1, "small-b.pkg": 2}
+    paths = [temp_workspace / name for name in sizes]
+
+    results = _pipeline(ingest, batch_size=10, probe_workers=2, small_max_bytes=10)(
+        paths, {str(temp_workspace / name): size for name, size in sizes.items()}
+    )
+
+    assert len(results) == 3
+    small_lane = [name for thread, name in ingest.probed if thread == "ingest-probe-0"]
+    assert small_lane[0] == "small-a.pkg"
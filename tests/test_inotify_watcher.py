@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from threading import Event
+
+import pytest
+
+from homebrew_cdn_m1_server.application.watchers.inotify_watcher import InotifyWatcher
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+
+
+class _Recorder:
+    def __init__(self, results: list[bool] | None = None) -> None:
+        self.calls: list[tuple[Path, ...]] = []
+        self._results: list[bool] = results or []
+        self.called: Event = Event()
+
+    def __call__(self, paths: tuple[Path, ...]) -> bool:
+        self.calls.append(paths)
+        self.called.set()
+        return self._results.pop(0) if self._results else True
+
+
+def _wait_for(predicate: object, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if callable(predicate) and predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def _make_watcher(root: Path, recorder: _Recorder, stable_seconds: float) -> InotifyWatcher:
+    return InotifyWatcher(
+        root=root,
+        excluded=(root / "media",),
+        on_ready=recorder,
+        stable_seconds=stable_seconds,
+        logger=logging.getLogger("test"),
+        poll_seconds=0.02,
+    )
+
+
+def test_inotify_watcher_given_written_pkg_when_stable_then_reports_it(tmp_path: Path) -> None:
+    root = tmp_path / "pkg"
+    (root / "media").mkdir(parents=True)
+    recorder = _Recorder()
+    watcher = _make_watcher(root, recorder, stable_seconds=0.2)
+    assert watcher.start() is True
+    try:
+        nested = root / "incoming"
+        nested.mkdir()
+        time.sleep(0.1)
+        pkg = nested / "A.pkg"
+        _ = pkg.write_bytes(b"data")
+        _ = (root / "media" / "B.pkg").write_bytes(b"ignored")
+        _ = (root / "notes.txt").write_text("ignored", encoding="utf-8")
+
+        assert _wait_for(lambda: recorder.calls)
+    finally:
+        watcher.stop()
+
+    assert recorder.calls[0] == (pkg,)
+
+
+def test_inotify_watcher_given_file_still_growing_when_polled_then_waits_for_stability(
+    tmp_path: Path,
+) -> None:
+    root = tmp_path / "pkg"
+    root.mkdir()
+    recorder = _Recorder()
+    watcher = _make_watcher(root, recorder, stable_seconds=0.4)
+    assert watcher.start() is True
+    try:
+        pkg = root / "A.pkg"
+        started = time.monotonic()
+        with pkg.open("wb") as handle:
+            for _ in range(5):
+                _ = handle.write(b"x" * 1024)
+                handle.flush()
+                os.fsync(handle.fileno())
+                time.sleep(0.15)
+        assert recorder.calls == []
+
+        assert _wait_for(lambda: recorder.calls)
+        elapsed = time.monotonic() - started
+    finally:
+        watcher.stop()
+
+    assert recorder.calls[0] == (pkg,)
+    assert elapsed >= 0.4 + 0.6
+
+
+def test_inotify_watcher_given_callback_declines_when_polled_then_retries(
+    tmp_path: Path,
+) -> None:
+    root = tmp_path / "pkg"
+    root.mkdir()
+    recorder = _Recorder(results=[False, True])
+    watcher = _make_watcher(root, recorder, stable_seconds=0.05)
+    assert watcher.start() is True
+    try:
+        pkg = root / "A.pkg"
+        _ = pkg.write_bytes(b"data")
+
+        assert _wait_for(lambda: len(recorder.calls) >= 2)
+        time.sleep(0.2)
+    finally:
+        watcher.stop()
+
+    assert recorder.calls == [(pkg,), (pkg,)]
+
+
+def test_inotify_watcher_given_existing_pkgs_when_started_then_reports_only_new_ones(
+    tmp_path: Path,
+) -> None:
+    root = tmp_path / "pkg"
+    (root / "game").mkdir(parents=True)
+    _ = (root / "game" / "OLD.pkg").write_bytes(b"data")
+    recorder = _Recorder()
+    watcher = _make_watcher(root, recorder, stable_seconds=0.05)
+    assert watcher.start() is True
+    try:
+        time.sleep(0.3)
+        assert recorder.calls == []
+
+        incoming = tmp_path / "incoming"
+        incoming.mkdir()
+        pkg = incoming / "NEW.pkg"
+        _ = pkg.write_bytes(b"data")
+        _ = incoming.rename(root / "incoming")
+
+        assert _wait_for(lambda: recorder.calls)
+    finally:
+        watcher.stop()
+
+    assert recorder.calls == [(root / "incoming" / "NEW.pkg",)]
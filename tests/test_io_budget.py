@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import pytest
+
+from homebrew_cdn_m1_server.application.io_budget import IoBudget
+from homebrew_cdn_m1_server.domain.models.io_budget_policy import (
+    IoBudgetPolicy,
+    parse_hour_range,
+)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_io_budget_given_byte_rate_when_burst_exceeded_then_sleeps_off_debt() -> None:
+    clock = _Clock()
+    budget = IoBudget(
+        IoBudgetPolicy(bytes_per_second=1000),
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+    # The bucket starts empty; every byte is paid for at the configured rate.
+    assert budget.consume(500, ops=0) == pytest.approx(0.5)
+    assert budget.consume(1500, ops=0) == pytest.approx(1.5)
+    clock.now += 1.0
+    assert budget.consume(1000, ops=0) == pytest.approx(0.0)
+
+
+def test_io_budget_given_iops_limit_when_consumed_then_waits_per_operation() -> None:
+    clock = _Clock()
+    budget = IoBudget(IoBudgetPolicy(ops_per_second=10), clock=clock, sleep=clock.sleep)
+
+    waits = [budget.consume(0) for _ in range(3)]
+
+    assert waits == [pytest.approx(0.1), pytest.approx(0.1), pytest.approx(0.1)]
+
+
+def test_io_budget_given_off_peak_hours_when_inside_window_then_uses_off_peak_policy() -> None:
+    hour = 23
+    budget = IoBudget(
+        IoBudgetPolicy(bytes_per_second=1000),
+        off_peak=IoBudgetPolicy(),
+        off_peak_hours=(22, 7),
+        hour=lambda: hour,
+    )
+
+    assert budget.policy() == IoBudgetPolicy()
+    assert budget.consume(10_000_000) == 0.0
+    hour = 12
+    assert budget.policy() == IoBudgetPolicy(bytes_per_second=1000)
+
+
+def test_parse_hour_range_given_values_when_parsed_then_validates() -> None:
+    assert parse_hour_range("22-7") == (22, 7)
+    assert parse_hour_range(" ") is None
+    with pytest.raises(ValueError):
+        _ = parse_hour_range("25-3")
+    with pytest.raises(ValueError):
+        _ = parse_hour_range("night")
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+from homebrew_cdn_m1_server.application.repositories.filesystem_repository import (
+    FilesystemRepository,
+)
+from homebrew_cdn_m1_server.application.repositories.sqlite_snapshot_repository import (
+    SqliteSnapshotRepository,
+)
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import (
+    SqliteUnitOfWork,
+)
+from homebrew_cdn_m1_server.config.settings_loader import SettingsLoader
+from homebrew_cdn_m1_server.domain.models.app_config import AppConfig
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.content_id import ContentId
+from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
+from homebrew_cdn_m1_server.domain.workflows.migrate_storage_layout import (
+    MigrateStorageLayout,
+)
+
+_CONTENT_ID = "UP0000-CUSA12345_00-TEST000000000000"
+
+
+def _config(temp_workspace: Path) -> AppConfig:
+    settings = temp_workspace / "configs" / "settings.ini"
+    _ = settings.write_text("", encoding="utf-8")
+    return SettingsLoader.load(settings)
+
+
+def _item(config: AppConfig, version: str) -> CatalogItem:
+    pkg_path = config.paths.game_dir / f"{_CONTENT_ID}.pkg"
+    icon0 = config.paths.media_dir / f"{_CONTENT_ID}_icon0.png"
+    pkg_path.parent.mkdir(parents=True, exist_ok=True)
+    icon0.parent.mkdir(parents=True, exist_ok=True)
+    _ = pkg_path.write_bytes(b"pkg")
+    _ = icon0.write_bytes(b"png")
+    stat = pkg_path.stat()
+    return CatalogItem(
+        content_id=ContentId.parse(_CONTENT_ID),
+        title_id="CUSA12345",
+        title="Test",
+        app_type=AppType.GAME,
+        category="gd",
+        version=version,
+        pubtoolinfo="",
+        system_ver="",
+        release_date="2025-01-01",
+        pkg_path=pkg_path,
+        pkg_size=int(stat.st_size),
+        pkg_mtime_ns=int(stat.st_mtime_ns),
+        pkg_fingerprint=f"fp-{version}",
+        icon0_path=icon0,
+        # Left in the PKG (PKGTOOL_LAZY_MEDIA); only the path moves.
+        pic0_path=config.paths.media_dir / f"{_CONTENT_ID}_pic0.png",
+        pic1_path=None,
+        sfo=ParamSfoSnapshot(fields={}, raw=b"", hash=""),
+        pic0_entry="12",
+    )
+
+
+def _migration(
+    config: AppConfig, layout: StorageLayout
+) -> tuple[MigrateStorageLayout, SqliteSnapshotRepository]:
+    snapshot_store = SqliteSnapshotRepository(config.paths.catalog_db_path)
+    migrate = MigrateStorageLayout(
+        uow_factory=lambda: SqliteUnitOfWork(config.paths.catalog_db_path),
+        package_store=FilesystemRepository(config.paths, layout=layout),
+        snapshot_store=snapshot_store,
+        media_dir=config.paths.media_dir,
+        layout=layout,
+        marker_path=config.paths.cache_dir / "storage_layout",
+        lock_path=config.paths.cache_dir / "reconcile.lock",
+        lock_timeout_seconds=0.0,
+        logger=logging.getLogger("tests.migrate_storage_layout"),
+    )
+    return migrate, snapshot_store
+
+
+def test_migrate_storage_layout_given_flat_catalog_when_sharded_then_moves_files_and_rows(
+    temp_workspace: Path,
+) -> None:
+    config = _config(temp_workspace)
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    older = _item(config, "01.00")
+    item = _item(config, "01.01")
+    with SqliteUnitOfWork(config.paths.catalog_db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.catalog.upsert(older)
+        uow.catalog.upsert(item)
+        uow.commit()
+    migrate, snapshot_store = _migration(config, StorageLayout.SHARDED)
+    snapshot_store.save({str(item.pkg_path): (item.pkg_size, item.pkg_mtime_ns)})
+
+    result = migrate()
+
+    pkg_path = config.paths.game_dir / "45" / "23" / f"{_CONTENT_ID}.pkg"
+    media_dir = config.paths.media_dir / "45" / "23"
+    # Both versions share one canonical PKG path and one set of media files.
+    assert (result.packages, result.media, result.failed) == (1, 2, 0)
+    assert pkg_path.read_bytes() == b"pkg"
+    assert (media_dir / f"{_CONTENT_ID}_icon0.png").read_bytes() == b"png"
+    assert item.pkg_path.exists() is False
+    with SqliteUnitOfWork(config.paths.catalog_db_path) as uow:
+        items = uow.catalog.list_items()
+    assert {stored.pkg_path for stored in items} == {pkg_path}
+    assert {stored.pic0_path for stored in items} == {media_dir / f"{_CONTENT_ID}_pic0.png"}
+    stat = pkg_path.stat()
+    assert snapshot_store.changed_paths({str(pkg_path): (stat.st_size, stat.st_mtime_ns)}) == ()
+    assert (config.paths.cache_dir / "storage_layout").read_text("utf-8") == "sharded\n"
+
+    again = migrate()
+    assert (again.packages, again.media) == (0, 0)
+
+    back, _ = _migration(config, StorageLayout.FLAT)
+    assert back().packages == 1
+    assert item.pkg_path.read_bytes() == b"pkg"
+
+
+def test_migrate_storage_layout_given_media_move_error_when_migrated_then_counts_failure(
+    temp_workspace: Path,
+) -> None:
+    config = _config(temp_workspace)
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    item = _item(config, "01.00")
+    with SqliteUnitOfWork(config.paths.catalog_db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.catalog.upsert(item)
+        uow.commit()
+    # A file where the shard directory should go makes the media move fail.
+    _ = (config.paths.media_dir / "45").write_bytes(b"")
+    migrate, _ = _migration(config, StorageLayout.SHARDED)
+
+    result = migrate()
+
+    assert result.failed == 1
+    assert result.packages == 1
+    assert item.icon0_path is not None and item.icon0_path.read_bytes() == b"png"
+    assert (config.paths.cache_dir / "storage_layout").exists() is False
+    with SqliteUnitOfWork(config.paths.catalog_db_path) as uow:
+        assert [stored.icon0_path for stored in uow.catalog.list_items()] == [item.icon0_path]
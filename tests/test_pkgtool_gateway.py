@@ -67,6 +67,68 @@ def test_pkgtool_gateway_list_entries_given_output_when_called_then_parses(
     assert entries == {"PARAM_SFO": "11", "ICON0_PNG": "12"}
 
 
+def test_pkgtool_gateway_pkg_timeout_given_per_gb_when_called_then_scales_with_size(
+    temp_workspace: Path,
+) -> None:
+    pkg_path = temp_workspace / "large.pkg"
+    with pkg_path.open("wb") as handle:
+        _ = handle.truncate(3 * 1024**3 + 1)
+    scaled = PkgtoolGateway(
+        pkgtool_bin=temp_workspace / "pkgtool",
+        timeout_seconds=300,
+        media_dir=temp_workspace / "media",
+        timeout_seconds_per_gb=10,
+    )
+    fixed = PkgtoolGateway(
+        pkgtool_bin=temp_workspace / "pkgtool",
+        timeout_seconds=300,
+        media_dir=temp_workspace / "media",
+    )
+
+    assert scaled._pkg_timeout(pkg_path) == 331
+    assert scaled._pkg_timeout(temp_workspace / "missing.pkg") == 300
+    assert fixed._pkg_timeout(pkg_path) == 300
+
+
+def test_pkgtool_gateway_run_given_idle_priority_when_called_then_prefixes_nice_and_ionice(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(
+        "homebrew_cdn_m1_server.application.gateways.pkgtool_gateway.shutil.which",
+        lambda name: f"/usr/bin/{name}",
+    )
+    _, pkgtool_bin = _gateway(temp_workspace)
+    gateway = PkgtoolGateway(
+        pkgtool_bin=pkgtool_bin,
+        timeout_seconds=10,
+        media_dir=temp_workspace / "media",
+        idle_priority=True,
+    )
+    commands: list[list[str]] = []
+
+    def _fake_subprocess_run(command: list[str], **_: object) -> subprocess.CompletedProcess[str]:
+        commands.append(command)
+        return subprocess.CompletedProcess(args=command, returncode=0, stdout="", stderr="")
+
+    monkeypatch.setattr(subprocess, "run", _fake_subprocess_run)
+    _ = gateway._run("pkg_listentries", "/tmp/fake.pkg")
+
+    assert commands == [
+        [
+            "/usr/bin/ionice",
+            "-c",
+            "3",
+            "/usr/bin/nice",
+            "-n",
+            "19",
+            str(pkgtool_bin),
+            "pkg_listentries",
+            "/tmp/fake.pkg",
+        ]
+    ]
+
+
 def test_pkgtool_gateway_version_and_release_helpers_when_called_then_normalize_values() -> None:
     assert PkgtoolGateway._resolve_version({"VERSION": "01.00", "APP_VER": "01.02"}) == "01.02"
     assert PkgtoolGateway._resolve_version({"VERSION": "bad", "APP_VER": "zzz"}) == "zzz"
@@ -305,3 +367,114 @@ def test_pkgtool_gateway_probe_given_update_without_icon0_when_called_then_retur
     assert result.icon0_path is None
     assert result.pic0_path is None
     assert result.pic1_path is None
+
+
+def test_pkgtool_gateway_rederive_given_stored_sfo_when_called_then_parses_without_pkg(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    gateway, _ = _gateway(temp_workspace)
+    media_dir = temp_workspace / "data" / "share" / "pkg" / "media"
+    media_dir.mkdir(parents=True, exist_ok=True)
+    icon0 = media_dir / "UP0000-TEST00000_00-TEST000000000000_icon0.png"
+    _ = icon0.write_bytes(b"png")
+    commands: list[str] = []
+
+    def _fake_run(
+        command: str,
+        *args: str,
+        timeout: int | None = None,
+    ) -> subprocess.CompletedProcess[str]:
+        _ = timeout
+        commands.append(command)
+        assert Path(args[0]).read_bytes() == b"sfo-bytes"
+        stdout = "\n".join(
+            [
+                "CONTENT_ID : utf8 = UP0000-TEST00000_00-TEST000000000000",
+                "TITLE_ID : utf8 = CUSA00001",
+                "TITLE : utf8 = Test Game",
+                "CATEGORY : utf8 = gp",
+                "VERSION : utf8 = 01.05",
+            ]
+        )
+        return subprocess.CompletedProcess(
+            args=[command, *args], returncode=0, stdout=stdout, stderr=""
+        )
+
+    monkeypatch.setattr(gateway, "_run", _fake_run)
+
+    result = gateway.rederive(b"sfo-bytes")
+
+    assert commands == ["sfo_listentries"]
+    assert result.app_type == AppType.UPDATE
+    assert result.version == "01.05"
+    assert result.icon0_path == icon0
+    assert result.pic0_path is None
+    assert result.derive_version == PkgtoolGateway.DERIVE_VERSION
+    with pytest.raises(ValueError):
+        _ = gateway.rederive(b"")
+
+
+def test_pkgtool_gateway_probe_given_lazy_media_when_called_then_defers_pic_extraction(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    pkgtool_bin = temp_workspace / "bin" / "pkgtool"
+    pkgtool_bin.parent.mkdir(parents=True, exist_ok=True)
+    _ = pkgtool_bin.write_text("#!/bin/sh\n", encoding="utf-8")
+    media_dir = temp_workspace / "media"
+    gateway = PkgtoolGateway(
+        pkgtool_bin=pkgtool_bin,
+        timeout_seconds=10,
+        media_dir=media_dir,
+        lazy_media=True,
+    )
+    pkg_path = temp_workspace / "A.pkg"
+    _ = pkg_path.write_bytes(b"x")
+    extracted: list[str] = []
+
+    def _list_entries(_pkg: Path) -> dict[str, str]:
+        return {"PARAM_SFO": "10", "ICON0_PNG": "11", "PIC0_PNG": "12", "PIC1_PNG": "13"}
+
+    def _fake_run(
+        command: str,
+        *args: str,
+        timeout: int | None = None,
+    ) -> subprocess.CompletedProcess[str]:
+        _ = timeout
+        stdout = ""
+        if command == "pkg_extractentry":
+            extracted.append(args[1])
+            _ = Path(args[2]).write_bytes(b"data")
+        if command == "sfo_listentries":
+            stdout = "\n".join(
+                [
+                    "CONTENT_ID : utf8 = UP0000-TEST00000_00-TEST000000000000",
+                    "TITLE_ID : utf8 = CUSA00001",
+                    "TITLE : utf8 = Test Game",
+                    "CATEGORY : utf8 = gd",
+                    "VERSION : utf8 = 01.00",
+                ]
+            )
+        return subprocess.CompletedProcess(
+            args=[command, *args], returncode=0, stdout=stdout, stderr=""
+        )
+
+    monkeypatch.setattr(gateway, "_list_entries", _list_entries)
+    monkeypatch.setattr(gateway, "_run", _fake_run)
+
+    result = gateway.probe(pkg_path)
+
+    assert extracted == ["10", "11"]
+    assert result.icon0_path is not None and result.icon0_path.exists() is True
+    assert result.pic0_path == media_dir / "UP0000-TEST00000_00-TEST000000000000_pic0.png"
+    assert result.pic0_path.exists() is False
+    assert (result.pic0_entry, result.pic1_entry) == ("12", "13")
+
+    out_path = gateway.extract_entry(pkg_path, "12", result.pic0_path)
+    assert extracted == ["10", "11", "12"]
+    assert out_path.read_bytes() == b"data"
+    assert sorted(path.name for path in media_dir.iterdir()) == [
+        "UP0000-TEST00000_00-TEST000000000000_icon0.png",
+        "UP0000-TEST00000_00-TEST000000000000_pic0.png",
+    ]
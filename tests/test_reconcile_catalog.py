@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from collections.abc import Collection, Sequence
 import logging
 from pathlib import Path
 from types import TracebackType
@@ -11,36 +12,41 @@ from filelock import Timeout
 from homebrew_cdn_m1_server.application.repositories.filesystem_repository import (
     FilesystemRepository,
 )
-from homebrew_cdn_m1_server.application.repositories.json_snapshot_repository import (
-    JsonSnapshotRepository,
-)
 from homebrew_cdn_m1_server.application.repositories.settings_snapshot_repository import (
     SettingsSnapshotRepository,
 )
+from homebrew_cdn_m1_server.application.repositories.sqlite_snapshot_repository import (
+    SqliteSnapshotRepository,
+)
 from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import (
     SqliteUnitOfWork,
 )
 from homebrew_cdn_m1_server.domain.models.app_type import AppType
 from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
 from homebrew_cdn_m1_server.domain.models.content_id import ContentId
+from homebrew_cdn_m1_server.domain.models.ingest_priority import IngestPriority
 from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
 from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
-from homebrew_cdn_m1_server.domain.models.results import IngestResult
+from homebrew_cdn_m1_server.domain.models.results import (
+    IngestResult,
+    PlacedPackage,
+    ProbedPackage,
+    ProbeResult,
+    ScanDelta,
+)
+from homebrew_cdn_m1_server.domain.models.settings_change import SettingsChange
 from homebrew_cdn_m1_server.domain.workflows import reconcile_catalog as module
 from homebrew_cdn_m1_server.domain.workflows.export_outputs import ExportOutputs
 from homebrew_cdn_m1_server.domain.workflows.ingest_package import IngestPackage
-from homebrew_cdn_m1_server.domain.workflows.reconcile_catalog import (
-    ReconcileCatalog,
-    build_delta,
-)
+from homebrew_cdn_m1_server.domain.workflows.reconcile_catalog import ReconcileCatalog
 
 
-def _catalog_item(path: Path) -> CatalogItem:
+def _catalog_item(path: Path, app_type: AppType = AppType.GAME) -> CatalogItem:
     return CatalogItem(
         content_id=ContentId.parse("UP0000-TEST00000_00-TEST000000000000"),
         title_id="CUSA00001",
         title="Game",
-        app_type=AppType.GAME,
+        app_type=app_type,
         category="GD",
         version="01.00",
         pubtoolinfo="c_date=20250101",
@@ -58,16 +64,34 @@ def _catalog_item(path: Path) -> CatalogItem:
 
 
 class _FakePackageStore:
-    def __init__(self, snapshot: dict[Path, tuple[int, int]], failing: set[Path] | None = None) -> None:
+    def __init__(
+        self,
+        snapshot: dict[Path, tuple[int, int]],
+        failing: set[Path] | None = None,
+        unreadable: list[Path] | None = None,
+    ) -> None:
         self._snapshot: dict[Path, tuple[int, int]] = snapshot
         self._failing: set[Path] = failing or set()
+        self._unreadable: list[Path] = unreadable if unreadable is not None else []
+
+    def unreadable_roots(self) -> tuple[Path, ...]:
+        return tuple(self._unreadable)
 
-    def scan_pkg_files(self) -> list[Path]:
-        return sorted(self._snapshot.keys())
+    def scan_pkg_stats(self) -> dict[str, tuple[int, int]]:
+        return {
+            str(path): meta
+            for path, meta in sorted(self._snapshot.items())
+            if path not in self._failing
+        }
+
+    def managed_pkg_path(self, pkg_path: Path) -> Path | None:
+        if pkg_path.suffix != ".pkg" or "media" in pkg_path.parts:
+            return None
+        return pkg_path
 
     def stat(self, pkg_path: Path) -> tuple[int, int]:
-        if pkg_path in self._failing:
-            raise OSError("stat failed")
+        if pkg_path not in self._snapshot or pkg_path in self._failing:
+            raise FileNotFoundError(pkg_path)
         return self._snapshot[pkg_path]
 
 
@@ -75,43 +99,112 @@ class _FakeSnapshotRepository:
     def __init__(self, previous: dict[str, tuple[int, int]]) -> None:
         self._previous: dict[str, tuple[int, int]] = previous
         self.saved: dict[str, tuple[int, int]] | None = None
+        self.upserted: dict[str, tuple[int, int]] = {}
+        self.deleted: set[str] = set()
+        self.reprobe: set[str] = set()
+
+    def build_delta(self, current: dict[str, tuple[int, int]]) -> ScanDelta:
+        previous = self._previous
+        return ScanDelta(
+            added=tuple(sorted(set(current) - set(previous))),
+            updated=tuple(
+                sorted(
+                    path
+                    for path in set(previous) & set(current)
+                    if previous[path] != current[path]
+                )
+            ),
+            removed=tuple(sorted(set(previous) - set(current))),
+        )
 
     def load(self) -> dict[str, tuple[int, int]]:
         return dict(self._previous)
 
+    def changed_paths(self, current: dict[str, tuple[int, int]]) -> tuple[str, ...]:
+        return tuple(
+            sorted(path for path, meta in current.items() if self._previous.get(path) != meta)
+        )
+
+    def upsert(self, snapshot: dict[str, tuple[int, int]]) -> None:
+        self.upserted.update(snapshot)
+
+    def delete(self, pkg_paths: set[str]) -> None:
+        self.deleted.update(pkg_paths)
+
     def save(self, snapshot: dict[str, tuple[int, int]]) -> None:
         self.saved = dict(snapshot)
 
+    def queue_reprobe(self, pkg_paths: list[str]) -> None:
+        self.reprobe = set(pkg_paths)
+
+    def reprobe_queue(self) -> tuple[str, ...]:
+        return tuple(sorted(self.reprobe))
+
+    def dequeue_reprobe(self, pkg_paths: set[str]) -> None:
+        self.reprobe -= set(pkg_paths)
+
 
 class _FakeSettingsSnapshotRepository:
-    def __init__(self, previous_hash: str, current_hash: str) -> None:
-        self._previous_hash = previous_hash
-        self._current_hash = current_hash
-        self.saved_hash: str | None = None
+    def __init__(self, previous: dict[str, str], current: dict[str, str]) -> None:
+        self._previous = previous
+        self._current = current
+        self.saved: dict[str, str] | None = None
 
-    def load(self) -> str:
-        return self._previous_hash
+    def load(self) -> dict[str, str]:
+        return dict(self._previous)
+
+    def current_hashes(self) -> dict[str, str]:
+        return dict(self._current)
 
-    def current_hash(self) -> str:
-        return self._current_hash
+    def classify(self, previous: dict[str, str], current: dict[str, str]) -> SettingsChange:
+        return SettingsSnapshotRepository.classify(previous, current)
 
-    def save(self, hash_value: str) -> None:
-        self.saved_hash = str(hash_value)
+    def save(self, hashes: dict[str, str]) -> None:
+        self.saved = dict(hashes)
 
 
 class _FakeCatalog:
     def __init__(self, removed: int) -> None:
         self._removed: int = removed
         self.received_paths: set[str] | None = None
+        self.kept_roots: tuple[Path, ...] = tuple()
+        self.items: list[CatalogItem] = []
+
+    def get_by_pkg_paths(self, pkg_paths: set[str]) -> list[CatalogItem]:
+        return [item for item in self.items if str(item.pkg_path) in pkg_paths]
 
-    def delete_by_pkg_paths_not_in(self, existing_pkg_paths: set[str]) -> int:
+    def delete_by_pkg_paths(self, pkg_paths: set[str]) -> int:
+        kept = [item for item in self.items if str(item.pkg_path) not in pkg_paths]
+        removed = len(self.items) - len(kept)
+        self.items = kept
+        return removed
+
+    def delete_by_pkg_paths_not_in(
+        self, existing_pkg_paths: set[str], keep_roots: Sequence[Path] = ()
+    ) -> int:
         self.received_paths = set(existing_pkg_paths)
+        self.kept_roots = tuple(keep_roots)
         return self._removed
 
 
+class _FakeProbeCache:
+    def __init__(self) -> None:
+        self.pruned: int = 0
+        self.cleared: int = 0
+
+    def delete_unreferenced(self) -> int:
+        self.pruned += 1
+        return 0
+
+    def clear(self) -> int:
+        self.cleared += 1
+        return 0
+
+
 class _FakeUow:
     def __init__(self, removed: int) -> None:
         self.catalog: _FakeCatalog = _FakeCatalog(removed)
+        self.probe_cache: _FakeProbeCache = _FakeProbeCache()
         self.committed: bool = False
 
     def __enter__(self) -> "_FakeUow":
@@ -133,9 +226,15 @@ class _FakeExportOutputs:
     def __init__(self, exported: tuple[Path, ...]) -> None:
         self._exported: tuple[Path, ...] = exported
         self.calls: list[tuple[OutputTarget, ...]] = []
+        self.app_types: list[Collection[AppType] | None] = []
 
-    def __call__(self, targets: tuple[OutputTarget, ...]) -> tuple[Path, ...]:
+    def __call__(
+        self,
+        targets: tuple[OutputTarget, ...],
+        app_types: Collection[AppType] | None = None,
+    ) -> tuple[Path, ...]:
         self.calls.append(targets)
+        self.app_types.append(app_types)
         return self._exported
 
 
@@ -143,6 +242,7 @@ class _FakeIngest:
     def __init__(self, failing_paths: set[Path] | None = None) -> None:
         self.failing_paths: set[Path] = failing_paths or set()
         self.calls: list[Path] = []
+        self.batches: list[int] = []
 
     def __call__(self, path: Path) -> IngestResult:
         self.calls.append(path)
@@ -150,6 +250,18 @@ class _FakeIngest:
             raise RuntimeError("worker failure")
         return IngestResult(item=_catalog_item(path), created=True, updated=False)
 
+    def probe_package(self, path: Path) -> ProbedPackage | None:
+        self.calls.append(path)
+        if path in self.failing_paths:
+            raise RuntimeError("worker failure")
+        return ProbedPackage(pkg_path=path, source=None, probe=cast(ProbeResult, object()))
+
+    def place_package(self, probed: ProbedPackage) -> PlacedPackage | None:
+        return PlacedPackage(item=_catalog_item(probed.pkg_path), probe=probed.probe)
+
+    def write_packages(self, placed: Sequence[PlacedPackage]) -> None:
+        self.batches.append(len(placed))
+
 
 class _NoopLock:
     def __init__(self, _path: str) -> None:
@@ -198,6 +310,11 @@ def _build_reconcile(
     removed: int = 0,
     worker_count: int = 1,
     failing_stats: set[Path] | None = None,
+    file_stable_seconds: float = 0.0,
+    cycle_max_items: int = 0,
+    export_every_items: int = 0,
+    priority: IngestPriority = IngestPriority.PATH,
+    unreadable_roots: list[Path] | None = None,
 ) -> tuple[
     ReconcileCatalog,
     _FakeSnapshotRepository,
@@ -205,11 +322,13 @@ def _build_reconcile(
     _FakeExportOutputs,
     _FakeUow,
 ]:
-    package_store = _FakePackageStore(package_snapshot, failing=failing_stats)
+    package_store = _FakePackageStore(
+        package_snapshot, failing=failing_stats, unreadable=unreadable_roots
+    )
     snapshot_store = _FakeSnapshotRepository(previous_snapshot)
     settings_snapshot_store = _FakeSettingsSnapshotRepository(
-        previous_hash="hash-a",
-        current_hash="hash-a",
+        previous={"export": "export-a", "probe": "probe-a"},
+        current={"export": "export-a", "probe": "probe-a"},
     )
     exported = (
         temp_workspace / "data" / "share" / "hb-store" / "store.db",
@@ -221,7 +340,7 @@ def _build_reconcile(
     reconcile = ReconcileCatalog(
         uow_factory=lambda: cast(SqliteUnitOfWork, cast(object, uow)),
         package_store=cast(FilesystemRepository, cast(object, package_store)),
-        snapshot_store=cast(JsonSnapshotRepository, cast(object, snapshot_store)),
+        snapshot_store=cast(SqliteSnapshotRepository, cast(object, snapshot_store)),
         settings_snapshot_store=cast(
             SettingsSnapshotRepository, cast(object, settings_snapshot_store)
         ),
@@ -232,22 +351,14 @@ def _build_reconcile(
         logger=logging.getLogger("test"),
         worker_count=worker_count,
         output_targets=(OutputTarget.HB_STORE, OutputTarget.FPKGI),
+        file_stable_seconds=file_stable_seconds,
+        cycle_max_items=cycle_max_items,
+        export_every_items=export_every_items,
+        priority=priority,
     )
     return reconcile, snapshot_store, settings_snapshot_store, export_outputs, uow
 
 
-def test_build_delta_given_previous_and_current_when_called_then_returns_expected_sets() -> None:
-    previous = {"a.pkg": (1, 10), "b.pkg": (2, 20)}
-    current = {"b.pkg": (2, 21), "c.pkg": (3, 30)}
-
-    delta = build_delta(previous, current)
-
-    assert delta.added == ("c.pkg",)
-    assert delta.updated == ("b.pkg",)
-    assert delta.removed == ("a.pkg",)
-    assert delta.has_changes is True
-
-
 def test_reconcile_catalog_given_lock_timeout_when_called_then_skips(
     temp_workspace: Path,
     monkeypatch: pytest.MonkeyPatch,
@@ -267,6 +378,7 @@ def test_reconcile_catalog_given_lock_timeout_when_called_then_skips(
     assert result.removed == 0
     assert result.failed == 0
     assert result.exported_files == tuple()
+    assert result.skipped is True
     assert export_outputs.calls == []
 
 
@@ -293,7 +405,7 @@ def test_reconcile_catalog_given_stat_failure_when_called_then_ignores_bad_entry
     assert result.added == 1
     assert result.failed == 0
     assert snapshot_store.saved == {str(ok): (1, 2)}
-    assert settings_snapshot_store.saved_hash == "hash-a"
+    assert settings_snapshot_store.saved == {"export": "export-a", "probe": "probe-a"}
 
 
 def test_reconcile_catalog_given_worker_failure_when_called_then_counts_failed(
@@ -349,9 +461,32 @@ def test_reconcile_catalog_given_changes_when_called_then_reconciles_and_exports
     assert len(result.exported_files) == 2
     assert len(export_outputs.calls) == 1
     assert uow.committed is True
+    assert uow.probe_cache.pruned == 1
+
+
+def test_reconcile_catalog_given_idle_cycle_when_called_then_exports_only_when_forced(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(module, "FileLock", _NoopLock)
+    pkg = temp_workspace / "A.pkg"
+
+    reconcile, _, _, export_outputs, _ = _build_reconcile(
+        temp_workspace,
+        package_snapshot={pkg: (1, 100)},
+        previous_snapshot={str(pkg): (1, 100)},
+        ingest=_FakeIngest(),
+    )
+
+    idle = reconcile()
+    forced = reconcile(force_export=True)
+
+    assert idle.exported_files == tuple()
+    assert len(forced.exported_files) == 2
+    assert len(export_outputs.calls) == 1
 
 
-def test_reconcile_catalog_given_settings_hash_changed_when_called_then_reprocesses_all_pkgs(
+def test_reconcile_catalog_given_probe_inputs_changed_when_called_then_reprocesses_all_pkgs(
     temp_workspace: Path,
     monkeypatch: pytest.MonkeyPatch,
 ) -> None:
@@ -367,17 +502,234 @@ def test_reconcile_catalog_given_settings_hash_changed_when_called_then_reproces
         str(p2): (2, 20),
     }
     ingest = _FakeIngest()
-    reconcile, _, settings_snapshot_store, _, _ = _build_reconcile(
+    reconcile, _, settings_snapshot_store, _, uow = _build_reconcile(
         temp_workspace,
         package_snapshot={p1: (1, 10), p2: (2, 20)},
         previous_snapshot=previous,
         ingest=ingest,
     )
-    settings_snapshot_store._previous_hash = "hash-old"
-    settings_snapshot_store._current_hash = "hash-new"
+    settings_snapshot_store._current = {"export": "export-a", "probe": "probe-new"}
 
     result = reconcile()
 
     assert result.added == 2
     assert result.failed == 0
     assert set(ingest.calls) == {p1, p2}
+    assert uow.probe_cache.cleared == 1
+
+
+def test_reconcile_catalog_given_probe_inputs_changed_and_cycle_budget_when_called_then_reprobes_across_cycles(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(module, "FileLock", _NoopLock)
+    paths = [temp_workspace / f"{name}.pkg" for name in ("A", "B", "C")]
+    stats = {path: (1, 10) for path in paths}
+    ingest = _FakeIngest()
+    reconcile, snapshot_store, settings_snapshot_store, _, uow = _build_reconcile(
+        temp_workspace,
+        package_snapshot=stats,
+        previous_snapshot={str(path): meta for path, meta in stats.items()},
+        ingest=ingest,
+        cycle_max_items=1,
+    )
+    settings_snapshot_store._current = {"export": "export-a", "probe": "probe-new"}
+
+    results = []
+    for _ in range(4):
+        results.append(reconcile())
+        assert settings_snapshot_store.saved is not None
+        settings_snapshot_store._previous = settings_snapshot_store.saved
+
+    assert ingest.calls == paths
+    assert [result.pending for result in results] == [2, 1, 0, 0]
+    assert snapshot_store.reprobe == set()
+    assert uow.probe_cache.cleared == 1
+
+
+def test_reconcile_catalog_given_extra_root_unmounted_when_called_then_keeps_its_packages(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(module, "FileLock", _NoopLock)
+    main_pkg = temp_workspace / "pkg" / "game" / "A.pkg"
+    extra_root = temp_workspace / "vol2"
+    extra_pkg = extra_root / "game" / "B.pkg"
+    package_snapshot = {main_pkg: (1, 10), extra_pkg: (2, 20)}
+    unreadable: list[Path] = []
+    reconcile, snapshot_store, _, export_outputs, uow = _build_reconcile(
+        temp_workspace,
+        package_snapshot=package_snapshot,
+        previous_snapshot={str(main_pkg): (1, 10), str(extra_pkg): (2, 20)},
+        ingest=_FakeIngest(),
+        unreadable_roots=unreadable,
+    )
+
+    first = reconcile()
+    assert first.has_changes is False
+    assert uow.catalog.kept_roots == tuple()
+
+    # The extra volume is unmounted between cycles, mid re-probe.
+    del package_snapshot[extra_pkg]
+    unreadable.append(extra_root)
+    snapshot_store.reprobe = {str(main_pkg), str(extra_pkg)}
+    second = reconcile()
+
+    assert second.added == 1
+    assert uow.catalog.kept_roots == (extra_root,)
+    assert uow.catalog.received_paths == {str(main_pkg)}
+    assert snapshot_store.saved == {str(main_pkg): (1, 10), str(extra_pkg): (2, 20)}
+    assert snapshot_store.reprobe == {str(extra_pkg)}
+    assert len(export_outputs.calls) == 1
+
+
+def test_reconcile_catalog_given_export_settings_changed_when_called_then_only_reexports(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(module, "FileLock", _NoopLock)
+    p1 = temp_workspace / "A.pkg"
+    ingest = _FakeIngest()
+    reconcile, _, settings_snapshot_store, export_outputs, uow = _build_reconcile(
+        temp_workspace,
+        package_snapshot={p1: (1, 10)},
+        previous_snapshot={str(p1): (1, 10)},
+        ingest=ingest,
+    )
+    settings_snapshot_store._current = {"export": "export-new", "probe": "probe-a"}
+
+    result = reconcile()
+
+    assert result.added == 0
+    assert ingest.calls == []
+    assert uow.probe_cache.cleared == 0
+    assert len(export_outputs.calls) == 1
+    assert settings_snapshot_store.saved == {"export": "export-new", "probe": "probe-a"}
+
+
+
+def test_reconcile_catalog_given_recently_modified_pkg_when_called_then_defers_it(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(module, "FileLock", _NoopLock)
+    monkeypatch.setattr(module.time, "time_ns", lambda: 1_000 * 1_000_000_000)
+    settled = temp_workspace / "settled.pkg"
+    copying = temp_workspace / "copying.pkg"
+    ingest = _FakeIngest()
+    reconcile, snapshot_store, _, _, _ = _build_reconcile(
+        temp_workspace,
+        package_snapshot={
+            settled: (1, 900 * 1_000_000_000),
+            copying: (2, 995 * 1_000_000_000),
+        },
+        previous_snapshot={},
+        ingest=ingest,
+        file_stable_seconds=15,
+    )
+
+    result = reconcile()
+
+    assert result.added == 1
+    assert result.deferred == 1
+    assert ingest.calls == [settled]
+    assert snapshot_store.saved == {str(settled): (1, 900 * 1_000_000_000)}
+
+
+def test_reconcile_catalog_given_cycle_budget_when_called_then_checkpoints_and_carries_over(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(module, "FileLock", _NoopLock)
+    large = temp_workspace / "a-large.pkg"
+    small = temp_workspace / "b-small.pkg"
+    medium = temp_workspace / "c-medium.pkg"
+    ingest = _FakeIngest()
+    reconcile, snapshot_store, _, export_outputs, _ = _build_reconcile(
+        temp_workspace,
+        package_snapshot={large: (300, 10), small: (100, 20), medium: (200, 30)},
+        previous_snapshot={},
+        ingest=ingest,
+        cycle_max_items=2,
+        export_every_items=1,
+        priority=IngestPriority.SMALLEST_FIRST,
+    )
+
+    result = reconcile()
+
+    assert ingest.calls == [small, medium]
+    assert result.added == 2
+    assert result.pending == 1
+    assert export_outputs.app_types == [{AppType.GAME}, None]
+    assert snapshot_store.saved == {str(small): (100, 20), str(medium): (200, 30)}
+
+
+def test_reconcile_catalog_given_target_paths_when_reconcile_paths_then_touches_only_them(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(module, "FileLock", _NoopLock)
+    new = temp_workspace / "new.pkg"
+    same = temp_workspace / "same.pkg"
+    gone = temp_workspace / "gone.pkg"
+    other = temp_workspace / "other.pkg"
+    ingest = _FakeIngest()
+    reconcile, snapshot_store, _, export_outputs, uow = _build_reconcile(
+        temp_workspace,
+        package_snapshot={new: (1, 100), same: (2, 200), other: (4, 400)},
+        previous_snapshot={str(same): (2, 200), str(gone): (3, 300), str(other): (4, 1)},
+        ingest=ingest,
+    )
+    uow.catalog.items = [_catalog_item(same), _catalog_item(gone, AppType.DLC)]
+
+    result = reconcile.reconcile_paths((new, same, gone, temp_workspace / "media" / "x.pkg"))
+
+    assert ingest.calls == [new]
+    assert result.added == 1
+    assert result.removed == 1
+    assert [item.pkg_path for item in result.items] == [new, same]
+    assert export_outputs.app_types == [{AppType.GAME, AppType.DLC}]
+    assert snapshot_store.deleted == {str(gone)}
+    assert snapshot_store.upserted == {str(new): (10, 20)}
+    assert snapshot_store.saved is None
+
+
+def test_reconcile_catalog_given_unchanged_target_paths_when_reconcile_paths_then_skips_export(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(module, "FileLock", _NoopLock)
+    same = temp_workspace / "same.pkg"
+    ingest = _FakeIngest()
+    reconcile, _, _, export_outputs, uow = _build_reconcile(
+        temp_workspace,
+        package_snapshot={same: (2, 200)},
+        previous_snapshot={str(same): (2, 200)},
+        ingest=ingest,
+    )
+    uow.catalog.items = [_catalog_item(same)]
+
+    result = reconcile.reconcile_paths((same,))
+
+    assert ingest.calls == []
+    assert export_outputs.calls == []
+    assert [item.pkg_path for item in result.items] == [same]
+
+
+def test_reconcile_catalog_given_lock_timeout_when_reconcile_paths_then_skips(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(module, "FileLock", _TimeoutLock)
+    ingest = _FakeIngest()
+    reconcile, _, _, _, _ = _build_reconcile(
+        temp_workspace,
+        package_snapshot={},
+        previous_snapshot={},
+        ingest=ingest,
+    )
+
+    result = reconcile.reconcile_paths((temp_workspace / "a.pkg",), lock_timeout_seconds=5.0)
+
+    assert result.skipped is True
+    assert ingest.calls == []
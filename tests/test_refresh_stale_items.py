@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+from collections.abc import Collection
+from contextlib import closing
+from dataclasses import replace
+import logging
+import sqlite3
+from pathlib import Path
+from typing import cast
+
+from homebrew_cdn_m1_server.application.gateways.pkgtool_gateway import PkgtoolGateway
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import (
+    SqliteUnitOfWork,
+)
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.content_id import ContentId
+from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
+from homebrew_cdn_m1_server.domain.models.results import ProbeResult
+from homebrew_cdn_m1_server.domain.workflows.export_outputs import ExportOutputs
+from homebrew_cdn_m1_server.domain.workflows.refresh_stale_items import RefreshStaleItems
+
+_CONTENT_ID = "UP0000-TEST00000_00-TEST000000000000"
+
+
+def _item(path: Path) -> CatalogItem:
+    return CatalogItem(
+        content_id=ContentId.parse(_CONTENT_ID),
+        title_id="CUSA00001",
+        title="Old Title",
+        app_type=AppType.GAME,
+        category="gd",
+        version="01.00",
+        pubtoolinfo="c_date=20250101",
+        system_ver="09.00",
+        release_date="2025-01-01",
+        pkg_path=path,
+        pkg_size=123,
+        pkg_mtime_ns=456,
+        pkg_fingerprint="fp",
+        icon0_path=None,
+        pic0_path=None,
+        pic1_path=None,
+        sfo=ParamSfoSnapshot(fields={"TITLE": "Old Title"}, raw=b"sfo", hash="h"),
+        probe_version=PkgtoolGateway.PROBE_VERSION,
+        derive_version=0,
+    )
+
+
+def _probe() -> ProbeResult:
+    return ProbeResult(
+        content_id=ContentId.parse(_CONTENT_ID),
+        title_id="CUSA00001",
+        title="New Title",
+        category="gd",
+        version="01.00",
+        pubtoolinfo="c_date=20250101",
+        system_ver="09.00",
+        app_type=AppType.GAME,
+        release_date="2025-01-01",
+        sfo_fields={"TITLE": "New Title"},
+        sfo_raw=b"sfo",
+        sfo_hash="h2",
+        icon0_path=None,
+        pic0_path=None,
+        pic1_path=None,
+        probe_version=PkgtoolGateway.PROBE_VERSION,
+        derive_version=PkgtoolGateway.DERIVE_VERSION,
+    )
+
+
+class _FakeProbe:
+    def __init__(self, probe: ProbeResult, error: Exception | None = None) -> None:
+        self.result: ProbeResult = probe
+        self.error: Exception | None = error
+        self.calls: int = 0
+        self.probed: list[Path] = []
+
+    def rederive(self, sfo_raw: bytes) -> ProbeResult:
+        _ = sfo_raw
+        self.calls += 1
+        return self.result
+
+    def probe(self, pkg_path: Path) -> ProbeResult:
+        self.probed.append(pkg_path)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _FakeExportOutputs:
+    def __init__(self) -> None:
+        self.app_types: list[Collection[AppType] | None] = []
+
+    def __call__(
+        self,
+        targets: tuple[OutputTarget, ...],
+        app_types: Collection[AppType] | None = None,
+    ) -> tuple[Path, ...]:
+        _ = targets
+        self.app_types.append(app_types)
+        return tuple()
+
+
+def _build(
+    temp_workspace: Path,
+    items: list[CatalogItem],
+    probe: _FakeProbe,
+    items_per_run: int = 10,
+    lazy_media: bool = False,
+) -> tuple[RefreshStaleItems, _FakeExportOutputs, Path]:
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        for item in items:
+            uow.catalog.upsert(item)
+        uow.commit()
+
+    export_outputs = _FakeExportOutputs()
+    refresh = RefreshStaleItems(
+        uow_factory=lambda: SqliteUnitOfWork(db_path),
+        package_probe=cast(PkgtoolGateway, cast(object, probe)),
+        export_outputs=cast(ExportOutputs, cast(object, export_outputs)),
+        output_targets=(OutputTarget.HB_STORE,),
+        lock_path=temp_workspace / "data" / "internal" / "catalog" / "reconcile.lock",
+        logger=logging.getLogger("test"),
+        items_per_run=items_per_run,
+        lazy_media=lazy_media,
+    )
+    return refresh, export_outputs, db_path
+
+
+def test_refresh_stale_items_given_derive_outdated_when_called_then_rederives_without_probe(
+    temp_workspace: Path,
+) -> None:
+    pkg_path = temp_workspace / "game" / "A.pkg"
+    probe = _FakeProbe(_probe())
+    refresh, export_outputs, db_path = _build(temp_workspace, [_item(pkg_path)], probe)
+
+    result = refresh()
+
+    assert (result.rederived, result.reprobed, result.removed) == (1, 0, 0)
+    assert probe.calls == 1
+    assert probe.probed == []
+    assert export_outputs.app_types == [{AppType.GAME}]
+    with SqliteUnitOfWork(db_path) as uow:
+        items = uow.catalog.list_items()
+    assert [item.title for item in items] == ["New Title"]
+    assert items[0].derive_version == PkgtoolGateway.DERIVE_VERSION
+    assert refresh().rederived == 0
+
+
+def test_refresh_stale_items_given_identity_changed_when_called_then_reprobes_in_place(
+    temp_workspace: Path,
+) -> None:
+    pkg_path = temp_workspace / "game" / "A.pkg"
+    pkg_path.parent.mkdir(parents=True, exist_ok=True)
+    _ = pkg_path.write_bytes(b"pkg")
+    probe = _FakeProbe(replace(_probe(), app_type=AppType.UPDATE))
+    refresh, export_outputs, db_path = _build(temp_workspace, [_item(pkg_path)], probe)
+
+    result = refresh()
+
+    assert (result.rederived, result.reprobed, result.removed) == (0, 1, 0)
+    assert probe.probed == [pkg_path]
+    assert export_outputs.app_types == [{AppType.GAME, AppType.UPDATE}]
+    assert pkg_path.read_bytes() == b"pkg"
+    with SqliteUnitOfWork(db_path) as uow:
+        items = uow.catalog.list_items()
+        cached = uow.probe_cache.get_result("fp")
+    assert [(item.app_type, item.pkg_path) for item in items] == [(AppType.UPDATE, pkg_path)]
+    assert items[0].derive_version == PkgtoolGateway.DERIVE_VERSION
+    assert cached is not None and cached.app_type is AppType.UPDATE
+
+
+def test_refresh_stale_items_given_probe_fails_when_called_then_keeps_row_for_retry(
+    temp_workspace: Path,
+) -> None:
+    failing = temp_workspace / "game" / "A.pkg"
+    other = temp_workspace / "game" / "B.pkg"
+    failing.parent.mkdir(parents=True, exist_ok=True)
+    _ = failing.write_bytes(b"pkg")
+    _ = other.write_bytes(b"pkg")
+    probe = _FakeProbe(_probe(), error=TimeoutError("pkgtool timed out"))
+    refresh, _, db_path = _build(
+        temp_workspace,
+        [
+            replace(_item(failing), probe_version=0),
+            replace(_item(other), version="01.01", probe_version=0),
+        ],
+        probe,
+        items_per_run=1,
+    )
+    # Both rows were ingested long before the refresh runs.
+    with closing(sqlite3.connect(db_path)) as conn:
+        _ = conn.execute("UPDATE catalog_items SET updated_at = '2025-01-01T00:00:00+00:00'")
+        conn.commit()
+
+    result = refresh()
+    _ = refresh()
+
+    assert (result.rederived, result.reprobed, result.removed) == (0, 0, 0)
+    # The failed row goes to the back of the queue, so the next run moves on.
+    assert probe.probed == [failing, other]
+    assert failing.exists()
+    with SqliteUnitOfWork(db_path) as uow:
+        items = uow.catalog.list_items()
+    assert [(item.pkg_path, item.probe_version) for item in items] == [(failing, 0), (other, 0)]
+
+
+def test_refresh_stale_items_given_probe_outdated_and_pkg_missing_when_called_then_removes_row(
+    temp_workspace: Path,
+) -> None:
+    probe = _FakeProbe(_probe())
+    refresh, _, db_path = _build(
+        temp_workspace,
+        [replace(_item(temp_workspace / "missing.pkg"), probe_version=0)],
+        probe,
+    )
+
+    result = refresh()
+
+    assert (result.rederived, result.reprobed, result.removed) == (0, 0, 1)
+    assert probe.calls == 0
+    assert probe.probed == []
+    with SqliteUnitOfWork(db_path) as uow:
+        assert uow.catalog.list_items() == []
+
+
+def test_refresh_stale_items_given_zero_budget_when_called_then_noop(
+    temp_workspace: Path,
+) -> None:
+    probe = _FakeProbe(_probe())
+    refresh, export_outputs, _ = _build(
+        temp_workspace,
+        [_item(temp_workspace / "A.pkg")],
+        probe,
+        items_per_run=0,
+    )
+
+    result = refresh()
+
+    assert (result.rederived, result.reprobed, result.removed) == (0, 0, 0)
+    assert probe.calls == 0
+    assert export_outputs.app_types == []
+
+
+def test_refresh_stale_items_given_deferred_media_when_lazy_mode_off_then_reprobes_to_extract(
+    temp_workspace: Path,
+) -> None:
+    pkg_path = temp_workspace / "game" / "A.pkg"
+    pkg_path.parent.mkdir(parents=True, exist_ok=True)
+    _ = pkg_path.write_bytes(b"pkg")
+    item = replace(
+        _item(pkg_path),
+        pic0_path=temp_workspace / "media" / "pic0.png",
+        pic0_entry="12",
+        derive_version=PkgtoolGateway.DERIVE_VERSION,
+    )
+    probe = _FakeProbe(replace(_probe(), pic0_path=temp_workspace / "media" / "pic0.png"))
+
+    lazy, _, _ = _build(temp_workspace, [item], probe, lazy_media=True)
+    assert lazy().reprobed == 0
+
+    refresh, _, db_path = _build(temp_workspace, [item], probe)
+    result = refresh()
+
+    assert (result.rederived, result.reprobed) == (0, 1)
+    assert probe.calls == 0
+    assert probe.probed == [pkg_path]
+    with SqliteUnitOfWork(db_path) as uow:
+        assert [row.pic0_entry for row in uow.catalog.list_items()] == [None]
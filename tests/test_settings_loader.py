@@ -3,7 +3,11 @@ from __future__ import annotations
 from pathlib import Path
 
 from homebrew_cdn_m1_server.config.settings_loader import SettingsLoader
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.download_counting import DownloadCounting
+from homebrew_cdn_m1_server.domain.models.ingest_priority import IngestPriority
 from homebrew_cdn_m1_server.domain.models.output_target import OutputTarget
+from homebrew_cdn_m1_server.domain.models.storage_layout import StorageLayout
 
 
 def test_settings_loader_given_settings_ini_when_load_then_parses_expected_fields(
@@ -21,6 +25,29 @@ def test_settings_loader_given_settings_ini_when_load_then_parses_expected_field
                 "RECONCILE_CRON_EXPRESSION=*/2 * * * *",
                 "EXPORT_TARGETS=hb-store,fpkgi,invalid",
                 "PKGTOOL_TIMEOUT_SECONDS=900",
+                "RECONCILE_WATCH_ENABLED=false",
+                "RECONCILE_FILE_STABLE_SECONDS=30",
+                "PKGTOOL_REFRESH_ITEMS_PER_MINUTE=0",
+                "RECONCILE_CYCLE_MAX_SECONDS=600",
+                "RECONCILE_EXPORT_EVERY_ITEMS=25",
+                "RECONCILE_PRIORITY=Newest-First",
+                "RECONCILE_SMALL_PKG_MAX_MB=512",
+                "PKGTOOL_TIMEOUT_SECONDS_PER_GB=15",
+                "IO_BUDGET_MB_PER_SECOND=80",
+                "IO_BUDGET_OFF_PEAK_HOURS= 22-07 ",
+                "PKGTOOL_IDLE_PRIORITY=true",
+                "PKGTOOL_LAZY_MEDIA=true",
+                "PKG_HASH_BLAKE2=true",
+                "PKG_HASH_VERIFY_DAYS=30",
+                "MEDIA_DERIVATIVES_ENABLED=true",
+                "MEDIA_DERIVATIVES_WORKERS=3",
+                "STORAGE_LAYOUT=Sharded",
+                "STORAGE_VERSIONED_PATHS=true",
+                "PKG_EXTRA_ROOTS=/mnt/disk2, relative, /mnt/disk3",
+                "PKG_ROOT_PINS=game:/mnt/disk2,bogus:/mnt/disk3",
+                "PAGE_CACHE_WARM_MB=2048",
+                "DOWNLOAD_COUNTING=Access-Log",
+                "DOWNLOAD_DEDUP_SECONDS=300",
             ]
         ),
         encoding="utf-8",
@@ -36,6 +63,29 @@ def test_settings_loader_given_settings_ini_when_load_then_parses_expected_field
     assert config.user.reconcile_cron_expression == "*/2 * * * *"
     assert config.user.output_targets == (OutputTarget.HB_STORE, OutputTarget.FPKGI)
     assert config.user.pkgtool_timeout_seconds == 900
+    assert config.user.reconcile_watch_enabled is False
+    assert config.reconcile_file_stable_seconds == 30
+    assert config.user.pkgtool_refresh_items_per_minute == 0
+    assert config.user.reconcile_cycle_max_seconds == 600
+    assert config.user.reconcile_export_every_items == 25
+    assert config.user.reconcile_priority == IngestPriority.NEWEST_FIRST
+    assert config.user.reconcile_small_pkg_max_mb == 512
+    assert config.user.pkgtool_timeout_seconds_per_gb == 15
+    assert config.user.io_budget_mb_per_second == 80
+    assert config.user.io_budget_off_peak_hours == "22-7"
+    assert config.user.pkgtool_idle_priority is True
+    assert config.user.pkgtool_lazy_media is True
+    assert config.user.pkg_hash_blake2 is True
+    assert config.user.pkg_hash_verify_days == 30
+    assert config.user.media_derivatives_enabled is True
+    assert config.user.media_derivatives_workers == 3
+    assert config.user.storage_layout == StorageLayout.SHARDED
+    assert config.user.storage_versioned_paths is True
+    assert config.user.pkg_extra_roots == (Path("/mnt/disk2"), Path("/mnt/disk3"))
+    assert config.user.pkg_root_pins == {AppType.GAME: Path("/mnt/disk2")}
+    assert config.user.page_cache_warm_mb == 2048
+    assert config.user.download_counting is DownloadCounting.ACCESS_LOG
+    assert config.user.download_dedup_seconds == 300
     assert str(config.paths.catalog_db_path).endswith("data/internal/catalog/catalog.db")
     assert str(config.paths.snapshot_path).endswith("data/internal/catalog/pkgs-snapshot.json")
     assert str(config.paths.settings_snapshot_path).endswith(
@@ -118,3 +168,14 @@ def test_settings_loader_given_blank_values_when_load_then_maps_them_to_none(
     assert config.user.reconcile_cron_expression is None
     assert config.user.output_targets is None
     assert config.user.pkgtool_timeout_seconds is None
+
+
+def test_settings_loader_given_auto_workers_when_loaded_then_keeps_auto(
+    temp_workspace: Path,
+) -> None:
+    settings = temp_workspace / "configs" / "settings.ini"
+    _ = settings.write_text("RECONCILE_PKG_PREPROCESS_WORKERS=Auto\n", encoding="utf-8")
+
+    config = SettingsLoader.load(settings)
+
+    assert config.user.reconcile_pkg_preprocess_workers == "auto"
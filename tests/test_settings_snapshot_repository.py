@@ -1,35 +1,109 @@
 from __future__ import annotations
 
+import json
+import os
 from pathlib import Path
 
+import pytest
+
 from homebrew_cdn_m1_server.application.repositories.settings_snapshot_repository import (
     SettingsSnapshotRepository,
 )
+from homebrew_cdn_m1_server.domain.models.settings_change import SettingsChange
+
+
+def _make_repository(temp_workspace: Path, settings: str) -> SettingsSnapshotRepository:
+    settings_path = temp_workspace / "configs" / "settings.ini"
+    snapshot_path = temp_workspace / "data" / "internal" / "catalog" / "settings-snapshot.json"
+    pkgtool_path = temp_workspace / "bin" / "pkgtool"
+    pkgtool_path.parent.mkdir(parents=True, exist_ok=True)
+    _ = pkgtool_path.write_bytes(b"v1")
+    _ = settings_path.write_text(settings, encoding="utf-8")
+    return SettingsSnapshotRepository(snapshot_path, settings_path, pkgtool_path)
+
+
+def test_settings_snapshot_repository_given_hashes_when_save_then_load_roundtrip(
+    temp_workspace: Path,
+) -> None:
+    repository = _make_repository(temp_workspace, "SERVER_IP=127.0.0.1\n")
+    current = repository.current_hashes()
+
+    repository.save(current)
 
+    assert repository.load() == current
+    assert repository.classify(repository.load(), current) is SettingsChange.NONE
 
-def test_settings_snapshot_repository_given_hash_when_save_then_load_roundtrip(
+
+def test_settings_snapshot_repository_given_noop_keys_changed_when_classify_then_returns_none(
     temp_workspace: Path,
 ) -> None:
     settings_path = temp_workspace / "configs" / "settings.ini"
-    snapshot_path = temp_workspace / "data" / "internal" / "catalog" / "settings-snapshot.json"
-    _ = settings_path.write_text("SERVER_IP=127.0.0.1\n", encoding="utf-8")
-    repository = SettingsSnapshotRepository(snapshot_path, settings_path)
+    repository = _make_repository(temp_workspace, "SERVER_IP=127.0.0.1\nLOG_LEVEL=info\n")
+    previous = repository.current_hashes()
 
-    repository.save("abc123")
+    _ = settings_path.write_text(
+        "SERVER_IP=127.0.0.1\nLOG_LEVEL=debug\nRECONCILE_CRON_EXPRESSION=* * * * *\n",
+        encoding="utf-8",
+    )
 
-    assert repository.load() == "abc123"
+    assert repository.classify(previous, repository.current_hashes()) is SettingsChange.NONE
 
 
-def test_settings_snapshot_repository_given_settings_changed_when_current_hash_then_changes(
+@pytest.mark.parametrize(
+    "changed",
+    [
+        "SERVER_IP=10.0.0.20",
+        "MEDIA_DERIVATIVES_ENABLED=true",
+        "STORAGE_LAYOUT=sharded",
+        "STORAGE_VERSIONED_PATHS=true",
+        "DOWNLOAD_COUNTING=access-log",
+    ],
+)
+def test_settings_snapshot_repository_given_export_keys_changed_when_classify_then_reexports(
     temp_workspace: Path,
+    changed: str,
 ) -> None:
     settings_path = temp_workspace / "configs" / "settings.ini"
+    repository = _make_repository(temp_workspace, "SERVER_IP=127.0.0.1\n")
+    previous = repository.current_hashes()
+
+    _ = settings_path.write_text(f"SERVER_IP=127.0.0.1\n{changed}\n", encoding="utf-8")
+
+    assert repository.classify(previous, repository.current_hashes()) is SettingsChange.REEXPORT
+
+
+def test_settings_snapshot_repository_given_pkgtool_changed_when_classify_then_reprobes(
+    temp_workspace: Path,
+) -> None:
+    repository = _make_repository(temp_workspace, "SERVER_IP=127.0.0.1\n")
+    previous = repository.current_hashes()
+
+    _ = (temp_workspace / "bin" / "pkgtool").write_bytes(b"version-2")
+
+    assert repository.classify(previous, repository.current_hashes()) is SettingsChange.REPROBE
+
+
+def test_settings_snapshot_repository_given_legacy_snapshot_when_classify_then_only_reexports(
+    temp_workspace: Path,
+) -> None:
+    repository = _make_repository(temp_workspace, "SERVER_IP=127.0.0.1\n")
     snapshot_path = temp_workspace / "data" / "internal" / "catalog" / "settings-snapshot.json"
-    _ = settings_path.write_text("SERVER_IP=127.0.0.1\n", encoding="utf-8")
-    repository = SettingsSnapshotRepository(snapshot_path, settings_path)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    _ = snapshot_path.write_text(json.dumps({"hash": "abc123"}), encoding="utf-8")
+
+    previous = repository.load()
+
+    assert previous == {}
+    assert repository.classify(previous, repository.current_hashes()) is SettingsChange.REEXPORT
+
+
+def test_settings_snapshot_repository_given_pkgtool_only_touched_when_classify_then_returns_none(
+    temp_workspace: Path,
+) -> None:
+    repository = _make_repository(temp_workspace, "SERVER_IP=127.0.0.1\n")
+    previous = repository.current_hashes()
 
-    first = repository.current_hash()
-    _ = settings_path.write_text("SERVER_IP=10.0.0.20\n", encoding="utf-8")
-    second = repository.current_hash()
+    pkgtool_path = temp_workspace / "bin" / "pkgtool"
+    os.utime(pkgtool_path, (1, 1))
 
-    assert first != second
+    assert repository.classify(previous, repository.current_hashes()) is SettingsChange.NONE
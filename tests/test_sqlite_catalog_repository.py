@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+from contextlib import closing
+from dataclasses import replace
 from pathlib import Path
+import sqlite3
 
 from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
 from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
@@ -46,12 +49,15 @@ def test_sqlite_repo_given_upsert_and_prune_then_persists_and_deletes(temp_works
         assert uow.catalog.get_download_count("CUSA00001") == 0
         assert uow.catalog.increment_download_count("CUSA00001") == 1
         assert uow.catalog.increment_download_count("CUSA00001") == 2
+        assert uow.catalog.add_download_counts({"CUSA00001": 3, "CUSA00002": 0, "": 4}) == 3
+        assert uow.catalog.get_download_count("CUSA00001") == 5
+        assert uow.catalog.get_download_count("CUSA00002") == 0
         uow.commit()
 
     with SqliteUnitOfWork(db_path) as uow:
         items = uow.catalog.list_items()
         assert len(items) == 1
-        assert items[0].downloads == 2
+        assert items[0].downloads == 5
         assert items[0].publisher == "Mojang"
         removed = uow.catalog.delete_by_pkg_paths_not_in(set())
         uow.commit()
@@ -60,3 +66,103 @@ def test_sqlite_repo_given_upsert_and_prune_then_persists_and_deletes(temp_works
 
     with SqliteUnitOfWork(db_path) as uow:
         assert uow.catalog.list_items() == []
+
+
+def test_sqlite_repo_given_pkg_paths_when_selected_and_deleted_then_touches_only_them(
+    temp_workspace: Path,
+):
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    pkg_a = temp_workspace / "A.pkg"
+
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.catalog.upsert(_item(pkg_a))
+        uow.commit()
+
+    with SqliteUnitOfWork(db_path) as uow:
+        selected = uow.catalog.get_by_pkg_paths({str(pkg_a), "missing.pkg"})
+        assert uow.catalog.delete_by_pkg_paths({"missing.pkg"}) == 0
+        removed = uow.catalog.delete_by_pkg_paths({str(pkg_a)})
+        uow.commit()
+
+    assert [item.pkg_path for item in selected] == [pkg_a]
+    assert removed == 1
+
+
+def test_sqlite_repo_given_kept_root_when_pruned_then_keeps_rows_under_it(
+    temp_workspace: Path,
+):
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    pkg_a = temp_workspace / "pkg" / "A.pkg"
+    pkg_b = temp_workspace / "vol2" / "B.pkg"
+    pkg_c = temp_workspace / "vol20" / "C.pkg"
+
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.catalog.upsert(_item(pkg_a))
+        uow.catalog.upsert(replace(_item(pkg_b), version="02.00"))
+        uow.catalog.upsert(replace(_item(pkg_c), version="03.00"))
+        removed = uow.catalog.delete_by_pkg_paths_not_in(set(), (temp_workspace / "vol2",))
+        uow.commit()
+
+    assert removed == 2
+    with SqliteUnitOfWork(db_path) as uow:
+        assert [item.pkg_path for item in uow.catalog.list_items()] == [pkg_b]
+
+
+def test_sqlite_repo_given_outdated_versions_when_list_stale_then_returns_only_them(
+    temp_workspace: Path,
+):
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    stale = _item(temp_workspace / "A.pkg")
+    fresh = replace(
+        _item(temp_workspace / "B.pkg"),
+        version="01.01",
+        probe_version=2,
+        derive_version=3,
+    )
+
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.catalog.upsert(stale)
+        uow.catalog.upsert(fresh)
+        uow.commit()
+
+    with SqliteUnitOfWork(db_path) as uow:
+        listed = uow.catalog.list_stale(2, 3, 10)
+        assert uow.catalog.list_stale(2, 3, 0) == []
+        assert uow.catalog.list_stale(0, 0, 10) == []
+        removed = uow.catalog.delete_item(stale)
+        uow.commit()
+
+    assert [item.pkg_path for item in listed] == [stale.pkg_path]
+    assert removed == 1
+    with SqliteUnitOfWork(db_path) as uow:
+        remaining = uow.catalog.list_items()
+    assert [(item.probe_version, item.derive_version) for item in remaining] == [(2, 3)]
+
+
+def test_sqlite_repo_given_rows_without_versions_when_migrated_then_marks_them_version_one(
+    temp_workspace: Path,
+):
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.catalog.upsert(_item(temp_workspace / "A.pkg"))
+        uow.commit()
+    # A catalog written before probe/derive versions were recorded.
+    with closing(sqlite3.connect(db_path)) as conn:
+        for column in ("probe_version", "derive_version"):
+            _ = conn.execute(f"ALTER TABLE catalog_items DROP COLUMN {column}")
+        conn.commit()
+
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.commit()
+        items = uow.catalog.list_items()
+
+    assert [(item.probe_version, item.derive_version) for item in items] == [(1, 1)]
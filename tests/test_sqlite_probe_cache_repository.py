@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from datetime import UTC, datetime
+from pathlib import Path
+
+from homebrew_cdn_m1_server.application.repositories.sqlite_probe_cache_repository import (
+    SqliteProbeCacheRepository,
+)
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import SqliteUnitOfWork
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.content_id import ContentId
+from homebrew_cdn_m1_server.domain.models.results import ProbeResult
+
+
+def _probe(icon0: Path | None) -> ProbeResult:
+    return ProbeResult(
+        content_id=ContentId.parse("UP0000-TEST00000_00-TEST000000000000"),
+        title_id="CUSA00001",
+        title="Test",
+        category="GD",
+        version="01.00",
+        pubtoolinfo="c_date=20250101",
+        system_ver="09.00",
+        app_type=AppType.GAME,
+        release_date="2025-01-01",
+        sfo_fields={"TITLE": "Test"},
+        sfo_raw=b"sfo",
+        sfo_hash="hash",
+        icon0_path=icon0,
+        pic0_path=None,
+        pic1_path=None,
+    )
+
+
+def test_probe_cache_given_saved_result_and_failure_when_loaded_then_round_trips(
+    temp_workspace: Path,
+):
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    icon0 = temp_workspace / "media" / "icon0.png"
+
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.probe_cache.save_result("fp-ok", _probe(icon0))
+        uow.probe_cache.record_failure("fp-bad", "PARAM.SFO not found")
+        uow.commit()
+
+    with SqliteUnitOfWork(db_path) as uow:
+        cached = uow.probe_cache.get_result("fp-ok")
+        assert cached == _probe(icon0)
+        assert uow.probe_cache.get_failure("fp-ok") is None
+        assert uow.probe_cache.get_result("fp-bad") is None
+        assert uow.probe_cache.get_failure("fp-bad") == "PARAM.SFO not found"
+        assert uow.probe_cache.get_result("missing") is None
+
+
+def test_probe_cache_given_unreferenced_entries_when_pruned_then_keeps_failures(
+    temp_workspace: Path,
+):
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.probe_cache.save_result("fp-ok", _probe(None))
+        uow.probe_cache.record_failure("fp-bad", "broken")
+        removed = uow.probe_cache.delete_unreferenced()
+        uow.commit()
+
+    assert removed == 1
+    with SqliteUnitOfWork(db_path) as uow:
+        assert uow.probe_cache.get_result("fp-ok") is None
+        assert uow.probe_cache.get_failure("fp-bad") == "broken"
+
+
+def test_probe_cache_given_expired_failure_when_pruned_then_deletes_it(
+    temp_workspace: Path,
+):
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.probe_cache.record_failure("fp-bad", "broken")
+        uow.commit()
+
+    later = datetime.now(UTC) + 2 * SqliteProbeCacheRepository.FAILURE_TTL
+    with SqliteUnitOfWork(db_path) as uow:
+        removed = uow.probe_cache.delete_unreferenced(now=later)
+        uow.commit()
+
+    assert removed == 1
+    with SqliteUnitOfWork(db_path) as uow:
+        assert uow.probe_cache.get_failure("fp-bad") is None
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+
+from homebrew_cdn_m1_server.application.repositories.sqlite_snapshot_repository import (
+    SqliteSnapshotRepository,
+)
+
+
+def _init_db(temp_workspace: Path) -> Path:
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    with sqlite3.connect(str(db_path)) as conn:
+        _ = conn.executescript(sql)
+    return db_path
+
+
+def _insert_catalog_path(db_path: Path, pkg_path: str, size: int, mtime_ns: int) -> None:
+    with sqlite3.connect(str(db_path)) as conn:
+        _ = conn.execute(
+            """
+            INSERT INTO catalog_items (
+                content_id, title_id, title, app_type, category, version,
+                release_date, pkg_path, pkg_size, pkg_mtime_ns, pkg_fingerprint,
+                sfo_json, sfo_raw, sfo_hash, created_at, updated_at
+            ) VALUES (
+                'UP0000-TEST00000_00-TEST000000000000', 'CUSA00001', 'Test', 'game', 'GD',
+                '01.00', '2025-01-01', ?, ?, ?, 'fp', '{}', x'', 'h', 'now', 'now'
+            )
+            """,
+            (pkg_path, size, mtime_ns),
+        )
+
+
+def test_sqlite_snapshot_given_saved_snapshot_when_saved_again_then_applies_only_changes(
+    temp_workspace: Path,
+):
+    repository = SqliteSnapshotRepository(_init_db(temp_workspace))
+
+    assert repository.is_empty() is True
+    repository.save({"a.pkg": (1, 10), "b.pkg": (2, 20)})
+    repository.save({"b.pkg": (2, 21), "c.pkg": (3, 30)})
+
+    assert repository.is_empty() is False
+    assert repository.load() == {"b.pkg": (2, 21), "c.pkg": (3, 30)}
+
+    repository.upsert({"d.pkg": (4, 40)})
+    repository.delete(["b.pkg"])
+
+    assert repository.load() == {"c.pkg": (3, 30), "d.pkg": (4, 40)}
+
+
+def test_sqlite_snapshot_given_previous_snapshot_when_build_delta_then_returns_expected_sets(
+    temp_workspace: Path,
+):
+    repository = SqliteSnapshotRepository(_init_db(temp_workspace))
+    repository.save({"a.pkg": (1, 10), "b.pkg": (2, 20)})
+
+    delta = repository.build_delta({"b.pkg": (2, 21), "c.pkg": (3, 30)})
+
+    assert delta.added == ("c.pkg",)
+    assert delta.updated == ("b.pkg",)
+    assert delta.removed == ("a.pkg",)
+
+
+def test_sqlite_snapshot_given_catalog_checkpoint_without_snapshot_when_build_delta_then_resumes(
+    temp_workspace: Path,
+):
+    db_path = _init_db(temp_workspace)
+    repository = SqliteSnapshotRepository(db_path)
+    _insert_catalog_path(db_path, "game/A.pkg", 1, 10)
+    repository.save({"game/A.pkg": (9, 99)})
+
+    delta = repository.build_delta({"game/A.pkg": (1, 10), "incoming.pkg": (2, 20)})
+
+    assert delta.added == ("incoming.pkg",)
+    assert delta.updated == tuple()
+    assert delta.removed == tuple()
+
+
+def test_sqlite_snapshot_given_subset_when_changed_paths_then_ignores_untouched_entries(
+    temp_workspace: Path,
+):
+    db_path = _init_db(temp_workspace)
+    repository = SqliteSnapshotRepository(db_path)
+    repository.save({"a.pkg": (1, 10), "b.pkg": (2, 20)})
+    _insert_catalog_path(db_path, "game/A.pkg", 5, 50)
+
+    changed = repository.changed_paths(
+        {"a.pkg": (1, 10), "b.pkg": (2, 21), "game/A.pkg": (5, 50), "new.pkg": (9, 90)}
+    )
+
+    assert changed == ("b.pkg", "new.pkg")
+
+
+def test_sqlite_snapshot_given_reprobe_queue_when_dequeued_then_keeps_remaining_paths(
+    temp_workspace: Path,
+):
+    repository = SqliteSnapshotRepository(_init_db(temp_workspace))
+
+    repository.queue_reprobe(["b.pkg", "a.pkg", "c.pkg"])
+    repository.dequeue_reprobe(["a.pkg"])
+    assert repository.reprobe_queue() == ("b.pkg", "c.pkg")
+
+    repository.queue_reprobe(["d.pkg"])
+    assert repository.reprobe_queue() == ("d.pkg",)
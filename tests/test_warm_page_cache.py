@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import cast
+
+import pytest
+
+from homebrew_cdn_m1_server.application.io_budget import IoBudget
+from homebrew_cdn_m1_server.application.repositories.sqlite_unit_of_work import (
+    SqliteUnitOfWork,
+)
+from homebrew_cdn_m1_server.domain.models.app_type import AppType
+from homebrew_cdn_m1_server.domain.models.catalog_item import CatalogItem
+from homebrew_cdn_m1_server.domain.models.content_id import ContentId
+from homebrew_cdn_m1_server.domain.models.param_sfo_snapshot import ParamSfoSnapshot
+from homebrew_cdn_m1_server.domain.workflows import warm_page_cache as module
+from homebrew_cdn_m1_server.domain.workflows.warm_page_cache import WarmPageCache
+
+pytestmark = pytest.mark.skipif(
+    not WarmPageCache.available(), reason="posix_fadvise is not available"
+)
+
+
+def _item(pkg_dir: Path, content_id: str, size: int) -> CatalogItem:
+    pkg_path = pkg_dir / f"{content_id}.pkg"
+    pkg_path.parent.mkdir(parents=True, exist_ok=True)
+    _ = pkg_path.write_bytes(b"\0" * size)
+    return CatalogItem(
+        content_id=ContentId.parse(content_id),
+        title_id=content_id[7:16],
+        title="Test",
+        app_type=AppType.GAME,
+        category="gd",
+        version="01.00",
+        pubtoolinfo="",
+        system_ver="",
+        release_date="2025-01-01",
+        pkg_path=pkg_path,
+        pkg_size=size,
+        pkg_mtime_ns=1,
+        pkg_fingerprint=f"fp-{content_id}",
+        icon0_path=None,
+        pic0_path=None,
+        pic1_path=None,
+        sfo=ParamSfoSnapshot(fields={}, raw=b"", hash=""),
+    )
+
+
+def _download(db_path: Path, content_id: str, times: int) -> None:
+    with SqliteUnitOfWork(db_path) as uow:
+        for _ in range(times):
+            _ = uow.catalog.increment_download_count(content_id)
+        uow.commit()
+
+
+def test_warm_page_cache_given_download_rates_when_run_then_prefetches_hot_and_drops_cold(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    pkg_dir = temp_workspace / "pkg" / "game"
+    popular = _item(pkg_dir, "UP0000-CUSA00001_00-TEST000000000000", 600)
+    rising = _item(pkg_dir, "UP0000-CUSA00002_00-TEST000000000000", 600)
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.catalog.upsert(popular)
+        uow.catalog.upsert(rising)
+        uow.commit()
+    _download(db_path, popular.content_id.value, 10)
+    _download(db_path, rising.content_id.value, 1)
+
+    calls: list[tuple[str, int, int, int]] = []
+    names: dict[int, str] = {}
+    real_open = os.open
+
+    def _open(path: Path, flags: int) -> int:
+        fd = real_open(path, flags)
+        names[fd] = Path(path).name[:16]
+        return fd
+
+    def _fadvise(fd: int, offset: int, length: int, advice: int) -> None:
+        calls.append((names[fd], offset, length, advice))
+
+    monkeypatch.setattr(module.os, "open", _open)
+    monkeypatch.setattr(module.os, "posix_fadvise", _fadvise)
+    now = [0.0]
+    warm = WarmPageCache(
+        uow_factory=lambda: SqliteUnitOfWork(db_path),
+        budget_bytes=1000,
+        logger=logging.getLogger("tests.warm_page_cache"),
+        clock=lambda: now[0],
+    )
+
+    # First cycle: no rates yet, cumulative downloads decide.
+    first = warm()
+    assert (first.warmed, first.evicted, first.warmed_bytes) == (2, 0, 1000)
+    assert calls == [
+        ("UP0000-CUSA00001", 0, 600, os.POSIX_FADV_WILLNEED),
+        ("UP0000-CUSA00002", 0, 400, os.POSIX_FADV_WILLNEED),
+    ]
+
+    # A burst of downloads outranks a larger but idle total; a new PKG jumps ahead.
+    calls.clear()
+    _download(db_path, rising.content_id.value, 5)
+    fresh = _item(pkg_dir, "UP0000-CUSA00003_00-TEST000000000000", 300)
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.upsert(fresh)
+        uow.commit()
+    now[0] = 60.0
+    second = warm()
+
+    # The popular PKG keeps a smaller share that is already resident.
+    assert (second.warmed, second.evicted, second.warmed_bytes) == (2, 0, 900)
+    assert [call[:3] for call in calls] == [
+        ("UP0000-CUSA00003", 0, 300),
+        ("UP0000-CUSA00002", 0, 600),
+    ]
+
+    calls.clear()
+    with SqliteUnitOfWork(db_path) as uow:
+        _ = uow.catalog.delete_item(popular)
+        uow.commit()
+    now[0] = 120.0
+    third = warm()
+    assert (third.warmed, third.evicted) == (0, 1)
+    assert calls == [("UP0000-CUSA00001", 0, 600, os.POSIX_FADV_DONTNEED)]
+
+
+class _RecordingBudget:
+    def __init__(self) -> None:
+        self.consumed: list[int] = []
+
+    def consume(self, size_bytes: int, ops: int = 1) -> float:
+        _ = ops
+        self.consumed.append(size_bytes)
+        return 0.0
+
+
+def test_warm_page_cache_given_resident_pages_when_refreshed_then_charges_only_new_bytes(
+    temp_workspace: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    db_path = temp_workspace / "data" / "internal" / "catalog" / "catalog.db"
+    sql = (Path(__file__).resolve().parents[1] / "init" / "catalog_db.sql").read_text("utf-8")
+    pkg_dir = temp_workspace / "pkg" / "game"
+    popular = _item(pkg_dir, "UP0000-CUSA00001_00-TEST000000000000", 600)
+    with SqliteUnitOfWork(db_path) as uow:
+        uow.catalog.init_schema(sql)
+        uow.catalog.upsert(popular)
+        uow.commit()
+    _download(db_path, popular.content_id.value, 1)
+
+    monkeypatch.setattr(module.os, "posix_fadvise", lambda *_args: None)
+    budget = _RecordingBudget()
+    now = [0.0]
+    warm = WarmPageCache(
+        uow_factory=lambda: SqliteUnitOfWork(db_path),
+        budget_bytes=400,
+        logger=logging.getLogger("tests.warm_page_cache"),
+        io_budget=cast(IoBudget, cast(object, budget)),
+        clock=lambda: now[0],
+    )
+
+    _ = warm()
+    assert budget.consumed == [400]
+    assert warm.is_warm(popular.pkg_path) is True
+
+    budget.consumed.clear()
+    now[0] = WarmPageCache.REFRESH_SECONDS + 1.0
+    refreshed = warm()
+    assert refreshed.warmed == 1
+    assert budget.consumed == []